@@ -0,0 +1,369 @@
+# app/backend/analytics.py
+"""
+饮食报告：每周 / 每月的食品消耗统计与浪费率（README 2.4）
+
+- 按用户按天的汇总表 daily_stats (user_id, day, metric, key) → (count, quantity)，报告只读该周期内的
+  汇总行（一周最多 7 天 × 类别数），与历史记录的长短无关；不扫 items 全表
+- 库存事件由 items 表上的触发器在同一事务里增量更新：录入计入录入当天的 added；status 改为
+  consumed / discarded 计入当天的吃完 / 丢弃（item_outcomes 记下是哪天，撤销或修改时从那天减回）；
+  删除条目视为录错，一并撤回。汇总因此始终等于按 items 现状重新统计的结果
+- 新鲜度检测 / OCR 扫描没有持久化的按用户记录：带 user_id 的请求在内存里合并计数，
+  每 flush_interval 秒一次 executemany 写入（查询报告前也会先写入）
+- 浪费率 = 丢弃条数 / (吃完 + 丢弃条数)；各食品单位不同，按条数而不是数量计算
+
+用法：
+    python -m app.backend.analytics backfill                          # 按现有库存重建汇总（可重复运行）
+    python -m app.backend.analytics report alice --period month --date 2024-06-01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.backend.config import get_section
+from app.backend.inventory import InventoryStore, get_store
+from app.backend.startup import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("week", "month")
+# 库存事件的指标（key 为类别）；扫描的指标（key 为新鲜度标签 / OCR 接口）
+ITEM_METRICS = ("added", "consumed", "discarded")
+SCAN_METRICS = ("freshness", "ocr")
+
+_UPSERT = ("ON CONFLICT (user_id, day, metric, key) DO UPDATE SET "
+           "count = count + excluded.count, quantity = quantity + excluded.quantity")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS daily_stats (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    key TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    quantity REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, metric, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS item_outcomes (
+    item_id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    key TEXT NOT NULL,
+    quantity REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS analytics_items_insert AFTER INSERT ON items BEGIN
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    VALUES (NEW.user_id, date(NEW.created_at, 'unixepoch', 'localtime'), 'added', COALESCE(NEW.category, ''),
+            1, NEW.quantity) {_UPSERT};
+    INSERT INTO item_outcomes (item_id, user_id, day, status, key, quantity)
+    SELECT NEW.id, NEW.user_id, date(NEW.updated_at, 'unixepoch', 'localtime'), NEW.status,
+           COALESCE(NEW.category, ''), NEW.quantity
+    WHERE NEW.status IN ('consumed', 'discarded');
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT user_id, day, status, key, 1, quantity FROM item_outcomes WHERE item_id = NEW.id {_UPSERT};
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_items_update AFTER UPDATE OF status, category, quantity ON items
+WHEN OLD.status IS NOT NEW.status OR OLD.category IS NOT NEW.category OR OLD.quantity IS NOT NEW.quantity
+BEGIN
+    -- 类别 / 数量改了：录入当天的 added 从旧值挪到新值
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT OLD.user_id, date(OLD.created_at, 'unixepoch', 'localtime'), 'added', COALESCE(OLD.category, ''),
+           -1, -OLD.quantity
+    WHERE OLD.category IS NOT NEW.category OR OLD.quantity IS NOT NEW.quantity {_UPSERT};
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT NEW.user_id, date(NEW.created_at, 'unixepoch', 'localtime'), 'added', COALESCE(NEW.category, ''),
+           1, NEW.quantity
+    WHERE OLD.category IS NOT NEW.category OR OLD.quantity IS NOT NEW.quantity {_UPSERT};
+    -- 吃完 / 丢弃：撤回旧结果，再按新状态记入（状态没变时仍记在原来那天）
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT user_id, day, status, key, -1, -quantity FROM item_outcomes WHERE item_id = OLD.id {_UPSERT};
+    INSERT OR REPLACE INTO item_outcomes (item_id, user_id, day, status, key, quantity)
+    SELECT NEW.id, NEW.user_id,
+           COALESCE((SELECT day FROM item_outcomes WHERE item_id = OLD.id AND OLD.status = NEW.status),
+                    date(NEW.updated_at, 'unixepoch', 'localtime')),
+           NEW.status, COALESCE(NEW.category, ''), NEW.quantity
+    WHERE NEW.status IN ('consumed', 'discarded');
+    DELETE FROM item_outcomes WHERE item_id = OLD.id AND NEW.status NOT IN ('consumed', 'discarded');
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT user_id, day, status, key, 1, quantity FROM item_outcomes WHERE item_id = NEW.id {_UPSERT};
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_items_delete AFTER DELETE ON items BEGIN
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    VALUES (OLD.user_id, date(OLD.created_at, 'unixepoch', 'localtime'), 'added', COALESCE(OLD.category, ''),
+            -1, -OLD.quantity) {_UPSERT};
+    INSERT INTO daily_stats (user_id, day, metric, key, count, quantity)
+    SELECT user_id, day, status, key, -1, -quantity FROM item_outcomes WHERE item_id = OLD.id {_UPSERT};
+    DELETE FROM item_outcomes WHERE item_id = OLD.id;
+END;
+"""
+
+# 按 items 现状重建库存类汇总（回填）；吃完 / 丢弃的日期取 updated_at，触发器建好之前的改动只能这样近似
+_REBUILD = (
+    "DELETE FROM daily_stats WHERE metric IN ('added', 'consumed', 'discarded')",
+    "DELETE FROM item_outcomes",
+    "INSERT INTO item_outcomes (item_id, user_id, day, status, key, quantity) "
+    "SELECT id, user_id, date(updated_at, 'unixepoch', 'localtime'), status, COALESCE(category, ''), quantity "
+    "FROM items WHERE status IN ('consumed', 'discarded')",
+    "INSERT INTO daily_stats (user_id, day, metric, key, count, quantity) "
+    "SELECT user_id, date(created_at, 'unixepoch', 'localtime'), 'added', COALESCE(category, ''), "
+    "COUNT(*), SUM(quantity) FROM items GROUP BY 1, 2, 4",
+    "INSERT INTO daily_stats (user_id, day, metric, key, count, quantity) "
+    "SELECT user_id, day, status, key, COUNT(*), SUM(quantity) FROM item_outcomes GROUP BY user_id, day, status, key",
+)
+
+
+def period_range(period: str, day: date) -> Tuple[date, date]:
+    """day 所在的自然周（周一到周日）或自然月的起止日期"""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == "month":
+        start = day.replace(day=1)
+        following = (start + timedelta(days=32)).replace(day=1)
+        return start, following - timedelta(days=1)
+    raise ValueError(f"报告周期只能是 {PERIODS}: {period}")
+
+
+def _as_date(value: Union[date, str, None]) -> date:
+    if value is None or value == "":
+        return date.today()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"date 不是有效日期（YYYY-MM-DD）: {value}") from None
+
+
+def _waste_rate(consumed: int, discarded: int) -> Optional[float]:
+    closed = consumed + discarded
+    return round(discarded / closed, 4) if closed > 0 else None
+
+
+def scan_key(kind: str, result: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    扫描结果 → (metric, key)；失败的结果不计
+
+    kind 为 freshness 时按新鲜度标签计数，ocr / analyze / dates 按接口计数
+    """
+    if not isinstance(result, dict) or result.get("status") == "error":
+        return None
+    if kind == "freshness":
+        return ("freshness", result["label"]) if result.get("label") else None
+    return "ocr", kind
+
+
+class AnalyticsEngine:
+    """按用户按天的汇总与周 / 月报告（与食品库存共用同一个 SQLite 数据库）"""
+
+    def __init__(self, store: InventoryStore, flush_interval: float = 5.0):
+        """
+        Args:
+            store: 食品库存；建表时在 items 上装好汇总触发器
+            flush_interval: 扫描计数在内存里合并多久写入一次（秒）
+        """
+        self.store = store
+        self.flush_interval = float(flush_interval)
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, str, str], int] = defaultdict(int)
+        with store.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+            empty = conn.execute("SELECT 1 FROM daily_stats LIMIT 1").fetchone() is None
+            has_items = conn.execute("SELECT 1 FROM items LIMIT 1").fetchone() is not None
+        if empty and has_items:
+            logger.warning("库存里已有食品但汇总为空，报告需先回填: python -m app.backend.analytics backfill")
+        register_after_fork(self)
+
+    @classmethod
+    def from_config(cls, store: InventoryStore, cfg: Dict[str, Any]) -> "AnalyticsEngine":
+        """按配置节（flush_interval）创建"""
+        return cls(store, flush_interval=cfg.get("flush_interval", 5.0))
+
+    def _after_fork(self) -> None:
+        # 父进程还没写入的计数由父进程自己写入，子进程从空开始，避免重复计数
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+
+    # ---------------- 写入 ----------------
+
+    def record_scan(self, user_id: str, kind: str, result: Dict[str, Any], day: Optional[date] = None) -> bool:
+        """记一次扫描（只在内存里累加，不访问数据库，可在事件循环里直接调用）；返回是否计入"""
+        key = scan_key(kind, result)
+        if not user_id or key is None:
+            return False
+        with self._lock:
+            self._pending[(user_id, (day or date.today()).isoformat(), *key)] += 1
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """把内存里的扫描计数一次写入（一个事务），返回写入的汇总行数；写入失败时计数放回，下次再写"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+        try:
+            with self.store.pool.transaction() as conn:
+                conn.executemany(
+                    f"INSERT INTO daily_stats (user_id, day, metric, key, count, quantity) "
+                    f"VALUES (?, ?, ?, ?, ?, 0) {_UPSERT}",
+                    [(*key, count) for key, count in pending.items()])
+        except BaseException:
+            with self._lock:
+                for key, count in pending.items():
+                    self._pending[key] += count
+            raise
+        return len(pending)
+
+    def rebuild(self) -> Dict[str, Any]:
+        """按 items 现状重建库存类汇总（一个事务内集合查询；扫描计数不受影响），可重复运行"""
+        started = time.perf_counter()
+        with self.store.pool.transaction() as conn:
+            for sql in _REBUILD:
+                conn.execute(sql)
+            items = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            rows = conn.execute("SELECT COUNT(*) FROM daily_stats WHERE metric IN ('added', 'consumed', 'discarded')"
+                                ).fetchone()[0]
+        result = {"items": items, "rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+        logger.info(f"饮食报告汇总已重建: {result}")
+        return result
+
+    # ---------------- 报告 ----------------
+
+    def report(self, user_id: str, period: str = "week", day: Union[date, str, None] = None) -> Dict[str, Any]:
+        """
+        day 所在自然周 / 自然月的报告，附上一周期的对比
+
+        只读 [上一周期开始, 本周期结束] 内该用户的汇总行（主键范围扫描）
+        """
+        start, end = period_range(period, _as_date(day))
+        prev_start, prev_end = period_range(period, start - timedelta(days=1))
+        self.flush()
+        with self.store.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT day, metric, key, count, quantity FROM daily_stats "
+                "WHERE user_id = ? AND day >= ? AND day <= ? AND count != 0",
+                (user_id, prev_start.isoformat(), end.isoformat())).fetchall()
+
+        current = [row for row in rows if row["day"] >= start.isoformat()]
+        previous = [row for row in rows if row["day"] < start.isoformat()]
+        report = {"user_id": user_id, "period": period, "start": start.isoformat(), "end": end.isoformat(),
+                  **self._summarize(current, start, end)}
+        before = self._totals(previous)
+        report["previous"] = {"start": prev_start.isoformat(), "end": prev_end.isoformat(),
+                              "consumed": before["consumed"]["count"], "discarded": before["discarded"]["count"],
+                              "waste_rate": _waste_rate(before["consumed"]["count"], before["discarded"]["count"])}
+        return report
+
+    @staticmethod
+    def _totals(rows: Iterable[Any]) -> Dict[str, Dict[str, float]]:
+        totals = {metric: {"count": 0, "quantity": 0.0} for metric in ITEM_METRICS}
+        for row in rows:
+            if row["metric"] in totals:
+                totals[row["metric"]]["count"] += row["count"]
+                totals[row["metric"]]["quantity"] += row["quantity"]
+        return totals
+
+    def _summarize(self, rows: List[Any], start: date, end: date) -> Dict[str, Any]:
+        totals = self._totals(rows)
+        for value in totals.values():
+            value["quantity"] = round(value["quantity"], 3)
+        categories: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(ITEM_METRICS, 0))
+        scans: Dict[str, Dict[str, int]] = {metric: defaultdict(int) for metric in SCAN_METRICS}
+        days = {(start + timedelta(days=i)).isoformat(): {**dict.fromkeys(ITEM_METRICS, 0), "scans": 0}
+                for i in range((end - start).days + 1)}
+        for row in rows:
+            metric, key, count = row["metric"], row["key"], row["count"]
+            if metric in ITEM_METRICS:
+                categories[key][metric] += count
+                days[row["day"]][metric] += count
+            elif metric in scans:
+                scans[metric][key] += count
+                days[row["day"]]["scans"] += count
+        consumed, discarded = totals["consumed"]["count"], totals["discarded"]["count"]
+        return {
+            **totals,
+            "waste_rate": _waste_rate(consumed, discarded),
+            "categories": sorted(
+                ({"category": key or None, **counts, "waste_rate": _waste_rate(counts["consumed"], counts["discarded"])}
+                 for key, counts in categories.items() if any(counts.values())),
+                key=lambda c: (-(c["added"] + c["consumed"] + c["discarded"]), c["category"] or "")),
+            "freshness": {"scans": sum(scans["freshness"].values()), "labels": dict(scans["freshness"])},
+            "ocr": {"scans": sum(scans["ocr"].values()), "kinds": dict(scans["ocr"])},
+            "daily": [{"day": d, **counts} for d, counts in days.items()],
+        }
+
+
+async def analytics_loop(engine: AnalyticsEngine, interval: float) -> None:
+    """每 interval 秒把内存里的扫描计数写入；在库存连接池线程里执行，不阻塞事件循环"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await engine.store.run(engine.flush)
+        except Exception as e:
+            logger.error(f"扫描计数写入失败，下次重试: {e}")
+
+
+def _config() -> Dict[str, Any]:
+    return get_section("service_config", "analytics")
+
+
+_engine: Optional[AnalyticsEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_analytics() -> AnalyticsEngine:
+    """全局报告引擎（首次调用时按 service_config.yaml 的 analytics 节创建，并装好 items 上的触发器）"""
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AnalyticsEngine.from_config(get_store(), _config())
+    return _engine
+
+
+def close_analytics() -> None:
+    """写入剩余的扫描计数（须在 close_store 之前调用）"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            try:
+                _engine.flush()
+            except Exception as e:
+                logger.error(f"扫描计数写入失败，{_engine.pending()} 条丢失: {e}")
+            _engine = None
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="饮食报告汇总")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="按现有库存重建汇总")
+    report = sub.add_parser("report", help="输出一个用户的报告")
+    report.add_argument("user_id")
+    report.add_argument("--period", choices=PERIODS, default="week")
+    report.add_argument("--date", default=None, help="报告所在的任一天（YYYY-MM-DD），默认今天")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    engine = get_analytics()
+    try:
+        if args.command == "backfill":
+            print(json.dumps(engine.rebuild(), ensure_ascii=False))
+        else:
+            print(json.dumps(engine.report(args.user_id, args.period, args.date), ensure_ascii=False, indent=2))
+    finally:
+        close_analytics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# app/backend/batching.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.backend.metrics import Histogram
+from app.backend.startup import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    动态微批调度器
+
+    并发请求先进入队列，后台线程把它们攒成一批（达到 max_batch_size
+    或最早的请求已等待 max_wait_ms 即发车），一次调用 batch_fn，
+    再把结果按顺序分发回每个调用方的 Future。
+    """
+
+    def __init__(self,
+                 batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 name: str = "batcher"):
+        """
+        Args:
+            batch_fn: 批处理函数，输入 N 个元素，按顺序返回 N 个结果
+            max_batch_size: 单批最大元素数
+            max_wait_ms: 批内第一个请求的最长等待时间（毫秒）
+            name: 名称，用于日志和线程名
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self.batch_size_hist = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_hist = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._start()
+        register_after_fork(self)
+        logger.info(f"微批调度器 {name} 已启动 (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={max_wait_ms})")
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name=f"{self.name}-batcher", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        """fork 出的子进程里没有后台线程：换新队列和直方图（只统计本进程），重新启动线程"""
+        if self._closed:
+            return
+        self._queue = queue.Queue()
+        self.batch_size_hist = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_hist = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._start()
+
+    def submit(self, item: Any) -> Future:
+        """提交一个元素，返回可等待结果的 Future"""
+        if self._closed:
+            raise RuntimeError(f"微批调度器 {self.name} 已关闭")
+        future: Future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def predict(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """同步接口：提交并阻塞等待结果"""
+        return self.submit(item).result(timeout=timeout)
+
+    def qsize(self) -> int:
+        """当前排队中的请求数"""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """批大小和排队等待时间（毫秒）直方图"""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.qsize(),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_wait_ms": self.queue_wait_hist.snapshot(),
+        }
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """停止后台线程（已入队的请求会先处理完）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def _collect(self, first) -> Tuple[List[tuple], bool]:
+        """以 first 为首攒一批，返回 (batch, 是否收到停止信号)"""
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    # 已到发车时间，只顺手带走已经在排队的请求
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        started = time.perf_counter()
+        self.batch_size_hist.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_hist.observe((started - enqueued) * 1000.0)
+
+        items = [entry[0] for entry in batch]
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"批处理返回 {len(results)} 个结果，期望 {len(items)} 个")
+        except Exception as e:
+            logger.error(f"微批调度器 {self.name} 批处理失败: {e}", exc_info=True)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,240 @@
+# app/backend/cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.backend.startup import keep_inherited, register_after_fork
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def content_key(data: bytes, namespace: str) -> str:
+    """图片内容 + 模型/版本 → 缓存键（blake2b，比 sha256 快且足够抗碰撞）"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(namespace.encode("utf-8"))
+    h.update(b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    按内容寻址的推理结果缓存
+
+    - 进程内 LRU：按条数和字节数双重上限淘汰，每条带 TTL
+    - 可选 SQLite 磁盘层：进程重启后仍可命中
+    - 相同 key 的并发请求合并，只跑一次推理（single-flight）
+
+    值以 JSON 文本保存，读取时反序列化，调用方拿到的是独立副本，可随意修改。
+    """
+
+    def __init__(self,
+                 name: str,
+                 max_entries: int = 2048,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 86400,
+                 disk_path: Optional[str] = None,
+                 max_disk_entries: int = 200000,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            name: 缓存名称，同时作为磁盘层的表名
+            max_entries: 内存层最大条数
+            max_bytes: 内存层最大字节数（按 JSON 文本长度计）
+            ttl_seconds: 过期时间（秒）
+            disk_path: SQLite 文件路径，None 表示不启用磁盘层
+            max_disk_entries: 磁盘层最大条数
+            clock: 时间函数（测试时可替换）
+        """
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl = float(ttl_seconds)
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self._clock = clock
+
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._disk_writes = 0
+        self._disk_path = disk_path
+        if disk_path:
+            self._open_disk(disk_path)
+        register_after_fork(self)
+
+    def _after_fork(self) -> None:
+        """fork 出的子进程里：锁和进行中的计算换新的；继承的 SQLite 连接不能用，重新打开一个"""
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._inflight = {}
+        if self._db is not None:
+            keep_inherited(self._db)
+            self._db = None
+            self._open_disk(self._disk_path)
+
+    def _open_disk(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" '
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        logger.info(f"结果缓存 {self.name} 已启用磁盘层: {path}")
+
+    # ---------------- 读写 ----------------
+
+    def get(self, key: str) -> Any:
+        """命中返回值，未命中（或已过期）返回 None"""
+        value = self._get(key)
+        return None if value is _MISSING else value
+
+    def _get(self, key: str) -> Any:
+        now = self._clock()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                expires_at, text = entry
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return json.loads(text)
+                self._remove(key)
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    f'SELECT value, expires_at FROM "{self.name}" WHERE key = ?', (key,)
+                ).fetchone()
+            if row is not None and row[1] > now:
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                    self._put_memory(key, row[0], row[1])
+                return json.loads(row[0])
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return _MISSING
+
+    def set(self, key: str, value: Any) -> None:
+        text = json.dumps(value, ensure_ascii=False)
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            self._put_memory(key, text, expires_at)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    f'INSERT OR REPLACE INTO "{self.name}" (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, text, expires_at),
+                )
+                self._db.commit()
+                self._disk_writes += 1
+                if self._disk_writes % 1000 == 0:
+                    self._prune_disk()
+
+    def get_or_compute(self,
+                       key: str,
+                       compute: Callable[[], Any],
+                       should_cache: Callable[[Any], bool] = lambda _: True) -> Any:
+        """
+        查缓存，未命中时调用 compute 计算并写入
+
+        同一 key 同时只有一个调用方真正执行 compute，其余调用方等待并共享结果；
+        compute 抛出的异常会传给所有等待者，且不写入缓存。
+        """
+        value = self._get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            # 刚好有别的调用方算完并写入了缓存
+            entry = self._lru.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self.counters["hits"] += 1
+                return json.loads(entry[1])
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            # 等待者拿到的是 JSON 副本，与领头调用方的结果互不影响
+            return json.loads(future.result())
+
+        try:
+            value = compute()
+            if should_cache(value):
+                self.set(key, value)
+            future.set_result(json.dumps(value, ensure_ascii=False))
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # ---------------- 淘汰 ----------------
+
+    def _put_memory(self, key: str, text: str, expires_at: float) -> None:
+        """调用方需持有 self._lock"""
+        if key in self._lru:
+            self._remove(key)
+        if len(text) > self.max_bytes:
+            return
+        self._lru[key] = (expires_at, text)
+        self._bytes += len(text)
+        while len(self._lru) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._lru))
+            self._remove(oldest)
+            self.counters["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        """调用方需持有 self._lock"""
+        _, text = self._lru.pop(key)
+        self._bytes -= len(text)
+
+    def _prune_disk(self) -> None:
+        """删除磁盘层中已过期的条目，并把条数压回上限（调用方需持有 self._db_lock）"""
+        self._db.execute(f'DELETE FROM "{self.name}" WHERE expires_at <= ?', (self._clock(),))
+        self._db.execute(
+            f'DELETE FROM "{self.name}" WHERE key IN (SELECT key FROM "{self.name}" '
+            f"ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self.counters)
+            data.update(entries=len(self._lru), bytes=self._bytes)
+        lookups = data["hits"] + data["disk_hits"] + data["misses"]
+        data["hit_rate"] = round((data["hits"] + data["disk_hits"]) / lookups, 4) if lookups else 0.0
+        data["disk"] = self._db is not None
+        return data
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
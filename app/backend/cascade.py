@@ -0,0 +1,103 @@
+# app/backend/cascade.py
+"""
+分层级联的新鲜度检测：先用便宜的检测器，拿不准时才交给深度模型
+
+    第 1 层 SimpleFreshnessDetector（颜色 / 褐变 / 纹理，约 1 毫秒）
+        置信度 ≥ high_confidence → 直接作答
+    第 2 层 FreshnessDetector（深度模型，经结果缓存与微批调度器）
+        置信度 < low_confidence → 结果标记 low_confidence，建议人工确认
+
+阈值取 freshness_config.yaml 的 thresholds 节；各层作答次数写入 Prometheus 计数器，
+升级率（交给深度模型的比例）见 stats()。
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+from app.backend.metrics import REGISTRY, stage
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("simple", "deep")
+
+CASCADE_ANSWERS = REGISTRY.counter("smart_food_cascade_answers_total", "级联新鲜度检测各层作答次数", ("tier",))
+
+
+class FreshnessCascade:
+    """两层级联：cheap 置信度够高就作答，否则升级到 deep"""
+
+    def __init__(self,
+                 cheap,
+                 deep_predict: Callable[[bytes], Dict[str, Any]],
+                 high_confidence: float = 0.8,
+                 low_confidence: float = 0.5):
+        """
+        Args:
+            cheap: 第 1 层检测器，带 predict(image_bytes) 方法（SimpleFreshnessDetector）
+            deep_predict: 第 2 层预测函数（带缓存 / 微批的深度模型推理）
+            high_confidence: 第 1 层置信度达到此值即作答
+            low_confidence: 最终置信度低于此值时标记 low_confidence
+        """
+        if not 0 <= low_confidence <= high_confidence <= 1:
+            raise ValueError(f"阈值须满足 0 ≤ low_confidence ≤ high_confidence ≤ 1: {low_confidence}, {high_confidence}")
+        self.cheap = cheap
+        self.deep_predict = deep_predict
+        self.high_confidence = float(high_confidence)
+        self.low_confidence = float(low_confidence)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "simple": 0, "deep": 0, "low_confidence": 0, "errors": 0}
+
+    @classmethod
+    def from_config(cls, cheap, deep_predict: Callable[[bytes], Dict[str, Any]],
+                    thresholds: Dict[str, Any]) -> "FreshnessCascade":
+        """按 freshness_config.yaml 的 thresholds 节（high_confidence / low_confidence）创建"""
+        return cls(cheap, deep_predict,
+                   high_confidence=thresholds.get("high_confidence", 0.8),
+                   low_confidence=thresholds.get("low_confidence", 0.5))
+
+    def _count(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self.counters[key] += 1
+
+    def predict(self, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        Returns:
+            检测结果，另带 tier（"simple" | "deep"，由哪一层作答）、
+            cheap_score（第 1 层置信度）、low_confidence（最终置信度低于阈值）
+        """
+        # 两层各自解码：第 1 层只按 analysis_size 缩小解码（JPEG 在 DCT 域缩小，约 1 毫秒）；
+        # 第 2 层按图片字节查结果缓存、进微批队列，命中缓存时根本不解码，因此不把第 1 层的解码结果传下去
+        with stage("freshness", "cascade_simple"):
+            first = self.cheap.predict(image_bytes)
+        if first["status"] != "success":
+            # 第 1 层解码失败时深度模型也无法处理，直接返回
+            self._count("requests", "errors")
+            return first
+
+        if first["score"] >= self.high_confidence:
+            result, tier = first, "simple"
+        else:
+            result, tier = self.deep_predict(image_bytes), "deep"
+            if result.get("status") != "success":
+                self._count("requests", "errors")
+                return result
+            result = dict(result)   # 不改动缓存里的对象
+
+        low = result["score"] < self.low_confidence
+        self._count("requests", tier, *(("low_confidence",) if low else ()))
+        CASCADE_ANSWERS.labels(tier=tier).inc()
+        result.update(tier=tier, cheap_score=round(first["score"], 4), low_confidence=low)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """各层作答次数与升级率"""
+        with self._lock:
+            counters = dict(self.counters)
+        answered = counters["simple"] + counters["deep"]
+        return {
+            "high_confidence": self.high_confidence,
+            "low_confidence": self.low_confidence,
+            **counters,
+            "escalation_rate": round(counters["deep"] / answered, 4) if answered else None,
+        }
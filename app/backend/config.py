@@ -0,0 +1,36 @@
+# app/backend/config.py
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 配置文件目录：app/config/
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config")
+
+
+@lru_cache(maxsize=None)
+def load_config(name: str = "freshness_config") -> Dict[str, Any]:
+    """
+    读取 app/config/<name>.yaml（进程内只读一次）
+
+    文件不存在或解析失败时返回空字典，调用方使用各自的默认值。
+    """
+    path = os.path.join(CONFIG_DIR, f"{name}.yaml")
+    if not os.path.exists(path):
+        logger.warning(f"配置文件不存在，使用默认配置: {path}")
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except Exception as e:
+        logger.error(f"配置文件解析失败 {path}: {e}")
+        return {}
+
+
+def get_section(name: str, section: str) -> Dict[str, Any]:
+    """读取配置文件中的某一节，缺失时返回空字典"""
+    return load_config(name).get(section) or {}
@@ -0,0 +1,659 @@
+# app/backend/dataset_pack.py
+"""
+新鲜度模型训练数据的打包与加载
+
+直接读 JPEG 目录训练时，每个 epoch 都要把每张图重新解码、缩放一遍，CPU 训练机上模型
+大部分时间在等数据。这里把解码和缩放挪到一次性的打包步骤：
+
+- 打包：dataset/<split>/<类别>/*.jpg 多进程解码（按 EXIF 转正），按 geometry 变成 pack_size 见方：
+  stretch 整张图拉伸（与线上 Preprocessor 把整图缩放到 224×224 一致，默认）；crop 短边缩放后中心裁剪
+  （保持长宽比但裁掉两边）。RGB uint8 写进 .npy 分片（shard-00000.npy，形状 (N, S, S, 3)），
+  labels.npy 存类别号（按 freshness_config.yaml 的 labels 顺序，目录名见 training.class_dirs），
+  index.json 记录类别、分片和源文件指纹；源目录没变时不重新打包
+- 加载：分片以内存映射方式打开，按批取出原始像素，多个加载进程并行做整批的数据增强
+  （随机裁剪 / 水平翻转 / 亮度对比度饱和度扰动 + 归一化；验证时 stretch 整图缩放到输入大小，
+  与线上完全一致），结果写进共享内存环形缓冲区，
+  训练进程零拷贝取用；分片页面由操作系统页缓存在各进程间共享
+- 基准：同样的增强，对比直接读 JPEG 目录与读分片的每个 epoch 耗时
+
+用法：
+    python -m app.backend.dataset_pack pack                      # 按 freshness_config.yaml 的 training 节
+    python -m app.backend.dataset_pack pack --src ./dataset --out ./data/freshness_packed
+    python -m app.backend.dataset_pack bench --epochs 2
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.backend.config import get_section
+from app.backend.ingest import IngestError, decode_image
+from app.backend.ocr_pool import attach_image
+from app.backend.preprocessing import IMAGENET_MEAN, IMAGENET_STD
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+# 打包时把图片变成正方形的方式：stretch 与线上推理一致（整图拉伸），crop 为短边缩放 + 中心裁剪
+GEOMETRIES = ("stretch", "crop")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+SPLITS = ("train", "val")
+
+# RGB → 灰度（ITU-R BT.601），饱和度扰动用
+_GRAY = (0.299, 0.587, 0.114)
+
+
+# ---------------- 打包 ----------------
+
+def list_images(split_dir: str, classes: Optional[Sequence[str]] = None) -> Tuple[List[str], List[Tuple[str, int]]]:
+    """
+    列出 <split_dir>/<类别>/ 下的图片
+
+    Returns:
+        (类别列表, [(图片路径, 类别号)])；classes 为 None 时取子目录名排序
+    """
+    if classes is None:
+        classes = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+    samples = []
+    for label, name in enumerate(classes):
+        class_dir = os.path.join(split_dir, name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, filename), label))
+    return list(classes), samples
+
+
+def model_classes(labels: Sequence[str], class_dirs: Dict[str, str]) -> List[str]:
+    """
+    按模型输出顺序给出各类别的数据集目录名：第 i 个目录的图片标成类别 i，训练出的第 i 个输出就是 labels[i]
+
+    Args:
+        labels: 线上检测器的标签（freshness_config.yaml 的 labels）
+        class_dirs: 标签 → dataset/<split>/ 下的目录名（training.class_dirs）
+    """
+    if not labels:
+        raise ValueError("freshness_config.yaml 未配置 labels")
+    missing = [label for label in labels if label not in class_dirs]
+    if missing:
+        raise ValueError(f"training.class_dirs 缺少标签 {missing} 对应的目录名")
+    classes = [class_dirs[label] for label in labels]
+    if len(set(classes)) != len(classes):
+        raise ValueError(f"training.class_dirs 中有重复的目录名: {classes}")
+    return classes
+
+
+def config_classes() -> List[str]:
+    """freshness_config.yaml 中 labels 顺序对应的数据集目录名"""
+    return model_classes(get_section("freshness_config", "labels"), _config().get("class_dirs") or {})
+
+
+def check_class_dirs(split_dir: str, classes: Sequence[str]) -> None:
+    """split_dir 下的类别目录须与 classes 一致：缺目录会少一个类别，多出的目录会被悄悄忽略"""
+    found = {d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d))}
+    missing, extra = sorted(set(classes) - found), sorted(found - set(classes))
+    if missing or extra:
+        raise ValueError(f"{split_dir} 的类别目录与 training.class_dirs 不一致：缺少 {missing}，多出 {extra}")
+
+
+def _fingerprint(samples: Sequence[Tuple[str, int]], size: int, geometry: str) -> str:
+    """源文件列表（路径、大小、修改时间）+ 打包尺寸的摘要，用来判断是否需要重新打包"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{FORMAT_VERSION}:{size}:{geometry}".encode())
+    for path, label in samples:
+        stat = os.stat(path)
+        h.update(f"\0{path}\0{label}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+
+def load_square(path: str, size: int, geometry: str = "stretch") -> Optional[np.ndarray]:
+    """
+    读一张图：按 EXIF 转正后变成 (size, size, 3) RGB uint8；失败返回 None
+
+    geometry 为 stretch 时整张图拉伸到 size 见方（同线上推理），crop 时短边缩放到 size 后中心裁剪
+    """
+    if geometry not in GEOMETRIES:
+        raise ValueError(f"geometry 只能是 {GEOMETRIES}: {geometry}")
+    try:
+        with open(path, "rb") as f:
+            img = decode_image(f.read(), min_side=size)
+    except (OSError, IngestError):
+        return None
+    h, w = img.shape[:2]
+    if geometry == "stretch":
+        shrink = h * w > size * size
+        img = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    scale = size / min(h, w)
+    nh, nw = max(size, round(h * scale)), max(size, round(w * scale))
+    img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    y, x = (nh - size) // 2, (nw - size) // 2
+    return cv2.cvtColor(img[y:y + size, x:x + size], cv2.COLOR_BGR2RGB)
+
+
+def _load_for_pack(args: Tuple[str, int, str]) -> Optional[np.ndarray]:
+    return load_square(*args)
+
+
+def pack_split(src_dir: str,
+               out_dir: str,
+               size: int = 256,
+               shard_size: int = 2048,
+               workers: int = 0,
+               classes: Optional[Sequence[str]] = None,
+               force: bool = False,
+               geometry: str = "stretch") -> Dict[str, Any]:
+    """
+    把一个划分（如 dataset/train）打包到 out_dir
+
+    先写到 <out_dir>.tmp，完成后整体替换，中途失败不会留下半个数据集。
+    解码失败的图片跳过并计入 skipped。
+
+    Args:
+        size: 打包边长（训练时从中随机裁剪模型输入大小）
+        shard_size: 每个分片的图片数
+        workers: 解码进程数，0 表示 CPU 核数
+        classes: 类别顺序（验证集应沿用训练集的），None 表示取子目录名排序
+        force: 源文件没变也重新打包
+        geometry: stretch（整图拉伸，同线上推理）| crop（短边缩放 + 中心裁剪）
+
+    Returns:
+        index.json 的内容（另加 packed: 本次是否重新打包）
+    """
+    classes, samples = list_images(src_dir, classes)
+    if geometry not in GEOMETRIES:
+        raise ValueError(f"geometry 只能是 {GEOMETRIES}: {geometry}")
+    fingerprint = _fingerprint(samples, size, geometry)
+    index_path = os.path.join(out_dir, "index.json")
+    if not force and os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("fingerprint") == fingerprint:
+            logger.info(f"{src_dir} 未变化，沿用已有的打包结果 {out_dir}")
+            return {**index, "packed": False}
+
+    tmp_dir = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    started = time.perf_counter()
+    shards, labels, skipped = [], [], 0
+    shard, filled = None, 0
+
+    def finish_shard():
+        nonlocal shard
+        if shard is not None:
+            shard.flush()
+            shards[-1]["count"] = filled
+            shard = None
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=ctx) as pool:
+        results = pool.map(_load_for_pack, [(path, size, geometry) for path, _ in samples], chunksize=32)
+        for i, ((path, label), img) in enumerate(zip(samples, results)):
+            if img is None:
+                logger.warning(f"图片读取失败，已跳过: {path}")
+                skipped += 1
+                continue
+            if shard is None or filled == shard.shape[0]:
+                finish_shard()
+                name = f"shard-{len(shards):05d}.npy"
+                # 分片按剩余图片数分配；有解码失败时末尾留空，count 记录实际张数
+                rows = min(shard_size, len(samples) - i)
+                shard = np.lib.format.open_memmap(os.path.join(tmp_dir, name), mode="w+",
+                                                  dtype=np.uint8, shape=(rows, size, size, 3))
+                shards.append({"file": name, "count": 0})
+                filled = 0
+            shard[filled] = img
+            filled += 1
+            labels.append(label)
+        finish_shard()
+
+    np.save(os.path.join(tmp_dir, "labels.npy"), np.asarray(labels, dtype=np.int64))
+    index = {
+        "version": FORMAT_VERSION,
+        "size": size,
+        "geometry": geometry,
+        "classes": classes,
+        "count": len(labels),
+        "skipped": skipped,
+        "shards": shards,
+        "fingerprint": fingerprint,
+        "source": os.path.abspath(src_dir),
+    }
+    with open(os.path.join(tmp_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    logger.info(f"{src_dir} 已打包到 {out_dir}: {len(labels)} 张, 跳过 {skipped} 张, "
+                f"{len(shards)} 个分片, 耗时 {time.perf_counter() - started:.1f}s")
+    return {**index, "packed": True}
+
+
+def pack_dataset(src_root: str, out_root: str, size: int = 256, shard_size: int = 2048,
+                 workers: int = 0, force: bool = False, geometry: str = "stretch",
+                 classes: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    打包 src_root 下的 train / val（存在哪个打包哪个），验证集沿用训练集的类别顺序
+
+    classes 给出时（模型输出顺序的目录名，见 model_classes）按它编号，各划分的类别目录须与之一致；
+    None 时取训练集子目录名排序。
+    """
+    results = {}
+    for split in SPLITS:
+        src = os.path.join(src_root, split)
+        if not os.path.isdir(src):
+            continue
+        if classes is not None:
+            check_class_dirs(src, classes)
+        results[split] = pack_split(src, os.path.join(out_root, split), size, shard_size, workers,
+                                    classes=classes, force=force, geometry=geometry)
+        classes = classes or results[split]["classes"]
+    return results
+
+
+# ---------------- 读取 ----------------
+
+class PackedDataset:
+    """打包好的一个划分：分片以只读内存映射打开，按下标批量取出原始像素"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"不支持的打包格式版本: {index.get('version')}，请重新打包")
+        self.path = path
+        self.size = int(index["size"])
+        self.geometry: str = index.get("geometry", "crop")   # 旧版打包只有 crop
+        self.classes: List[str] = index["classes"]
+        self.labels = np.load(os.path.join(path, "labels.npy"))
+        self._shards = [np.load(os.path.join(path, s["file"]), mmap_mode="r")[:s["count"]]
+                        for s in index["shards"]]
+        self._offsets = np.cumsum([0] + [s["count"] for s in index["shards"]])
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def get(self, indices: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """按下标取一批，返回 ((N, S, S, 3) RGB uint8, (N,) 类别号)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        images = np.empty((len(indices), self.size, self.size, 3), dtype=np.uint8)
+        shard_ids = np.searchsorted(self._offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            rows = indices[mask] - self._offsets[shard_id]
+            # 按行号顺序读，内存映射上是顺序访问
+            order = np.argsort(rows)
+            images[np.flatnonzero(mask)[order]] = self._shards[shard_id][rows[order]]
+        return images, self.labels[indices]
+
+
+# ---------------- 数据增强 ----------------
+
+def augment_batch(images: np.ndarray,
+                  rng: np.random.Generator,
+                  size: int = 224,
+                  train: bool = True,
+                  jitter: float = 0.4,
+                  out: Optional[np.ndarray] = None,
+                  mean: Sequence[float] = IMAGENET_MEAN,
+                  std: Sequence[float] = IMAGENET_STD,
+                  full_view: bool = False) -> np.ndarray:
+    """
+    整批数据增强 + 归一化：(N, S, S, 3) RGB uint8 → (N, 3, size, size) float32
+
+    train 时每张图独立地随机裁剪、水平翻转，亮度 / 对比度 / 饱和度各在 [1 - jitter, 1 + jitter]
+    内扰动；否则中心裁剪（full_view 时整张图缩放到 size，即 stretch 打包的验证方式，与线上推理一致）、
+    不扰动。裁剪是在 sliding_window_view 上一次高级索引取出整批
+    （直接得到 CHW 布局）；三种扰动合并为每张图三个系数 y = a·x + b·gray + c，
+    与归一化一起都是整批广播运算，没有逐张的 Python 循环。
+    """
+    n, side = images.shape[0], images.shape[1]
+    if out is None:
+        out = np.empty((n, 3, size, size), dtype=np.float32)
+    if not train and full_view and side != size:
+        # 验证集较小，逐张缩放即可
+        crops = np.stack([cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+                          for img in images]).transpose(0, 3, 1, 2)
+    else:
+        if train:
+            ys = rng.integers(0, side - size + 1, n)
+            xs = rng.integers(0, side - size + 1, n)
+        else:
+            ys = xs = np.full(n, (side - size) // 2)
+        windows = sliding_window_view(images, (size, size), axis=(1, 2))   # (N, ny, nx, 3, size, size)
+        crops = windows[np.arange(n), ys, xs]
+    if train:
+        flip = rng.random(n) < 0.5
+        crops[flip] = crops[flip, :, :, ::-1]
+    np.copyto(out, crops)
+
+    if train and jitter > 0:
+        brightness, contrast, saturation = rng.uniform(1 - jitter, 1 + jitter, (3, n)).astype(np.float32)
+        gray = out[:, 0] * _GRAY[0] + out[:, 1] * _GRAY[1] + out[:, 2] * _GRAY[2]
+        # 亮度：x·b；饱和度：向灰度图靠拢 s·x + (1-s)·gray；对比度：向整张图的平均灰度靠拢
+        a = contrast * saturation * brightness
+        b = contrast * (1 - saturation) * brightness
+        c = (1 - contrast) * brightness * gray.mean(axis=(1, 2))
+        out *= a[:, None, None, None]
+        gray *= b[:, None, None]
+        out += gray[:, None]
+        out += c[:, None, None, None]
+        np.clip(out, 0, 255, out=out)
+
+    # (x / 255 - mean) / std = x·scale + shift，每个通道一次乘加
+    scale = (1.0 / (255.0 * np.asarray(std))).astype(np.float32)
+    shift = (-np.asarray(mean) / np.asarray(std)).astype(np.float32)
+    out *= scale[None, :, None, None]
+    out += shift[None, :, None, None]
+    return out
+
+
+def _batch_rng(seed: int, epoch: int, batch_no: int) -> np.random.Generator:
+    # 每批独立的随机流：结果只取决于 (seed, epoch, 批号)，与加载进程数无关
+    return np.random.default_rng([seed, epoch, batch_no])
+
+
+# ---------------- 多进程加载 ----------------
+
+def _loader_worker(path: str, meta: Dict[str, Any], size: int, jitter: float, full_view: bool, tasks, done) -> None:
+    """加载进程：从任务队列取 (槽位, 批号, epoch, 下标, seed, train)，增强结果写进共享内存的对应槽位"""
+    dataset = PackedDataset(path)
+    shm, slots = attach_image(meta)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, batch_no, epoch, indices, seed, train = task
+            try:
+                images, _ = dataset.get(indices)
+                augment_batch(images, _batch_rng(seed, epoch, batch_no), size=size, train=train,
+                              jitter=jitter, out=slots[slot, :len(indices)], full_view=full_view)
+                done.put((slot, batch_no, None))
+            except Exception as e:
+                done.put((slot, batch_no, f"{type(e).__name__}: {e}"))
+    finally:
+        del slots
+        shm.close()
+
+
+class PackedLoader:
+    """
+    打包数据集的多进程加载器
+
+    for images, labels in loader: ...  # 每次迭代一个 epoch
+
+    images 是共享内存里的 (N, 3, size, size) float32 视图，下一次迭代时会被覆盖，
+    调用方需在此之前用完（如转成张量）。num_workers=0 时在当前进程内同步加载。
+    """
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = 32,
+                 train: bool = True,
+                 size: int = 224,
+                 jitter: float = 0.4,
+                 num_workers: int = 4,
+                 prefetch: int = 2,
+                 drop_last: bool = False,
+                 seed: int = 0):
+        """
+        Args:
+            path: 打包好的划分目录（含 index.json）
+            batch_size: 每批图片数
+            train: True 时每个 epoch 打乱顺序并做随机增强，否则按顺序取图，
+                stretch 打包的整图缩放到 size（同线上推理），crop 打包的中心裁剪
+            size: 模型输入边长，不大于打包边长
+            jitter: 亮度 / 对比度 / 饱和度扰动幅度
+            num_workers: 加载进程数
+            prefetch: 每个加载进程预取的批数（共享内存槽位数 = num_workers × prefetch）
+            drop_last: 丢弃最后不满一批的数据
+            seed: 随机种子（打乱顺序和增强）
+        """
+        self.dataset = PackedDataset(path)
+        if size > self.dataset.size:
+            raise ValueError(f"模型输入 {size} 大于打包边长 {self.dataset.size}")
+        self.path = path
+        self.batch_size = int(batch_size)
+        self.train = train
+        self.size = int(size)
+        self.jitter = float(jitter)
+        self.num_workers = max(0, int(num_workers))
+        self.drop_last = drop_last
+        self.seed = int(seed)
+        self.epoch = 0
+        # stretch 打包的验证 / 评估按线上方式看整张图，而不是中心裁剪
+        self.full_view = self.dataset.geometry == "stretch"
+
+        self._num_slots = max(1, self.num_workers * max(1, int(prefetch)))
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._slots: Optional[np.ndarray] = None
+        self._workers: List[Any] = []
+        self._tasks = self._done = None
+        self._outstanding = 0
+        self._local: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_config(cls, path: str, cfg: Dict[str, Any], train: bool = True) -> "PackedLoader":
+        """按配置节（freshness_config.yaml 的 training 节）创建"""
+        return cls(path,
+                   batch_size=cfg.get("batch_size", 32),
+                   train=train,
+                   size=cfg.get("input_size", 224),
+                   jitter=cfg.get("jitter", 0.4) if train else 0.0,
+                   num_workers=cfg.get("num_workers", 4),
+                   prefetch=cfg.get("prefetch", 2),
+                   drop_last=train,
+                   seed=cfg.get("seed", 0))
+
+    def __len__(self) -> int:
+        n = len(self.dataset)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def _batches(self, epoch: int) -> List[np.ndarray]:
+        n = len(self.dataset)
+        order = np.random.default_rng([self.seed, epoch]).permutation(n) if self.train else np.arange(n)
+        return [order[i:i + self.batch_size] for i in range(0, len(self) * self.batch_size, self.batch_size)]
+
+    def _start(self) -> None:
+        ctx = multiprocessing.get_context("spawn")
+        shape = (self._num_slots, self.batch_size, 3, self.size, self.size)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        self._slots = np.ndarray(shape, dtype=np.float32, buffer=self._shm.buf)
+        meta = {"name": self._shm.name, "shape": shape, "dtype": np.dtype(np.float32).str}
+        self._tasks, self._done = ctx.Queue(), ctx.Queue()
+        for _ in range(self.num_workers):
+            p = ctx.Process(target=_loader_worker, daemon=True,
+                            args=(self.path, meta, self.size, self.jitter, self.full_view, self._tasks, self._done))
+            p.start()
+            self._workers.append(p)
+        logger.info(f"数据加载器已启动: {self.num_workers} 个进程, {self._num_slots} 个槽位")
+
+    def _wait_done(self) -> Tuple[int, int, Optional[str]]:
+        while True:
+            try:
+                return self._done.get(timeout=1)
+            except queue.Empty:
+                dead = [p.pid for p in self._workers if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"数据加载进程异常退出: {dead}")
+
+    def _drain(self) -> None:
+        # 上一个 epoch 中途 break 时还有在途任务，等它们写完再复用槽位
+        while self._outstanding:
+            self._wait_done()
+            self._outstanding -= 1
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        epoch = self.epoch
+        self.epoch += 1
+        batches = self._batches(epoch)
+        if self.num_workers == 0:
+            for batch_no, indices in enumerate(batches):
+                images, labels = self.dataset.get(indices)
+                if self._local is None:
+                    self._local = np.empty((self.batch_size, 3, self.size, self.size), dtype=np.float32)
+                out = self._local[:len(indices)]
+                augment_batch(images, _batch_rng(self.seed, epoch, batch_no), self.size, self.train,
+                              self.jitter, out=out, full_view=self.full_view)
+                yield out, labels
+            return
+
+        if self._shm is None:
+            self._start()
+        self._drain()
+
+        def submit(slot: int, batch_no: int) -> None:
+            self._tasks.put((slot, batch_no, epoch, batches[batch_no], self.seed, self.train))
+            self._outstanding += 1
+
+        for slot in range(min(self._num_slots, len(batches))):
+            submit(slot, slot)
+        ready: Dict[int, int] = {}
+        for batch_no, indices in enumerate(batches):
+            # 各进程完成顺序不定，按批号顺序交给调用方
+            while batch_no not in ready:
+                slot, done_no, error = self._wait_done()
+                self._outstanding -= 1
+                if error is not None:
+                    raise RuntimeError(f"第 {done_no} 批加载失败: {error}")
+                ready[done_no] = slot
+            slot = ready.pop(batch_no)
+            yield self._slots[slot, :len(indices)], self.dataset.labels[indices]
+            # 调用方已用完这一批，槽位交给后面的批
+            if batch_no + self._num_slots < len(batches):
+                submit(slot, batch_no + self._num_slots)
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        for _ in self._workers:
+            self._tasks.put(None)
+        for p in self._workers:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self._workers = []
+        self._slots = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        self._outstanding = 0
+
+    def __enter__(self) -> "PackedLoader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------------- 基准：读 JPEG 目录 vs 读分片 ----------------
+
+def _load_raw_batch(args: Tuple[List[str], int, str, int, int, int]) -> np.ndarray:
+    """原来的路径：每个 epoch 逐张解码、缩放，再做同样的增强"""
+    paths, pack_size, geometry, size, epoch, batch_no = args
+    images = np.stack([load_square(p, pack_size, geometry) for p in paths])
+    return augment_batch(images, _batch_rng(0, epoch, batch_no), size)
+
+
+def benchmark_epochs(src_dir: str,
+                     packed_dir: str,
+                     epochs: int = 1,
+                     batch_size: int = 32,
+                     num_workers: int = 4,
+                     size: int = 224) -> Dict[str, Any]:
+    """
+    同样的进程数、批大小和增强下，对比每个 epoch 的耗时
+
+    raw：每批的 JPEG 在进程池里解码、缩放、增强后整批传回（对应直接指向图片目录的训练）
+    packed：PackedLoader 从内存映射分片读取
+    """
+    dataset = PackedDataset(packed_dir)
+    _, samples = list_images(src_dir, dataset.classes)
+    paths = [p for p, _ in samples]
+    n_batches = len(paths) // batch_size
+    results: Dict[str, Any] = {"images": n_batches * batch_size, "batch_size": batch_size,
+                               "num_workers": num_workers}
+
+    raw_times = []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, num_workers), mp_context=ctx) as pool:
+        list(pool.map(_load_raw_batch, [(paths[:batch_size], dataset.size, dataset.geometry, size, 0, 0)] * max(1, num_workers)))  # 先把进程都启动起来
+        for epoch in range(epochs):
+            order = np.random.default_rng([0, epoch]).permutation(len(paths))
+            jobs = [([paths[i] for i in order[b * batch_size:(b + 1) * batch_size]], dataset.size, dataset.geometry,
+                     size, epoch, b)
+                    for b in range(n_batches)]
+            started = time.perf_counter()
+            for _ in pool.map(_load_raw_batch, jobs):
+                pass
+            raw_times.append(time.perf_counter() - started)
+
+    packed_times = []
+    with PackedLoader(packed_dir, batch_size=batch_size, size=size, num_workers=num_workers,
+                      drop_last=True) as loader:
+        for _ in range(epochs + 1):
+            started = time.perf_counter()
+            for _ in loader:
+                pass
+            packed_times.append(time.perf_counter() - started)
+    packed_times = packed_times[1:]   # 第一个 epoch 含进程启动，不计入
+
+    for name, times in (("raw", raw_times), ("packed", packed_times)):
+        epoch_s = float(np.mean(times))
+        results[name] = {"epoch_s": round(epoch_s, 3), "images_per_s": round(results["images"] / epoch_s, 1)}
+    results["speedup"] = round(results["raw"]["epoch_s"] / results["packed"]["epoch_s"], 2)
+    return results
+
+
+def _config() -> Dict[str, Any]:
+    return get_section("freshness_config", "training")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    cfg = _config()
+    parser = argparse.ArgumentParser(description="新鲜度模型训练数据打包")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="把 JPEG 目录打包成内存映射分片")
+    pack.add_argument("--src", default=cfg.get("dataset_dir", "./dataset"), help="含 train/val 的图片目录")
+    pack.add_argument("--out", default=cfg.get("packed_dir", "./data/freshness_packed"), help="输出目录")
+    pack.add_argument("--size", type=int, default=cfg.get("pack_size", 256), help="打包边长")
+    pack.add_argument("--geometry", choices=GEOMETRIES, default=cfg.get("geometry", "stretch"),
+                      help="stretch：整图拉伸（同线上推理）；crop：短边缩放 + 中心裁剪")
+    pack.add_argument("--shard-size", type=int, default=cfg.get("shard_size", 2048), help="每个分片的图片数")
+    pack.add_argument("--workers", type=int, default=0, help="解码进程数，默认 CPU 核数")
+    pack.add_argument("--force", action="store_true", help="源文件没变也重新打包")
+    bench = sub.add_parser("bench", help="对比读 JPEG 目录与读分片的 epoch 耗时")
+    bench.add_argument("--src", default=os.path.join(cfg.get("dataset_dir", "./dataset"), "train"))
+    bench.add_argument("--packed", default=os.path.join(cfg.get("packed_dir", "./data/freshness_packed"), "train"))
+    bench.add_argument("--epochs", type=int, default=1)
+    bench.add_argument("--batch-size", type=int, default=cfg.get("batch_size", 32))
+    bench.add_argument("--num-workers", type=int, default=cfg.get("num_workers", 4))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "pack":
+        results = pack_dataset(args.src, args.out, args.size, args.shard_size, args.workers, args.force,
+                               geometry=args.geometry, classes=config_classes())
+        print(json.dumps({split: {k: r[k] for k in ("count", "skipped", "classes", "packed")}
+                          for split, r in results.items()}, ensure_ascii=False))
+    else:
+        print(json.dumps(benchmark_epochs(args.src, args.packed, args.epochs, args.batch_size, args.num_workers),
+                         ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
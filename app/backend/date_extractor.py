@@ -0,0 +1,207 @@
+# app/backend/date_extractor.py
+"""
+从包装文字中提取生产日期、保质期，并计算到期日
+
+所有规则（标签词、各种日期写法、保质期时长、"见喷码"）合并成一个预编译的正则，
+finditer 一遍扫描得到按位置排列的记号流，再用一个小状态机把日期/时长归到前面最近的标签上：
+
+    生产日期：2024.05.01  保质期：12个月        → 生产 2024-05-01，到期 2025-04-30
+    生产日期：见瓶盖喷码  保质期至 20250430       → 到期 2025-04-30
+    20240501 20250430（无标签的喷码）             → 较早的为生产日期，较晚的为到期日
+
+到期日按"保质期内的最后一天"计算：生产日期 + 时长 - 1 天。
+"""
+import calendar
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# 标签词：同一类里长的写在前面（"保质期至"要先于"保质期"匹配）
+_PRODUCTION_LABELS = ("生产日期", "制造日期", "出厂日期", "包装日期", "灌装日期", "加工日期", "分装日期", "生产日",
+                      "mfg date", "mfd", "mfg", "prod date", "prd")
+_EXPIRY_LABELS = ("保质期至", "有效期至", "保质期到", "到期日期", "到期日", "过期日期", "失效日期", "最佳食用日期",
+                  "此日期前最佳", "best before", "expiry date", "exp date", "use by", "exp", "bbe")
+_SHELF_LIFE_LABELS = ("保质期限", "保质期", "保存期", "有效期", "shelf life")
+
+# 标签与其后的日期/时长之间允许的最大字符数（中间可能是冒号、"（年/月/日）"、"常温" 等）
+_LABEL_WINDOW = 24
+
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100}
+_UNIT_NAMES = {"年": "year", "个月": "month", "月": "month", "周": "week", "星期": "week", "天": "day", "日": "day",
+               "years": "year", "year": "year", "months": "month", "month": "month", "days": "day", "day": "day"}
+
+
+def _alternation(words) -> str:
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_SEP = r"\s*[年./\-/]\s*"
+# 英文标签两侧不能紧挨字母（"exp" 不匹配 "express"）
+_TOKEN = re.compile(
+    rf"(?<![a-z])(?:(?P<expiry_label>{_alternation(_EXPIRY_LABELS)})"
+    rf"|(?P<production_label>{_alternation(_PRODUCTION_LABELS)})"
+    rf"|(?P<shelf_label>{_alternation(_SHELF_LIFE_LABELS)}))(?![a-z])"
+    # 2024.05.01 / 2024-5-1 / 2024/05/01 / 2024年5月1日
+    rf"|(?P<date>(?<!\d)(?P<y>(?:19|20)\d{{2}}){_SEP}(?P<m>\d{{1,2}})\s*[月./\-/]\s*(?P<d>\d{{1,2}})(?!\d)\s*日?)"
+    # 20240501（喷码常见）
+    r"|(?P<compact>(?<!\d)(?P<cy>(?:19|20)\d{2})(?P<cm>0[1-9]|1[0-2])(?P<cd>0[1-9]|[12]\d|3[01])(?!\d))"
+    # 12个月 / 十八个月 / 365天 / 2年 / 6 months
+    r"|(?P<duration>(?P<num>\d{1,4}|[零〇一二两三四五六七八九十百]{1,4})\s*"
+    r"(?P<unit>个月|星期|years?|months?|days?|年|月|周|天|日)(?![a-z]))"
+    # 见喷码 / 见瓶盖 / 详见包装 / 见封口处
+    r"|(?P<see_print>见(?:本品|产品)?(?:喷码|瓶盖|瓶身|瓶底|瓶肩|罐底|罐盖|盒底|盒盖|袋底|袋口|包装|封口|侧面|背面|顶部|底部|标签|打码))",
+    re.IGNORECASE,
+)
+
+
+def _parse_number(text: str) -> Optional[int]:
+    """阿拉伯数字或简单中文数字（十二、十八、三十、一百八十、两）"""
+    if text.isdigit():
+        return int(text)
+    total, current = 0, 0
+    for ch in text:
+        if ch in _CN_DIGITS:
+            current = _CN_DIGITS[ch]
+        elif ch in _CN_UNITS:
+            total += (current or 1) * _CN_UNITS[ch]
+            current = 0
+        else:
+            return None
+    return total + current or None
+
+
+def add_duration(start: date, value: int, unit: str) -> date:
+    """日期加上一段时长；按月/年相加时月末对齐（1 月 31 日 + 1 个月 = 2 月 28/29 日）"""
+    if unit == "day":
+        return start + timedelta(days=value)
+    if unit == "week":
+        return start + timedelta(weeks=value)
+    months = value * 12 if unit == "year" else value
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def expiry_from(production: date, value: int, unit: str) -> date:
+    """保质期内的最后一天：生产日期 + 时长 - 1 天"""
+    return add_duration(production, value, unit) - timedelta(days=1)
+
+
+def _subtract_duration(expiry: date, value: int, unit: str) -> date:
+    """由到期日反推生产日期（expiry_from 的逆运算）"""
+    end = expiry + timedelta(days=1)
+    if unit in ("day", "week"):
+        return end - timedelta(days=value * (7 if unit == "week" else 1))
+    months = value * 12 if unit == "year" else value
+    month_index = end.month - 1 - months
+    year, month = end.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(end.day, calendar.monthrange(year, month)[1]))
+
+
+def _to_date(y: str, m: str, d: str) -> Optional[date]:
+    try:
+        return date(int(y), int(m), int(d))
+    except ValueError:
+        return None
+
+
+def scan(text: str) -> List[Tuple[str, int, int, Any]]:
+    """
+    一遍扫描，返回按位置排列的记号 [(类型, 起点, 终点, 值)]
+
+    类型：production_label / expiry_label / shelf_label / date / duration / see_print；
+    date 的值为 datetime.date，duration 的值为 (数量, 单位)。
+    """
+    tokens = []
+    for m in _TOKEN.finditer(text):
+        kind = m.lastgroup
+        value: Any = m.group(kind)
+        if kind == "date":
+            value = _to_date(m.group("y"), m.group("m"), m.group("d"))
+        elif kind == "compact":
+            kind, value = "date", _to_date(m.group("cy"), m.group("cm"), m.group("cd"))
+        elif kind == "duration":
+            number = _parse_number(m.group("num"))
+            value = (number, _UNIT_NAMES[m.group("unit").lower()]) if number else None
+        if value is None:
+            continue
+        tokens.append((kind, m.start(), m.end(), value))
+    return tokens
+
+
+def extract_dates(text: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    提取生产日期、保质期、到期日
+
+    Args:
+        text: OCR 文本（多行）或用户输入的文字
+        today: 给出时额外返回 days_left（距到期的天数，已过期为负数）
+
+    Returns:
+        {"production_date": "2024-05-01" | None,
+         "shelf_life": {"value": 12, "unit": "month", "text": "12个月"} | None,
+         "expiry_date": "2025-04-30" | None,
+         "expiry_source": "label" | "computed" | "inferred" | None,   # 标签直接给出 / 生产日期+保质期 / 无标签日期推断
+         "production_source": "label" | "computed" | "inferred" | None,
+         "see_print": false,      # 标签写着"见喷码"等，日期不在本段文字里
+         "dates": ["2024-05-01", ...],   # 识别到的全部日期
+         "days_left": 120}        # 仅在传入 today 时
+    """
+    text = unicodedata.normalize("NFKC", text)
+    production = expiry = None
+    production_source = expiry_source = None
+    shelf_life = None
+    see_print = False
+    unlabeled: List[date] = []
+    all_dates: List[date] = []
+    pending: Optional[Tuple[str, int]] = None   # (标签类型, 标签结束位置)
+
+    for kind, start, end, value in scan(text):
+        if kind.endswith("_label"):
+            pending = (kind, end)
+            continue
+        label = pending[0] if pending and start - pending[1] <= _LABEL_WINDOW else None
+        if kind == "date":
+            all_dates.append(value)
+            if label == "production_label" and production is None:
+                production, production_source = value, "label"
+            elif label in ("expiry_label", "shelf_label") and expiry is None:
+                expiry, expiry_source = value, "label"
+            else:
+                unlabeled.append(value)
+            pending = None
+        elif kind == "duration":
+            if label == "shelf_label" and shelf_life is None:
+                shelf_life = {"value": value[0], "unit": value[1], "text": text[start:end]}
+                pending = None
+        elif kind == "see_print":
+            see_print = True
+
+    # 没有标签的日期（喷码常只有两个日期）：较早的当生产日期，较晚的当到期日
+    unlabeled.sort()
+    if production is None and unlabeled and (expiry is None or unlabeled[0] < expiry):
+        production, production_source = unlabeled.pop(0), "inferred"
+    if expiry is None and unlabeled and production is not None and unlabeled[-1] > production:
+        expiry, expiry_source = unlabeled.pop(), "inferred"
+
+    if shelf_life is not None:
+        if expiry is None and production is not None:
+            expiry, expiry_source = expiry_from(production, shelf_life["value"], shelf_life["unit"]), "computed"
+        elif production is None and expiry is not None:
+            production = _subtract_duration(expiry, shelf_life["value"], shelf_life["unit"])
+            production_source = "computed"
+
+    result = {
+        "production_date": production.isoformat() if production else None,
+        "production_source": production_source,
+        "shelf_life": shelf_life,
+        "expiry_date": expiry.isoformat() if expiry else None,
+        "expiry_source": expiry_source,
+        "see_print": see_print,
+        "dates": [d.isoformat() for d in all_dates],
+    }
+    if today is not None:
+        result["days_left"] = (expiry - today).days if expiry else None
+    return result
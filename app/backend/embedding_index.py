@@ -0,0 +1,388 @@
+# app/backend/embedding_index.py
+"""
+包装识别向量索引：见过的包装再次上传时直接返回上次的 OCR 结果，不再跑 OCR
+
+- 向量：新鲜度检测器 MobileNetV3 骨干倒数第二层的特征（FreshnessDetector.embed），L2 归一化后
+  以 float16 追加写入 vectors.f16，按内存映射读取（百万条 × 1280 维约 2.4GB，不占进程堆内存）
+- 结果：SQLite（index.sqlite3），行号与向量行号一致；另存模型版本，模型换了旧向量不再可比，整个索引清空
+- 检索：余弦相似度 = 点积，分块做矩阵乘 + argpartition 取 top-k
+- 可选 IVF 分区：条目数达到 train_size 后用 k-means 把向量分成 nlist 个桶，查询只扫最近的 nprobe 个桶，
+  百万级条目时每次查询只读几个百分点的向量
+- 多进程：uvicorn --workers / prefork 下每个 worker 各开一份索引。写入在 SQLite BEGIN IMMEDIATE 事务里进行，
+  条目 id 取库里的 MAX(id) + 1，向量写在该事务内，跨进程串行；每次写入 / 检索前先跟上其他进程写入的条目
+配置见 service_config.yaml 的 embedding_index 节。
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.backend.config import get_section
+from app.backend.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = "./data/label_index"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    list_id INTEGER NOT NULL DEFAULT -1,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+INDEX_LOOKUPS = REGISTRY.counter("smart_food_label_index_lookups_total", "包装向量索引查询次数（hit / miss）",
+                                 ("outcome",))
+
+# 暴力检索 / 训练分桶时每次转成 float32 计算的行数（1280 维约 20MB，块小一些缓存更友好）
+_CHUNK_ROWS = 4096
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化（float32）"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """scores 中最大的 k 个的下标，按分数从高到低"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """球面 k-means（余弦距离），返回 (k, dim) 的归一化质心"""
+    rng = np.random.default_rng(seed)
+    data = normalize(vectors)
+    centroids = data[rng.choice(len(data), size=k, replace=False)]
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        sizes = np.bincount(assign, minlength=k)
+        empty = sizes == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[~empty]
+        sums[~empty] = np.add.reduceat(data[order], starts, axis=0)
+        # 空桶重新随机取一个样本作质心
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def _inverted_lists(list_ids: np.ndarray, nlist: int) -> List[np.ndarray]:
+    """每条目的桶号 → 各桶的条目 id（升序）"""
+    order = np.argsort(list_ids, kind="stable").astype(np.int64)
+    bounds = np.searchsorted(list_ids[order], np.arange(nlist + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+
+
+class EmbeddingIndex:
+    """float16 内存映射向量 + SQLite 结果的 top-k 余弦检索索引（可选 IVF 分区）"""
+
+    def __init__(self,
+                 path: str = DEFAULT_PATH,
+                 model_version: str = "",
+                 nlist: int = 0,
+                 nprobe: int = 8,
+                 train_size: int = 50000):
+        """
+        Args:
+            path: 索引目录
+            model_version: 产生向量的模型版本，与已有索引不一致时清空重建
+            nlist: IVF 桶数，0 表示不分区（暴力检索）
+            nprobe: 查询时扫描的桶数
+            train_size: 条目数达到此值时训练 IVF 质心
+        """
+        if nlist < 0 or nprobe < 1:
+            raise ValueError(f"nlist 须 ≥ 0、nprobe 须 ≥ 1: {nlist}, {nprobe}")
+        if nlist and train_size < nlist:
+            raise ValueError(f"train_size ({train_size}) 不能小于 nlist ({nlist})")
+        self.path = path
+        self.model_version = model_version
+        self.nlist = int(nlist)
+        self.nprobe = int(nprobe)
+        self.train_size = int(train_size)
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self.dim = 0
+        self.count = 0
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []   # IVF 各桶的条目 id
+        self._open()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], model_version: str = "") -> "EmbeddingIndex":
+        """按 service_config.yaml 的 embedding_index 节创建"""
+        return cls(path=cfg.get("path", DEFAULT_PATH),
+                   model_version=model_version,
+                   nlist=cfg.get("nlist", 0),
+                   nprobe=cfg.get("nprobe", 8),
+                   train_size=cfg.get("train_size", 50000))
+
+    # ---------------- 存储 ----------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self._db = sqlite3.connect(self._file("index.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if meta.get("model_version", self.model_version) != self.model_version:
+            logger.warning(f"包装向量索引的模型版本已变化（{meta['model_version']} → {self.model_version}），清空重建")
+            self._db.close()
+            shutil.rmtree(self.path)
+            return self._open()
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model_version', ?)", (self.model_version,))
+
+        self._refresh()
+        logger.info(f"包装向量索引已加载: {self.path}（{self.count} 条，dim={self.dim}，"
+                    f"IVF={'on' if self.centroids is not None else 'off'}）")
+
+    def _map(self, rows: int, grow: bool = False) -> None:
+        """
+        映射向量文件（至少 rows 行）
+
+        grow 时把文件补长到 rows 行，只在写事务里做（跨进程串行），其他进程可能已把文件写得更长，
+        这里只增不减；文件的实际长度都会映射进来。
+        """
+        path = self._file("vectors.f16")
+        row_bytes = 2 * self.dim
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if grow and size < rows * row_bytes:
+            with open(path, "ab") as f:
+                f.truncate(rows * row_bytes)
+            size = rows * row_bytes
+        capacity = size // row_bytes
+        self._capacity = capacity
+        # 旧映射仍被正在检索的线程持有时继续有效（文件只会变长）
+        self._vectors = np.memmap(path, dtype=np.float16, mode="r+", shape=(capacity, self.dim)) if capacity else None
+
+    def _refresh(self) -> None:
+        """
+        跟上库里已提交的条目（调用方持有锁，或在 __init__ 里）：其他进程写入的条目、维度和 IVF 质心
+
+        条目 id 连续（写入时取 MAX(id) + 1），库里的条目数就是 MAX(id) + 1；向量先于结果行写入，
+        崩溃时多出的半条向量会被下一次写入覆盖。
+        """
+        in_transaction = self._db.in_transaction
+        if not in_transaction:
+            self._db.execute("BEGIN")   # 一个读快照里取条目数、meta 和桶号
+        try:
+            count = self._db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM entries").fetchone()[0]
+            meta = dict(self._db.execute("SELECT key, value FROM meta"))
+            if not self.dim:
+                self.dim = int(meta.get("dim", 0))
+            if count > self._capacity:
+                self._map(count)
+            # 质心文件先于 meta 的 ivf_nlist 写入，meta 里有了才说明训练已提交
+            if self.centroids is None and "ivf_nlist" in meta:
+                self.centroids = np.load(self._file("centroids.npy"))
+                self.count = 0
+                self._lists = [np.empty(0, dtype=np.int64)] * len(self.centroids)
+            if count > self.count and self.centroids is not None:
+                list_ids = np.fromiter((row[0] for row in self._db.execute(
+                    "SELECT list_id FROM entries WHERE id >= ? AND id < ? ORDER BY id", (self.count, count))),
+                    dtype=np.int64, count=count - self.count)
+                self._extend_lists(self.count, list_ids)
+        finally:
+            if not in_transaction:
+                self._db.execute("COMMIT")
+        self.count = max(self.count, count)
+
+    def _extend_lists(self, start: int, list_ids: np.ndarray) -> None:
+        """把 id 从 start 起、桶号为 list_ids 的条目加进 IVF 各桶"""
+        # 只复制涉及的桶（每桶约 count / nlist 个 id）；正在检索的线程仍持有旧数组
+        for list_id in np.unique(list_ids):
+            if list_id < 0:
+                continue
+            added = start + np.flatnonzero(list_ids == list_id)
+            self._lists[list_id] = np.concatenate((self._lists[list_id], added))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._db.close()
+
+    # ---------------- 写入 ----------------
+
+    def add(self, vector: np.ndarray, result: Dict[str, Any]) -> int:
+        """追加一条向量及其结果，返回条目 id"""
+        return self.add_many(vector, [result])[0]
+
+    def add_many(self, vectors: np.ndarray, results: List[Dict[str, Any]]) -> List[int]:
+        """批量追加（向量和结果在一个写事务里写入），返回各条目 id"""
+        vecs = normalize(vectors)
+        if len(vecs) != len(results):
+            raise ValueError(f"向量数 {len(vecs)} 与结果数 {len(results)} 不一致")
+        with self._lock:
+            # BEGIN IMMEDIATE 先拿到库的写锁：其他进程的写入在此之前已提交、之后要等本事务结束
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                if not self.dim:
+                    self.dim = vecs.shape[1]
+                    self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                if vecs.shape[1] != self.dim:
+                    raise ValueError(f"向量维度 {vecs.shape[1]} 与索引维度 {self.dim} 不一致")
+                start, end = self.count, self.count + len(vecs)
+                if end > self._capacity:
+                    capacity = max(1024, self._capacity)
+                    while capacity < end:
+                        capacity *= 2
+                    self._map(capacity, grow=True)
+                self._vectors[start:end] = vecs
+                list_ids = np.full(len(vecs), -1, dtype=np.int64)
+                if self.centroids is not None:
+                    list_ids = np.argmax(vecs @ self.centroids.T, axis=1)
+                now = time.time()
+                self._db.executemany("INSERT INTO entries (id, list_id, result, created_at) VALUES (?, ?, ?, ?)",
+                                     ((start + i, int(list_id), json.dumps(result, ensure_ascii=False), now)
+                                      for i, (list_id, result) in enumerate(zip(list_ids, results))))
+                trained = None
+                if self.nlist and self.centroids is None and end >= self.train_size:
+                    trained = self._train(end)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            # 提交后再改内存里的状态，回滚时不会与库不一致
+            if trained is not None:
+                self.centroids, self._lists = trained[0], _inverted_lists(trained[1], self.nlist)
+            elif self.centroids is not None:
+                self._extend_lists(start, list_ids)
+            self.count = end
+        return list(range(start, end))
+
+    def _train(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        用前 count 条向量（至多 train_size 条样本）训练 IVF 质心并给这些条目分桶，返回 (质心, 桶号)
+
+        在调用方的写事务里更新桶号和 meta 的 ivf_nlist；质心文件先原子替换好，
+        其他进程看到提交的 ivf_nlist 时文件已就位。
+        """
+        began = time.perf_counter()
+        rng = np.random.default_rng(0)
+        sample = rng.choice(count, size=min(count, self.train_size), replace=False)
+        centroids = kmeans(self._vectors[np.sort(sample)], self.nlist)
+        list_ids = np.empty(count, dtype=np.int32)
+        for start in range(0, count, _CHUNK_ROWS):
+            block = self._vectors[start:min(start + _CHUNK_ROWS, count)].astype(np.float32)
+            list_ids[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        tmp = self._file(f"centroids.{os.getpid()}.npy")
+        np.save(tmp, centroids)
+        os.replace(tmp, self._file("centroids.npy"))
+        self._db.executemany("UPDATE entries SET list_id = ? WHERE id = ?",
+                             ((int(l), i) for i, l in enumerate(list_ids)))
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ivf_nlist', ?)", (str(self.nlist),))
+        logger.info(f"包装向量索引 IVF 训练完成: {count} 条 → {self.nlist} 桶，"
+                    f"{(time.perf_counter() - began) * 1000:.0f}ms")
+        return centroids, list_ids
+
+    # ---------------- 检索 ----------------
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            [(条目 id, 余弦相似度), ...]，按相似度从高到低，至多 k 条
+        """
+        query = normalize(vector)[0]
+        with self._lock:
+            self._refresh()
+            count, vectors, centroids = self.count, self._vectors, self.centroids
+            lists = list(self._lists) if centroids is not None else None
+        if not count or len(query) != self.dim:
+            return []
+
+        if lists is not None:
+            probe = _top_k(centroids @ query, min(self.nprobe, len(lists)))
+            ids = np.concatenate([lists[i] for i in probe])
+            ids = np.sort(ids[ids < count])   # 顺序读内存映射
+            scores = vectors[ids].astype(np.float32) @ query
+            best = _top_k(scores, k)
+            return [(int(ids[i]), float(scores[i])) for i in best]
+
+        # 暴力检索：分块转 float32 计算，每块保留 top-k 再合并
+        cand_ids, cand_scores = [], []
+        for start in range(0, count, _CHUNK_ROWS):
+            scores = vectors[start:min(start + _CHUNK_ROWS, count)].astype(np.float32) @ query
+            best = _top_k(scores, k)
+            cand_ids.append(best + start)
+            cand_scores.append(scores[best])
+        ids, scores = np.concatenate(cand_ids), np.concatenate(cand_scores)
+        best = _top_k(scores, k)
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT result FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, vector: np.ndarray, threshold: float) -> Optional[Dict[str, Any]]:
+        """
+        最相似条目的相似度 ≥ threshold 时返回 {"id", "similarity", "result"}，否则 None
+        """
+        hits = self.search(vector, k=1)
+        if not hits or hits[0][1] < threshold:
+            INDEX_LOOKUPS.labels(outcome="miss").inc()
+            return None
+        INDEX_LOOKUPS.labels(outcome="hit").inc()
+        entry_id, similarity = hits[0]
+        return {"id": entry_id, "similarity": round(similarity, 4), "result": self.get(entry_id)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {"path": self.path, "count": self.count, "dim": self.dim, "model_version": self.model_version,
+                    "nlist": len(self.centroids) if self.centroids is not None else 0, "nprobe": self.nprobe}
+
+
+# 全局索引（首次调用时按 service_config.yaml 的 embedding_index 节打开）
+_index: Optional[EmbeddingIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index(model_version: str) -> EmbeddingIndex:
+    """全局包装向量索引；model_version 为产生向量的检测器模型版本"""
+    global _index
+    if _index is not None and _index.model_version == model_version:
+        return _index
+    with _index_lock:
+        if _index is None or _index.model_version != model_version:
+            if _index is not None:
+                _index.close()
+            _index = EmbeddingIndex.from_config(get_section("service_config", "embedding_index"), model_version)
+    return _index
+
+
+def current_index() -> Optional[EmbeddingIndex]:
+    """已打开的全局索引（还没有请求用到时为 None，不会为此加载检测器）"""
+    return _index
+
+
+def close_index() -> None:
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
@@ -0,0 +1,126 @@
+# app/backend/executor.py
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.backend.startup import keep_inherited, register_after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorBusyError(RuntimeError):
+    """推理队列已满（调用方应返回 503 + Retry-After）"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"推理队列 {name} 已满")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    有界推理执行器
+
+    把阻塞的模型推理放到线程池或进程池里执行，避免卡住 asyncio 事件循环；
+    同时最多容纳 max_workers + max_queue 个任务，超出时立即抛出
+    ExecutorBusyError，而不是无限排队拖垮延迟。
+    """
+
+    def __init__(self,
+                 name: str,
+                 kind: str = "thread",
+                 max_workers: int = 2,
+                 max_queue: int = 16,
+                 retry_after: int = 1):
+        """
+        Args:
+            name: 执行器名称（日志/统计用）
+            kind: "thread" 或 "process"；进程池要求提交的函数可被 pickle
+            max_workers: 并发执行的任务数
+            max_queue: 在执行中的任务之外，允许排队等待的任务数
+            retry_after: 队列满时建议客户端重试的秒数
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"不支持的执行器类型: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = int(retry_after)
+
+        self._capacity = self.max_workers + self.max_queue
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = self._make_pool()
+        register_after_fork(self)
+        logger.info(f"推理执行器 {name} 已创建 ({kind}, workers={self.max_workers}, "
+                    f"queue={self.max_queue})")
+
+    def _make_pool(self) -> Executor:
+        if self.kind == "process":
+            # spawn：避免 fork 已初始化的 Paddle/线程状态
+            return ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-infer")
+
+    def _after_fork(self) -> None:
+        """fork 出的子进程里：池里的线程/子进程都属于父进程，换一个新池子，计数清零"""
+        keep_inherited(self._pool)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._pool = self._make_pool()
+
+    @classmethod
+    def from_config(cls, name: str, cfg: Dict[str, Any]) -> "InferenceExecutor":
+        """按配置节（kind / max_workers / max_queue / retry_after）创建执行器"""
+        return cls(name,
+                   kind=cfg.get("kind", "thread"),
+                   max_workers=cfg.get("max_workers", 2),
+                   max_queue=cfg.get("max_queue", 16),
+                   retry_after=cfg.get("retry_after", 1))
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """提交任务；队列已满时抛出 ExecutorBusyError"""
+        with self._lock:
+            if self._in_flight >= self._capacity:
+                raise ExecutorBusyError(self.name, self.retry_after)
+            self._in_flight += 1
+        try:
+            if self.kind == "thread":
+                # 带上调用方的上下文变量（如请求级的阶段计时）
+                future = self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+            else:
+                future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在执行器中运行 fn 并异步等待结果"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def in_flight(self) -> int:
+        """执行中 + 排队中的任务数"""
+        return self._in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight(),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,112 @@
+# app/backend/export_freshness_model.py
+"""
+导出新鲜度模型的推理产物
+
+用法：
+    python -m app.backend.export_freshness_model \\
+        --weights ./models/freshness_model.pdparams \\
+        --output ./models/freshness_model --onnx --check
+
+产物：
+    <output>.json / .pdmodel + <output>.pdiparams   Paddle Inference 静态图（Paddle 3.x 导出 .json）
+    <output>.onnx                                   ONNX 模型（需要 paddle2onnx）
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from app.backend.config import get_section
+from app.backend.freshness_backends import EagerBackend, create_backend, resolve_model_file
+
+logger = logging.getLogger(__name__)
+
+
+def export_static(backend: EagerBackend, output_prefix: str) -> Tuple[str, str]:
+    """把已加载权重的动态图模型导出为静态图，返回 (模型文件, 参数文件)"""
+    import paddle
+    from paddle.static import InputSpec
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_prefix)), exist_ok=True)
+    paddle.jit.save(backend.model, output_prefix,
+                    input_spec=[InputSpec([None, 3, 224, 224], "float32", "x")])
+    model_file = resolve_model_file(output_prefix + ".pdmodel")
+    params_file = output_prefix + ".pdiparams"
+    logger.info(f"静态图模型已导出: {model_file}, {params_file}")
+    return model_file, params_file
+
+
+def export_onnx(model_file: str, params_file: str, onnx_path: str, opset_version: int = 13) -> str:
+    """静态图 → ONNX（可选依赖 paddle2onnx）"""
+    try:
+        import paddle2onnx
+    except ImportError:
+        raise RuntimeError("未安装 paddle2onnx，无法导出 ONNX：pip install paddle2onnx")
+    paddle2onnx.export(model_file, params_file, onnx_path, opset_version=opset_version)
+    logger.info(f"ONNX 模型已导出: {onnx_path}")
+    return onnx_path
+
+
+def compare_backends(backends: Dict[str, Callable[[np.ndarray], np.ndarray]],
+                     batch_size: int = 8,
+                     runs: int = 20,
+                     seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    用同一批随机输入比较各后端：与第一个后端（基准）的最大概率差、top-1 一致率和平均延迟
+    """
+    rng = np.random.default_rng(seed)
+    batch = rng.standard_normal((batch_size, 3, 224, 224)).astype(np.float32)
+    names = list(backends)
+    reference = backends[names[0]](batch)
+
+    report = {}
+    for name in names:
+        fn = backends[name]
+        probs = fn(batch)  # 预热
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(batch)
+        elapsed = (time.perf_counter() - start) / runs
+        report[name] = {
+            "max_abs_diff": float(np.abs(probs - reference).max()),
+            "top1_agreement": float((probs.argmax(1) == reference.argmax(1)).mean()),
+            "latency_ms_per_batch": round(elapsed * 1000, 3),
+            "latency_ms_per_image": round(elapsed * 1000 / batch_size, 3),
+        }
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="导出新鲜度模型的 Paddle Inference / ONNX 产物")
+    parser.add_argument("--weights", default="./models/freshness_model.pdparams", help="动态图权重 .pdparams")
+    parser.add_argument("--output", default="./models/freshness_model", help="输出文件前缀")
+    parser.add_argument("--num-classes", type=int, default=len(get_section("freshness_config", "labels")) or 3,
+                        help="类别数，默认 freshness_config.yaml 的 labels 个数")
+    parser.add_argument("--onnx", action="store_true", help="同时导出 ONNX")
+    parser.add_argument("--check", action="store_true", help="导出后比较各后端的输出一致性与延迟")
+    parser.add_argument("--cpu-threads", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    eager = EagerBackend(args.num_classes, weights_path=args.weights, device="cpu")
+    if not os.path.exists(args.weights):
+        logger.warning("未找到权重文件，导出的是随机初始化的模型（仅用于调试）")
+    model_file, params_file = export_static(eager, args.output)
+    onnx_path = export_onnx(model_file, params_file, args.output + ".onnx") if args.onnx else None
+
+    if args.check:
+        options = {"model_file": model_file, "params_file": params_file,
+                   "onnx_path": onnx_path, "cpu_threads": args.cpu_threads}
+        backends = {"eager": eager,
+                    "paddle_inference": create_backend("paddle_inference", args.num_classes, options=options)}
+        if onnx_path:
+            backends["onnxruntime"] = create_backend("onnxruntime", args.num_classes, options=options)
+        print(json.dumps(compare_backends(backends), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
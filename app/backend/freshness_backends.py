@@ -0,0 +1,202 @@
+# app/backend/freshness_backends.py
+import logging
+import os
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "paddle_inference", "onnxruntime")
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """按最后一维做数值稳定的 softmax"""
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def resolve_model_file(path: str) -> str:
+    """
+    定位静态图模型文件
+
+    Paddle 3.x 默认导出 .json（PIR），旧版导出 .pdmodel；配置里写哪一种都可以，
+    不存在时自动尝试另一种后缀。
+    """
+    if os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(path)
+    for alt in (".json", ".pdmodel"):
+        if alt != ext and os.path.exists(stem + alt):
+            return stem + alt
+    raise FileNotFoundError(f"静态图模型文件不存在: {path}")
+
+
+def _file_version(prefix: str, path: str) -> str:
+    stat = os.stat(path)
+    return f"{prefix}:{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class EagerBackend:
+    """动态图（eager）后端：paddle.vision 的 mobilenet_v3_large"""
+
+    name = "eager"
+
+    def __init__(self, num_classes: int, weights_path: Optional[str] = None, device: str = "cpu"):
+        import paddle
+        from paddle.vision.models import mobilenet_v3_large
+
+        paddle.set_device(device)
+        self._paddle = paddle
+        self.model = mobilenet_v3_large(pretrained=False, num_classes=num_classes)
+        if weights_path and os.path.exists(weights_path):
+            logger.info(f"加载自定义模型权重: {weights_path}")
+            self.model.set_state_dict(paddle.load(weights_path))
+            self.version = _file_version("mobilenet_v3_large", weights_path)
+            self.trained = True
+        else:
+            # 未加载权重时每个实例都是随机初始化，版本标识不可跨实例复用
+            self.version = f"mobilenet_v3_large:untrained:{uuid.uuid4().hex[:8]}"
+            self.trained = False
+        self.model.eval()
+
+    def logits(self, batch: np.ndarray) -> np.ndarray:
+        paddle = self._paddle
+        with paddle.no_grad():
+            return self.model(paddle.to_tensor(batch, dtype='float32')).numpy()
+
+    def features(self, batch: np.ndarray) -> np.ndarray:
+        """分类层之前（倒数第二层）的特征，(N, 1280)"""
+        if not self.trained:
+            # 随机初始化的网络对任意两张图给出的特征都高度相似，不能用来识别包装
+            raise RuntimeError("未加载模型权重，无法提取有区分度的特征")
+        paddle = self._paddle
+        model = self.model
+        with paddle.no_grad():
+            x = model.lastconv(model.blocks(model.conv(paddle.to_tensor(batch, dtype='float32'))))
+            x = paddle.flatten(model.avgpool(x), 1)
+            # classifier = Linear → Hardswish → Dropout → Linear，去掉最后的 Linear
+            for layer in list(model.classifier)[:-1]:
+                x = layer(x)
+            return x.numpy()
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        return softmax(self.logits(batch))
+
+
+class PaddleInferenceBackend:
+    """
+    Paddle Inference 预测器后端（静态图）
+
+    CPU 上开启 MKLDNN(oneDNN)、IR 图优化，并设置数学库线程数。
+    """
+
+    name = "paddle_inference"
+
+    def __init__(self,
+                 model_file: str,
+                 params_file: str,
+                 device: str = "cpu",
+                 cpu_threads: int = 4,
+                 enable_mkldnn: bool = True,
+                 ir_optim: bool = True,
+                 precision: str = "fp32"):
+        from paddle import inference
+
+        model_file = resolve_model_file(model_file)
+        config = inference.Config(model_file, params_file)
+        if device == "gpu":
+            config.enable_use_gpu(256, 0)
+        else:
+            config.disable_gpu()
+            config.set_cpu_math_library_num_threads(int(cpu_threads))
+            if enable_mkldnn:
+                config.enable_mkldnn()
+                if precision == "bf16":
+                    config.enable_mkldnn_bfloat16()
+        config.switch_ir_optim(ir_optim)
+        config.disable_glog_info()
+
+        self._predictor = inference.create_predictor(config)
+        self._lock = threading.Lock()
+        self._input = self._predictor.get_input_handle(self._predictor.get_input_names()[0])
+        self._output = self._predictor.get_output_handle(self._predictor.get_output_names()[0])
+        self.version = _file_version("paddle_inference", params_file)
+        logger.info(f"Paddle Inference 预测器已加载: {model_file} (mkldnn={enable_mkldnn}, "
+                    f"threads={cpu_threads}, ir_optim={ir_optim}, precision={precision})")
+
+    def logits(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        # 预测器的输入输出句柄不是线程安全的
+        with self._lock:
+            self._input.reshape(list(batch.shape))
+            self._input.copy_from_cpu(batch)
+            self._predictor.run()
+            return self._output.copy_to_cpu()
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        return softmax(self.logits(batch))
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime 后端（可选依赖 onnxruntime）"""
+
+    name = "onnxruntime"
+
+    def __init__(self, onnx_path: str, cpu_threads: int = 4):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("未安装 onnxruntime，无法使用 onnxruntime 后端：pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(cpu_threads)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(onnx_path, sess_options=options,
+                                             providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        self.version = _file_version("onnxruntime", onnx_path)
+        logger.info(f"ONNX Runtime 会话已加载: {onnx_path} (threads={cpu_threads})")
+
+    def logits(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._session.run(None, {self._input_name: batch})[0]
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        return softmax(self.logits(batch))
+
+
+def create_backend(kind: str,
+                   num_classes: int,
+                   device: str = "cpu",
+                   options: Optional[Dict[str, Any]] = None):
+    """
+    按名称创建推理后端
+
+    Args:
+        kind: "eager" | "paddle_inference" | "onnxruntime"
+        num_classes: 类别数（仅 eager 需要，静态图/ONNX 模型自带）
+        device: "gpu" 或 "cpu"
+        options: 后端参数，见 freshness_config.yaml 的 model / inference 节
+    """
+    options = options or {}
+    if kind == "eager":
+        return EagerBackend(num_classes, weights_path=options.get("weights_path"), device=device)
+    if kind == "paddle_inference":
+        return PaddleInferenceBackend(options["model_file"], options["params_file"],
+                                      device=device,
+                                      cpu_threads=options.get("cpu_threads", 4),
+                                      enable_mkldnn=options.get("enable_mkldnn", True),
+                                      ir_optim=options.get("ir_optim", True),
+                                      precision=options.get("precision", "fp32"))
+    if kind == "onnxruntime":
+        # precision 为 int8 / fp16 时加载 quantize_freshness_model 生成的对应模型
+        precision = options.get("precision", "fp32")
+        onnx_path = options["onnx_path"] if precision == "fp32" else options.get(f"onnx_{precision}_path")
+        if not onnx_path:
+            raise ValueError(f"onnxruntime 后端未配置 {precision} 模型路径（model.onnx_{precision}_path）")
+        return OnnxRuntimeBackend(onnx_path, cpu_threads=options.get("cpu_threads", 4))
+    raise ValueError(f"不支持的推理后端: {kind}，可选 {BACKENDS}")
@@ -1,10 +1,10 @@
-from paddle.vision.models import mobilenet_v3_large
-import paddle
 import numpy as np
-import cv2
 import logging
-import os
 from typing import Dict, Optional, List, Any
+from app.backend.freshness_backends import create_backend, softmax
+from app.backend.freshness_detector_simple import freshness_advice
+from app.backend.metrics import observe_image, stage
+from app.backend.preprocessing import Preprocessor, decode_many
 
 logger = logging.getLogger(__name__)
 
@@ -15,37 +15,44 @@ class FreshnessDetector:
                  model_name: str = "MobileNetV3_large",
                  model_path: Optional[str] = None,
                  label_list: Optional[list] = None,
-                 device: str = "cpu"):
+                 device: str = "cpu",
+                 reduced_decode: bool = False,
+                 max_side: Optional[int] = None,
+                 backend: str = "eager",
+                 backend_options: Optional[Dict[str, Any]] = None):
         """
         初始化新鲜度检测器
         
         Args:
             model_name: 模型名称（当前仅支持 "MobileNetV3_large"）
-            model_path: 自定义模型权重路径 (.pdparams)
+            model_path: 自定义模型权重路径 (.pdparams)，eager 后端使用；
+                指向 .onnx 文件（如量化后的 INT8 模型）时改用 onnxruntime 后端加载该文件
             label_list: 类别标签列表，如 ["新鲜", "轻微变质", "严重变质"]
             device: 使用设备 "gpu" 或 "cpu"
+            reduced_decode: 大图是否用 IMREAD_REDUCED_* 缩小解码（更快，结果与全尺寸解码略有差异）
+            max_side: 解码后最长边上限（freshness_config.yaml 的 preprocessing.max_size），None 表示不限制
+            backend: 推理后端 "eager" | "paddle_inference" | "onnxruntime"
+            backend_options: 后端参数（静态图/ONNX 模型路径、线程数等），见 freshness_backends.create_backend
         """
         self.label_list = label_list or ["新鲜", "一般", "变质"]
         self.device = device
         self.model = None
+        self.preprocessor = Preprocessor(size=224, reduced_decode=reduced_decode, max_side=max_side)
         
         try:
-            # 设置设备
-            paddle.set_device(device)
+            options = dict(backend_options or {})
+            if model_path and model_path.endswith(".onnx"):
+                backend = "onnxruntime"
+                options.update(onnx_path=model_path, precision="fp32")
+            else:
+                options.setdefault("weights_path", model_path)
+            # 初始化推理后端（eager 后端会加载自定义权重并设置为评估模式）
+            self.model = create_backend(backend, len(self.label_list), device=device, options=options)
+            self.backend = backend
+            # 模型版本标识（结果缓存键的一部分），模型文件变化后旧缓存自动失效
+            self.model_version = self.model.version
             
-            # 初始化模型
-            self.model = mobilenet_v3_large(pretrained=False, num_classes=len(self.label_list))
-            
-            # 加载自定义权重（如果有）
-            if model_path and os.path.exists(model_path):
-                logger.info(f"加载自定义模型权重: {model_path}")
-                state_dict = paddle.load(model_path)
-                self.model.set_state_dict(state_dict)
-            
-            # 设置为评估模式
-            self.model.eval()
-            
-            logger.info(f"新鲜度检测器初始化成功 ({device.upper()})")
+            logger.info(f"新鲜度检测器初始化成功 ({device.upper()}, backend={backend})")
         except Exception as e:
             logger.error(f"新鲜度检测器初始化失败: {e}", exc_info=True)
             raise RuntimeError(f"检测器初始化失败: {str(e)}")
@@ -78,26 +85,23 @@ class FreshnessDetector:
         
         try:
             # 解码图片
-            img = self._decode_image(image_bytes)
+            with stage("freshness", "decode"):
+                img = self._decode_image(image_bytes)
             if img is None:
                 return {
                     "status": "error",
                     "message": "图片解码失败"
                 }
+            observe_image("freshness", shape=img.shape)
             
-            # 预处理
-            img = self._preprocess_image(img)
-            
-            # 转换为张量 - 确保数据类型正确
-            img_tensor = paddle.to_tensor(img, dtype='float32').unsqueeze(0)  # 添加批次维度
-            
-            # 执行预测
-            with paddle.no_grad():
-                output = self.model(img_tensor)
-                probs = paddle.nn.functional.softmax(output).numpy()[0]
+            # 预处理（直接写入批缓冲区，批大小为 1）并执行预测
+            with stage("freshness", "preprocess"):
+                batch = self.preprocessor.batch([img])
+            probs = self._forward(batch)[0]
             
             # 解析结果
-            return self._parse_result(probs)
+            with stage("freshness", "postprocess"):
+                return self._parse_result(probs)
             
         except Exception as e:
             logger.error(f"新鲜度检测失败: {e}", exc_info=True)
@@ -106,12 +110,77 @@ class FreshnessDetector:
                 "message": f"检测失败: {str(e)}"
             }
     
+    def predict_batch(self, images: List[bytes]) -> List[Dict[str, Any]]:
+        """
+        批量预测食品新鲜度：并行解码，所有可解码的图片拼成一个张量，只做一次前向
+        
+        Args:
+            images: 图片二进制数据列表
+            
+        Returns:
+            与输入一一对应的结果列表，单张图片失败不影响其它图片
+        """
+        if self.model is None:
+            return [{"status": "error", "message": "检测器未初始化"} for _ in images]
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        valid_idx, decoded = [], []
+        # 各图片并行解码，再拼成一个批
+        with stage("freshness", "decode"):
+            decoded_all = decode_many(self._decode_image, images)
+        for i, img in enumerate(decoded_all):
+            if img is None:
+                results[i] = {"status": "error", "message": "图片解码失败"}
+                continue
+            observe_image("freshness", shape=img.shape)
+            valid_idx.append(i)
+            decoded.append(img)
+        
+        if decoded:
+            try:
+                with stage("freshness", "preprocess"):
+                    batch = self.preprocessor.batch(decoded)
+                probs = self._forward(batch)
+                with stage("freshness", "postprocess"):
+                    for i, p in zip(valid_idx, probs):
+                        results[i] = self._parse_result(p)
+            except Exception as e:
+                logger.error(f"新鲜度批量检测失败: {e}", exc_info=True)
+                for i in valid_idx:
+                    results[i] = {"status": "error", "message": f"检测失败: {str(e)}"}
+        
+        return results
+    
+    def embed(self, image_bytes: bytes) -> np.ndarray:
+        """
+        图片的特征向量（骨干网络倒数第二层输出），用于包装识别向量索引（embedding_index.py）
+
+        Raises:
+            ValueError: 图片解码失败
+            RuntimeError: 推理后端不支持提取中间层特征（静态图 / ONNX 模型只导出了分类输出）
+        """
+        if not hasattr(self.model, "features"):
+            raise RuntimeError(f"推理后端 {self.backend} 不支持提取特征，请使用 eager 后端")
+        with stage("freshness", "decode"):
+            img = self._decode_image(image_bytes)
+        if img is None:
+            raise ValueError("图片解码失败")
+        with stage("freshness", "preprocess"):
+            batch = self.preprocessor.batch([img])
+        with stage("freshness", "embed"):
+            return self.model.features(batch)[0]
+    
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        """对 NCHW 批数据做一次前向，返回 (N, num_classes) 的 softmax 概率"""
+        with stage("freshness", "forward"):
+            logits = self.model.logits(batch)
+        with stage("freshness", "softmax"):
+            return softmax(logits)
+    
     def _decode_image(self, image_bytes: bytes) -> Optional[np.ndarray]:
         """解码图片"""
         try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            return img
+            return self.preprocessor.decode(image_bytes)
         except Exception as e:
             logger.error(f"图片解码失败: {e}")
             return None
@@ -121,25 +190,11 @@ class FreshnessDetector:
         图片预处理
         - 调整大小到 224x224 (MobileNetV3 的标准输入尺寸)
         - 转换为 RGB
-        - 归一化
-        """
-        # 调整大小
-        img = cv2.resize(img, (224, 224))
+        - 归一化 (ImageNet 标准)，输出 CHW float32
         
-        # 转换为 RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # 归一化 (ImageNet 标准) 并确保使用 float32
-        img = img.astype(np.float32)  # 关键修复：显式转换为 float32
-        img = img / 255.0
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)  # 确保均值和标准差也是 float32
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        img = (img - mean) / std
-        
-        # 转换为 CHW 格式
-        img = img.transpose((2, 0, 1))
-        
-        return img
+        各步骤由 Preprocessor 融合为一次 resize + 查表完成
+        """
+        return self.preprocessor.preprocess(img)
     
     def _parse_result(self, probs: np.ndarray) -> Dict[str, any]:
         """解析预测结果"""
@@ -182,18 +237,4 @@ class FreshnessDetector:
         Returns:
             建议文本
         """
-        advice_map = {
-            "新鲜": "食品状态良好，可以放心食用。建议尽快食用以保持最佳口感。",
-            "一般": "食品状态一般，建议尽快食用。注意检查是否有异味或变色。",
-            "变质": "食品已变质，不建议食用，请妥善处理。",
-            "轻微变质": "食品可能开始变质，建议仔细检查后决定是否食用。",
-            "严重变质": "食品严重变质，请立即丢弃，避免食用。"
-        }
-        
-        advice = advice_map.get(label, "请根据实际情况判断是否食用。")
-        
-        # 如果置信度较低，添加提醒
-        if score < 0.7:
-            advice += " （注意：检测置信度较低，建议人工再次确认）"
-        
-        return advice
\ No newline at end of file
+        return freshness_advice(label, score)
\ No newline at end of file
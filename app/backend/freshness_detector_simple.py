@@ -1,48 +1,171 @@
 # app/backend/freshness_detector_simple.py
-import numpy as np
+"""
+经典视觉新鲜度检测器（不依赖 PaddleClas）
+
+在缩小到 analysis_size 的图上用 NumPy / OpenCV 向量化计算几项特征：
+    - 前景：饱和度够高或足够暗的像素（排除白/灰背景）
+    - 色相直方图、鲜艳像素占比（高饱和高亮度）
+    - 褐变占比（橙褐色相、中等亮度）
+    - 暗斑占比：比前景亮度中位数暗得多（spot_ratio 倍以下）或绝对亮度很低的像素
+    - 纹理：前景内部（腐蚀掉轮廓边缘）拉普拉斯响应的均值，斑点、霉变、皱缩使其升高
+各项按配置的权重加权成"变质分"，再按阈值映射到 新鲜 / 一般 / 变质 三类的概率。
+结果完全确定；单张图（不含解码）约 1 毫秒，可作深度模型前的预筛，或模型过载时的降级方案。
+阈值见 freshness_config.yaml 的 simple_detector 节。
+"""
+import logging
+from typing import Any, Dict, Optional
+
 import cv2
-from typing import Dict
-import random
+import numpy as np
+
+from app.backend.config import get_section
+from app.backend.ingest import IngestError, decode_image
+
+logger = logging.getLogger(__name__)
+
+_KERNEL = np.ones((5, 5), np.uint8)
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "analysis_size": 128,          # 分析前把最长边缩到这么大
+    "background_saturation": 45,   # 饱和度低于此且不暗的像素视为背景
+    "min_foreground": 0.05,        # 前景占比低于此时整张图都参与计算
+    "brown_hue": [5, 22],          # OpenCV 色相（0~180）
+    "brown_saturation": 70,
+    "brown_value": [30, 150],
+    "dark_value": 60,              # 亮度低于此为暗斑
+    "spot_ratio": 0.6,             # 亮度低于前景中位数的这个倍数为暗斑
+    "vivid_saturation": 110,
+    "vivid_value": 130,
+    "texture_scale": 60.0,         # 拉普拉斯均值除以此值后截断到 [0, 1]
+    "weights": {"browning": 1.0, "dark_spots": 2.0, "texture": 0.4, "vividness": -0.3},
+    "fresh_below": 0.1,            # 变质分低于此偏向"新鲜"
+    "spoiled_above": 0.3,          # 高于此偏向"变质"
+    "temperature": 0.06,           # 越小概率越"硬"
+}
+
+
+_ADVICE = {
+    "新鲜": "食品状态良好，可以放心食用。建议尽快食用以保持最佳口感。",
+    "一般": "食品状态一般，建议尽快食用。注意检查是否有异味或变色。",
+    "变质": "食品已变质，不建议食用，请妥善处理。",
+    "轻微变质": "食品可能开始变质，建议仔细检查后决定是否食用。",
+    "严重变质": "食品严重变质，请立即丢弃，避免食用。"
+}
+
+
+def freshness_advice(label: str, score: float) -> str:
+    """根据检测结果给出建议（深度模型与本检测器共用）"""
+    advice = _ADVICE.get(label, "请根据实际情况判断是否食用。")
+    # 如果置信度较低，添加提醒
+    if score < 0.7:
+        advice += " （注意：检测置信度较低，建议人工再次确认）"
+    return advice
+
+
+def _merge(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    cfg["weights"] = {**DEFAULT_CONFIG["weights"], **(cfg.get("weights") or {})}
+    return cfg
+
 
 class SimpleFreshnessDetector:
-    """简化版新鲜度检测器（不依赖 PaddleClas）"""
-    
-    def __init__(self):
+    """简化版新鲜度检测器（颜色 / 褐变 / 暗斑 / 纹理特征，确定性，CPU 毫秒级）"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: 覆盖 DEFAULT_CONFIG 的参数；None 时读取 freshness_config.yaml 的 simple_detector 节
+        """
         self.labels = ["新鲜", "一般", "变质"]
-    
-    def predict(self, image_bytes: bytes) -> Dict:
-        # 验证图片
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            return {"status": "error", "message": "图片解码失败"}
-        
-        # 基于图像特征的简单判断（示例）
-        # 实际项目中可以用 OpenCV 分析颜色、纹理等
-        brightness = np.mean(img)
-        
-        # 模拟检测逻辑
-        if brightness > 150:  # 较亮
-            scores = [0.8, 0.15, 0.05]  # 倾向新鲜
-        elif brightness > 100:  # 中等
-            scores = [0.3, 0.5, 0.2]   # 倾向一般
-        else:  # 较暗
-            scores = [0.1, 0.3, 0.6]   # 倾向变质
-        
-        # 加入随机性
-        scores = [s + random.uniform(-0.1, 0.1) for s in scores]
-        scores = [max(0, min(1, s)) for s in scores]
-        total = sum(scores)
-        scores = [s/total for s in scores]
-        
-        max_idx = scores.index(max(scores))
-        
+        self.config = _merge(get_section("freshness_config", "simple_detector") if config is None else config)
+
+    # ---------------- 特征 ----------------
+
+    def _downsample(self, img: np.ndarray) -> np.ndarray:
+        size = int(self.config["analysis_size"])
+        h, w = img.shape[:2]
+        scale = size / max(h, w)
+        if scale >= 1:
+            return img
+        return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def extract_features(self, img: np.ndarray) -> Dict[str, Any]:
+        """BGR 图 → 特征（各占比均相对前景像素数）"""
+        cfg = self.config
+        small = self._downsample(img)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+        very_dark = v < cfg["dark_value"]
+        fg = (s >= cfg["background_saturation"]) | very_dark
+        if fg.mean() < cfg["min_foreground"]:
+            fg = np.ones_like(fg)
+        n = max(int(np.count_nonzero(fg)), 1)
+        # 前景内部：去掉物体轮廓，避免边缘被算成纹理
+        inner = cv2.erode(fg.view(np.uint8), _KERNEL).view(bool)
+        if np.count_nonzero(inner) < 16:
+            inner = fg
+
+        lo_h, hi_h = cfg["brown_hue"]
+        lo_v, hi_v = cfg["brown_value"]
+        brown = fg & (h >= lo_h) & (h <= hi_h) & (s >= cfg["brown_saturation"]) & (v >= lo_v) & (v <= hi_v)
+        vivid = fg & (s >= cfg["vivid_saturation"]) & (v >= cfg["vivid_value"])
+
+        spots = fg & ((v < cfg["spot_ratio"] * np.median(v[fg])) | very_dark)
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        laplacian = np.abs(cv2.Laplacian(gray, cv2.CV_16S))
+        texture = min(float(laplacian[inner].mean()) / cfg["texture_scale"], 1.0)
+
+        hue_hist = np.bincount(h[fg].ravel() // 10, minlength=18)[:18] / n
+        return {
+            "foreground": round(float(fg.mean()), 4),
+            "browning": round(float(np.count_nonzero(brown)) / n, 4),
+            "dark_spots": round(float(np.count_nonzero(spots)) / n, 4),
+            "vividness": round(float(np.count_nonzero(vivid)) / n, 4),
+            "texture": round(texture, 4),
+            "hue_histogram": [round(float(x), 4) for x in hue_hist],
+        }
+
+    def spoilage_score(self, features: Dict[str, Any]) -> float:
+        """特征加权和（越大越可能变质）"""
+        weights = self.config["weights"]
+        return float(sum(weight * features[name] for name, weight in weights.items()))
+
+    def _probabilities(self, score: float) -> np.ndarray:
+        cfg = self.config
+        t = max(float(cfg["temperature"]), 1e-6)
+        logits = np.array([(cfg["fresh_below"] - score) / t,
+                           0.0,
+                           (score - cfg["spoiled_above"]) / t])
+        logits -= logits.max()
+        probs = np.exp(logits)
+        return probs / probs.sum()
+
+    # ---------------- 预测 ----------------
+
+    def predict_image(self, img: np.ndarray) -> Dict[str, Any]:
+        """对已解码的 BGR 图检测（调用方已有解码结果时用，省去 predict 里的解码）"""
+        features = self.extract_features(img)
+        score = self.spoilage_score(features)
+        probs = self._probabilities(score)
+        best = int(np.argmax(probs))
         return {
             "status": "success",
-            "label": self.labels[max_idx],
-            "score": float(scores[max_idx]),
-            "all_results": [
-                {"label": label, "score": float(score)}
-                for label, score in zip(self.labels, scores)
-            ]
-        }
\ No newline at end of file
+            "label": self.labels[best],
+            "score": float(probs[best]),
+            "all_results": [{"label": label, "score": float(p)} for label, p in zip(self.labels, probs)],
+            "spoilage_score": round(score, 4),
+            "features": features,
+        }
+
+    def get_freshness_advice(self, label: str, score: float) -> str:
+        return freshness_advice(label, score)
+
+    def predict(self, image_bytes: bytes) -> Dict[str, Any]:
+        # 只需要 analysis_size 大小的图：JPEG 直接缩小解码，省掉大部分解码时间
+        try:
+            img = decode_image(image_bytes, max_side=int(self.config["analysis_size"]))
+        except IngestError as e:
+            return {"status": "error", "message": str(e)}
+        return self.predict_image(img)
@@ -0,0 +1,292 @@
+# app/backend/ingest.py
+"""
+图片接入：在解码和推理之前限制每个请求的内存与耗时
+
+    1. 整个请求体在接收时按 max_request_bytes 限制（RequestSizeLimitMiddleware，超限即停止接收）；
+       单个文件在 Starlette 接收、暂存之后分块读出，超过 max_upload_bytes 即 413，不把整个文件读进内存
+    2. 只读文件头（PIL 惰性打开）拿到格式、宽高、EXIF 方向；无法识别 → 415，像素数超限 → 413
+    3. 解码：JPEG 按目标尺寸选 IMREAD_REDUCED_*（DCT 域缩小，解码本身就更快、更省内存），
+       再按 EXIF 方向旋转，最长边仍超过 max_side 时再缩放到 max_side
+"""
+import io
+import logging
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# EXIF Orientation 标签
+_ORIENTATION_TAG = 0x0112
+
+# OpenCV 能解码的格式（PIL 的格式名）；MPO 是带多帧的 JPEG（部分手机相机输出）
+SUPPORTED_FORMATS = ("JPEG", "MPO", "PNG", "WEBP", "BMP", "TIFF")
+
+# 缩小解码：(缩小倍数, imread 标志)，从大到小尝试
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class IngestError(ValueError):
+    """图片不符合接入要求；status_code 为建议返回的 HTTP 状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ImageInfo:
+    """文件头信息：格式、原始宽高（未旋转）、EXIF 方向（1~8）"""
+
+    __slots__ = ("format", "width", "height", "orientation")
+
+    def __init__(self, format: str, width: int, height: int, orientation: int = 1):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.orientation = orientation
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def __repr__(self) -> str:
+        return f"ImageInfo({self.format}, {self.width}x{self.height}, orientation={self.orientation})"
+
+
+class ImageBytes(bytes):
+    """
+    上传图片的字节，附带接入时 probe 得到的文件头信息（info）
+
+    与 bytes 完全一样地传给缓存、执行器、微批调度器等；最终 decode_image 直接用 info，不再解析一遍文件头。
+    """
+
+    info: Optional[ImageInfo] = None
+
+
+def probe(image_bytes: bytes, max_pixels: Optional[int] = None) -> ImageInfo:
+    """
+    只解析文件头，不解码像素
+
+    Raises:
+        IngestError: 无法识别/不支持的格式（415），像素数超过 max_pixels（413）
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as im:
+            fmt = im.format
+            width, height = im.size
+            try:
+                orientation = int(im.getexif().get(_ORIENTATION_TAG, 1))
+            except Exception:
+                # EXIF 段损坏不影响像素数据，按未旋转处理
+                orientation = 1
+    except Image.DecompressionBombError:
+        raise IngestError("图片像素数过大", 413)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        logger.debug(f"文件头解析失败: {e}")
+        raise IngestError("无法识别的图片文件", 415)
+
+    if fmt not in SUPPORTED_FORMATS:
+        raise IngestError(f"不支持的图片格式: {fmt}", 415)
+    if width <= 0 or height <= 0:
+        raise IngestError("图片尺寸无效", 400)
+    if max_pixels and width * height > max_pixels:
+        raise IngestError(f"图片像素数过大: {width}x{height}，上限 {int(max_pixels)} 像素", 413)
+    return ImageInfo(fmt, width, height, orientation if 1 <= orientation <= 8 else 1)
+
+
+def reduce_factor(width: int, height: int,
+                  max_side: Optional[int] = None,
+                  min_side: Optional[int] = None) -> int:
+    """
+    选择缩小解码倍数（1/2/4/8）：缩小后最长边仍不小于 max_side、最短边仍不小于 min_side 的最大倍数
+
+    两个条件都未给出时返回 1（全尺寸解码）。
+    """
+    if not max_side and not min_side:
+        return 1
+    for factor, _ in _REDUCED_FLAGS:
+        if max_side and max(width, height) // factor < max_side:
+            continue
+        if min_side and min(width, height) // factor < min_side:
+            continue
+        return factor
+    return 1
+
+
+def apply_orientation(img: np.ndarray, orientation: int) -> np.ndarray:
+    """按 EXIF Orientation 把图片转正（与 PIL ImageOps.exif_transpose 一致）"""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def decode_image(image_bytes: bytes,
+                 max_side: Optional[int] = None,
+                 min_side: Optional[int] = None,
+                 info: Optional[ImageInfo] = None,
+                 max_pixels: Optional[int] = None) -> np.ndarray:
+    """
+    解码为 BGR uint8 图片：缩小解码 → EXIF 转正 → 最长边不超过 max_side
+
+    Args:
+        max_side: 输出最长边上限，None 表示不限制
+        min_side: 缩小解码时最短边至少保留的像素数（如模型输入边长）；
+            给出时即使 max_side 为 None 也会尽量缩小解码
+        info: 已经 probe 过的文件头信息，省去重复解析；不给时用 ImageBytes 上附带的 info
+
+    Raises:
+        IngestError: 文件头无法识别或像素解码失败
+    """
+    if info is None:
+        info = getattr(image_bytes, "info", None) or probe(image_bytes, max_pixels)
+
+    flag = cv2.IMREAD_COLOR
+    # 只有 JPEG 能在 DCT 域直接缩小；其它格式 OpenCV 也是先全尺寸解码再缩放，不如后面统一处理
+    if info.format in ("JPEG", "MPO"):
+        factor = reduce_factor(info.width, info.height, max_side, min_side)
+        flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        raise IngestError("图片解码失败", 400)
+
+    img = apply_orientation(img, info.orientation)
+    if max_side:
+        h, w = img.shape[:2]
+        longest = max(h, w)
+        if longest > max_side:
+            scale = max_side / longest
+            # 缩小不到一半时 INTER_LINEAR 几乎没有混叠，且比非整数倍的 INTER_AREA 快一个数量级
+            interpolation = cv2.INTER_AREA if scale <= 0.5 else cv2.INTER_LINEAR
+            img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                             interpolation=interpolation)
+    return img
+
+
+async def read_upload(upload, max_bytes: Optional[int] = None, chunk_size: int = 1 << 20) -> ImageBytes:
+    """
+    分块读取上传文件，累计超过 max_bytes 立即抛出 IngestError(413)
+
+    upload 为 FastAPI/Starlette 的 UploadFile；已知大小（multipart 解析后的 size）时直接拒绝，不再读取。
+    此时请求体已接收并暂存完毕，这里限制的是读进内存的字节数，接收阶段的上限见 RequestSizeLimitMiddleware。
+    """
+    size = getattr(upload, "size", None)
+    if max_bytes and size is not None and size > max_bytes:
+        raise IngestError(f"文件过大：{size} 字节，上限 {int(max_bytes)} 字节", 413)
+
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if max_bytes and len(buffer) > max_bytes:
+            raise IngestError(f"文件过大：超过上限 {int(max_bytes)} 字节", 413)
+    return ImageBytes(buffer)
+
+
+class ImageIngestor:
+    """
+    接入限制的集合（见 service_config.yaml 的 ingest 节）
+
+        ingestor = ImageIngestor.from_config(get_section("service_config", "ingest"))
+        data = await ingestor.read(upload)      # 字节上限
+        ingestor.check(data)                    # 文件头：格式、像素数（记在 data.info 上，解码时复用）
+    """
+
+    def __init__(self,
+                 max_bytes: Optional[int] = 20 * 1024 * 1024,
+                 max_pixels: Optional[int] = 100_000_000,
+                 chunk_size: int = 1 << 20):
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.max_pixels = int(max_pixels) if max_pixels else None
+        self.chunk_size = int(chunk_size)
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> "ImageIngestor":
+        cfg = cfg or {}
+        return cls(max_bytes=cfg.get("max_upload_bytes", 20 * 1024 * 1024),
+                   max_pixels=cfg.get("max_pixels", 100_000_000),
+                   chunk_size=cfg.get("chunk_size", 1 << 20))
+
+    async def read(self, upload) -> ImageBytes:
+        return await read_upload(upload, self.max_bytes, self.chunk_size)
+
+    def check(self, image_bytes: bytes) -> ImageInfo:
+        if not image_bytes:
+            raise IngestError("上传文件为空", 400)
+        info = probe(image_bytes, self.max_pixels)
+        if isinstance(image_bytes, ImageBytes):
+            image_bytes.info = info
+        return info
+
+    def decode(self, image_bytes: bytes,
+               max_side: Optional[int] = None,
+               min_side: Optional[int] = None) -> np.ndarray:
+        return decode_image(image_bytes, max_side=max_side, min_side=min_side,
+                            info=self.check(image_bytes))
+
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI 中间件：限制整个请求体大小（批量、流式接口一次可上传多张图片）
+
+    声明了 Content-Length 的请求超限直接返回 413，不读取请求体；分块传输的请求
+    边接收边累计，超限时抛出 HTTPException(413)，由路由的异常处理返回。
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = int(max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        from starlette.exceptions import HTTPException
+        from starlette.responses import PlainTextResponse
+
+        message = f"请求体过大，上限 {self.max_bytes} 字节"
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_large = int(value) > self.max_bytes
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    await PlainTextResponse(message, status_code=413)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            event = await receive()
+            if event["type"] == "http.request":
+                received += len(event.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(413, message)
+            return event
+
+        await self.app(scope, limited_receive, send)
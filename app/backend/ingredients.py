@@ -0,0 +1,605 @@
+# app/backend/ingredients.py
+"""
+配料表分析：把 OCR 文本切成配料项，并用 Aho-Corasick 自动机匹配添加剂 / 过敏原词典
+
+词典（TSV，见 app/data/ingredient_dictionary.tsv）离线编译成一个二进制文件：
+状态的出边（按字符排序）、失败指针、输出链全部是定长 uint32 数组，运行时 mmap 映射、
+按需分页，多个进程共享同一份物理内存。匹配只扫一遍文本，耗时与文本长度成正比，
+与词典条目数无关。
+
+用法：
+    python -m app.backend.ingredients build                       # 按 service_config.yaml 编译
+    python -m app.backend.ingredients build --source extra.tsv --output data/ingredients.acm
+    python -m app.backend.ingredients match "配料：水、白砂糖、苯甲酸钠"
+"""
+import argparse
+import bisect
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 随代码分发的种子词典；更大的词典在 service_config.yaml 的 ingredients.dictionaries 里追加
+DEFAULT_DICTIONARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "data", "ingredient_dictionary.tsv")
+DEFAULT_AUTOMATON = "./data/ingredients.acm"
+
+CATEGORIES = ("additive", "allergen", "concern")
+
+# 文件头：魔数、词典指纹、状态数、边数、输出数、模式数、条目数、元数据字节数
+_MAGIC = b"SFMAC\x00\x01\x00"
+_HEADER = struct.Struct("<8s16s6I")
+
+
+# ---------------- 文本规范化 ----------------
+
+@lru_cache(maxsize=65536)
+def _normalize_char(ch: str) -> str:
+    """单个字符的规范形式：NFKC（全角转半角等）+ 小写；空白返回空串（OCR 常在词中间断行、插空格）"""
+    if ch.isspace():
+        return ""
+    return unicodedata.normalize("NFKC", ch).lower().replace(" ", "")
+
+
+def normalize(text: str) -> Tuple[List[int], List[int]]:
+    """
+    规范化文本，返回 (码点序列, 每个码点对应的原文下标)
+
+    词典编译和匹配走同一套规则，匹配结果可以按下标映射回原文。
+    """
+    codes: List[int] = []
+    index: List[int] = []
+    for i, ch in enumerate(text):
+        for c in _normalize_char(ch):
+            codes.append(ord(c))
+            index.append(i)
+    return codes, index
+
+
+def _is_word_char(ch: str) -> bool:
+    norm = _normalize_char(ch)
+    return bool(norm) and norm[-1].isascii() and norm[-1].isalnum()
+
+
+# ---------------- 词典 ----------------
+
+def load_dictionary(paths: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    读取 TSV 词典（可多个，后面的文件可补充前面的条目）
+
+    列：name, category, e_number, function, risk, synonyms（| 分隔）, note；# 开头为注释。
+    同一 (name, category) 的条目合并同义词。
+    """
+    entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = csv.DictReader((line for line in f if line.strip() and not line.startswith("#")),
+                                  delimiter="\t", quoting=csv.QUOTE_NONE)
+            for row in rows:
+                name = (row.get("name") or "").strip()
+                category = (row.get("category") or "").strip()
+                if not name or category not in CATEGORIES:
+                    logger.warning(f"跳过无效词典行 {path}: {row}")
+                    continue
+                entry = entries.setdefault((name, category), {
+                    "name": name,
+                    "category": category,
+                    "e_number": None,
+                    "function": None,
+                    "risk": None,
+                    "note": None,
+                    "synonyms": [],
+                })
+                for field in ("e_number", "function", "risk", "note"):
+                    value = (row.get(field) or "").strip()
+                    if value:
+                        entry[field] = value
+                for synonym in (row.get("synonyms") or "").split("|"):
+                    synonym = synonym.strip()
+                    if synonym and synonym not in entry["synonyms"]:
+                        entry["synonyms"].append(synonym)
+    return list(entries.values())
+
+
+def _patterns(entry: Dict[str, Any]) -> List[str]:
+    """条目的全部匹配词：名称、同义词、E 编号（E211 / E-211）"""
+    terms = [entry["name"], *entry["synonyms"]]
+    e_number = entry.get("e_number")
+    if e_number:
+        terms += [e_number, e_number[:1] + "-" + e_number[1:]]
+    return terms
+
+
+def _fingerprint(paths: Sequence[str]) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\x00")
+    return digest.digest()
+
+
+# ---------------- 编译 ----------------
+
+def compile_automaton(entries: List[Dict[str, Any]], output_path: str, fingerprint: bytes = b"") -> Dict[str, int]:
+    """
+    把词典编译为 Aho-Corasick 自动机文件
+
+    文件布局（均为小端 uint32）：
+        edge_start[S+1]  edge_char[E]  edge_target[E]   每个状态的出边，按字符升序
+        fail[S]  dict_link[S]                            失败指针；沿失败链最近的有输出的状态（0 表示没有）
+        out_start[S+1]  out_pattern[O]                   每个状态自身的输出模式
+        pattern_entry[P]  pattern_len[P]                 模式 → 条目、规范化后长度
+        entry_offset[N+1]  + UTF-8 JSON                  条目元数据，匹配到时才解析
+    """
+    children: List[Dict[int, int]] = [{}]
+    outputs: List[List[int]] = [[]]
+    pattern_entry: List[int] = []
+    pattern_len: List[int] = []
+    seen = set()
+    for entry_id, entry in enumerate(entries):
+        for term in _patterns(entry):
+            codes, _ = normalize(term)
+            if not codes or (tuple(codes), entry_id) in seen:
+                continue
+            seen.add((tuple(codes), entry_id))
+            state = 0
+            for c in codes:
+                nxt = children[state].get(c)
+                if nxt is None:
+                    nxt = len(children)
+                    children[state][c] = nxt
+                    children.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(len(pattern_entry))
+            pattern_entry.append(entry_id)
+            pattern_len.append(len(codes))
+
+    n_states = len(children)
+    fail = [0] * n_states
+    dict_link = [0] * n_states
+    queue = deque(children[0].values())
+    while queue:
+        state = queue.popleft()
+        for c, child in children[state].items():
+            f = fail[state]
+            while f and c not in children[f]:
+                f = fail[f]
+            target = children[f].get(c, 0)
+            fail[child] = target if target != child else 0
+            dict_link[child] = fail[child] if outputs[fail[child]] else dict_link[fail[child]]
+            queue.append(child)
+
+    edge_start = np.zeros(n_states + 1, dtype="<u4")
+    edge_char, edge_target = [], []
+    out_start = np.zeros(n_states + 1, dtype="<u4")
+    out_pattern: List[int] = []
+    for state in range(n_states):
+        for c in sorted(children[state]):
+            edge_char.append(c)
+            edge_target.append(children[state][c])
+        edge_start[state + 1] = len(edge_char)
+        out_pattern.extend(outputs[state])
+        out_start[state + 1] = len(out_pattern)
+
+    blobs = [json.dumps({k: v for k, v in entry.items() if k != "synonyms"}, ensure_ascii=False).encode("utf-8")
+             for entry in entries]
+    entry_offset = np.zeros(len(entries) + 1, dtype="<u4")
+    entry_offset[1:] = np.cumsum([len(b) for b in blobs]) if blobs else []
+    blob = b"".join(blobs)
+
+    arrays = [edge_start, edge_char, edge_target, fail, dict_link, out_start, out_pattern,
+              pattern_entry, pattern_len, entry_offset]
+    header = _HEADER.pack(_MAGIC, fingerprint.ljust(16, b"\x00")[:16], n_states, len(edge_char),
+                          len(out_pattern), len(pattern_entry), len(entries), len(blob))
+
+    # 先写临时文件再替换，正在映射旧文件的进程不受影响
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for array in arrays:
+            f.write(np.asarray(array, dtype="<u4").tobytes())
+        f.write(blob)
+    os.replace(tmp_path, output_path)
+
+    stats = {"entries": len(entries), "patterns": len(pattern_entry), "states": n_states,
+             "edges": len(edge_char), "bytes": os.path.getsize(output_path)}
+    logger.info(f"配料词典自动机已编译: {output_path} {stats}")
+    return stats
+
+
+def read_fingerprint(path: str) -> Optional[bytes]:
+    """读取已编译文件的词典指纹；文件不存在或格式不符时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(head) < _HEADER.size or head[:8] != _MAGIC:
+        return None
+    return _HEADER.unpack(head)[1]
+
+
+# ---------------- 匹配 ----------------
+
+class IngredientMatcher:
+    """
+    内存映射的 Aho-Corasick 自动机
+
+    数组通过 memoryview 直接读 mmap，不复制进 Python 对象；只有根状态的出边
+    （分支最多、每个字符都要查）在加载时展开成 dict。线程安全（只读）。
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("配料词典自动机文件为小端格式，当前平台不支持")
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fingerprint, n_states, n_edges, n_out, n_patterns, n_entries, blob_len = \
+            _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"不是配料词典自动机文件: {path}")
+        self.fingerprint = fingerprint
+        self.num_states = n_states
+        self.num_patterns = n_patterns
+        self.num_entries = n_entries
+
+        self._views: List[memoryview] = []
+        offset = _HEADER.size
+
+        def take(count: int) -> memoryview:
+            nonlocal offset
+            view = memoryview(self._mm)[offset:offset + 4 * count].cast("I")
+            self._views.append(view)
+            offset += 4 * count
+            return view
+
+        self._edge_start = take(n_states + 1)
+        self._edge_char = take(n_edges)
+        self._edge_target = take(n_edges)
+        self._fail = take(n_states)
+        self._dict_link = take(n_states)
+        self._out_start = take(n_states + 1)
+        self._out_pattern = take(n_out)
+        self._pattern_entry = take(n_patterns)
+        self._pattern_len = take(n_patterns)
+        self._entry_offset = take(n_entries + 1)
+        self._blob_offset = offset
+
+        lo, hi = self._edge_start[0], self._edge_start[1]
+        self._root = dict(zip(self._edge_char[lo:hi].tolist(), self._edge_target[lo:hi].tolist()))
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._entries_lock = threading.Lock()
+
+    def close(self) -> None:
+        for view in getattr(self, "_views", []):
+            view.release()
+        self._views = []
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    def entry(self, entry_id: int) -> Dict[str, Any]:
+        """条目元数据（首次访问时从映射区解析）"""
+        cached = self._entries.get(entry_id)
+        if cached is None:
+            start = self._blob_offset + self._entry_offset[entry_id]
+            end = self._blob_offset + self._entry_offset[entry_id + 1]
+            cached = json.loads(self._mm[start:end].decode("utf-8"))
+            with self._entries_lock:
+                self._entries.setdefault(entry_id, cached)
+        return cached
+
+    def _goto(self, state: int, c: int) -> int:
+        if state == 0:
+            return self._root.get(c, -1)
+        lo, hi = self._edge_start[state], self._edge_start[state + 1]
+        chars = self._edge_char
+        # 非根状态的出边通常只有一两条，线性扫描比二分更快
+        if hi - lo <= 8:
+            for j in range(lo, hi):
+                if chars[j] == c:
+                    return self._edge_target[j]
+            return -1
+        j = bisect.bisect_left(chars, c, lo, hi)
+        return self._edge_target[j] if j < hi and chars[j] == c else -1
+
+    def scan(self, codes: Sequence[int]) -> List[Tuple[int, int, int]]:
+        """在规范化码点序列上匹配，返回 [(起点, 终点(不含), 模式号)]，均为码点下标"""
+        fail, dict_link = self._fail, self._dict_link
+        out_start, out_pattern, pattern_len = self._out_start, self._out_pattern, self._pattern_len
+        hits = []
+        state = 0
+        for i, c in enumerate(codes):
+            while True:
+                nxt = self._goto(state, c)
+                if nxt >= 0:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            s = state if out_start[state] != out_start[state + 1] else dict_link[state]
+            while s:
+                for k in range(out_start[s], out_start[s + 1]):
+                    pattern = out_pattern[k]
+                    hits.append((i + 1 - pattern_len[pattern], i + 1, pattern))
+                s = dict_link[s]
+        return hits
+
+    def match(self, text: str) -> List[Dict[str, Any]]:
+        """
+        在原文中匹配词典条目
+
+        被同一位置更长匹配完全覆盖的短匹配会去掉（如"人造奶油"里的"奶油"）；英文/数字词要求
+        两侧不是字母数字（"E211" 不会命中 "E2110"）。
+
+        Returns:
+            [{"term": 原文片段, "start": 原文起点, "end": 原文终点, "entry_id": 条目号}]，按起点排序
+        """
+        codes, index = normalize(text)
+        spans = {}
+        for start, end, pattern in self.scan(codes):
+            o_start, o_end = index[start], index[end - 1] + 1
+            if o_start > 0 and _is_word_char(text[o_start]) and _is_word_char(text[o_start - 1]):
+                continue
+            if o_end < len(text) and _is_word_char(text[o_end - 1]) and _is_word_char(text[o_end]):
+                continue
+            spans.setdefault((o_start, o_end), set()).add(self._pattern_entry[pattern])
+
+        # 被更长匹配完全覆盖的去掉；同一片段命中多个条目（如"酱油"同属大豆和麸质）时都保留
+        # 按起点升序、长度降序遍历：已保留片段的起点都不晚于当前片段，终点覆盖即被包含
+        kept: List[Tuple[int, int]] = []
+        max_end = -1
+        for span in sorted(spans, key=lambda s: (s[0], -s[1])):
+            if span[1] > max_end:
+                kept.append(span)
+                max_end = span[1]
+
+        results = []
+        for o_start, o_end in kept:
+            for entry_id in sorted(spans[(o_start, o_end)]):
+                results.append({"term": text[o_start:o_end], "start": o_start, "end": o_end, "entry_id": entry_id})
+        return results
+
+
+# ---------------- 配料切分 ----------------
+
+# 配料表起始标记与其后的其它栏目（遇到即结束）
+_INGREDIENTS_START = re.compile(r"(配料表|配料|原辅料|原料与辅料|原料|ingredients?)\s*[:：]", re.IGNORECASE)
+_SECTION_END = re.compile(r"(产品标准代?号|食品生产许可证|生产许可证|生产日期|保质期|贮存条件|储存条件|储存方法|净含量|规格|"
+                          r"营养成分表|致敏物质提示|过敏原信息|制造商|生产商|委托方|地址|电话|产地|食用方法)\s*[:：]?")
+_DELIMITERS = set("，,、;；。")
+_OPEN, _CLOSE = set("(（[【"), set(")）]】")
+_PERCENT = re.compile(r"^[\d.≥≤<>＞＜%％]+$")
+
+
+def _compact(text: str) -> str:
+    """去掉配料项里的换行和多余空格（英文单词之间保留一个空格）"""
+    text = re.sub(r"(?<=[A-Za-z0-9])\s+(?=[A-Za-z0-9])", " ", text.strip())
+    return re.sub(r"(?<![A-Za-z0-9])\s+|\s+(?![A-Za-z0-9])", "", text)
+
+
+def split_ingredients(text: str) -> List[Dict[str, Any]]:
+    """
+    把配料表文本切成配料项
+
+    只取"配料："之后、下一个栏目（生产日期、贮存条件等）之前的部分，没有标记时取全文。
+    括号里的子配料单独成项，parent 指向括号前的配料项；"（≥10%）"之类的含量记在父项的 percent 上。
+
+    Returns:
+        [{"text": "食品添加剂", "start": 12, "end": 17, "parent": None}, ...]，start/end 为原文下标
+    """
+    begin = 0
+    start_match = _INGREDIENTS_START.search(text)
+    if start_match:
+        begin = start_match.end()
+    end_match = _SECTION_END.search(text, begin)
+    end = end_match.start() if end_match else len(text)
+
+    tokens: List[Dict[str, Any]] = []
+    stack: List[Optional[int]] = []
+    token_start = begin
+
+    def flush(stop: int) -> None:
+        raw = text[token_start:stop]
+        item = _compact(raw)
+        if not item:
+            return
+        parent = stack[-1] if stack else None
+        if _PERCENT.match(item) and parent is not None:
+            tokens[parent]["percent"] = item
+            return
+        offset = token_start + (len(raw) - len(raw.lstrip()))
+        tokens.append({"text": item, "start": offset, "end": offset + len(raw.strip()), "parent": parent})
+
+    for i in range(begin, end):
+        ch = text[i]
+        if ch in _DELIMITERS or ch in _OPEN or ch in _CLOSE:
+            flush(i)
+            token_start = i + 1
+            if ch in _OPEN:
+                stack.append(len(tokens) - 1 if tokens else None)
+            elif ch in _CLOSE and stack:
+                stack.pop()
+    flush(end)
+    return tokens
+
+
+# ---------------- 分析 ----------------
+
+def _innermost_token(tokens: List[Dict[str, Any]], start: int, end: int) -> Optional[int]:
+    best = None
+    for i, token in enumerate(tokens):
+        if token["start"] <= start and end <= token["end"]:
+            if best is None or token["end"] - token["start"] <= tokens[best]["end"] - tokens[best]["start"]:
+                best = i
+    return best
+
+
+def analyze_text(text: str,
+                 matcher: Optional["IngredientMatcher"] = None,
+                 lines: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    分析配料表文本
+
+    Args:
+        text: 配料表文本（OCR 多行以换行拼接）
+        matcher: 不传时使用全局词典（get_matcher）
+        lines: OCR 文本行 [{"text", "score", "box"}]，与 text 的各行一一对应；给出时每个匹配附带
+            所在行号、文本框和最低置信度
+
+    Returns:
+        {"ingredients": [...], "matches": [...], "additives": [...], "allergens": [...],
+         "concerns": [...], "warnings": [...]}
+    """
+    matcher = matcher or get_matcher()
+    tokens = split_ingredients(text)
+
+    line_starts: List[int] = []
+    if lines is not None:
+        pos = 0
+        for line in lines:
+            line_starts.append(pos)
+            pos += len(line["text"]) + 1
+
+    matches = []
+    for hit in matcher.match(text):
+        entry = matcher.entry(hit["entry_id"])
+        item = {"term": hit["term"], "start": hit["start"], "end": hit["end"],
+                "ingredient": _innermost_token(tokens, hit["start"], hit["end"]), **entry}
+        if lines is not None:
+            first = bisect.bisect_right(line_starts, hit["start"]) - 1
+            last = bisect.bisect_right(line_starts, hit["end"] - 1) - 1
+            covered = lines[first:last + 1]
+            item["lines"] = list(range(first, last + 1))
+            item["boxes"] = [line.get("box") for line in covered]
+            scores = [line["score"] for line in covered if line.get("score") is not None]
+            item["score"] = min(scores) if scores else None
+        matches.append(item)
+
+    return {"ingredients": tokens, "matches": matches, **summarize(matches)}
+
+
+def analyze_items(items: List[Dict[str, Any]], matcher: Optional["IngredientMatcher"] = None) -> Dict[str, Any]:
+    """分析 OCR 结构化结果（ocr.ocr_items 的返回值），保留每行的文本框和置信度"""
+    text = "\n".join(item["text"] for item in items)
+    result = analyze_text(text, matcher, lines=items)
+    return {"text": text, "lines": items, **result}
+
+
+def summarize(matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按条目汇总匹配结果，并生成风险提示"""
+    additives: Dict[str, Dict[str, Any]] = {}
+    concerns: Dict[str, Dict[str, Any]] = {}
+    allergens: Dict[str, Dict[str, Any]] = {}
+    for m in matches:
+        if m["category"] == "allergen":
+            group = allergens.setdefault(m["function"] or m["name"], {"group": m["function"] or m["name"], "terms": []})
+            if m["term"] not in group["terms"]:
+                group["terms"].append(m["term"])
+            continue
+        target = additives if m["category"] == "additive" else concerns
+        summary = target.setdefault(m["name"], {key: m[key] for key in ("name", "e_number", "function", "risk", "note")})
+        summary["count"] = summary.get("count", 0) + 1
+
+    warnings = []
+    by_function: Dict[str, List[str]] = {}
+    for a in additives.values():
+        if a["risk"] in ("medium", "high"):
+            by_function.setdefault(a["function"] or "添加剂", []).append(a["name"])
+    for function, names in by_function.items():
+        warnings.append(f"含有{function}：{'、'.join(names)}")
+    for a in additives.values():
+        if a["risk"] == "high" and a["note"]:
+            warnings.append(f"{a['name']}：{a['note']}")
+    for c in concerns.values():
+        warnings.append(f"含有{c['name']}：{c['note'] or c['function']}")
+    if allergens:
+        warnings.append("含有过敏原：" + "；".join(f"{g['group']}（{'、'.join(g['terms'])}）" for g in allergens.values()))
+    return {
+        "additives": list(additives.values()),
+        "allergens": list(allergens.values()),
+        "concerns": list(concerns.values()),
+        "warnings": warnings,
+    }
+
+
+# ---------------- 全局词典 ----------------
+
+_matcher: Optional[IngredientMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    from app.backend.config import get_section
+    return get_section("service_config", "ingredients")
+
+
+def ensure_compiled(sources: Sequence[str], output_path: str) -> str:
+    """已编译文件不存在或与词典内容不一致时重新编译，返回自动机文件路径"""
+    fingerprint = _fingerprint(sources)
+    if read_fingerprint(output_path) != fingerprint:
+        logger.info(f"编译配料词典: {list(sources)} → {output_path}")
+        compile_automaton(load_dictionary(sources), output_path, fingerprint)
+    return output_path
+
+
+def get_matcher() -> IngredientMatcher:
+    """全局配料词典（首次调用时按需编译并映射，进程内只加载一次）"""
+    global _matcher
+    if _matcher is not None:
+        return _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            cfg = _config()
+            sources = cfg.get("dictionaries") or [DEFAULT_DICTIONARY]
+            path = ensure_compiled(sources, cfg.get("automaton_path") or DEFAULT_AUTOMATON)
+            _matcher = IngredientMatcher(path)
+            logger.info(f"配料词典已加载: {path}（{_matcher.num_entries} 个条目，{_matcher.num_patterns} 个匹配词）")
+    return _matcher
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="配料词典编译与匹配")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="把 TSV 词典编译为自动机文件")
+    build.add_argument("--source", action="append", default=None,
+                       help="TSV 词典，可重复；默认取 service_config.yaml 的 ingredients.dictionaries")
+    build.add_argument("--output", default=None, help="输出路径，默认 ingredients.automaton_path")
+    match = sub.add_parser("match", help="分析一段配料表文本")
+    match.add_argument("text")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    cfg = _config()
+    if args.command == "build":
+        sources = args.source or cfg.get("dictionaries") or [DEFAULT_DICTIONARY]
+        output = args.output or cfg.get("automaton_path") or DEFAULT_AUTOMATON
+        stats = compile_automaton(load_dictionary(sources), output, _fingerprint(sources))
+        print(json.dumps(stats, ensure_ascii=False))
+    else:
+        print(json.dumps(analyze_text(args.text), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# app/backend/inventory.py
+"""
+食品库存：按到期日排序的清单、"N 天内到期"查询、批量录入（SQLite，WAL 模式）
+
+- 索引 (user_id, expiry_date, id)，只覆盖 status='active' 的行：按用户按到期日的范围查询和排序都走索引，
+  已吃完/丢弃的历史记录不占索引
+- 分页用键集（expiry_date, id）游标而不是 OFFSET，翻到第几页都只读一页的行，百万级数据下仍是毫秒级
+- 连接池：每个连接固定在池自己的线程里使用，async 接口通过 await store.run(...) 在池线程中执行，
+  不阻塞事件循环；WAL 下读写互不阻塞，写事务用 BEGIN IMMEDIATE 排队
+"""
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.backend.config import get_section
+from app.backend.date_extractor import extract_dates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "./data/inventory.sqlite3"
+STATUSES = ("active", "consumed", "discarded")
+
+# AUTOINCREMENT：删掉的 id（哪怕是最大的那个）不会再分配给新条目，客户端缓存的 id、
+# 到期提醒的去重键 (item_id, lead_days, expiry_date) 都不会指到另一条食品上
+_ITEMS_TABLE = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT,
+    quantity REAL NOT NULL DEFAULT 1,
+    unit TEXT,
+    production_date TEXT,
+    expiry_date TEXT,
+    status TEXT NOT NULL DEFAULT 'active',
+    freshness_label TEXT,
+    freshness_score REAL,
+    source TEXT,
+    note TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)"""
+
+_SCHEMA = _ITEMS_TABLE + """;
+CREATE INDEX IF NOT EXISTS idx_items_user_expiry ON items (user_id, expiry_date, id) WHERE status = 'active';
+-- 跨用户按到期日的范围查询（到期提醒，见 reminders.py）
+CREATE INDEX IF NOT EXISTS idx_items_expiry ON items (expiry_date) WHERE status = 'active';
+"""
+
+# 可由调用方写入 / 修改的列
+_FIELDS = ("name", "category", "quantity", "unit", "production_date", "expiry_date", "status",
+           "freshness_label", "freshness_score", "source", "note")
+_COLUMNS = ("id", "user_id") + _FIELDS + ("created_at", "updated_at")
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM items"
+
+
+class ConnectionPool:
+    """
+    固定大小的 SQLite 连接池
+
+    连接在创建时设好 WAL / synchronous=NORMAL / busy_timeout 等参数；取不到空闲连接时最多等待 timeout 秒。
+    run() 在池自带的线程里执行，线程数等于连接数，因此 async 调用方永远不会在池线程里等连接。
+    """
+
+    def __init__(self, path: str, size: int = 4, timeout: float = 5.0, busy_timeout_ms: int = 5000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all: List[sqlite3.Connection] = []
+        for _ in range(self.size):
+            conn = self._connect(busy_timeout_ms)
+            self._all.append(conn)
+            self._idle.put(conn)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="inventory-db")
+
+    def _connect(self, busy_timeout_ms: int) -> sqlite3.Connection:
+        # isolation_level=None：自动提交，事务由 transaction() 显式开启
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")   # 每个连接约 16MB 页缓存
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接，用完归还"""
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"数据库连接池已满（{self.size} 个连接）") from None
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务：BEGIN IMMEDIATE 先拿写锁，避免读事务升级为写时死锁"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在池线程中执行阻塞的数据库操作并异步等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for conn in self._all:
+            conn.close()
+
+
+def encode_cursor(expiry_date: Optional[str], item_id: int) -> str:
+    """键集分页游标："2024-05-01:123"；到期日未知的条目排在最后，游标为 ":123" """
+    return f"{expiry_date or ''}:{item_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    expiry, sep, item_id = cursor.rpartition(":")
+    if not sep or not item_id.isdigit():
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return expiry or None, int(item_id)
+
+
+def _iso_date(value: Any, field: str) -> Optional[str]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f"{field} 不是有效日期（YYYY-MM-DD）: {value}") from None
+
+
+def normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    校验并整理一条待录入的食品
+
+    除 _FIELDS 外还接受：
+        ocr_text: 包装上识别出的文字；没有给出日期时从中提取生产日期 / 到期日
+        freshness: 新鲜度检测结果 {"label", "score"}
+    """
+    name = (item.get("name") or "").strip()
+    if not name:
+        raise ValueError("食品名称不能为空")
+    row = {field: item.get(field) for field in _FIELDS}
+    row["name"] = name
+    row["status"] = row["status"] or "active"
+    if row["status"] not in STATUSES:
+        raise ValueError(f"status 只能是 {STATUSES}: {row['status']}")
+    row["quantity"] = float(1 if row["quantity"] is None else row["quantity"])
+    if item.get("ocr_text") and not (row["expiry_date"] and row["production_date"]):
+        dates = extract_dates(item["ocr_text"])
+        row["production_date"] = row["production_date"] or dates["production_date"]
+        row["expiry_date"] = row["expiry_date"] or dates["expiry_date"]
+        row["source"] = row["source"] or "ocr"
+    freshness = item.get("freshness") or {}
+    if freshness.get("label") and not row["freshness_label"]:
+        row["freshness_label"], row["freshness_score"] = freshness["label"], freshness.get("score")
+    row["production_date"] = _iso_date(row["production_date"], "production_date")
+    row["expiry_date"] = _iso_date(row["expiry_date"], "expiry_date")
+    return row
+
+
+def _row_dict(row: sqlite3.Row, today: Optional[date] = None) -> Dict[str, Any]:
+    item = dict(row)
+    if today is not None:
+        item["days_left"] = (date.fromisoformat(item["expiry_date"]) - today).days if item["expiry_date"] else None
+    return item
+
+
+class InventoryStore:
+    """按用户隔离的食品库存"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, pool_size: int = 4, busy_timeout_ms: int = 5000,
+                 max_bulk_items: int = 1000, max_page_size: int = 500):
+        self.pool = ConnectionPool(path, size=pool_size, busy_timeout_ms=busy_timeout_ms)
+        self.max_bulk_items = int(max_bulk_items)
+        self.max_page_size = int(max_page_size)
+        self._migrate()
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+        logger.info(f"食品库存数据库已打开: {path}（连接池 {self.pool.size}）")
+
+    def _migrate(self) -> None:
+        """旧库的 items 表没有 AUTOINCREMENT（删掉最大 id 后会被复用）：重建表，数据和 id 不变"""
+        with self.pool.transaction() as conn:
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'items'").fetchone()
+            if row is None or "AUTOINCREMENT" in row[0].upper():
+                return
+            columns = ", ".join(_COLUMNS)
+            conn.execute(_ITEMS_TABLE.replace("IF NOT EXISTS items", "items_autoincrement"))
+            # 显式写入 id，sqlite_sequence 随之记下当前最大 id
+            conn.execute(f"INSERT INTO items_autoincrement ({columns}) SELECT {columns} FROM items")
+            # 旧表上的索引和触发器（analytics.py）随表删除，之后由各自的建表语句重建
+            conn.execute("DROP TABLE items")
+            conn.execute("ALTER TABLE items_autoincrement RENAME TO items")
+        logger.info("食品库存 items 表已迁移为 AUTOINCREMENT")
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "InventoryStore":
+        """按配置节（db_path / pool_size / busy_timeout_ms / max_bulk_items / max_page_size）创建"""
+        return cls(cfg.get("db_path") or DEFAULT_DB_PATH,
+                   pool_size=cfg.get("pool_size", 4),
+                   busy_timeout_ms=cfg.get("busy_timeout_ms", 5000),
+                   max_bulk_items=cfg.get("max_bulk_items", 1000),
+                   max_page_size=cfg.get("max_page_size", 500))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在连接池线程中执行 store 的方法（供 async 接口使用）"""
+        return await self.pool.run(fn, *args, **kwargs)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    # ---------------- 写入 ----------------
+
+    def add_items(self, user_id: str, items: Iterable[Dict[str, Any]]) -> List[int]:
+        """批量录入（一个事务、一次 executemany），返回新条目的 id（与输入顺序一致）"""
+        items = list(items)
+        if len(items) > self.max_bulk_items:
+            raise ValueError(f"单次最多录入 {self.max_bulk_items} 条")
+        rows = [normalize_item(item) for item in items]
+        if not rows:
+            return []
+        now = time.time()
+        params = [(user_id, *(row[f] for f in _FIELDS), now, now) for row in rows]
+        placeholders = ", ".join("?" * (len(_FIELDS) + 3))
+        with self.pool.transaction() as conn:
+            # 从 sqlite_sequence（分配过的最大 id，删除不会让它变小）之后显式分配连续 id：
+            # executemany 不返回每行的 rowid，写锁保证区间不被并发写入占用；写入后 sqlite_sequence 随之更新
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'items'").fetchone()
+            first = (row[0] if row else 0) + 1
+            conn.executemany(
+                f"INSERT INTO items (id, user_id, {', '.join(_FIELDS)}, created_at, updated_at) "
+                f"VALUES (?, {placeholders})",
+                [(first + i, *p) for i, p in enumerate(params)],
+            )
+        return list(range(first, first + len(rows)))
+
+    def update_item(self, user_id: str, item_id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """修改一条食品（只改给出的字段）；不存在返回 None"""
+        unknown = set(changes) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"不能修改的字段: {sorted(unknown)}")
+        with self.pool.transaction() as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ? AND user_id = ?", (item_id, user_id)).fetchone()
+            if row is None:
+                return None
+            merged = normalize_item({**dict(row), **changes})
+            sets = ", ".join(f"{f} = ?" for f in _FIELDS)
+            conn.execute(f"UPDATE items SET {sets}, updated_at = ? WHERE id = ?",
+                         (*(merged[f] for f in _FIELDS), time.time(), item_id))
+            return _row_dict(conn.execute(f"{_SELECT} WHERE id = ?", (item_id,)).fetchone())
+
+    def delete_item(self, user_id: str, item_id: int) -> bool:
+        with self.pool.transaction() as conn:
+            return conn.execute("DELETE FROM items WHERE id = ? AND user_id = ?", (item_id, user_id)).rowcount > 0
+
+    # ---------------- 查询 ----------------
+
+    def get_item(self, user_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ? AND user_id = ?", (item_id, user_id)).fetchone()
+        return _row_dict(row) if row is not None else None
+
+    def _page(self, conn: sqlite3.Connection, where: str, params: Tuple, cursor: Optional[str],
+              limit: int, include_unknown: bool) -> List[sqlite3.Row]:
+        """
+        按 (expiry_date, id) 取下一页；include_unknown 时到期日未知的条目接在有日期的条目之后，按 id 排
+
+        where 必须带 status = 'active' 字面量，查询才能用上部分索引。
+        """
+        after_expiry, after_id = decode_cursor(cursor) if cursor else ("", 0)
+        rows: List[sqlite3.Row] = []
+        if after_expiry is not None:
+            # 行值比较：NULL 到期日不满足 > 条件，自然排除
+            rows = conn.execute(
+                f"{_SELECT} WHERE {where} AND (expiry_date, id) > (?, ?) ORDER BY expiry_date, id LIMIT ?",
+                (*params, after_expiry, after_id, limit)).fetchall()
+            after_id = 0
+        if len(rows) < limit and include_unknown:
+            rows += conn.execute(
+                f"{_SELECT} WHERE {where} AND expiry_date IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (*params, after_id, limit - len(rows))).fetchall()
+        return rows
+
+    def _page_result(self, rows: List[sqlite3.Row], limit: int, today: date) -> Dict[str, Any]:
+        items = [_row_dict(row, today) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["expiry_date"], last["id"])
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _limit(self, limit: int) -> int:
+        return max(1, min(int(limit), self.max_page_size))
+
+    def list_items(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                   today: Optional[date] = None) -> Dict[str, Any]:
+        """在库食品按到期日升序（未知到期日排最后），键集分页"""
+        limit = self._limit(limit)
+        with self.pool.connection() as conn:
+            # 多取一条判断是否还有下一页
+            rows = self._page(conn, "user_id = ? AND status = 'active'", (user_id,), cursor, limit + 1, True)
+        return self._page_result(rows, limit, today or date.today())
+
+    def expiring(self, user_id: str, days: int, limit: int = 50, cursor: Optional[str] = None,
+                 today: Optional[date] = None, include_expired: bool = False) -> Dict[str, Any]:
+        """
+        N 天内到期的在库食品（到期日 ≤ 今天 + N），按到期日升序，键集分页
+
+        include_expired 为 False 时不含已过期（到期日早于今天）的条目。
+        """
+        today = today or date.today()
+        limit = self._limit(limit)
+        until = (today + timedelta(days=int(days))).isoformat()
+        if cursor is None and not include_expired:
+            # 游标 (today, 0) 等价于 expiry_date >= today
+            cursor = encode_cursor(today.isoformat(), 0)
+        with self.pool.connection() as conn:
+            rows = self._page(conn, "user_id = ? AND status = 'active' AND expiry_date <= ?",
+                              (user_id, until), cursor, limit + 1, False)
+        return self._page_result(rows, limit, today)
+
+    def counts(self, user_id: str, today: Optional[date] = None, days: int = 3) -> Dict[str, int]:
+        """在库总数、已过期数、days 天内到期数（均走索引）"""
+        today = today or date.today()
+        until = (today + timedelta(days=int(days))).isoformat()
+        with self.pool.connection() as conn:
+            total, expired, expiring = conn.execute(
+                "SELECT COUNT(*), "
+                "COUNT(CASE WHEN expiry_date < ? THEN 1 END), "
+                "COUNT(CASE WHEN expiry_date >= ? AND expiry_date <= ? THEN 1 END) "
+                "FROM items WHERE user_id = ? AND status = 'active'",
+                (today.isoformat(), today.isoformat(), until, user_id)).fetchone()
+        return {"active": total, "expired": expired, f"expiring_{int(days)}d": expiring}
+
+
+_store: Optional[InventoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> InventoryStore:
+    """全局库存数据库（首次调用时按 service_config.yaml 的 inventory 节打开）"""
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            _store = InventoryStore.from_config(get_section("service_config", "inventory"))
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
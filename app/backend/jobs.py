@@ -0,0 +1,514 @@
+# app/backend/jobs.py
+"""
+异步任务：提交后立即返回任务 id，客户端轮询（或等 webhook 回调）取结果
+
+网络不稳的移动端上传大图做 OCR 时，一直挂着请求容易超时再重试，负载翻倍；改成任务后，
+请求耗时只有写一行数据库的时间，与推理耗时无关。
+
+- 队列持久化在 SQLite（WAL，复用库存模块的连接池），进程崩溃 / 重启不丢任务
+- 幂等键：同一用户同一 Idempotency-Key 重复提交返回同一个任务；换了图片再用同一个键返回 409
+- 按用户公平：每次领取一批时各用户轮流出队（ROW_NUMBER() OVER (PARTITION BY user_id)），
+  一个用户一次提交很多张不会饿死别人；每用户排队数有上限
+- 租约：领取时写入 lease_until，工作进程崩溃后租约过期的任务回到队列（超过 max_attempts 次则失败）
+- 保留期：完成的任务保留 retention_seconds 秒后删除，期间可重复查询；图片在任务结束时即清掉
+- webhook：回调地址按 WebhookPolicy 限制（只许公网地址或白名单主机），防止借回调访问内网
+配置见 service_config.yaml 的 jobs 节。
+"""
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.backend.config import get_section
+from app.backend.executor import ExecutorBusyError
+from app.backend.inventory import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "./data/jobs.sqlite3"
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    idempotency_key TEXT,
+    payload BLOB,
+    payload_hash TEXT NOT NULL,
+    webhook_url TEXT,
+    webhook_status TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs (user_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (user_id, seq) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (lease_until) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+"""
+
+_PUBLIC = ("id", "user_id", "kind", "status", "idempotency_key", "webhook_url", "webhook_status",
+           "result", "error", "attempts", "created_at", "started_at", "finished_at")
+
+# 各用户轮流出队：先按"这是该用户排队中的第几个"排序，再按提交顺序
+_CLAIM = """
+SELECT seq FROM (
+    SELECT seq, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY seq) AS turn
+    FROM jobs WHERE status = 'queued'
+) ORDER BY turn, seq LIMIT ?
+"""
+
+
+class JobQueueFullError(Exception):
+    """该用户排队中的任务已达上限（调用方应返回 429）"""
+
+
+class IdempotencyConflictError(Exception):
+    """幂等键已被内容不同的任务使用（调用方应返回 409）"""
+
+
+def payload_hash(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _job_dict(row) -> Dict[str, Any]:
+    job = {key: row[key] for key in _PUBLIC}
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class WebhookPolicy:
+    """
+    webhook 回调地址的限制：服务端会向客户端给的地址发 POST，不加限制就能借它访问内网（SSRF）
+
+    配置了 allowlist 时只允许列出的主机（"hooks.example.com" 或 "*.example.com"），可以是内网服务；
+    没配置时允许任意主机，但解析出的地址中有回环 / 私有 / 链路本地 / 保留 / 组播地址就拒绝。
+    提交时和发送前各检查一次（DNS 可能在两次之间改了指向），发送时不跟随重定向。
+    """
+
+    def __init__(self, allowlist: Optional[Sequence[str]] = None):
+        self.allowlist = [host.lower().rstrip(".") for host in allowlist or []]
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "WebhookPolicy":
+        """按 service_config.yaml 的 jobs 节（webhook_allowlist）创建"""
+        return cls(allowlist=cfg.get("webhook_allowlist"))
+
+    def _listed(self, host: str) -> bool:
+        return any(host == pattern or (pattern.startswith("*.") and host.endswith(pattern[1:]))
+                   for pattern in self.allowlist)
+
+    def check(self, url: str) -> None:
+        """
+        Raises:
+            ValueError: 不是 http(s) 地址、主机不在白名单中、无法解析或解析到非公网地址
+        """
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"webhook_url 必须是 http(s) 地址: {url}")
+        host = parts.hostname.rstrip(".")
+        if self.allowlist:
+            if not self._listed(host):
+                raise ValueError(f"webhook_url 的主机不在 jobs.webhook_allowlist 中: {host}")
+            return
+        try:
+            infos = socket.getaddrinfo(host, parts.port or 80, proto=socket.IPPROTO_TCP)
+        except (socket.gaierror, UnicodeError):
+            raise ValueError(f"webhook_url 的主机无法解析: {host}")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%")[0])
+            if address.version == 6 and address.ipv4_mapped is not None:
+                address = address.ipv4_mapped
+            if not address.is_global or address.is_multicast:
+                raise ValueError(f"webhook_url 不能指向内网或保留地址: {host} → {address}")
+
+
+class JobQueue:
+    """SQLite 持久化任务队列"""
+
+    def __init__(self,
+                 path: str = DEFAULT_DB_PATH,
+                 pool_size: int = 2,
+                 busy_timeout_ms: int = 5000,
+                 lease_seconds: float = 300,
+                 max_attempts: int = 3,
+                 retention_seconds: float = 86400,
+                 max_queued_per_user: int = 20,
+                 webhook_policy: Optional[WebhookPolicy] = None):
+        """
+        Args:
+            lease_seconds: 领取后多久没完成视为工作进程已崩溃，任务回到队列
+            max_attempts: 最多执行次数（含崩溃后的重试）
+            retention_seconds: 完成的任务保留多久
+            max_queued_per_user: 每用户排队 + 执行中的任务上限
+            webhook_policy: 回调地址限制，默认只允许公网地址
+        """
+        self.pool = ConnectionPool(path, size=pool_size, busy_timeout_ms=busy_timeout_ms)
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = int(max_attempts)
+        self.retention_seconds = float(retention_seconds)
+        self.max_queued_per_user = int(max_queued_per_user)
+        self.webhook_policy = webhook_policy or WebhookPolicy()
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "JobQueue":
+        """按 service_config.yaml 的 jobs 节创建"""
+        return cls(path=cfg.get("db_path", DEFAULT_DB_PATH),
+                   pool_size=cfg.get("pool_size", 2),
+                   busy_timeout_ms=cfg.get("busy_timeout_ms", 5000),
+                   lease_seconds=cfg.get("lease_seconds", 300),
+                   max_attempts=cfg.get("max_attempts", 3),
+                   retention_seconds=cfg.get("retention_seconds", 86400),
+                   max_queued_per_user=cfg.get("max_queued_per_user", 20),
+                   webhook_policy=WebhookPolicy.from_config(cfg))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.pool.run(fn, *args, **kwargs)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    # ---------------- 提交 / 查询 ----------------
+
+    def submit(self,
+               user_id: str,
+               kind: str,
+               payload: bytes,
+               idempotency_key: Optional[str] = None,
+               webhook_url: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Returns:
+            (任务, 是否新建)；幂等键命中时返回已有任务和 False
+
+        Raises:
+            ValueError: webhook_url 不是 http(s) 地址或不被 webhook_policy 允许
+            IdempotencyConflictError: 幂等键已用于内容不同的任务
+            JobQueueFullError: 该用户排队中的任务已达上限
+        """
+        if webhook_url:
+            self.webhook_policy.check(webhook_url)
+        digest = payload_hash(payload)
+        with self.pool.transaction() as conn:
+            if idempotency_key:
+                row = conn.execute("SELECT * FROM jobs WHERE user_id = ? AND idempotency_key = ?",
+                                   (user_id, idempotency_key)).fetchone()
+                if row is not None:
+                    if (row["payload_hash"], row["kind"]) != (digest, kind):
+                        raise IdempotencyConflictError(f"幂等键 {idempotency_key} 已用于另一个任务")
+                    return _job_dict(row), False
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                                   (user_id,)).fetchone()[0]
+            if pending >= self.max_queued_per_user:
+                raise JobQueueFullError(f"排队中的任务已达上限（{self.max_queued_per_user} 个），请等待完成后再提交")
+            job_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO jobs (id, user_id, kind, idempotency_key, payload, payload_hash, webhook_url, "
+                         "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (job_id, user_id, kind, idempotency_key, payload, digest, webhook_url, time.time()))
+            return _job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务状态与结果；不存在或已过保留期时返回 None"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["finished_at"] is not None
+                           and row["finished_at"] < time.time() - self.retention_seconds):
+            return None
+        job = _job_dict(row)
+        if job["status"] == "queued":
+            job["position"] = self._position(row)
+        return job
+
+    def _position(self, row) -> int:
+        """公平出队顺序下前面还有几个任务（近似值：只看排队中的任务）"""
+        with self.pool.connection() as conn:
+            turn = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND user_id = ? AND seq < ?",
+                                (row["user_id"], row["seq"])).fetchone()[0]
+            # 其它用户在第 turn 轮及之前能出队的任务数
+            others = conn.execute("SELECT COALESCE(SUM(MIN(n, ?)), 0) FROM (SELECT COUNT(*) AS n FROM jobs "
+                                  "WHERE status = 'queued' AND user_id != ? GROUP BY user_id)",
+                                  (turn + 1, row["user_id"])).fetchone()[0]
+        return turn + others
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中的任务（已开始执行的不能取消）"""
+        with self.pool.transaction() as conn:
+            cur = conn.execute("UPDATE jobs SET status = 'cancelled', payload = NULL, finished_at = ? "
+                               "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            return cur.rowcount == 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            users = conn.execute("SELECT COUNT(DISTINCT user_id) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {**{status: counts.get(status, 0) for status in STATUSES}, "queued_users": users}
+
+    # ---------------- 工作进程 ----------------
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """按用户轮流领取至多 limit 个任务（含图片），标记为 running 并写入租约"""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            seqs = [row[0] for row in conn.execute(_CLAIM, (int(limit),))]
+            if not seqs:
+                return []
+            marks = ",".join("?" * len(seqs))
+            rows = conn.execute(f"UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                                f"lease_until = ? WHERE seq IN ({marks}) RETURNING *",
+                                (now, now + self.lease_seconds, *seqs)).fetchall()
+        order = {seq: i for i, seq in enumerate(seqs)}
+        return [{**_job_dict(row), "payload": row["payload"]} for row in sorted(rows, key=lambda r: order[r["seq"]])]
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self.pool.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'succeeded', result = ?, payload = NULL, finished_at = ?, "
+                         "lease_until = NULL WHERE id = ? AND status = 'running'",
+                         (json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id: str, error: str, retry: bool = False) -> str:
+        """
+        记录失败；retry 为 True 且未超过 max_attempts 时回到队列
+
+        Returns:
+            任务的新状态 "queued" | "failed"
+        """
+        with self.pool.transaction() as conn:
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if retry and attempts < self.max_attempts:
+                conn.execute("UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL "
+                             "WHERE id = ? AND status = 'running'", (error, job_id))
+                return "queued"
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, payload = NULL, finished_at = ?, "
+                         "lease_until = NULL WHERE id = ? AND status = 'running'", (error, time.time(), job_id))
+            return "failed"
+
+    def release(self, job_id: str) -> None:
+        """推理队列满、这次没有执行：放回队列，不计执行次数"""
+        with self.pool.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', attempts = attempts - 1, lease_until = NULL "
+                         "WHERE id = ? AND status = 'running'", (job_id,))
+
+    def set_webhook_status(self, job_id: str, status: str) -> None:
+        with self.pool.transaction() as conn:
+            conn.execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id))
+
+    def recover(self, now: Optional[float] = None) -> int:
+        """租约已过期的 running 任务（工作进程崩溃）回到队列，执行次数用完的标记失败"""
+        now = time.time() if now is None else now
+        with self.pool.transaction() as conn:
+            failed = conn.execute("UPDATE jobs SET status = 'failed', error = '执行超时或工作进程退出', payload = NULL, "
+                                  "finished_at = ?, lease_until = NULL "
+                                  "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                                  (now, now, self.max_attempts)).rowcount
+            requeued = conn.execute("UPDATE jobs SET status = 'queued', lease_until = NULL "
+                                    "WHERE status = 'running' AND lease_until < ?", (now,)).rowcount
+        if failed or requeued:
+            logger.warning(f"恢复中断的任务：{requeued} 个重新排队，{failed} 个超过重试次数标记失败")
+        return requeued + failed
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """删除超过保留期的已完成任务"""
+        now = time.time() if now is None else now
+        with self.pool.transaction() as conn:
+            return conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.retention_seconds,)).rowcount
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """不跟随重定向：否则公网地址可以把回调 302 到内网"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_webhook_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def post_webhook(url: str, body: Dict[str, Any], timeout: float = 5.0, retries: int = 3,
+                 policy: Optional[WebhookPolicy] = None) -> bool:
+    """
+    POST JSON 到 url，失败按 1s、2s、4s… 退避重试；返回是否送达（2xx）
+
+    每次发送前按 policy 重新检查地址（默认只允许公网地址），不跟随重定向
+    """
+    policy = policy or WebhookPolicy()
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    for attempt in range(retries):
+        try:
+            policy.check(url)
+        except ValueError as e:
+            logger.warning(f"webhook 地址被拒绝，不再重试: {e}")
+            return False
+        try:
+            request = urllib.request.Request(url, data=data, method="POST",
+                                             headers={"Content-Type": "application/json"})
+            with _webhook_opener.open(request, timeout=timeout) as response:
+                if 200 <= response.status < 300:
+                    return True
+        except Exception as e:
+            logger.warning(f"webhook 回调失败（第 {attempt + 1} 次）{url}: {e}")
+        if attempt + 1 < retries:
+            time.sleep(2 ** attempt)
+    return False
+
+
+Handler = Callable[[bytes], Awaitable[Dict[str, Any]]]
+
+
+class JobWorker:
+    """
+    领取 → 执行 → 记录结果的循环
+
+    handlers 按任务类型给出异步处理函数（一般是 executor.run(推理函数, 图片)）。一批任务并发执行，
+    推理队列满（ExecutorBusyError）时任务放回队列、本轮提前结束并退避。
+    on_success(job, result) 在任务成功后同步调用（如按用户记扫描次数），不能阻塞。
+    """
+
+    def __init__(self,
+                 queue: JobQueue,
+                 handlers: Dict[str, Handler],
+                 batch_size: int = 8,
+                 poll_interval: float = 0.5,
+                 maintenance_interval: float = 60,
+                 webhook_timeout: float = 5.0,
+                 webhook_retries: int = 3,
+                 webhook_policy: Optional[WebhookPolicy] = None,
+                 on_success: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None):
+        self.queue = queue
+        self.handlers = handlers
+        self.on_success = on_success
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = float(poll_interval)
+        self.maintenance_interval = float(maintenance_interval)
+        self.webhook_timeout = float(webhook_timeout)
+        self.webhook_retries = int(webhook_retries)
+        self.webhook_policy = webhook_policy or queue.webhook_policy
+        self._webhooks: Set[asyncio.Task] = set()
+        self._busy_until = 0.0
+
+    @classmethod
+    def from_config(cls, queue: JobQueue, handlers: Dict[str, Handler], cfg: Dict[str, Any],
+                    on_success: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None) -> "JobWorker":
+        return cls(queue, handlers, on_success=on_success,
+                   batch_size=cfg.get("batch_size", 8),
+                   poll_interval=cfg.get("poll_interval", 0.5),
+                   maintenance_interval=cfg.get("maintenance_interval", 60),
+                   webhook_timeout=cfg.get("webhook_timeout", 5.0),
+                   webhook_retries=cfg.get("webhook_retries", 3))
+
+    async def run_once(self) -> int:
+        """领取并执行一批，返回领取的任务数"""
+        jobs = await self.queue.run(self.queue.claim, self.batch_size)
+        if jobs:
+            await asyncio.gather(*(self._execute(job) for job in jobs))
+        return len(jobs)
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self._finish(job, error=f"不支持的任务类型: {job['kind']}")
+            return
+        try:
+            result = await handler(job["payload"])
+        except ExecutorBusyError as e:
+            await self.queue.run(self.queue.release, job["id"])
+            self._busy_until = time.monotonic() + e.retry_after
+            return
+        except Exception as e:
+            logger.error(f"任务 {job['id']} 执行失败: {e}", exc_info=True)
+            await self._finish(job, error=str(e), retry=True)
+            return
+        if isinstance(result, dict) and result.get("status") == "error":
+            # 检测器返回的确定性错误（如图片无法解码），重试也没用
+            await self._finish(job, error=result.get("message", "处理失败"))
+        else:
+            await self._finish(job, result=result)
+
+    async def _finish(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                      error: Optional[str] = None, retry: bool = False) -> None:
+        if error is None:
+            await self.queue.run(self.queue.complete, job["id"], result)
+            status = "succeeded"
+            if self.on_success is not None:
+                try:
+                    self.on_success(job, result)
+                except Exception as e:
+                    logger.error(f"任务 {job['id']} 完成回调失败: {e}")
+        else:
+            status = await self.queue.run(self.queue.fail, job["id"], error, retry)
+            if status == "queued":
+                return
+        if job.get("webhook_url"):
+            body = {"id": job["id"], "kind": job["kind"], "status": status, "result": result, "error": error}
+            task = asyncio.create_task(self._notify(job["id"], job["webhook_url"], body))
+            self._webhooks.add(task)
+            task.add_done_callback(self._webhooks.discard)
+
+    async def _notify(self, job_id: str, url: str, body: Dict[str, Any]) -> None:
+        delivered = await asyncio.to_thread(post_webhook, url, body, self.webhook_timeout, self.webhook_retries,
+                                            self.webhook_policy)
+        await self.queue.run(self.queue.set_webhook_status, job_id, "delivered" if delivered else "failed")
+
+    async def drain(self) -> None:
+        """等待还在发送的 webhook（测试与停机时用）"""
+        if self._webhooks:
+            await asyncio.gather(*list(self._webhooks), return_exceptions=True)
+
+    async def run_forever(self) -> None:
+        """持续运行；启动时先恢复上次崩溃时中断的任务，之后每 maintenance_interval 秒恢复 + 清理一次"""
+        next_maintenance = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_maintenance:
+                    await self.queue.run(self.queue.recover)
+                    await self.queue.run(self.queue.purge)
+                    next_maintenance = time.monotonic() + self.maintenance_interval
+                wait = self._busy_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if await self.run_once() == 0:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"任务工作循环出错: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+
+# 全局任务队列（首次调用时按 service_config.yaml 的 jobs 节打开）
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is not None:
+        return _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue.from_config(get_section("service_config", "jobs"))
+    return _queue
+
+
+def close_job_queue() -> None:
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.close()
+            _queue = None
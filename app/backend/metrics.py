@@ -0,0 +1,305 @@
+# app/backend/metrics.py
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class Histogram:
+    """
+    线程安全的累积直方图（桶上界 le，与 Prometheus 语义一致）
+
+    用于统计批大小、排队等待时间等分布，方便调参。
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(float(b) for b in buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """返回累积计数：{"buckets": {"1.0": n, ..., "+Inf": n}, "count": n, "sum": s}"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = {}
+        running = 0
+        for bound, c in zip(self.buckets + [float("inf")], counts):
+            running += c
+            cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+
+# ---------------- Prometheus 文本格式 ----------------
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_histogram(name: str, snapshot: Dict[str, object], labels: Labels = ()) -> List[str]:
+    """把 Histogram.snapshot() 转成 Prometheus 样本行"""
+    lines = [f"{name}_bucket{_label_str(labels, ('le', le))} {count}"
+             for le, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{_label_str(labels)} {_format_value(snapshot['sum'])}")
+    lines.append(f"{name}_count{_label_str(labels)} {snapshot['count']}")
+    return lines
+
+
+def format_sample(name: str, value: float, labels: Labels = ()) -> str:
+    return f"{name}{_label_str(labels)} {_format_value(value)}"
+
+
+class _Family:
+    """同名、不同标签值的一组指标"""
+
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, kwargs: Dict[str, str]) -> Labels:
+        if len(kwargs) != len(self.labelnames) or any(k not in kwargs for k in self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际 {tuple(kwargs)}")
+        return tuple((k, str(kwargs[k])) for k in self.labelnames)
+
+    def _child(self, key: Labels, factory: Callable[[], object]):
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, factory())
+        return child
+
+    def children(self) -> List[Tuple[Labels, object]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class HistogramFamily(_Family):
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, "histogram", labelnames)
+        self.buckets = tuple(buckets)
+
+    def labels(self, **kwargs) -> Histogram:
+        return self._child(self._key(kwargs), lambda: Histogram(self.buckets))
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, hist in self.children():
+            lines.extend(format_histogram(self.name, hist.snapshot(), key))
+        return lines
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class CounterFamily(_Family):
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, "counter", labelnames)
+
+    def labels(self, **kwargs) -> _CounterValue:
+        return self._child(self._key(kwargs), _CounterValue)
+
+    def render(self) -> List[str]:
+        return [format_sample(self.name, c.value, key) for key, c in self.children()]
+
+
+class Registry:
+    """
+    指标注册表，渲染为 Prometheus 文本格式
+
+    热路径上只有直方图/计数器的加锁累加；队列深度、缓存命中等已有统计
+    通过 collector 回调在抓取（/metrics）时才读取，不增加请求开销。
+    """
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], List[str]]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float],
+                  labelnames: Sequence[str] = ()) -> HistogramFamily:
+        with self._lock:
+            family = self._families.setdefault(name, HistogramFamily(name, help_text, buckets, labelnames))
+        return family
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> CounterFamily:
+        with self._lock:
+            family = self._families.setdefault(name, CounterFamily(name, help_text, labelnames))
+        return family
+
+    def register_collector(self, name: str, kind: str, help_text: str,
+                           collect: Callable[[], List[str]]) -> None:
+        """注册抓取时调用的回调，collect() 返回该指标的样本行（可用 format_sample / format_histogram 生成）"""
+        with self._lock:
+            self._collectors[name] = (kind, help_text, collect)
+
+    def render(self) -> str:
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors.items())
+        out = []
+        for family in families:
+            out.append(f"# HELP {family.name} {family.help}")
+            out.append(f"# TYPE {family.name} {family.kind}")
+            out.extend(family.render())
+        for name, (kind, help_text, collect) in collectors:
+            try:
+                samples = collect()
+            except Exception:
+                continue
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(samples)
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+# 阶段耗时（秒）与图片尺寸分布
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IMAGE_BYTES_BUCKETS = (16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+IMAGE_PIXELS_BUCKETS = (0.1e6, 0.3e6, 1e6, 2e6, 4e6, 8e6, 12e6, 24e6)
+
+STAGE_SECONDS = REGISTRY.histogram("smart_food_stage_seconds", "各处理阶段耗时（秒）",
+                                   STAGE_BUCKETS, ("pipeline", "stage"))
+IMAGE_BYTES = REGISTRY.histogram("smart_food_image_bytes", "上传图片大小（字节）",
+                                 IMAGE_BYTES_BUCKETS, ("pipeline",))
+IMAGE_PIXELS = REGISTRY.histogram("smart_food_image_pixels", "解码后图片像素数",
+                                  IMAGE_PIXELS_BUCKETS, ("pipeline",))
+REQUEST_SECONDS = REGISTRY.histogram("smart_food_http_request_seconds", "HTTP 请求耗时（秒）",
+                                     STAGE_BUCKETS, ("method", "route", "status"))
+
+
+# ---------------- 阶段计时 ----------------
+
+# 当前请求已完成的阶段 [(名称, 毫秒)]，仅在开启 Server-Timing 时由中间件设置
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_timings", default=None)
+
+
+# (pipeline, stage) → (直方图, Server-Timing 名称)，省去每次按标签查找
+_STAGE_CHILDREN: Dict[Tuple[str, str], Tuple[Histogram, str]] = {}
+
+
+class stage:
+    """
+    记录一个处理阶段的耗时：写入 smart_food_stage_seconds，并追加到当前请求的 Server-Timing
+
+        with stage("ocr", "decode"):
+            img = cv2.imdecode(...)
+
+    用类而非 @contextmanager 生成器实现，单次开销在微秒级，可常开。
+    """
+
+    __slots__ = ("_hist", "_name", "_start")
+
+    def __init__(self, pipeline: str, name: str):
+        cached = _STAGE_CHILDREN.get((pipeline, name))
+        if cached is None:
+            cached = _STAGE_CHILDREN.setdefault(
+                (pipeline, name), (STAGE_SECONDS.labels(pipeline=pipeline, stage=name), f"{pipeline}-{name}"))
+        self._hist, self._name = cached
+
+    def __enter__(self) -> "stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self._start
+        self._hist.observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self._name, elapsed * 1000.0))
+
+
+def observe_image(pipeline: str, num_bytes: Optional[int] = None, shape: Optional[Sequence[int]] = None) -> None:
+    """记录图片大小（上传字节数 / 解码后像素数）"""
+    if num_bytes is not None:
+        IMAGE_BYTES.labels(pipeline=pipeline).observe(num_bytes)
+    if shape is not None:
+        IMAGE_PIXELS.labels(pipeline=pipeline).observe(shape[0] * shape[1])
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """同名阶段（如批量接口里的多张图片）合并累加"""
+    merged: Dict[str, float] = {}
+    for name, ms in timings:
+        merged[name] = merged.get(name, 0.0) + ms
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in merged.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：记录每个请求的耗时（按路由模板聚合），可选附加 Server-Timing 响应头
+
+    用纯 ASGI 实现而非 BaseHTTPMiddleware，对流式响应也不额外缓冲。
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: Optional[List[Tuple[str, float]]] = [] if self.server_timing else None
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if timings is not None:
+                    total = (time.perf_counter() - start) * 1000.0
+                    value = server_timing_header(timings + [("total", total)])
+                    message = {**message, "headers": list(message.get("headers", []))
+                               + [(b"server-timing", value.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(method=scope["method"],
+                                   route=getattr(route, "path", "unmatched"),
+                                   status=str(status["code"])).observe(time.perf_counter() - start)
@@ -1,25 +1,127 @@
 # app/ocr.py
 import logging
-from paddleocr import PaddleOCR
+import os
 import numpy as np
-import cv2
+import threading
+from typing import Any, Dict, List, Optional
+from app.backend.config import get_section
+from app.backend.ingest import decode_image
+from app.backend.metrics import observe_image, stage
+from app.backend.ocr_pool import OCRWorkerPool
+from app.backend.ocr_roi import get_roi_engine
+from app.backend.preprocessing import decode_many
+from app.backend.startup import detect_device, keep_inherited, startup_report
 
 logger = logging.getLogger(__name__)
-logger.info("正在初始化 PaddleOCR 引擎...")
-ocr_engine = PaddleOCR(lang='ch')
-# 初始化 OCR 引擎（优先用 GPU，失败则用 CPU）
-
-try:
-    ocr_engine = PaddleOCR(lang='ch', device='gpu')
-    logger.info("PaddleOCR 引擎初始化成功（GPU）")
-except Exception as e:
-    logger.warning(f"PaddleOCR GPU 初始化失败，尝试使用 CPU: {e}")
-    try:
-        ocr_engine = PaddleOCR(lang='ch', device='cpu')
-        logger.info("PaddleOCR 引擎初始化成功（CPU）")
-    except Exception as cpu_e:
-        logger.error(f"PaddleOCR CPU 初始化也失败: {cpu_e}")
-        ocr_engine = None  # 明确标记初始化失败
+
+_ocr_cfg = get_section("service_config", "ocr")
+
+# 解码后最长边上限：手机原图（4800 万像素）缩到这个尺寸，检测和识别耗时、内存都有上界
+_max_side = _ocr_cfg.get("max_side") or None
+
+# 多进程 OCR 池配置（service_config.yaml 的 ocr.pool 节），workers=0 表示进程内单引擎
+_pool_cfg = _ocr_cfg.get("pool") or {}
+_pool_workers = int(_pool_cfg.get("workers", 0) or 0)
+_ocr_pool: Optional[OCRWorkerPool] = None
+_pool_lock = threading.Lock()
+
+# 进程内 OCR 引擎：首次使用时才创建，且只创建一次
+ocr_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """
+    获取进程内 PaddleOCR 引擎（懒加载）
+
+    设备由 ocr.device 配置决定，"auto" 时自动检测；GPU 初始化失败则退回 CPU。
+    两种设备都失败时抛出 RuntimeError，下次调用会重新尝试。
+    """
+    global ocr_engine
+    if ocr_engine is not None:
+        return ocr_engine
+    with _engine_lock:
+        if ocr_engine is not None:
+            return ocr_engine
+
+        with startup_report.measure("ocr", "import"):
+            from paddleocr import PaddleOCR
+
+        lang = _ocr_cfg.get("lang", "ch")
+        device = detect_device(_ocr_cfg.get("device", "auto"))
+        devices = [device] if device == "cpu" else [device, "cpu"]
+        logger.info("正在初始化 PaddleOCR 引擎...")
+        for dev in devices:
+            try:
+                with startup_report.measure("ocr", "weight_load"):
+                    ocr_engine = PaddleOCR(lang=lang, device=dev)
+                logger.info(f"PaddleOCR 引擎初始化成功（{dev.upper()}）")
+                return ocr_engine
+            except Exception as e:
+                logger.warning(f"PaddleOCR {dev.upper()} 初始化失败: {e}")
+        logger.error("PaddleOCR 引擎初始化失败")
+        raise RuntimeError("OCR 引擎未就绪")
+
+
+def _get_pool() -> Optional[OCRWorkerPool]:
+    """首次调用时创建 OCR 进程池（未启用时返回 None）"""
+    global _ocr_pool
+    if _pool_workers <= 0:
+        return None
+    if _ocr_pool is None:
+        with _pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = OCRWorkerPool(
+                    _pool_workers,
+                    engine_kwargs={"lang": _ocr_cfg.get("lang", "ch"),
+                                   "device": detect_device(_pool_cfg.get("device", "auto"))},
+                    pin_cores=_pool_cfg.get("pin_cores", True),
+                )
+    return _ocr_pool
+
+
+def _reset_after_fork() -> None:
+    # OCR 进程池的子进程属于父进程，fork 出的进程下次使用时自己再建一个
+    global _ocr_pool, _pool_lock
+    if _ocr_pool is not None:
+        keep_inherited(_ocr_pool)
+    _ocr_pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _box(poly) -> Optional[List[List[int]]]:
+    return None if poly is None else np.asarray(poly).astype(int).tolist()
+
+
+def _parse_items(result) -> List[Dict[str, Any]]:
+    """
+    从 PaddleOCR 的 predict 结果中取出文本行
+
+    Returns:
+        [{"text": "配料表", "score": 0.98, "box": [[x, y], ...]}]，box 为文本框四个顶点
+    """
+    items = []
+    # 解析结果：rec_texts / rec_scores / rec_polys 按下标一一对应
+    if result and isinstance(result, list) and 'rec_texts' in result[0]:
+        res = result[0]
+        texts = list(res['rec_texts'])
+        scores = list(res.get('rec_scores', [None] * len(texts)))
+        polys = list(res.get('rec_polys', [None] * len(texts)))
+        for text, score, poly in zip(texts, scores, polys):
+            items.append({"text": text,
+                          "score": None if score is None else float(score),
+                          "box": _box(poly)})
+    # 老版兼容：[[box, (text, score)], ...]
+    elif result and isinstance(result, list) and len(result) > 0:
+        for line in result[0]:
+            items.append({"text": line[1][0], "score": float(line[1][1]), "box": _box(line[0])})
+    else:
+        logger.warning(f"OCR 识别结果为空或格式异常: {result}")
+    return items
 
 
 def do_ocr(image_bytes: bytes) -> str:
@@ -27,32 +129,101 @@ def do_ocr(image_bytes: bytes) -> str:
     输入：图像二进制
     返回：识别到的文字（按行拼接）
     """
-    if ocr_engine is None:
-        logger.error("OCR 引擎未成功初始化，无法执行 OCR")
-        raise RuntimeError("OCR 引擎未就绪")
+    return "\n".join(item["text"] for item in ocr_items(image_bytes))
+
+
+def ocr_items(image_bytes: bytes) -> List[Dict[str, Any]]:
+    """
+    输入：图像二进制
+    返回：识别到的文本行，含置信度和文本框（见 _parse_items）
+    """
+    pool = _get_pool()
+    engine = get_ocr_engine() if pool is None else None
 
     try:
-        # PaddleOCR 3.x 推荐用 ocr() 方法
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        # 2. 解码为 OpenCV 图像
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        #print("img.shape:", img.shape)
-        #cv2.imwrite("debug.jpg", img)  # 保存解码后的图片，手动检查
-        result = ocr_engine.predict(img)
-        #print("result:", result)
-        lines = []
-        # 解析结果
-        if result and isinstance(result, list) and 'rec_texts' in result[0]:
-            lines = result[0]['rec_texts']
-        # 老版兼容
-        elif result and isinstance(result, list) and len(result) > 0:
-            for line in result[0]:
-                text = line[1][0]
-                lines.append(text)
+        with stage("ocr", "decode"):
+            # 解码为 OpenCV 图像（按 EXIF 转正、限制最长边），失败抛出 IngestError
+            img = _decode(image_bytes)
+        observe_image("ocr", shape=img.shape)
+        if pool is not None:
+            # 解码后的图片经共享内存交给 OCR 工作进程（检测 + 识别 + 解析都在子进程内）
+            with stage("ocr", "pool"):
+                items = pool.run(img)
         else:
-            logger.warning(f"OCR 识别结果为空或格式异常: {result}")
-        logger.info(f"PaddleOCR 识别完成，识别到 {len(lines)} 行文本")
-        return "\n".join(lines)
+            # PaddleOCR 3.x 用 predict()（ocr() 已弃用）；检测与识别在流水线内部串行完成，这里合并计为 predict
+            with stage("ocr", "predict"):
+                result = engine.predict(img)
+            with stage("ocr", "parse"):
+                items = _parse_items(result)
+        logger.info(f"PaddleOCR 识别完成，识别到 {len(items)} 行文本")
+        return items
     except Exception as e:
-        logger.error(f"do_ocr 函数内部发生错误: {e}", exc_info=True)
-        raise e
\ No newline at end of file
+        logger.error(f"OCR 识别发生错误: {e}", exc_info=True)
+        raise e
+
+
+def ocr_roi(image_bytes: bytes) -> Dict[str, Any]:
+    """
+    ROI 模式：缩小检测一次，只按原图分辨率识别配料表和日期区域的文本行（见 ocr_roi.py）
+
+    进程内运行（不经 OCR 进程池）；返回格式见 RoiOCR.run
+    """
+    with stage("ocr", "decode"):
+        img = _decode(image_bytes)
+    observe_image("ocr", shape=img.shape)
+    engine = get_roi_engine(_ocr_cfg.get("roi") or {}, detect_device(_ocr_cfg.get("device", "auto")))
+    result = engine.run(img)
+    logger.info(f"ROI OCR 完成：检测到 {result['boxes_detected']} 个文本框，"
+                f"识别 {result['boxes_recognized']} 个，跳过 {result['boxes_skipped']} 个")
+    return result
+
+
+def _decode(image_bytes: bytes) -> np.ndarray:
+    return decode_image(image_bytes, max_side=_max_side)
+
+
+def do_ocr_batch(images: List[bytes]) -> List[Dict[str, Any]]:
+    """
+    批量 OCR：并行解码，再一次性交给引擎（进程内引擎用批量 predict，进程池则分发到各进程）
+
+    Returns:
+        与输入一一对应的结果 {"status": "success", "text": ...} 或
+        {"status": "error", "message": ...}，单张失败不影响其它图片
+    """
+    pool = _get_pool()
+    engine = get_ocr_engine() if pool is None else None
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    valid_idx, decoded = [], []
+    with stage("ocr", "decode"):
+        decoded_all = decode_many(_decode, images)
+    for i, img in enumerate(decoded_all):
+        if img is None:
+            results[i] = {"status": "error", "message": "图片解码失败"}
+            continue
+        observe_image("ocr", shape=img.shape)
+        valid_idx.append(i)
+        decoded.append(img)
+    if not decoded:
+        return results
+
+    try:
+        if pool is not None:
+            with stage("ocr", "pool"):
+                outputs = pool.run_many(decoded)
+        else:
+            with stage("ocr", "predict"):
+                raw = engine.predict(decoded)
+            with stage("ocr", "parse"):
+                outputs = [_parse_items([r]) for r in raw]
+    except Exception as e:
+        logger.error(f"批量 OCR 失败: {e}", exc_info=True)
+        outputs = [e] * len(decoded)
+
+    for i, items in zip(valid_idx, outputs):
+        if isinstance(items, Exception):
+            results[i] = {"status": "error", "message": f"OCR 处理失败：{items}"}
+        else:
+            results[i] = {"status": "success", "text": "\n".join(item["text"] for item in items)}
+    logger.info(f"批量 OCR 完成：共 {len(images)} 张，解码成功 {len(decoded)} 张")
+    return results
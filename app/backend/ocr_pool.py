@@ -0,0 +1,152 @@
+# app/backend/ocr_pool.py
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 子进程内的 OCR 引擎（每个工作进程一个）
+_worker_engine = None
+
+
+def split_cores(cores: Sequence[int], num_workers: int) -> List[List[int]]:
+    """把可用 CPU 核按连续区间平均分给 num_workers 个工作进程"""
+    cores = sorted(cores)
+    num_workers = max(1, num_workers)
+    if len(cores) < num_workers:
+        # 核数不够时允许多个进程共享同一个核
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+    chunks = np.array_split(np.array(cores), num_workers)
+    return [chunk.tolist() for chunk in chunks]
+
+
+def share_image(img: np.ndarray) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """
+    把解码后的图片拷贝到一块新的共享内存中
+
+    Returns:
+        (共享内存对象, 元信息 {"name", "shape", "dtype"})；调用方负责 close + unlink
+    """
+    img = np.ascontiguousarray(img)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+    view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+    view[...] = img
+    del view
+    return shm, {"name": shm.name, "shape": img.shape, "dtype": img.dtype.str}
+
+
+def attach_image(meta: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """在工作进程中按元信息挂载共享内存，返回零拷贝的图片视图"""
+    # spawn 出的工作进程与父进程共用同一个 resource_tracker，回收统一由父进程 unlink 完成
+    shm = shared_memory.SharedMemory(name=meta["name"])
+    img = np.ndarray(tuple(meta["shape"]), dtype=np.dtype(meta["dtype"]), buffer=shm.buf)
+    return shm, img
+
+
+def _init_worker(core_queue, engine_kwargs: Dict[str, Any]) -> None:
+    """工作进程初始化：绑定 CPU 核，再创建该进程独占的 PaddleOCR 引擎"""
+    global _worker_engine
+    cores = None
+    if core_queue is not None:
+        try:
+            cores = core_queue.get(timeout=5)
+        except queue.Empty:
+            pass
+    if cores:
+        # 线程数需在导入 Paddle 之前设置
+        os.environ["OMP_NUM_THREADS"] = str(len(cores))
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError as e:
+                logger.warning(f"OCR 工作进程绑定 CPU 核失败: {e}")
+        engine_kwargs = {"cpu_threads": len(cores), **engine_kwargs}
+
+    from paddleocr import PaddleOCR
+    _worker_engine = PaddleOCR(**engine_kwargs)
+    logger.info(f"OCR 工作进程 {os.getpid()} 初始化完成 (cores={cores})")
+
+
+def _run_ocr(meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """工作进程内执行 OCR：从共享内存读取图片，只把识别出的文本行（文本、置信度、框）传回"""
+    from app.backend.ocr import _parse_items
+
+    shm, img = attach_image(meta)
+    try:
+        result = _worker_engine.predict(img)
+        return _parse_items(result)
+    finally:
+        del img
+        shm.close()
+
+
+class OCRWorkerPool:
+    """
+    多进程 OCR 引擎池
+
+    每个工作进程持有自己的 PaddleOCR 实例并绑定一部分 CPU 核，
+    绕开单进程里 Python 侧前后处理的 GIL 瓶颈；图片在父进程解码后
+    经共享内存交给工作进程，不做 pickle 序列化。
+    """
+
+    def __init__(self,
+                 num_workers: int,
+                 engine_kwargs: Optional[Dict[str, Any]] = None,
+                 pin_cores: bool = True):
+        """
+        Args:
+            num_workers: 工作进程数
+            engine_kwargs: 传给 PaddleOCR 的参数，如 {"lang": "ch", "device": "cpu"}
+            pin_cores: 是否把各工作进程绑定到互不重叠的 CPU 核上
+        """
+        self.num_workers = max(1, int(num_workers))
+        ctx = multiprocessing.get_context("spawn")
+
+        core_queue = None
+        if pin_cores:
+            if hasattr(os, "sched_getaffinity"):
+                cores = sorted(os.sched_getaffinity(0))
+            else:
+                cores = list(range(os.cpu_count() or 1))
+            core_queue = ctx.Queue()
+            for chunk in split_cores(cores, self.num_workers):
+                core_queue.put(chunk)
+
+        self._pool = ProcessPoolExecutor(max_workers=self.num_workers,
+                                         mp_context=ctx,
+                                         initializer=_init_worker,
+                                         initargs=(core_queue, dict(engine_kwargs or {})))
+        logger.info(f"OCR 进程池已创建 (workers={self.num_workers}, pin_cores={pin_cores})")
+
+    def run(self, img: np.ndarray) -> List[Dict[str, Any]]:
+        """识别一张已解码的图片，阻塞等待结果（文本行列表，见 ocr._parse_items）"""
+        shm, meta = share_image(img)
+        try:
+            return self._pool.submit(_run_ocr, meta).result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def run_many(self, images: List[np.ndarray]) -> List[Union[List[Dict[str, Any]], Exception]]:
+        """
+        识别多张已解码的图片，分发到各工作进程并行处理
+
+        返回与输入一一对应的结果，单张失败时对应位置为异常对象
+        """
+        shared = [share_image(img) for img in images]
+        try:
+            futures = [self._pool.submit(_run_ocr, meta) for _, meta in shared]
+            return [f.exception() or f.result() for f in futures]
+        finally:
+            for shm, _ in shared:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
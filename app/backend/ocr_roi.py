@@ -0,0 +1,278 @@
+# app/backend/ocr_roi.py
+"""
+感兴趣区域（ROI）OCR：只识别配料表和生产日期 / 保质期所在的文本行
+
+整页 OCR 对包装照片上的每一行字（品牌、广告语、营养成分表……）都做一次全分辨率识别，
+而配料分析和日期提取只用得到其中两块。ROI 模式：
+
+1. 检测：在缩小到 det_side 的图上做一次文本检测，文本框按比例映射回原图
+2. 探测：每个文本框只截开头一小段（约 probe_chars 个字宽），整批低成本识别，用来找锚点关键词
+   （"配料"、"生产日期"、"保质期"……）和形如日期的喷码
+3. 版面：从锚点行出发，按行距和水平重叠把同一栏里后续的行并入区域，遇到其它栏目的标题行为止
+4. 识别：只对区域内的文本行按原图分辨率识别；开头一段就是整行的不再重复识别
+
+文本行方向分类（0° / 180°）只对探测置信度偏低的行做（orientation: auto）。
+找不到任何锚点时退回识别全部文本行，结果与整页 OCR 一致。
+配置见 service_config.yaml 的 ocr.roi 节。
+"""
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.backend.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+REGIONS = ("ingredients", "dates")
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "det_side": 960,           # 检测时最长边缩到这么大
+    "probe_chars": 4,          # 探测时每行截取的宽度（按行高的倍数）
+    "line_gap": 1.2,           # 与上一行的竖直间距不超过行高的这么多倍才算同一栏
+    "date_lines_below": 1,     # 日期锚点下方再并入几行（日期常印在标题下一行）
+    "orientation": "auto",     # auto：只对探测置信度低的行做方向分类 | never | always
+    "min_probe_score": 0.5,
+    "fallback": "full",        # 找不到锚点时：full 识别全部文本行 | none 返回空
+}
+
+# 锚点是栏目标题，印在行首（探测文本就是行首几个字）
+_INGREDIENT_ANCHOR = re.compile(r"^\W*(?:配\s*料|原\s*料|成\s*分|ingredients?)", re.IGNORECASE)
+_DATE_ANCHOR = re.compile(r"^\W*(?:生\s*产\s*日|保\s*质|有\s*效\s*期|到\s*期|限用|喷码|批号|EXP|MFG)", re.IGNORECASE)
+# 没有标题、直接印出的日期：2024-05-01、2024.05、20240501、24/05/01
+_DATE_LIKE = re.compile(r"(?:19|20)\d{2}\s*[.\-/年]\s*\d{1,2}|(?:19|20)\d{6}|\d{2}/\d{2}/\d{2}")
+# 其它栏目的标题：配料区域到此为止
+_SECTION_TITLE = re.compile(r"贮\s*存|储\s*存|净含量|规\s*格|生产商|制造商|委托|产\s*地|地\s*址|电\s*话|营养成分|"
+                            r"食用方法|执行标准|许可证|致敏|过敏|注意事项|温馨提示")
+
+Box = Tuple[float, float, float, float]
+
+
+def _bbox(poly: np.ndarray) -> Box:
+    xs, ys = poly[:, 0], poly[:, 1]
+    return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
+
+
+def rectify_crop(img: np.ndarray, poly: np.ndarray) -> np.ndarray:
+    """按文本框四个顶点透视变换成水平的文本行图；竖排（高 ≥ 1.5 倍宽）时转 90°"""
+    poly = np.asarray(poly, dtype=np.float32)
+    width = int(max(np.linalg.norm(poly[0] - poly[1]), np.linalg.norm(poly[2] - poly[3])))
+    height = int(max(np.linalg.norm(poly[0] - poly[3]), np.linalg.norm(poly[1] - poly[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    crop = cv2.warpPerspective(img, cv2.getPerspectiveTransform(poly, target), (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height >= 1.5 * width:
+        crop = np.rot90(crop)
+    return crop
+
+
+def _classify(text: str) -> Optional[str]:
+    """探测文本 → 锚点类型"""
+    if _SECTION_TITLE.search(text):
+        return None
+    if _INGREDIENT_ANCHOR.search(text):
+        return "ingredients"
+    if _DATE_ANCHOR.search(text) or _DATE_LIKE.search(text):
+        return "dates"
+    return None
+
+
+class RoiOCR:
+    """
+    检测一次 + 只识别目标区域的 OCR
+
+    detector / recognizer / classifier 与具体模型解耦（见 create_paddle_roi_ocr）：
+        detector(img) -> 文本框列表，每个为 (4, 2) 顶点数组（顺时针，从左上角开始）
+        recognizer(crops) -> [(text, score), ...]
+        classifier(crops) -> [0 或 180, ...]（可选）
+    """
+
+    def __init__(self,
+                 detector: Callable[[np.ndarray], Sequence[np.ndarray]],
+                 recognizer: Callable[[List[np.ndarray]], List[Tuple[str, float]]],
+                 classifier: Optional[Callable[[List[np.ndarray]], List[int]]] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.detector = detector
+        self.recognizer = recognizer
+        self.classifier = classifier
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        if self.config["orientation"] not in ("auto", "never", "always"):
+            raise ValueError(f"orientation 只能是 auto / never / always: {self.config['orientation']}")
+
+    def detect(self, img: np.ndarray) -> List[np.ndarray]:
+        """缩小后检测，文本框坐标映射回原图"""
+        side = int(self.config["det_side"])
+        h, w = img.shape[:2]
+        scale = min(1.0, side / max(h, w))
+        small = img if scale >= 1 else cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                                  interpolation=cv2.INTER_AREA)
+        with stage("ocr", "roi_detect"):
+            polys = self.detector(small)
+        return [np.asarray(p, dtype=np.float32) / scale for p in polys]
+
+    def _orient(self, crops: List[np.ndarray], scores: List[float]) -> List[bool]:
+        """哪些行需要转 180°"""
+        mode = self.config["orientation"]
+        if self.classifier is None or mode == "never":
+            return [False] * len(crops)
+        todo = [i for i, s in enumerate(scores) if mode == "always" or s < self.config["min_probe_score"]]
+        if not todo:
+            return [False] * len(crops)
+        with stage("ocr", "roi_orientation"):
+            angles = self.classifier([crops[i] for i in todo])
+        flip = [False] * len(crops)
+        for i, angle in zip(todo, angles):
+            flip[i] = angle == 180
+        return flip
+
+    def regions(self, boxes: List[Box], kinds: List[Optional[str]], texts: List[str]) -> Dict[int, str]:
+        """
+        从锚点行按版面扩展出区域
+
+        Args:
+            boxes: 各文本行的外接矩形 (x0, y0, x1, y1)
+            kinds: 各行探测文本的锚点类型（None 表示不是锚点）
+            texts: 各行的探测文本（判断是否为其它栏目的标题）
+
+        Returns:
+            {行下标: 区域类型}
+        """
+        order = sorted(range(len(boxes)), key=lambda i: ((boxes[i][1] + boxes[i][3]) / 2, boxes[i][0]))
+        heights = [b[3] - b[1] for b in boxes]
+        gap = float(self.config["line_gap"])
+        selected: Dict[int, str] = {}
+
+        def same_row(a: int, b: int) -> bool:
+            ca, cb = (boxes[a][1] + boxes[a][3]) / 2, (boxes[b][1] + boxes[b][3]) / 2
+            return abs(ca - cb) < 0.5 * max(heights[a], heights[b]) and boxes[b][0] >= boxes[a][0]
+
+        for anchor in order:
+            kind = kinds[anchor]
+            if kind is None:
+                continue
+            selected.setdefault(anchor, kind)
+            # 同一行右侧被检测成单独文本框的部分
+            for j in order:
+                if j != anchor and same_row(anchor, j):
+                    selected.setdefault(j, kind)
+            # 向下扩展：行距够小、水平方向与区域重叠，且不是另一个栏目的标题
+            x0, _, x1, bottom = boxes[anchor]
+            limit = None if kind == "ingredients" else int(self.config["date_lines_below"])
+            taken = 0
+            for j in order:
+                bx0, by0, bx1, by1 = boxes[j]
+                # 只看锚点下方的行（同一行右侧的部分上面已经并入）
+                if (by0 + by1) / 2 <= boxes[anchor][3] or j in selected and selected[j] != kind:
+                    continue
+                if by0 - bottom > gap * heights[anchor] or limit is not None and taken >= limit:
+                    break
+                if bx1 < x0 or bx0 > x1:
+                    continue
+                if kinds[j] is not None and kinds[j] != kind or _SECTION_TITLE.search(texts[j]):
+                    break
+                selected.setdefault(j, kind)
+                x0, x1, bottom = min(x0, bx0), max(x1, bx1), max(bottom, by1)
+                taken += 1
+        return selected
+
+    def run(self, img: np.ndarray) -> Dict[str, Any]:
+        """
+        Returns:
+            {"items": [{"text", "score", "box", "region"}],   # 按阅读顺序
+             "regions": {"ingredients": "…", "dates": "…"},
+             "boxes_detected": 57, "boxes_recognized": 9, "boxes_skipped": 48, "anchors_found": true}
+            boxes_skipped 为没有做整行识别的文本框数（只做了开头一段的探测）
+        """
+        polys = self.detect(img)
+        if not polys:
+            return {"items": [], "regions": {}, "boxes_detected": 0, "boxes_recognized": 0,
+                    "boxes_skipped": 0, "anchors_found": False}
+        with stage("ocr", "roi_crop"):
+            crops = [rectify_crop(img, p) for p in polys]
+            probe_width = [int(self.config["probe_chars"] * c.shape[0]) for c in crops]
+            probes = [c[:, :w] if c.shape[1] > w else c for c, w in zip(crops, probe_width)]
+        with stage("ocr", "roi_probe"):
+            probed = self.recognizer(probes)
+
+        flip = self._orient(probes, [score for _, score in probed])
+        if any(flip):
+            # 倒置的行：转正后行首在原来的末尾，重新截取开头一段再探测
+            redo = [i for i, f in enumerate(flip) if f]
+            for i in redo:
+                crops[i] = np.rot90(crops[i], 2)
+                probes[i] = crops[i][:, :probe_width[i]]
+            for i, result in zip(redo, self.recognizer([probes[i] for i in redo])):
+                probed[i] = result
+
+        texts = [text for text, _ in probed]
+        kinds = [_classify(text) for text in texts]
+        boxes = [_bbox(p) for p in polys]
+        selected = self.regions(boxes, kinds, texts)
+        anchors_found = bool(selected)
+        if not anchors_found and self.config["fallback"] == "full":
+            selected = {i: None for i in range(len(polys))}
+
+        # 开头一段已是整行的直接用探测结果，其余按原图分辨率识别
+        full = {i: probed[i] for i in selected if crops[i].shape[1] <= probe_width[i]}
+        todo = [i for i in selected if i not in full]
+        if todo:
+            with stage("ocr", "roi_recognize"):
+                for i, result in zip(todo, self.recognizer([crops[i] for i in todo])):
+                    full[i] = result
+
+        order = sorted(selected, key=lambda i: ((boxes[i][1] + boxes[i][3]) / 2, boxes[i][0]))
+        items = [{"text": full[i][0], "score": float(full[i][1]),
+                  "box": polys[i].astype(int).tolist(), "region": selected[i]} for i in order]
+        regions = {kind: "\n".join(item["text"] for item in items if item["region"] == kind)
+                   for kind in REGIONS if any(item["region"] == kind for item in items)}
+        return {"items": items, "regions": regions,
+                "boxes_detected": len(polys), "boxes_recognized": len(selected),
+                "boxes_skipped": len(polys) - len(selected), "anchors_found": anchors_found}
+
+
+def create_paddle_roi_ocr(cfg: Dict[str, Any], device: str = "cpu") -> RoiOCR:
+    """用 PaddleOCR 的单独检测 / 识别 / 文本行方向分类模型组装 RoiOCR"""
+    from paddleocr import TextDetection, TextLineOrientationClassification, TextRecognition
+
+    det = TextDetection(model_name=cfg.get("det_model", "PP-OCRv5_server_det"), device=device,
+                        limit_side_len=int(cfg.get("det_side", DEFAULT_CONFIG["det_side"])), limit_type="max")
+    rec = TextRecognition(model_name=cfg.get("rec_model", "PP-OCRv5_server_rec"), device=device)
+    cls = None
+    if cfg.get("orientation", DEFAULT_CONFIG["orientation"]) != "never":
+        cls = TextLineOrientationClassification(model_name=cfg.get("cls_model", "PP-LCNet_x1_0_textline_ori"),
+                                                device=device)
+
+    def detector(img: np.ndarray) -> List[np.ndarray]:
+        result = det.predict(img)[0]
+        return [np.asarray(p) for p in result["dt_polys"]]
+
+    def recognizer(crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        if not crops:
+            return []
+        return [(r["rec_text"], float(r["rec_score"])) for r in rec.predict([np.ascontiguousarray(c) for c in crops])]
+
+    def classifier(crops: List[np.ndarray]) -> List[int]:
+        # 类别 0 为 0°，1 为 180°
+        return [180 if int(r["class_ids"][0]) == 1 else 0
+                for r in cls.predict([np.ascontiguousarray(c) for c in crops])]
+
+    return RoiOCR(detector, recognizer, classifier if cls is not None else None, cfg)
+
+
+# 进程内 ROI OCR 引擎（首次使用时创建）
+_roi_engine: Optional[RoiOCR] = None
+_roi_lock = threading.Lock()
+
+
+def get_roi_engine(cfg: Dict[str, Any], device: str = "cpu") -> RoiOCR:
+    global _roi_engine
+    if _roi_engine is not None:
+        return _roi_engine
+    with _roi_lock:
+        if _roi_engine is None:
+            _roi_engine = create_paddle_roi_ocr(cfg, device)
+    return _roi_engine
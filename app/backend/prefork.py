@@ -0,0 +1,415 @@
+# app/backend/prefork.py
+"""
+预先 fork 的多 worker 启动器：模型只加载一次，worker 之间写时复制共享权重
+
+`uvicorn app.main:app --workers N` 的每个 worker 都是独立启动的进程，各自加载一份 PaddleOCR
+和新鲜度模型，常驻内存随 worker 数线性增长。这里换一种方式：
+
+- 父进程导入 app.main，加载并预热模型（startup 报告的 mode 记为 prefork），
+  gc.collect() + gc.freeze() 后再 fork，避免子进程里的垃圾回收扫描、改写继承来的对象；
+- 父进程绑定监听端口，worker 继承同一个 socket，各自跑 uvicorn；
+- fork 后子进程里不能直接用的状态（线程池、微批调度器线程、SQLite 连接、OCR 进程池）
+  由各模块通过 startup.register_after_fork / os.register_at_fork 重新初始化；
+- 父进程只做监管：worker 异常退出就重新 fork（模型仍在父进程里，不用重新加载），
+  收到 SIGTERM/SIGINT 转发给 worker 并等待它们处理完请求。
+
+限制：只适用于 Linux 和 CPU 推理。CUDA 上下文不能跨 fork 继承，可能用到 GPU 时
+父进程不加载模型，退回到各 worker 自行加载（与 --workers N 相同）。
+
+内存报告读取 /proc/<pid>/smaps_rollup：RSS 会把共享页重复计入每个进程，
+PSS 按共享进程数均摊，各进程 PSS 之和就是整组进程的真实占用。
+
+用法：
+    python -m app.backend.prefork serve --workers 4 --port 8000
+    python -m app.backend.prefork memory --workers 4   # 对比两种布局的内存占用
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.backend.config import get_section
+from app.backend.startup import startup_report
+
+logger = logging.getLogger(__name__)
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+# worker 进程里记录父进程 pid，内存报告据此找到同组的其它 worker
+_parent_pid: Optional[int] = None
+
+
+# ---------------- 内存报告 ----------------
+
+def parse_smaps_rollup(text: str) -> Dict[str, int]:
+    """smaps_rollup 内容 → {字段: kB}"""
+    values = {}
+    for line in text.splitlines():
+        name, _, rest = line.partition(":")
+        if name in _SMAPS_FIELDS:
+            values[name] = int(rest.split()[0])
+    return values
+
+
+def process_memory(pid: int) -> Optional[Dict[str, Any]]:
+    """进程内存占用（MB）：rss、pss、shared（与其它进程共享的页）、private；读不到返回 None"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            kb = parse_smaps_rollup(f.read())
+    except OSError:
+        return None
+    mb = lambda v: round(v / 1024.0, 1)
+    return {
+        "pid": pid,
+        "rss_mb": mb(kb.get("Rss", 0)),
+        "pss_mb": mb(kb.get("Pss", 0)),
+        "shared_mb": mb(kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0)),
+        "private_mb": mb(kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)),
+        "swap_mb": mb(kb.get("Swap", 0)),
+    }
+
+
+def child_pids(ppid: int) -> List[int]:
+    """父进程为 ppid 的全部进程（扫描 /proc/*/stat）"""
+    pids = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # 进程名可能含空格和括号，从最后一个 ")" 之后取字段：state ppid ...
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == ppid:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def memory_report(parent_pid: Optional[int] = None,
+                  worker_pids: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+    """
+    一组 worker 的内存报告
+
+    prefork 布局（给出 parent_pid，或在 prefork worker 里调用）：父进程 + 各 worker，
+    total_pss_mb 是整组的真实占用；separate_estimate_mb 按"每个 worker 都像父进程
+    一样自己加载一份模型"估算原来布局的占用，便于对比。
+    其它情况只报告给出的进程（默认当前进程）。
+    """
+    parent_pid = parent_pid or _parent_pid
+    if worker_pids is None:
+        worker_pids = child_pids(parent_pid) if parent_pid else [os.getpid()]
+    workers = [m for m in (process_memory(pid) for pid in worker_pids) if m is not None]
+    report = {"layout": "prefork" if parent_pid else "separate", "workers": workers}
+    total = sum(w["pss_mb"] for w in workers)
+    if parent_pid:
+        parent = process_memory(parent_pid)
+        report["parent"] = parent
+        if parent is not None:
+            total += parent["pss_mb"]
+            report["separate_estimate_mb"] = round(parent["rss_mb"] * len(workers), 1)
+    report["total_pss_mb"] = round(total, 1)
+    return report
+
+
+# ---------------- 启动器 ----------------
+
+def _gpu_possible() -> bool:
+    """配置里的推理设备有可能是 GPU（不初始化 CUDA，只看配置和编译选项）"""
+    devices = [get_section("service_config", "ocr").get("device", "auto"),
+               get_section("freshness_config", "model").get("device", "auto")]
+    if all(d == "cpu" for d in devices):
+        return False
+    if any(d == "gpu" for d in devices):
+        return True
+    try:
+        import paddle
+        return paddle.device.is_compiled_with_cuda()
+    except Exception:
+        return False
+
+
+class PreforkServer:
+    """父进程加载模型后 fork 出多个 uvicorn worker 并负责监管"""
+
+    def __init__(self,
+                 workers: int = 2,
+                 host: str = "0.0.0.0",
+                 port: int = 8000,
+                 threads_per_worker: int = 0,
+                 backlog: int = 2048,
+                 graceful_timeout: float = 30,
+                 restart_delay: float = 1,
+                 memory_report_after: float = 30,
+                 log_level: str = "info"):
+        """
+        Args:
+            workers: worker 进程数
+            host, port: 监听地址（父进程绑定，worker 共用）
+            threads_per_worker: 每个 worker 的 OpenMP/OpenCV 线程数，0 表示 CPU 核数 / workers
+            backlog: 监听队列长度
+            graceful_timeout: 停止时等待 worker 退出的秒数，超时后 SIGKILL
+            restart_delay: worker 异常退出后，隔多少秒重新 fork
+            memory_report_after: 启动多少秒后在日志里输出内存报告，0 表示不输出
+            log_level: uvicorn 日志级别
+        """
+        self.workers = max(1, int(workers))
+        self.host = host
+        self.port = int(port)
+        self.threads_per_worker = int(threads_per_worker) or max(1, (os.cpu_count() or 1) // self.workers)
+        self.backlog = int(backlog)
+        self.graceful_timeout = float(graceful_timeout)
+        self.restart_delay = float(restart_delay)
+        self.memory_report_after = float(memory_report_after)
+        self.log_level = log_level
+
+        self.preloaded = False
+        self._socket: Optional[socket.socket] = None
+        self._children: Dict[int, int] = {}   # pid → worker 序号
+        self._stopping = False
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "PreforkServer":
+        """按配置节（service_config.yaml 的 prefork 节）创建"""
+        return cls(workers=cfg.get("workers", 2),
+                   host=cfg.get("host", "0.0.0.0"),
+                   port=cfg.get("port", 8000),
+                   threads_per_worker=cfg.get("threads_per_worker", 0),
+                   backlog=cfg.get("backlog", 2048),
+                   graceful_timeout=cfg.get("graceful_timeout", 30),
+                   restart_delay=cfg.get("restart_delay", 1),
+                   memory_report_after=cfg.get("memory_report_after", 30),
+                   log_level=cfg.get("log_level", "info"))
+
+    def limit_threads(self) -> None:
+        """要在 Paddle 初始化 OpenMP 之前设好：worker 继承这个线程数，避免 N 个 worker 各开满核"""
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, str(self.threads_per_worker))
+
+    def preload(self) -> bool:
+        """父进程里导入应用、加载并预热模型；可能用到 GPU 时不加载，返回 False"""
+        self.limit_threads()
+        import app.main
+        if _gpu_possible():
+            logger.warning("推理可能使用 GPU，CUDA 上下文不能跨 fork 继承：父进程不加载模型，由各 worker 自行加载")
+            return False
+        app.main._warmup()
+        startup_report.mode = "prefork"
+        # 预热产生的垃圾先回收，再把存活对象移出 GC 管理：子进程里的回收不会再触碰（改写）这些页
+        gc.collect()
+        gc.freeze()
+        self.preloaded = True
+        return True
+
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        self.port = sock.getsockname()[1]
+        self._socket = sock
+        return sock
+
+    def spawn(self, index: int) -> int:
+        """fork 出第 index 个 worker，返回 pid"""
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self._serve_worker(index)
+                code = 0
+            except BaseException:
+                logger.exception(f"worker {index} 异常退出")
+            finally:
+                # 不执行父进程注册的 atexit / finally 清理
+                os._exit(code)
+        self._children[pid] = index
+        logger.info(f"worker {index} 已启动 (pid={pid})")
+        return pid
+
+    def _serve_worker(self, index: int) -> None:
+        global _parent_pid
+        _parent_pid = os.getppid()
+        # 父进程的信号处理换回默认，由 uvicorn 自己接管 SIGINT/SIGTERM
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        import cv2
+        import numpy as np
+        import uvicorn
+        import app.main
+        cv2.setNumThreads(self.threads_per_worker)
+        # numpy 的全局随机状态随 fork 复制，各 worker 重新播种
+        np.random.seed()
+        config = uvicorn.Config(app.main.app, lifespan="on", log_level=self.log_level)
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _reap(self) -> List[int]:
+        """回收已退出的 worker，返回它们的序号"""
+        exited = []
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            index = self._children.pop(pid, None)
+            if index is not None:
+                log = logger.info if self._stopping else logger.warning
+                log(f"worker {index} (pid={pid}) 已退出，状态 {os.waitstatus_to_exitcode(status)}")
+                exited.append(index)
+        return exited
+
+    def stop(self) -> None:
+        """通知全部 worker 退出，等待 graceful_timeout 秒后强制结束"""
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self._children):
+            logger.warning(f"worker pid={pid} 未在 {self.graceful_timeout}s 内退出，强制结束")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children.clear()
+
+    def run(self) -> None:
+        """加载模型、绑定端口、fork worker，然后监管到收到停止信号"""
+        self.preload()
+        self.bind()
+        logger.info(f"prefork 启动: {self.workers} 个 worker，监听 {self.host}:{self.port}，"
+                    f"每个 worker {self.threads_per_worker} 个计算线程，模型{'已' if self.preloaded else '未'}在父进程加载")
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for i in range(self.workers):
+            self.spawn(i)
+
+        report_at = time.monotonic() + self.memory_report_after if self.memory_report_after > 0 else None
+        while not self._stopping:
+            for index in self._reap():
+                if not self._stopping:
+                    time.sleep(self.restart_delay)
+                    self.spawn(index)
+            if report_at is not None and time.monotonic() >= report_at:
+                logger.info(f"内存报告: {json.dumps(memory_report(os.getpid()), ensure_ascii=False)}")
+                report_at = None
+            time.sleep(0.2)
+
+        logger.info("正在停止全部 worker")
+        self.stop()
+        self._socket.close()
+
+
+# ---------------- 两种布局的内存对比 ----------------
+
+def _hold() -> None:
+    """原来的布局：本进程自己导入应用、加载并预热模型，然后等待标准输入关闭"""
+    import app.main
+    app.main._warmup()
+    app.main._warmup()   # 再跑一遍推理，和 prefork worker 做同样的事
+    print("ready", flush=True)
+    sys.stdin.read()
+
+
+def compare_layouts(workers: int, settle: float = 2.0) -> Dict[str, Any]:
+    """
+    分别按两种布局启动 workers 个进程，都完成模型加载和一次推理后读取内存
+
+    separate：各自独立启动、各自加载模型（uvicorn --workers 的布局）
+    prefork：本进程加载并预热模型后 fork，worker 里再做一次推理
+    """
+    server = PreforkServer(workers=workers)
+    server.limit_threads()
+    holders = [subprocess.Popen([sys.executable, "-m", "app.backend.prefork", "hold"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+               for _ in range(workers)]
+    for p in holders:
+        p.stdout.readline()
+    time.sleep(settle)
+    separate = memory_report(worker_pids=[p.pid for p in holders])
+    for p in holders:
+        p.stdin.close()
+        p.wait()
+
+    server.preload()
+    import app.main
+    pids, releases = [], []
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        release_r, release_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(release_w)
+            app.main._warmup()
+            os.write(ready_w, b"1")
+            os.read(release_r, 1)
+            os._exit(0)
+        os.close(ready_w)
+        os.close(release_r)
+        os.read(ready_r, 1)
+        os.close(ready_r)
+        pids.append(pid)
+        releases.append(release_w)
+    time.sleep(settle)
+    prefork = memory_report(os.getpid(), worker_pids=pids)
+    for fd in releases:
+        os.close(fd)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    return {"workers": workers, "separate": separate, "prefork": prefork,
+            "saved_mb": round(separate["total_pss_mb"] - prefork["total_pss_mb"], 1)}
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    cfg = dict(get_section("service_config", "prefork"))
+    parser = argparse.ArgumentParser(description="预先 fork 的多 worker 启动器")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="加载模型后 fork 出 worker 提供服务")
+    serve.add_argument("--workers", type=int, default=None, help="worker 数，默认 prefork.workers")
+    serve.add_argument("--host", default=None, help="监听地址，默认 prefork.host")
+    serve.add_argument("--port", type=int, default=None, help="监听端口，默认 prefork.port")
+    memory = sub.add_parser("memory", help="对比两种布局下每个 worker 的内存占用")
+    memory.add_argument("--workers", type=int, default=None, help="worker 数，默认 prefork.workers")
+    sub.add_parser("hold", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == "hold":
+        _hold()
+        return
+    logging.basicConfig(level=logging.INFO)
+    if args.workers:
+        cfg["workers"] = args.workers
+    if args.command == "memory":
+        print(json.dumps(compare_layouts(cfg.get("workers", 2)), ensure_ascii=False, indent=2))
+        return
+    if args.host:
+        cfg["host"] = args.host
+    if args.port is not None:
+        cfg["port"] = args.port
+    PreforkServer.from_config(cfg).run()
+
+
+if __name__ == "__main__":
+    # 经由包内的模块对象运行：worker 里 app.main 导入的 app.backend.prefork 与这里是同一个（_parent_pid）
+    from app.backend.prefork import main as _main
+    _main()
@@ -0,0 +1,135 @@
+# app/backend/preprocessing.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from app.backend.ingest import IngestError, decode_image
+from app.backend.startup import keep_inherited
+
+logger = logging.getLogger(__name__)
+
+# ImageNet 标准均值/方差（RGB 顺序）
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# 批量解码共用的线程池（OpenCV 解码时释放 GIL，多张图片可真正并行）
+_decode_pool: Optional[ThreadPoolExecutor] = None
+_decode_pool_lock = threading.Lock()
+
+
+def decode_many(decode: Callable[[bytes], Optional[np.ndarray]],
+                images: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+    """并行解码多张图片，结果与输入一一对应；解码失败（返回 None 或抛异常）的位置为 None"""
+    global _decode_pool
+
+    def safe_decode(image_bytes: bytes) -> Optional[np.ndarray]:
+        try:
+            return decode(image_bytes)
+        except Exception as e:
+            logger.warning(f"图片解码失败: {e}")
+            return None
+
+    if len(images) <= 1:
+        return [safe_decode(b) for b in images]
+    if _decode_pool is None:
+        with _decode_pool_lock:
+            if _decode_pool is None:
+                _decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                                  thread_name_prefix="decode")
+    return list(_decode_pool.map(safe_decode, images))
+
+
+def _reset_after_fork() -> None:
+    # 线程池的线程没有被子进程继承，下次使用时重新创建
+    global _decode_pool, _decode_pool_lock
+    if _decode_pool is not None:
+        keep_inherited(_decode_pool)
+    _decode_pool = None
+    _decode_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Preprocessor:
+    """
+    新鲜度模型的预处理引擎
+
+    把 resize → BGR 转 RGB → /255 → 减均值除方差 → HWC 转 CHW 融合为：
+    一次 resize，加上每个通道一次查表（uint8 → float32 的 scale-and-shift
+    预先算好 256 项），结果直接写进预分配的 NCHW 批缓冲区，中间不再
+    生成 224x224x3 的临时数组。
+    """
+
+    def __init__(self,
+                 size: int = 224,
+                 mean: Sequence[float] = IMAGENET_MEAN,
+                 std: Sequence[float] = IMAGENET_STD,
+                 reduced_decode: bool = False,
+                 max_side: Optional[int] = None):
+        """
+        Args:
+            size: 模型输入边长
+            mean: RGB 均值
+            std: RGB 方差
+            reduced_decode: 上传图片远大于 size 时缩小解码（JPEG 用 IMREAD_REDUCED_*，见 ingest.decode_image）
+            max_side: 解码后最长边上限（超出时缩小解码 + resize），None 表示不限制
+        """
+        self.size = int(size)
+        self.reduced_decode = reduced_decode
+        self.max_side = int(max_side) if max_side else None
+        # (v / 255 - mean) / std 在 float64 下算好再转 float32，与逐步计算的误差在 1e-6 量级
+        values = np.arange(256, dtype=np.float64) / 255.0
+        self._lut = np.stack([((values - m) / s) for m, s in zip(mean, std)]).astype(np.float32)
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], size: int = 224) -> "Preprocessor":
+        """按 freshness_config.yaml 的 preprocessing 节（max_size / reduced_decode）创建，与线上推理的解码一致"""
+        return cls(size=size, reduced_decode=cfg.get("reduced_decode", False), max_side=cfg.get("max_size"))
+
+    # ---------------- 解码 ----------------
+
+    def decode(self, image_bytes: bytes) -> Optional[np.ndarray]:
+        """解码为 BGR uint8 图片（按 EXIF 方向转正，最长边不超过 max_side），失败返回 None"""
+        try:
+            return decode_image(image_bytes, max_side=self.max_side,
+                                min_side=self.size if self.reduced_decode else None)
+        except IngestError:
+            return None
+
+    # ---------------- 预处理 ----------------
+
+    def preprocess_into(self, img: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """把一张 BGR uint8 图片预处理后写入 out（形状 (3, size, size)，float32）"""
+        resized = cv2.resize(img, (self.size, self.size))
+        for c in range(3):
+            # 输出第 c 个 RGB 通道对应 BGR 的第 2 - c 个通道
+            np.take(self._lut[c], resized[:, :, 2 - c], out=out[c], mode="clip")
+        return out
+
+    def preprocess(self, img: np.ndarray) -> np.ndarray:
+        """单张预处理，返回新的 (3, size, size) float32 数组"""
+        out = np.empty((3, self.size, self.size), dtype=np.float32)
+        return self.preprocess_into(img, out)
+
+    def batch(self, images: List[np.ndarray]) -> np.ndarray:
+        """
+        批量预处理，写入当前线程的预分配缓冲区并返回 (N, 3, size, size) 视图
+
+        缓冲区会被同一线程的下一次调用覆盖，调用方需在此之前用完（如转成张量）。
+        """
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < len(images):
+            capacity = max(len(images), 1 if buffer is None else buffer.shape[0] * 2)
+            buffer = np.empty((capacity, 3, self.size, self.size), dtype=np.float32)
+            self._local.buffer = buffer
+        for i, img in enumerate(images):
+            self.preprocess_into(img, buffer[i])
+        return buffer[:len(images)]
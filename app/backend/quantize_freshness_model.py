@@ -0,0 +1,252 @@
+# app/backend/quantize_freshness_model.py
+"""
+新鲜度模型的后训练量化（PTQ）与精度/速度对比报告
+
+用法：
+    # 先用 export_freshness_model 导出 FP32 ONNX，再用样例图片校准生成 INT8 模型
+    python -m app.backend.quantize_freshness_model \\
+        --onnx ./models/freshness_model.onnx \\
+        --calib-dir ./dataset/train \\
+        --output ./models/freshness_model_int8.onnx --fp16 \\
+        --report ./models/quantization_report.json
+
+校准目录与 train_freshness_model.py 的数据集结构相同：<calib-dir>/<类别>/*.jpg。
+类别目录名为 fresh / normal / spoiled 时，报告中还会给出各模型的准确率。
+
+量化走 ONNX Runtime 的静态量化（QDQ 格式、权重逐通道 INT8）。Paddle 3.x 的动态图
+PTQ 在导出动态 batch 的静态图时会失败，因此不用它。生成的模型由
+FreshnessDetector 的 onnxruntime 后端加载，配置见 freshness_config.yaml：
+inference.precision: int8。
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.backend.config import get_section
+from app.backend.dataset_pack import config_classes
+from app.backend.freshness_backends import OnnxRuntimeBackend
+from app.backend.preprocessing import Preprocessor
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def list_images(dataset_dir: str, limit: Optional[int] = None) -> List[Tuple[str, Optional[int]]]:
+    """
+    列出 <dataset_dir>/<类别>/ 下的图片，返回 [(路径, 标签下标或 None)]，各类别交替排列
+
+    标签下标与训练一致：freshness_config.yaml 的 labels 顺序，目录名见 training.class_dirs
+    """
+    classes = config_classes()
+    per_class = []
+    for class_name in sorted(os.listdir(dataset_dir)):
+        class_dir = os.path.join(dataset_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        label = classes.index(class_name) if class_name in classes else None
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTS))
+        per_class.append([(os.path.join(class_dir, f), label) for f in files])
+
+    # 各类别交替取样，limit 较小时校准集也能覆盖所有类别
+    images = []
+    for i in range(max((len(c) for c in per_class), default=0)):
+        images.extend(c[i] for c in per_class if i < len(c))
+    return images[:limit] if limit else images
+
+
+def serving_preprocessor() -> Preprocessor:
+    """与线上推理相同的解码与预处理（EXIF 转正、max_size、缩小解码，见 freshness_config.yaml 的 preprocessing 节）"""
+    return Preprocessor.from_config(get_section("freshness_config", "preprocessing"))
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def iter_batches(paths: List[str], batch_size: int,
+                 preprocessor: Preprocessor) -> Iterator[Tuple[np.ndarray, List[int]]]:
+    """
+    按 batch_size 读取并预处理图片，产出 (NCHW float32 批, 各张图在 paths 中的下标)
+
+    无法解码的图片跳过并记日志，下标用来把预测对回原来的标签。
+    解码走 preprocessor.decode（即 ingest.decode_image），校准 / 评估看到的图与线上一致
+    """
+    for start in range(0, len(paths), batch_size):
+        decoded, kept = [], []
+        for i in range(start, min(start + batch_size, len(paths))):
+            img = preprocessor.decode(_read(paths[i]))
+            if img is None:
+                logger.warning(f"跳过无法解码的图片: {paths[i]}")
+                continue
+            decoded.append(img)
+            kept.append(i)
+        if decoded:
+            yield preprocessor.batch(decoded).copy(), kept
+
+
+def quantize_int8(onnx_path: str,
+                  output_path: str,
+                  calib_dir: str,
+                  batch_size: int = 8,
+                  limit: Optional[int] = 256,
+                  per_channel: bool = True) -> str:
+    """用校准图片对 FP32 ONNX 模型做静态 INT8 量化"""
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                              quant_pre_process, quantize_static)
+    except ImportError:
+        raise RuntimeError("未安装 onnxruntime，无法量化：pip install onnxruntime")
+
+    paths = [p for p, _ in list_images(calib_dir, limit)]
+    if not paths:
+        raise ValueError(f"校准目录中没有图片: {calib_dir}")
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    preprocessor = serving_preprocessor()
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = iter_batches(paths, batch_size, preprocessor)
+
+        def get_next(self):
+            item = next(self._batches, None)
+            return None if item is None else {input_name: item[0]}
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    prepared = output_path + ".pre.onnx"
+    quant_pre_process(onnx_path, prepared)
+    try:
+        quantize_static(prepared, output_path, _Reader(),
+                        quant_format=QuantFormat.QDQ,
+                        per_channel=per_channel,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8)
+    finally:
+        os.remove(prepared)
+    logger.info(f"INT8 模型已生成: {output_path}（校准图片 {len(paths)} 张）")
+    return output_path
+
+
+def convert_fp16(onnx_path: str, output_path: str) -> str:
+    """把 FP32 ONNX 模型的权重和计算转为 FP16（输入输出保持 FP32），主要用于 GPU"""
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    model = convert_float_to_float16(onnx.load(onnx_path), keep_io_types=True)
+    onnx.save(model, output_path)
+    logger.info(f"FP16 模型已生成: {output_path}")
+    return output_path
+
+
+def _rss_mb() -> Optional[float]:
+    """当前进程常驻内存（MB），无法获取时返回 None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def build_report(variants: Dict[str, str],
+                 dataset_dir: str,
+                 limit: Optional[int] = 512,
+                 batch_size: int = 8,
+                 cpu_threads: int = 4,
+                 runs: int = 20) -> Dict[str, Dict[str, object]]:
+    """
+    对比各精度模型：与第一个模型（FP32 基准）的 top-1 一致率、准确率、延迟和内存
+
+    Args:
+        variants: {"fp32": 路径, "int8": 路径, ...}，第一个作为基准
+        dataset_dir: 评估图片目录（<类别>/*.jpg）
+    """
+    images = list_images(dataset_dir, limit)
+    paths = [p for p, _ in images]
+    labels = np.array([-1 if label is None else label for _, label in images])
+    preprocessor = serving_preprocessor()
+    items = list(iter_batches(paths, batch_size, preprocessor))
+    if not items:
+        raise ValueError(f"评估目录中没有图片: {dataset_dir}")
+    batches = [batch for batch, _ in items]
+    # 只对成功解码的图片打分，标签按下标取，坏图不会让后面的预测错位
+    labels = labels[[i for _, kept in items for i in kept]]
+    single = batches[0][:1]
+
+    report: Dict[str, Dict[str, object]] = {}
+    reference = None
+    for name, path in variants.items():
+        rss_before = _rss_mb()
+        backend = OnnxRuntimeBackend(path, cpu_threads=cpu_threads)
+        rss_after = _rss_mb()
+        preds = np.concatenate([backend(b).argmax(1) for b in batches])
+        if reference is None:
+            reference = preds
+
+        backend(single)
+        start = time.perf_counter()
+        for _ in range(runs):
+            backend(single)
+        latency_single = (time.perf_counter() - start) / runs
+        start = time.perf_counter()
+        for _ in range(max(1, runs // 4)):
+            backend(batches[0])
+        latency_batch = (time.perf_counter() - start) / max(1, runs // 4)
+
+        known = labels >= 0
+        report[name] = {
+            "model_size_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+            "session_rss_mb": (round(rss_after - rss_before, 1)
+                               if rss_before is not None and rss_after is not None else None),
+            "top1_agreement_vs_fp32": round(float((preds == reference).mean()), 4),
+            "accuracy": round(float((preds[known] == labels[known]).mean()), 4) if known.any() else None,
+            "latency_ms_batch1": round(latency_single * 1000, 3),
+            "latency_ms_per_image_batch": round(latency_batch * 1000 / len(batches[0]), 3),
+            "images": int(len(preds)),
+        }
+        del backend
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="新鲜度模型 INT8/FP16 量化与对比报告")
+    parser.add_argument("--onnx", default="./models/freshness_model.onnx", help="FP32 ONNX 模型")
+    parser.add_argument("--calib-dir", default="./dataset/train", help="校准图片目录（<类别>/*.jpg）")
+    parser.add_argument("--eval-dir", default=None, help="评估图片目录，默认同 --calib-dir")
+    parser.add_argument("--output", default="./models/freshness_model_int8.onnx", help="INT8 模型输出路径")
+    parser.add_argument("--calib-limit", type=int, default=256, help="最多使用的校准图片数")
+    parser.add_argument("--fp16", action="store_true", help="同时生成 FP16 模型")
+    parser.add_argument("--report", default=None, help="对比报告 JSON 输出路径")
+    parser.add_argument("--cpu-threads", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    variants = {"fp32": args.onnx,
+                "int8": quantize_int8(args.onnx, args.output, args.calib_dir, limit=args.calib_limit)}
+    if args.fp16:
+        variants["fp16"] = convert_fp16(args.onnx, os.path.splitext(args.output)[0].replace("_int8", "") + "_fp16.onnx")
+
+    report = build_report(variants, args.eval_dir or args.calib_dir, cpu_threads=args.cpu_threads)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
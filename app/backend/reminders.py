@@ -0,0 +1,340 @@
+# app/backend/reminders.py
+"""
+到期提醒：每天算出"纯牛奶将在 3 天后过期"并推送
+
+- 集合查询：提醒提前量（如 0/3/7 天）把剩余天数分成区间 [0,0]、[1,3]、[4,7]，每个区间一条
+  INSERT OR IGNORE ... SELECT，按到期日范围扫 idx_items_expiry；不逐用户循环，也不扫全部食品
+- 去重：reminders 表对 (item_id, lead_days, expiry_date) 唯一，同一条提醒只生成一次；
+  改了到期日的食品按新日期重新提醒
+- 投递：生成的提醒先落表（delivered_at 为空），再分批交给 sink，成功后标记已投递；
+  进程重启后从未投递的记录继续（至少投递一次）
+- 漏跑的日子不用补：区间按"今天的剩余天数"划分，重启后的第一次运行自然覆盖
+
+用法：
+    python -m app.backend.reminders run                  # 按 service_config.yaml 跑一次
+    python -m app.backend.reminders run --date 2024-06-01
+    python -m app.backend.reminders loop --interval 3600
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.backend.config import get_section
+from app.backend.inventory import InventoryStore, get_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEAD_DAYS = (0, 3, 7)
+SINKS = ("file", "queue", "log")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    expiry_date TEXT NOT NULL,
+    lead_days INTEGER NOT NULL,
+    days_left INTEGER NOT NULL,
+    due_date TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    delivered_at REAL,
+    UNIQUE (item_id, lead_days, expiry_date)
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders (id) WHERE delivered_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_reminders_expiry ON reminders (expiry_date);
+CREATE TABLE IF NOT EXISTS reminder_settings (
+    user_id TEXT PRIMARY KEY,
+    lead_days TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reminder_settings_leads ON reminder_settings (lead_days);
+CREATE TABLE IF NOT EXISTS reminder_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_INSERT = """
+INSERT OR IGNORE INTO reminders (item_id, user_id, name, expiry_date, lead_days, days_left, due_date, created_at)
+SELECT id, user_id, name, expiry_date, ?, CAST(julianday(expiry_date) - julianday(?) AS INTEGER), ?, ?
+FROM items
+WHERE status = 'active' AND expiry_date >= ? AND expiry_date <= ? AND {users}
+"""
+
+_REMINDER_COLUMNS = "id, item_id, user_id, name, expiry_date, lead_days, days_left, due_date, created_at, delivered_at"
+
+
+def normalize_lead_days(lead_days: Iterable[int]) -> Tuple[int, ...]:
+    """去重、升序；提前量须在 0~365 天之间"""
+    leads = tuple(sorted({int(d) for d in lead_days}))
+    if not leads or leads[0] < 0 or leads[-1] > 365:
+        raise ValueError(f"提醒提前量须为 0~365 天且至少一个: {list(lead_days)}")
+    return leads
+
+
+def lead_bands(lead_days: Iterable[int]) -> List[Tuple[int, int, int]]:
+    """提前量 → 剩余天数区间 [(lo, hi, lead)]：(0,3,7) → [(0,0,0), (1,3,3), (4,7,7)]"""
+    bands, low = [], 0
+    for lead in normalize_lead_days(lead_days):
+        bands.append((low, lead, lead))
+        low = lead + 1
+    return bands
+
+
+def format_message(name: str, days_left: int) -> str:
+    if days_left <= 0:
+        return f"{name}今天过期"
+    return f"{name}将在{days_left}天后过期"
+
+
+# ---------------- 投递目标 ----------------
+
+class JsonlFileSink:
+    """追加写入 JSON Lines 文件（推送服务的本地替身，可由其它进程 tail 消费）"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+
+    def send(self, reminders: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in reminders)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class QueueSink:
+    """放进进程内队列，由消费者取走；队列满时等待 timeout 秒后失败，提醒留待下次投递"""
+
+    def __init__(self, maxsize: int = 0, timeout: float = 1.0):
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize)
+        self.timeout = timeout
+
+    def send(self, reminders: List[Dict[str, Any]]) -> None:
+        for reminder in reminders:
+            self.queue.put(reminder, timeout=self.timeout)
+
+
+class LogSink:
+    """只写日志（调试用）"""
+
+    def send(self, reminders: List[Dict[str, Any]]) -> None:
+        for reminder in reminders:
+            logger.info(f"到期提醒 [{reminder['user_id']}] {reminder['message']}")
+
+
+def create_sink(kind: str, options: Optional[Dict[str, Any]] = None):
+    """
+    按名称创建投递目标；自定义推送只需实现 send(reminders: List[Dict]) 并直接传给 ReminderEngine
+
+    Args:
+        kind: "file" | "queue" | "log"
+        options: file 需要 sink_path；queue 可选 queue_size
+    """
+    options = options or {}
+    if kind == "file":
+        return JsonlFileSink(options.get("sink_path") or "./data/reminders.jsonl")
+    if kind == "queue":
+        return QueueSink(options.get("queue_size", 0))
+    if kind == "log":
+        return LogSink()
+    raise ValueError(f"不支持的提醒投递方式: {kind}，可选 {SINKS}")
+
+
+# ---------------- 引擎 ----------------
+
+class ReminderEngine:
+    """到期提醒的计算、去重与投递（与食品库存共用同一个 SQLite 数据库）"""
+
+    def __init__(self,
+                 store: InventoryStore,
+                 sink,
+                 lead_days: Iterable[int] = DEFAULT_LEAD_DAYS,
+                 batch_size: int = 500,
+                 retention_days: int = 90):
+        """
+        Args:
+            store: 食品库存
+            sink: 投递目标，任何带 send(reminders) 方法的对象
+            lead_days: 默认提前量（天），用户可在 reminder_settings 里自定义
+            batch_size: 每次交给 sink 的提醒条数
+            retention_days: 到期超过这么多天的提醒记录被清理
+        """
+        self.store = store
+        self.sink = sink
+        self.lead_days = normalize_lead_days(lead_days)
+        self.batch_size = max(1, int(batch_size))
+        self.retention_days = int(retention_days)
+        self._run_lock = threading.Lock()
+        with store.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_config(cls, store: InventoryStore, cfg: Dict[str, Any]) -> "ReminderEngine":
+        """按配置节（lead_days / sink / sink_path / batch_size / retention_days）创建"""
+        return cls(store,
+                   create_sink(cfg.get("sink", "file"), cfg),
+                   lead_days=cfg.get("lead_days") or DEFAULT_LEAD_DAYS,
+                   batch_size=cfg.get("batch_size", 500),
+                   retention_days=cfg.get("retention_days", 90))
+
+    # ---------------- 用户设置 ----------------
+
+    def get_lead_days(self, user_id: str) -> List[int]:
+        with self.store.pool.connection() as conn:
+            row = conn.execute("SELECT lead_days FROM reminder_settings WHERE user_id = ?", (user_id,)).fetchone()
+        return [int(d) for d in row[0].split(",")] if row else list(self.lead_days)
+
+    def set_lead_days(self, user_id: str, lead_days: Optional[Iterable[int]]) -> List[int]:
+        """设置用户的提前量；None 恢复默认"""
+        with self.store.pool.transaction() as conn:
+            if lead_days is None:
+                conn.execute("DELETE FROM reminder_settings WHERE user_id = ?", (user_id,))
+                return list(self.lead_days)
+            leads = normalize_lead_days(lead_days)
+            # 规范化后的字符串作为分组键：提前量相同的用户共用一组集合查询
+            conn.execute("INSERT OR REPLACE INTO reminder_settings (user_id, lead_days) VALUES (?, ?)",
+                         (user_id, ",".join(map(str, leads))))
+        return list(leads)
+
+    # ---------------- 计算 / 投递 ----------------
+
+    def compute(self, today: Optional[date] = None) -> int:
+        """生成今天到期区间内、尚未生成过的提醒，返回新增条数"""
+        today = today or date.today()
+        day, now = today.isoformat(), time.time()
+        created = 0
+        with self.store.pool.transaction() as conn:
+            groups = [(self.lead_days, "user_id NOT IN (SELECT user_id FROM reminder_settings)", ())]
+            for (key,) in conn.execute("SELECT DISTINCT lead_days FROM reminder_settings").fetchall():
+                groups.append((tuple(int(d) for d in key.split(",")),
+                               "user_id IN (SELECT user_id FROM reminder_settings WHERE lead_days = ?)", (key,)))
+            for leads, users, params in groups:
+                sql = _INSERT.format(users=users)
+                for low, high, lead in lead_bands(leads):
+                    cursor = conn.execute(sql, (lead, day, day, now,
+                                                (today + timedelta(days=low)).isoformat(),
+                                                (today + timedelta(days=high)).isoformat(), *params))
+                    created += cursor.rowcount
+            if self.retention_days >= 0:
+                conn.execute("DELETE FROM reminders WHERE expiry_date < ?",
+                             ((today - timedelta(days=self.retention_days)).isoformat(),))
+            conn.execute("INSERT OR REPLACE INTO reminder_state (key, value) VALUES ('last_computed_date', ?)", (day,))
+        return created
+
+    def deliver(self) -> int:
+        """把未投递的提醒按批交给 sink；sink 出错时停止，剩下的留待下次，返回本次投递条数"""
+        delivered = 0
+        while True:
+            with self.store.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT {_REMINDER_COLUMNS} FROM reminders WHERE delivered_at IS NULL ORDER BY id LIMIT ?",
+                    (self.batch_size,)).fetchall()
+            if not rows:
+                return delivered
+            batch = [self._payload(row) for row in rows]
+            try:
+                self.sink.send(batch)
+            except Exception as e:
+                logger.error(f"到期提醒投递失败，{len(batch)} 条留待下次: {e}")
+                return delivered
+            now = time.time()
+            with self.store.pool.transaction() as conn:
+                conn.executemany("UPDATE reminders SET delivered_at = ? WHERE id = ?", [(now, r["id"]) for r in batch])
+            delivered += len(batch)
+
+    def run_once(self, today: Optional[date] = None) -> Dict[str, Any]:
+        """计算 + 投递一轮（同一进程内串行）"""
+        today = today or date.today()
+        with self._run_lock:
+            started = time.perf_counter()
+            created = self.compute(today)
+            delivered = self.deliver()
+        result = {"date": today.isoformat(), "created": created, "delivered": delivered,
+                  "seconds": round(time.perf_counter() - started, 3)}
+        logger.info(f"到期提醒: {result}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """待投递条数、上次计算日期、默认提前量"""
+        with self.store.pool.connection() as conn:
+            pending = conn.execute("SELECT COUNT(*) FROM reminders WHERE delivered_at IS NULL").fetchone()[0]
+            row = conn.execute("SELECT value FROM reminder_state WHERE key = 'last_computed_date'").fetchone()
+        return {"pending": pending, "last_computed_date": row[0] if row else None, "lead_days": list(self.lead_days)}
+
+    def list_reminders(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """用户最近的提醒（站内消息列表），新的在前"""
+        with self.store.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {_REMINDER_COLUMNS} FROM reminders WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, max(1, min(int(limit), self.store.max_page_size)))).fetchall()
+        return [self._payload(row) for row in rows]
+
+    @staticmethod
+    def _payload(row) -> Dict[str, Any]:
+        reminder = dict(row)
+        reminder["message"] = format_message(reminder["name"], reminder["days_left"])
+        return reminder
+
+
+async def reminder_loop(engine: ReminderEngine, interval: float) -> None:
+    """每 interval 秒运行一轮；在库存连接池线程里执行，不阻塞事件循环"""
+    while True:
+        try:
+            await engine.store.run(engine.run_once)
+        except Exception as e:
+            logger.error(f"到期提醒运行失败: {e}")
+        await asyncio.sleep(interval)
+
+
+def _config() -> Dict[str, Any]:
+    return get_section("service_config", "reminders")
+
+
+_engine: Optional[ReminderEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ReminderEngine:
+    """全局提醒引擎（首次调用时按 service_config.yaml 的 reminders 节创建）"""
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ReminderEngine.from_config(get_store(), _config())
+    return _engine
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="食品到期提醒")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="计算并投递一轮")
+    run.add_argument("--date", default=None, help="按哪一天计算（YYYY-MM-DD），默认今天")
+    loop = sub.add_parser("loop", help="按固定间隔持续运行")
+    loop.add_argument("--interval", type=float, default=None, help="间隔秒数，默认 reminders.interval_seconds")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    engine = get_engine()
+    if args.command == "run":
+        today = date.fromisoformat(args.date) if args.date else None
+        print(json.dumps(engine.run_once(today), ensure_ascii=False))
+    else:
+        interval = args.interval or _config().get("interval_seconds", 3600)
+        try:
+            asyncio.run(reminder_loop(engine, interval))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# app/backend/startup.py
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def detect_device(preferred: str = "auto") -> str:
+    """
+    选择推理设备
+
+    preferred 为 "gpu"/"cpu" 时原样返回；为 "auto" 时，Paddle 编译了 CUDA
+    且能看到至少一张显卡才用 GPU，否则用 CPU。
+    """
+    if preferred and preferred != "auto":
+        return preferred
+    try:
+        import paddle
+        if paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0:
+            return "gpu"
+    except Exception as e:
+        logger.warning(f"检测 GPU 失败，使用 CPU: {e}")
+    return "cpu"
+
+
+class StartupReport:
+    """
+    启动耗时报告
+
+    按组件记录各阶段耗时（秒）：import（导入框架）、weight_load（构建模型、
+    加载权重）、warmup（首次推理）。
+    """
+
+    def __init__(self):
+        self.mode = "lazy"
+        self._phases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, component: str, phase: str, seconds: float) -> None:
+        with self._lock:
+            self._phases.setdefault(component, {})[phase] = round(seconds, 4)
+        logger.info(f"[startup] {component}.{phase}: {seconds:.3f}s")
+
+    @contextmanager
+    def measure(self, component: str, phase: str):
+        """计时上下文：with startup_report.measure("ocr", "weight_load"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, phase, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(phases) for name, phases in self._phases.items()}
+        total = sum(sum(phases.values()) for phases in components.values())
+        return {"mode": self.mode, "components": components, "total_s": round(total, 4)}
+
+
+# 进程级单例
+startup_report = StartupReport()
+
+
+# ---------------- fork 之后的重新初始化 ----------------
+# 子进程只继承调用 fork 的那个线程：线程池、后台线程都不存在了，锁可能停在被别的线程持有的状态。
+# 持有这类状态的对象调用 register_after_fork(self)，fork 出的子进程里会调用它的 _after_fork()。
+
+_after_fork_objects: "weakref.WeakSet" = weakref.WeakSet()
+# 从父进程继承、子进程里不能使用也不能关闭的对象（如 SQLite 连接：关闭会动到父进程的锁和 WAL），只保留引用
+_inherited: List[Any] = []
+
+
+def register_after_fork(obj: Any) -> None:
+    """fork 出的子进程里调用 obj._after_fork()（obj 被回收后自动失效）"""
+    _after_fork_objects.add(obj)
+
+
+def keep_inherited(obj: Any) -> None:
+    """保留继承来的对象，避免子进程里被回收时触发关闭"""
+    _inherited.append(obj)
+
+
+def _run_after_fork() -> None:
+    for obj in list(_after_fork_objects):
+        try:
+            obj._after_fork()
+        except Exception as e:
+            logger.error(f"fork 后重新初始化 {type(obj).__name__} 失败: {e}")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_run_after_fork)
@@ -1,24 +1,154 @@
 # train_freshness_model.py
-from paddleclas import PaddleClasTrainer
-
-# 准备数据集（目录结构）
-# dataset/
-#   train/
-#     fresh/
-#     normal/
-#     spoiled/
-#   val/
-#     fresh/
-#     normal/
-#     spoiled/
-
-trainer = PaddleClasTrainer(
-    model_name="ResNet50_vd",
-    dataset_dir="./dataset",
-    num_classes=3,
-    epochs=20,
-    batch_size=32
-)
-
-trainer.train()
-trainer.export_model("./models/freshness_model")
\ No newline at end of file
+"""
+训练新鲜度模型
+
+准备数据集（目录结构）：
+    dataset/
+      train/
+        fresh/
+        normal/
+        spoiled/
+      val/
+        fresh/
+        normal/
+        spoiled/
+
+用法：
+    python -m app.backend.train_freshness_model                  # 打包（源目录没变则跳过）后用分片训练
+    python -m app.backend.train_freshness_model --epochs 5 --num-workers 8
+    python -m app.backend.train_freshness_model --trainer paddleclas   # 旧方式：PaddleClas 直接读 JPEG 目录
+
+分片训练得到 mobilenet_v3_large 的动态图权重（freshness_config.yaml 的 model.weights_path），
+即 eager 后端加载的模型；再用 python -m app.backend.export_freshness_model 导出推理产物。
+类别数和顺序取 freshness_config.yaml 的 labels（线上检测器按它解释输出），各标签的目录名见
+training.class_dirs，数据集目录与之不一致时报错。
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from app.backend.config import get_section
+from app.backend.dataset_pack import PackedLoader, model_classes, pack_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def train_paddleclas(dataset_dir: str, epochs: int, batch_size: int, num_classes: int) -> None:
+    """旧方式：PaddleClasTrainer 每个 epoch 直接读 JPEG 目录"""
+    from paddleclas import PaddleClasTrainer
+
+    trainer = PaddleClasTrainer(
+        model_name="ResNet50_vd",
+        dataset_dir=dataset_dir,
+        num_classes=num_classes,
+        epochs=epochs,
+        batch_size=batch_size
+    )
+    trainer.train()
+    trainer.export_model("./models/freshness_model")
+
+
+def evaluate(model, loader: PackedLoader) -> float:
+    """验证集 top-1 准确率"""
+    import paddle
+
+    model.eval()
+    correct = total = 0
+    with paddle.no_grad():
+        for images, labels in loader:
+            logits = model(paddle.to_tensor(images))
+            correct += int((logits.argmax(axis=1).numpy() == labels).sum())
+            total += len(labels)
+    model.train()
+    return correct / max(1, total)
+
+
+def train_packed(cfg: Dict[str, Any], output: str) -> Dict[str, Any]:
+    """打包数据集（源目录没变时跳过），再用多进程加载器训练 mobilenet_v3_large"""
+    import paddle
+    from paddle.vision.models import mobilenet_v3_large
+
+    labels = get_section("freshness_config", "labels")
+    packed_dir = cfg.get("packed_dir", "./data/freshness_packed")
+    packed = pack_dataset(cfg.get("dataset_dir", "./dataset"), packed_dir,
+                          size=cfg.get("pack_size", 256), shard_size=cfg.get("shard_size", 2048),
+                          geometry=cfg.get("geometry", "stretch"),
+                          classes=model_classes(labels, cfg.get("class_dirs") or {}))
+    if "train" not in packed:
+        raise FileNotFoundError(f"找不到训练集: {os.path.join(cfg.get('dataset_dir', './dataset'), 'train')}")
+    classes = packed["train"]["classes"]
+    logger.info(f"类别: {dict(zip(labels, classes))}, 训练集 {packed['train']['count']} 张")
+
+    paddle.seed(cfg.get("seed", 0))
+    model = mobilenet_v3_large(pretrained=False, num_classes=len(classes))
+    optimizer = paddle.optimizer.Adam(learning_rate=cfg.get("learning_rate", 0.001), parameters=model.parameters())
+    loss_fn = paddle.nn.CrossEntropyLoss()
+
+    train_loader = PackedLoader.from_config(os.path.join(packed_dir, "train"), cfg, train=True)
+    val_loader = (PackedLoader.from_config(os.path.join(packed_dir, "val"), cfg, train=False)
+                  if "val" in packed else None)
+    history = []
+    try:
+        for epoch in range(cfg.get("epochs", 20)):
+            started = time.perf_counter()
+            wait = 0.0
+            losses = []
+            t = time.perf_counter()
+            for images, labels in train_loader:
+                wait += time.perf_counter() - t
+                # 转成张量时拷贝出共享内存，之后槽位就可以交给下一批
+                loss = loss_fn(model(paddle.to_tensor(images)), paddle.to_tensor(labels))
+                loss.backward()
+                optimizer.step()
+                optimizer.clear_grad()
+                losses.append(float(loss))
+                t = time.perf_counter()
+            elapsed = time.perf_counter() - started
+            record = {"epoch": epoch, "loss": round(float(np.mean(losses)), 4) if losses else None,
+                      "epoch_s": round(elapsed, 2), "data_wait_s": round(wait, 2)}
+            if val_loader is not None:
+                record["val_acc"] = round(evaluate(model, val_loader), 4)
+            logger.info(f"epoch {epoch}: {record}")
+            history.append(record)
+    finally:
+        train_loader.close()
+        if val_loader is not None:
+            val_loader.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    paddle.save(model.state_dict(), output)
+    logger.info(f"模型权重已保存: {output}")
+    return {"classes": classes, "history": history, "weights": output}
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    cfg = dict(get_section("freshness_config", "training"))
+    parser = argparse.ArgumentParser(description="训练新鲜度模型")
+    parser.add_argument("--trainer", choices=("packed", "paddleclas"), default="packed",
+                        help="packed：打包分片 + 多进程加载（默认）；paddleclas：直接读 JPEG 目录")
+    parser.add_argument("--epochs", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--num-workers", type=int, default=None, help="数据加载进程数")
+    parser.add_argument("--output", default=get_section("freshness_config", "model").get(
+        "weights_path", "./models/freshness_model.pdparams"), help="权重输出路径")
+    args = parser.parse_args(argv)
+
+    # 导入 paddle 会改掉根日志器的级别和处理器：先导入，再配置日志
+    import paddle  # noqa: F401
+    logging.basicConfig(level=logging.INFO, force=True)
+    for key in ("epochs", "batch_size", "num_workers"):
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+    if args.trainer == "paddleclas":
+        train_paddleclas(cfg.get("dataset_dir", "./dataset"), cfg.get("epochs", 20), cfg.get("batch_size", 32),
+                         len(get_section("freshness_config", "labels")) or 3)
+    else:
+        train_packed(cfg, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,46 +7,850 @@
 #    return {"msg": "Hello, Smart Food Manager!"}
 #-------------------------------------------------------------------------------------
 #启动命令uvicorn app.main:app --reload
+#多 worker（模型只加载一次，worker 间共享）：python -m app.backend.prefork serve --workers 4
 # app/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from app.backend.ocr import do_ocr
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Union
+import cv2
+import numpy as np
+from datetime import date
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request, Response, Body
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app.backend.ocr import do_ocr, do_ocr_batch, ocr_items, ocr_roi
+from app.backend.config import get_section
+from app.backend.executor import InferenceExecutor, ExecutorBusyError
+from app.backend.startup import detect_device, startup_report
+from app.backend.prefork import memory_report
+from app.backend.cache import ResultCache, content_key
+from app.backend.ingest import ImageIngestor, IngestError, RequestSizeLimitMiddleware
+from app.backend.ingredients import analyze_items, analyze_text, get_matcher
+from app.backend.date_extractor import extract_dates
+from app.backend.inventory import close_store, get_store
+from app.backend.reminders import get_engine, reminder_loop
+from app.backend.analytics import analytics_loop, close_analytics, get_analytics
+from app.backend.embedding_index import close_index, current_index, get_index
+from app.backend.jobs import (IdempotencyConflictError, JobQueueFullError, JobWorker, close_job_queue,
+                              get_job_queue)
+from app.backend.metrics import (REGISTRY, MetricsMiddleware, format_histogram, format_sample,
+                                 observe_image, stage)
+
+logger = logging.getLogger(__name__)
+
+
+def _warmup() -> None:
+    """启动预热：加载两个模型并各做一次推理，计入启动报告"""
+    _, buf = cv2.imencode(".jpg", np.full((224, 224, 3), 255, dtype=np.uint8))
+    blank = buf.tobytes()
+    try:
+        with startup_report.measure("ocr", "warmup"):
+            do_ocr(blank)
+    except Exception as e:
+        logger.error(f"OCR 预热失败: {e}")
+    try:
+        detector = get_freshness_detector()
+        with startup_report.measure("freshness", "warmup"):
+            detector.predict(blank)
+    except Exception as e:
+        logger.error(f"新鲜度检测器预热失败: {e}")
+    try:
+        with startup_report.measure("ingredients", "load"):
+            get_matcher()
+    except Exception as e:
+        logger.error(f"配料词典加载失败: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # startup.mode=warmup 时在开始接收请求前加载并预热模型，否则首个请求时懒加载；
+    # 由 prefork 启动器 fork 出的 worker，模型已在父进程里加载并预热过
+    if startup_report.mode != "prefork":
+        startup_report.mode = get_section("service_config", "startup").get("mode", "lazy")
+        if startup_report.mode == "warmup":
+            await asyncio.to_thread(_warmup)
+    logger.info(f"启动耗时报告: {startup_report.as_dict()}")
+    reminder_task = None
+    _reminders_cfg = get_section("service_config", "reminders")
+    if _reminders_cfg.get("enabled", False):
+        reminder_task = asyncio.create_task(reminder_loop(get_engine(), _reminders_cfg.get("interval_seconds", 3600)))
+    analytics_task = None
+    if _analytics_cfg.get("enabled", True):
+        # 建好 items 上的汇总触发器后再接收库存写入
+        analytics = await asyncio.to_thread(get_analytics)
+        analytics_task = asyncio.create_task(analytics_loop(analytics, _analytics_cfg.get("flush_interval", 5)))
+    job_task = None
+    if _jobs_cfg.get("worker", True):
+        job_task = asyncio.create_task(JobWorker.from_config(get_job_queue(), JOB_HANDLERS, _jobs_cfg,
+                                                             on_success=_record_job).run_forever())
+    yield
+    for task in (reminder_task, analytics_task, job_task):
+        if task is not None:
+            task.cancel()
+    if freshness_batcher is not None:
+        freshness_batcher.close(timeout=5)
+    ocr_executor.shutdown(wait=False)
+    freshness_executor.shutdown(wait=False)
+    for cache in (ocr_cache, freshness_cache):
+        if cache is not None:
+            cache.close()
+    close_analytics()
+    close_store()
+    close_index()
+    close_job_queue()
+
+
+app = FastAPI(title="智能食品管家 OCR 服务", lifespan=lifespan)
+
+# 请求耗时与分阶段计时（见 service_config.yaml 的 metrics 节），/metrics 输出 Prometheus 格式
+_metrics_cfg = get_section("service_config", "metrics")
+if _metrics_cfg.get("enabled", True):
+    app.add_middleware(MetricsMiddleware, server_timing=_metrics_cfg.get("server_timing", False))
+
+# 图片接入限制：单文件字节数、文件头像素数、整个请求体大小（见 service_config.yaml 的 ingest 节）
+_ingest_cfg = get_section("service_config", "ingest")
+ingestor = ImageIngestor.from_config(_ingest_cfg)
+if _ingest_cfg.get("max_request_bytes"):
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=_ingest_cfg["max_request_bytes"])
+
+# 推理执行器：阻塞推理不在事件循环里跑，队列满时返回 503（见 service_config.yaml）
+_executor_cfg = get_section("service_config", "executors")
+ocr_executor = InferenceExecutor.from_config("ocr", _executor_cfg.get("ocr") or {})
+
+
+# 结果缓存：按图片内容 + 模型版本寻址，重复上传直接返回（见 service_config.yaml 的 cache 节）
+_cache_cfg = get_section("service_config", "cache")
+
+
+def _make_cache(name: str) -> Optional[ResultCache]:
+    if not _cache_cfg.get("enabled", True):
+        return None
+    return ResultCache(name,
+                       max_entries=_cache_cfg.get("max_entries", 2048),
+                       max_bytes=_cache_cfg.get("max_bytes", 64 * 1024 * 1024),
+                       ttl_seconds=_cache_cfg.get("ttl_seconds", 86400),
+                       disk_path=_cache_cfg.get("disk_path"),
+                       max_disk_entries=_cache_cfg.get("max_disk_entries", 200000))
+
+
+ocr_cache = _make_cache("ocr")
+freshness_cache = _make_cache("freshness")
+
+
+def _cached_ocr(img_bytes: bytes) -> str:
+    """带缓存的 OCR：同一张图片（同一 OCR 版本）只识别一次"""
+    if ocr_cache is None:
+        return do_ocr(img_bytes)
+    key = content_key(img_bytes, _cache_cfg.get("ocr_version", "paddleocr:ch"))
+    return ocr_cache.get_or_compute(key, lambda: do_ocr(img_bytes))
+
+
+def _busy(e: ExecutorBusyError) -> HTTPException:
+    """推理队列已满 → 503 + Retry-After"""
+    return HTTPException(503, "服务繁忙，请稍后重试", headers={"Retry-After": str(e.retry_after)})
+
+
+def _check_batch_size(files: List[UploadFile]) -> None:
+    max_files = _batch_cfg.get("max_files", 64)
+    if len(files) > max_files:
+        raise HTTPException(413, f"单次最多上传 {max_files} 张图片")
+
+
+# 批量上传接口（/ocr/batch、/api/freshness/batch）
+_batch_cfg = get_section("service_config", "batch")
+
+
+async def _read_upload(file: UploadFile, pipeline: str) -> bytes:
+    """
+    分块读取上传文件并检查文件头，计入 read / probe 阶段耗时和图片大小分布
+
+    超过字节上限、格式无法识别或像素数超限时抛出 IngestError，此时还没有解码像素。
+    返回的 ImageBytes 带着文件头信息，之后解码时不再重复解析。
+    """
+    with stage(pipeline, "read"):
+        data = await ingestor.read(file)
+    observe_image(pipeline, num_bytes=len(data))
+    with stage(pipeline, "probe"):
+        ingestor.check(data)
+    return data
+
+
+async def _read_image(file: UploadFile, pipeline: str) -> bytes:
+    """单张上传：不合格的图片在推理前直接返回 4xx"""
+    try:
+        return await _read_upload(file, pipeline)
+    except IngestError as e:
+        raise HTTPException(e.status_code, str(e))
+
+
+# 批量上传的一项：图片字节；None 表示不是图片文件；dict 表示读取时已判定失败的结果
+BatchItem = Union[bytes, Dict[str, Any], None]
+
+
+async def _read_batch(files: List[UploadFile], pipeline: str) -> List[BatchItem]:
+    """读取批量上传的文件；非图片或不合格的文件只让该项报错"""
+    _check_batch_size(files)
+    items: List[BatchItem] = []
+    for f in files:
+        if not (f.content_type or "").startswith("image/"):
+            items.append(None)
+            continue
+        try:
+            items.append(await _read_upload(f, pipeline))
+        except IngestError as e:
+            items.append({"status": "error", "message": str(e)})
+    return items
+
+
+def _run_cached_batch(cache: Optional[ResultCache],
+                      namespace: str,
+                      images: List[BatchItem],
+                      compute: Callable[[List[bytes]], List[Dict[str, Any]]],
+                      to_cache: Callable[[Dict[str, Any]], Any] = lambda r: r,
+                      from_cache: Callable[[Any], Dict[str, Any]] = lambda v: v) -> List[Dict[str, Any]]:
+    """
+    批量推理 + 逐项缓存
+
+    先逐张查缓存；未命中的图片（批内重复的只算一次）一起交给 compute 做一次批量推理，
+    成功的结果写回缓存。to_cache / from_cache 用于和单张接口共用同一份缓存格式。
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    pending: Dict[str, List[int]] = {}
+    for i, image_bytes in enumerate(images):
+        if image_bytes is None:
+            results[i] = {"status": "error", "message": "请上传图片文件"}
+            continue
+        if isinstance(image_bytes, dict):
+            results[i] = image_bytes
+            continue
+        key = content_key(image_bytes, namespace)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[i] = from_cache(cached)
+        else:
+            pending.setdefault(key, []).append(i)
+
+    if pending:
+        keys = list(pending)
+        computed = compute([images[pending[key][0]] for key in keys])
+        for key, result in zip(keys, computed):
+            if cache is not None and result.get("status") == "success":
+                cache.set(key, to_cache(result))
+            for i in pending[key]:
+                results[i] = dict(result)
+    return results
+
+
+def _batch_response(files: List[UploadFile], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    items = [{"index": i, "filename": f.filename, **r} for i, (f, r) in enumerate(zip(files, results))]
+    return {
+        "count": len(items),
+        "succeeded": sum(r["status"] == "success" for r in results),
+        "results": items,
+    }
+
+
+def _cached_ocr_batch(images: List[BatchItem]) -> List[Dict[str, Any]]:
+    """带缓存的批量 OCR，与 /ocr/ 共用缓存（缓存值为识别文本）"""
+    return _run_cached_batch(ocr_cache, _cache_cfg.get("ocr_version", "paddleocr:ch"), images, do_ocr_batch,
+                             to_cache=lambda r: r["text"],
+                             from_cache=lambda text: {"status": "success", "text": text})
+
+
+# 包装识别向量索引：同款包装再次上传时跳过 OCR（见 service_config.yaml 的 embedding_index 节）
+_index_cfg = get_section("service_config", "embedding_index")
+_index_unavailable = False
+
+
+def _indexed_ocr(img_bytes: bytes) -> Dict[str, Any]:
+    """
+    先用新鲜度检测器的骨干网络提取图片特征，在索引里找到足够相似的包装时返回其 OCR 结果（附 index_match），
+    否则跑 OCR 并把结果加入索引
+    """
+    global _index_unavailable
+    if not _index_cfg.get("enabled", False) or _index_unavailable:
+        return {"text": _cached_ocr(img_bytes)}
+    try:
+        detector = get_freshness_detector()
+        vector = detector.embed(img_bytes)
+    except RuntimeError as e:
+        # 检测器不可用或后端不支持提取特征：本进程内不再尝试
+        logger.error(f"包装向量索引不可用，/ocr/ 改为直接识别: {e}")
+        _index_unavailable = True
+        return {"text": _cached_ocr(img_bytes)}
+    except ValueError as e:
+        logger.warning(f"包装特征提取失败，直接 OCR: {e}")
+        return {"text": _cached_ocr(img_bytes)}
+    index = get_index(detector.model_version)
+    with stage("ocr", "index_lookup"):
+        match = index.lookup(vector, _index_cfg.get("match_threshold", 0.95))
+    if match is not None:
+        return {**match["result"], "index_match": {"id": match["id"], "similarity": match["similarity"]}}
+    result = {"text": _cached_ocr(img_bytes)}
+    # 没识别出文字的图片（空白、非包装）不入索引，免得之后把相似的图都匹配成空结果
+    if result["text"].strip():
+        try:
+            index.add(vector, result)
+        except sqlite3.OperationalError as e:
+            # 其他 worker 长时间占着索引的写锁（如正在训练 IVF）：这次不入索引，结果照常返回
+            logger.warning(f"包装向量索引写入失败，跳过: {e}")
+    return result
+
+
+@app.get("/api/ocr/index")
+def ocr_index_stats():
+    """包装向量索引：条目数、维度、IVF 桶数（首个 /ocr/ 请求之前索引尚未打开）"""
+    index = current_index()
+    return {"enabled": _index_cfg.get("enabled", False), **(index.stats() if index is not None else {"count": None})}
 
-app = FastAPI(title="智能食品管家 OCR 服务")
 
 @app.get("/")
 def home():
     return {"msg": "Welcome to Smart Food Manager!"}
 
+
+@app.get("/health")
+def health():
+    """健康检查：不经过推理执行器，推理繁忙时也能及时返回"""
+    return {"status": "ok"}
+
 @app.post("/ocr/")
-async def ocr_endpoint(file: UploadFile = File(...)):
+async def ocr_endpoint(file: UploadFile = File(...), user_id: Optional[str] = None):
     # 1) 简单校验
     if not file.content_type.startswith("image/"):
         raise HTTPException(400, "请上传图片文件")
     # 2) 读取二进制
-    img_bytes = await file.read()
-    # 3) 调用 OCR
+    img_bytes = await _read_image(file, "ocr")
+    # 3) 调用 OCR（在推理执行器中运行，不阻塞事件循环）；启用包装向量索引时见过的包装直接返回上次结果
     try:
-        text = do_ocr(img_bytes)
-        return {"text": text}
+        result = await ocr_executor.run(_indexed_ocr, img_bytes)
+    except ExecutorBusyError as e:
+        raise _busy(e)
     except Exception as e:
         # 出错时返回 500
         raise HTTPException(500, f"OCR 处理失败：{e}")
-    
+    # 4) 带 user_id 时计入饮食报告的扫描次数
+    _record_scans(user_id, "ocr", [result])
+    return result
+
+
+@app.post("/ocr/batch")
+async def ocr_batch_endpoint(files: List[UploadFile] = File(...), user_id: Optional[str] = None):
+    """
+    批量 OCR：一次上传多张图片（表单字段 files），并行解码后整批识别
+
+    Returns:
+        {"count": 3, "succeeded": 2, "results": [
+            {"index": 0, "filename": "a.jpg", "status": "success", "text": "..."},
+            {"index": 1, "filename": "b.txt", "status": "error", "message": "请上传图片文件"}, ...]}
+    """
+    images = await _read_batch(files, "ocr")
+    try:
+        results = await ocr_executor.run(_cached_ocr_batch, images)
+    except ExecutorBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(500, f"OCR 处理失败：{e}")
+    _record_scans(user_id, "ocr", results)
+    return _batch_response(files, results)
+
+# 流式 OCR：逐张识别，每识别完一张就把其中的文本行推给客户端
+_STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _cached_ocr_items(img_bytes: bytes) -> List[Dict[str, Any]]:
+    """带缓存的结构化 OCR（文本、置信度、文本框）"""
+    if ocr_cache is None:
+        return ocr_items(img_bytes)
+    key = content_key(img_bytes, _cache_cfg.get("ocr_version", "paddleocr:ch") + ":items")
+    return ocr_cache.get_or_compute(key, lambda: ocr_items(img_bytes))
+
+
+def _stream_event(event: Dict[str, Any], fmt: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+@app.post("/ocr/stream")
+async def ocr_stream_endpoint(request: Request, fmt: str = Query("ndjson", alias="format")):
+    """
+    流式 OCR：上传多张图片（表单字段 files），按 NDJSON（默认）或 SSE（?format=sse）逐条推送识别结果
+
+    事件依次为：
+        {"event": "line", "image": 0, "filename": "a.jpg", "index": 0, "text": "...", "score": 0.98, "box": [[x, y], ...]}
+        {"event": "image_done", "image": 0, "filename": "a.jpg", "lines": 12}
+        {"event": "error", "image": 1, "filename": "b.jpg", "message": "..."}   # 单张失败不中断
+        {"event": "done", "images": 2, "succeeded": 1}
+
+    图片逐张读取、逐张识别，服务端不会攒下整批结果。表单由本接口自己解析：
+    上传文件（超过 1MB 的落盘）要在流式响应结束后才关闭，不能交给 File 参数。
+    """
+    if fmt not in _STREAM_MEDIA_TYPES:
+        raise HTTPException(400, f"format 只支持 {list(_STREAM_MEDIA_TYPES)}")
+    form = await request.form()
+    files = [f for f in form.getlist("files") if not isinstance(f, str)]
+    if not files:
+        await form.close()
+        raise HTTPException(400, "请上传图片文件")
+    try:
+        _check_batch_size(files)
+    except HTTPException:
+        await form.close()
+        raise
+
+    async def events():
+        try:
+            async for event in _ocr_events(files, fmt):
+                yield event
+        finally:
+            await form.close()
+
+    # 关闭代理缓冲，保证每条结果及时到达客户端
+    return StreamingResponse(events(), media_type=_STREAM_MEDIA_TYPES[fmt],
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def _ocr_events(files: List[UploadFile], fmt: str):
+    """逐张识别并产出流式事件"""
+    succeeded = 0
+    for i, file in enumerate(files):
+        meta = {"image": i, "filename": file.filename}
+        if not (file.content_type or "").startswith("image/"):
+            yield _stream_event({"event": "error", **meta, "message": "请上传图片文件"}, fmt)
+            continue
+        try:
+            img_bytes = await _read_upload(file, "ocr")
+        except IngestError as e:
+            yield _stream_event({"event": "error", **meta, "message": str(e)}, fmt)
+            continue
+        try:
+            items = await ocr_executor.run(_cached_ocr_items, img_bytes)
+        except ExecutorBusyError as e:
+            yield _stream_event({"event": "error", **meta, "message": "服务繁忙，请稍后重试",
+                                 "retry_after": e.retry_after}, fmt)
+            continue
+        except Exception as e:
+            yield _stream_event({"event": "error", **meta, "message": f"OCR 处理失败：{e}"}, fmt)
+            continue
+        for j, item in enumerate(items):
+            yield _stream_event({"event": "line", **meta, "index": j, **item}, fmt)
+        yield _stream_event({"event": "image_done", **meta, "lines": len(items)}, fmt)
+        succeeded += 1
+    yield _stream_event({"event": "done", "images": len(files), "succeeded": succeeded}, fmt)
+
+
+# 配料表分析：OCR 文本行 → 配料项 + 添加剂 / 过敏原匹配（词典见 service_config.yaml 的 ingredients 节）
+_MAX_ANALYZE_CHARS = 20000
+
+
+# ROI 模式：只识别配料表和日期区域（见 service_config.yaml 的 ocr.roi 节）
+_roi_cfg = get_section("service_config", "ocr").get("roi") or {}
+
+
+def _use_roi(roi: Optional[bool]) -> bool:
+    return _roi_cfg.get("enabled", False) if roi is None else roi
+
+
+def _cached_roi(img_bytes: bytes) -> Dict[str, Any]:
+    """带缓存的 ROI OCR"""
+    if ocr_cache is None:
+        return ocr_roi(img_bytes)
+    key = content_key(img_bytes, _cache_cfg.get("ocr_version", "paddleocr:ch") + ":roi")
+    return ocr_cache.get_or_compute(key, lambda: ocr_roi(img_bytes))
+
+
+def _roi_lines(result: Dict[str, Any], region: str) -> List[Dict[str, Any]]:
+    """某一区域的文本行；没找到锚点、退回整页识别时（region 为 None）返回全部行"""
+    return [item for item in result["items"] if item["region"] in (region, None)]
+
+
+def _roi_stats(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: result[key] for key in ("boxes_detected", "boxes_recognized", "boxes_skipped", "anchors_found")}
+
+
+def _ocr_analyze(img_bytes: bytes, roi: Optional[bool] = None) -> Dict[str, Any]:
+    if _use_roi(roi):
+        result = _cached_roi(img_bytes)
+        with stage("ocr", "analyze"):
+            return {**analyze_items(_roi_lines(result, "ingredients")), "roi": _roi_stats(result)}
+    items = _cached_ocr_items(img_bytes)
+    with stage("ocr", "analyze"):
+        return analyze_items(items)
+
+
+@app.post("/ocr/roi")
+async def ocr_roi_endpoint(file: UploadFile = File(...)):
+    """
+    ROI OCR：只识别配料表和生产日期 / 保质期区域
+
+    Returns:
+        {"items": [{"text", "score", "box", "region": "ingredients" | "dates" | null}],
+         "regions": {"ingredients": "配料：…", "dates": "生产日期：…"},
+         "boxes_detected": 57, "boxes_recognized": 9, "boxes_skipped": 48, "anchors_found": true}
+    """
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "请上传图片文件")
+    img_bytes = await _read_image(file, "ocr")
+    try:
+        return await ocr_executor.run(_cached_roi, img_bytes)
+    except ExecutorBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(500, f"OCR 处理失败：{e}")
+
+
+@app.post("/ocr/analyze")
+async def ocr_analyze_endpoint(file: UploadFile = File(...), roi: Optional[bool] = None,
+                               user_id: Optional[str] = None):
+    """
+    配料表分析：识别图片中的文字，切分配料项，匹配添加剂、过敏原和需关注成分
+
+    roi 为 true 时只识别配料表区域（另带 roi 统计），不传时按 ocr.roi.enabled；
+    带 user_id 时计入该用户饮食报告的扫描次数（/ocr/、/ocr/batch、/api/dates、/api/freshness 同）
+
+    Returns:
+        {"text": "...", "lines": [{"text", "score", "box"}],
+         "ingredients": [{"text": "苯甲酸钠", "start": 30, "end": 35, "parent": 3}],
+         "matches": [{"term": "苯甲酸钠", "name": "苯甲酸钠", "category": "additive", "e_number": "E211",
+                      "function": "防腐剂", "risk": "medium", "ingredient": 4, "lines": [2], "boxes": [...], ...}],
+         "additives": [...], "allergens": [{"group": "乳及乳制品", "terms": ["全脂乳粉"]}], "concerns": [...],
+         "warnings": ["含有防腐剂：苯甲酸钠", ...]}
+    """
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "请上传图片文件")
+    img_bytes = await _read_image(file, "ocr")
+    try:
+        result = await ocr_executor.run(_ocr_analyze, img_bytes, roi)
+    except ExecutorBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(500, f"OCR 处理失败：{e}")
+    _record_scans(user_id, "analyze", [result])
+    return result
+
+
+@app.post("/api/ingredients/analyze")
+def ingredients_analyze(text: str = Body(..., embed=True)):
+    """直接分析配料表文本（客户端已有文字，或用户修改了 OCR 结果），返回格式同 /ocr/analyze（无文本框）"""
+    if len(text) > _MAX_ANALYZE_CHARS:
+        raise HTTPException(413, f"文本过长，上限 {_MAX_ANALYZE_CHARS} 字")
+    with stage("ingredients", "analyze"):
+        return analyze_text(text)
+
+
+def _ocr_dates(img_bytes: bytes, roi: Optional[bool] = None) -> Dict[str, Any]:
+    extra = {}
+    if _use_roi(roi):
+        result = _cached_roi(img_bytes)
+        text = "\n".join(item["text"] for item in _roi_lines(result, "dates"))
+        extra["roi"] = _roi_stats(result)
+    else:
+        text = _cached_ocr(img_bytes)
+    with stage("ocr", "dates"):
+        return {"text": text, **extract_dates(text, today=date.today()), **extra}
+
+
+@app.post("/api/dates")
+async def dates_extract(file: Optional[UploadFile] = File(None), text: Optional[str] = Form(None),
+                        roi: Optional[bool] = None, user_id: Optional[str] = None):
+    """
+    提取生产日期 / 保质期并计算到期日：上传包装图片（表单字段 file）或直接提交文字（表单字段 text）
+
+    roi 为 true 时只识别日期区域（另带 roi 统计），不传时按 ocr.roi.enabled
+
+    Returns:
+        {"text": "...", "production_date": "2024-05-01", "production_source": "label",
+         "shelf_life": {"value": 12, "unit": "month", "text": "12个月"},
+         "expiry_date": "2025-04-30", "expiry_source": "computed", "see_print": false,
+         "dates": ["2024-05-01"], "days_left": 120}
+    """
+    if text is not None:
+        if len(text) > _MAX_ANALYZE_CHARS:
+            raise HTTPException(413, f"文本过长，上限 {_MAX_ANALYZE_CHARS} 字")
+        with stage("dates", "extract"):
+            return {"text": text, **extract_dates(text, today=date.today())}
+    if file is None:
+        raise HTTPException(400, "请上传图片或提供文字")
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "请上传图片文件")
+    img_bytes = await _read_image(file, "ocr")
+    try:
+        result = await ocr_executor.run(_ocr_dates, img_bytes, roi)
+    except ExecutorBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(500, f"OCR 处理失败：{e}")
+    _record_scans(user_id, "dates", [result])
+    return result
+
+
+# 食品库存：按到期日排序的清单、N 天内到期查询、批量录入（见 service_config.yaml 的 inventory 节）
+# 数据库操作在库存连接池的线程里执行，不阻塞事件循环
+async def _inventory(fn: Callable, *args, **kwargs) -> Any:
+    store = get_store()
+    try:
+        with stage("inventory", fn.__name__):
+            return await store.run(fn, *args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except TimeoutError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+
+
+@app.post("/api/inventory/{user_id}/items")
+async def inventory_add(user_id: str, items: List[Dict[str, Any]] = Body(..., embed=True)):
+    """
+    批量录入食品（一个事务）：可直接提交批量 OCR / 新鲜度检测的结果
+
+    每条：{"name": "纯牛奶", "quantity": 2, "unit": "盒", "production_date": "2024-05-01",
+           "expiry_date": "2024-11-01", "category": "乳制品", "note": "...",
+           "ocr_text": "生产日期：... 保质期：6个月",   # 未给日期时从中提取
+           "freshness": {"label": "新鲜", "score": 0.95}}
+
+    Returns:
+        {"count": 2, "ids": [101, 102]}
+    """
+    store = get_store()
+    if len(items) > store.max_bulk_items:
+        raise HTTPException(413, f"单次最多录入 {store.max_bulk_items} 条")
+    ids = await _inventory(store.add_items, user_id, items)
+    return {"count": len(ids), "ids": ids}
+
+
+@app.get("/api/inventory/{user_id}/items")
+async def inventory_list(user_id: str, limit: int = Query(50, ge=1), cursor: Optional[str] = None):
+    """
+    在库食品按到期日升序（到期日未知的排最后）；翻页时把上一页的 next_cursor 作为 cursor 传回
+
+    Returns:
+        {"items": [{"id": 101, "name": "纯牛奶", "expiry_date": "2024-11-01", "days_left": 3, ...}],
+         "next_cursor": "2024-11-01:101"}
+    """
+    return await _inventory(get_store().list_items, user_id, limit, cursor)
+
+
+@app.get("/api/inventory/{user_id}/expiring")
+async def inventory_expiring(user_id: str, days: int = Query(7, ge=0, le=3650), limit: int = Query(50, ge=1),
+                             cursor: Optional[str] = None, include_expired: bool = False):
+    """days 天内到期的在库食品（默认不含已过期的），按到期日升序，格式同 /items"""
+    return await _inventory(get_store().expiring, user_id, days, limit, cursor, include_expired=include_expired)
+
+
+@app.get("/api/inventory/{user_id}/summary")
+async def inventory_summary(user_id: str, days: int = Query(3, ge=0, le=3650)):
+    """在库总数、已过期数、days 天内到期数"""
+    return await _inventory(get_store().counts, user_id, days=days)
+
+
+@app.patch("/api/inventory/{user_id}/items/{item_id}")
+async def inventory_update(user_id: str, item_id: int, changes: Dict[str, Any] = Body(...)):
+    """修改食品信息（只改给出的字段）；标记吃完 / 丢弃：{"status": "consumed" | "discarded"}"""
+    item = await _inventory(get_store().update_item, user_id, item_id, changes)
+    if item is None:
+        raise HTTPException(404, "食品不存在")
+    return item
+
+
+@app.delete("/api/inventory/{user_id}/items/{item_id}")
+async def inventory_delete(user_id: str, item_id: int):
+    if not await _inventory(get_store().delete_item, user_id, item_id):
+        raise HTTPException(404, "食品不存在")
+    return {"deleted": True}
+
+
+# 到期提醒（见 service_config.yaml 的 reminders 节）
+@app.get("/api/reminders")
+async def reminders_stats():
+    """待投递提醒数、上次计算日期、默认提前量"""
+    return await _inventory(get_engine().stats)
+
+
+@app.post("/api/reminders/run")
+async def reminders_run():
+    """立即计算并投递一轮（同一天重复运行不会重复提醒）"""
+    return await _inventory(get_engine().run_once)
+
+
+@app.get("/api/reminders/{user_id}")
+async def reminders_list(user_id: str, limit: int = Query(50, ge=1)):
+    """
+    用户最近的到期提醒，新的在前
+
+    Returns:
+        {"reminders": [{"id": 1, "item_id": 101, "name": "纯牛奶", "expiry_date": "2024-06-04",
+                        "days_left": 3, "lead_days": 3, "message": "纯牛奶将在3天后过期", ...}]}
+    """
+    return {"reminders": await _inventory(get_engine().list_reminders, user_id, limit)}
+
+
+@app.get("/api/reminders/{user_id}/settings")
+async def reminders_settings(user_id: str):
+    return {"lead_days": await _inventory(get_engine().get_lead_days, user_id)}
+
+
+@app.put("/api/reminders/{user_id}/settings")
+async def reminders_update_settings(user_id: str, lead_days: Optional[List[int]] = Body(..., embed=True)):
+    """自定义提前量（天），如 {"lead_days": [3, 7]}；null 恢复默认"""
+    return {"lead_days": await _inventory(get_engine().set_lead_days, user_id, lead_days)}
+
+
+# 饮食报告：库存事件与带 user_id 的扫描增量汇总到按用户按天的统计，
+# 周 / 月报告只读该周期的汇总行，与历史长短无关（见 service_config.yaml 的 analytics 节）
+_analytics_cfg = get_section("service_config", "analytics")
+
+
+def _record_scans(user_id: Optional[str], kind: str, results: List[Dict[str, Any]]) -> None:
+    """带 user_id 的扫描计入该用户当天的汇总（只在内存里累加，定时写入）"""
+    if not user_id or not _analytics_cfg.get("enabled", True):
+        return
+    analytics = get_analytics()
+    for result in results:
+        analytics.record_scan(user_id, kind, result)
+
+
+def _record_job(job: Dict[str, Any], result: Dict[str, Any]) -> None:
+    _record_scans(job["user_id"], job["kind"], [result])
+
+
+async def _report(user_id: str, period: str, day: Optional[str]) -> Dict[str, Any]:
+    return await _inventory(get_analytics().report, user_id, period, day)
+
+
+@app.get("/api/reports/{user_id}/weekly")
+async def report_weekly(user_id: str, day: Optional[str] = Query(None, alias="date")):
+    """
+    date 所在自然周（周一到周日，默认本周）的饮食报告
+
+    Returns:
+        {"user_id": "alice", "period": "week", "start": "2024-05-27", "end": "2024-06-02",
+         "added": {"count": 12, "quantity": 20.0}, "consumed": {...}, "discarded": {"count": 2, ...},
+         "waste_rate": 0.2,                       # 丢弃 / (吃完 + 丢弃)，按条数；没有时为 null
+         "categories": [{"category": "乳制品", "added": 4, "consumed": 3, "discarded": 1, "waste_rate": 0.25}],
+         "freshness": {"scans": 5, "labels": {"新鲜": 4, "变质": 1}},
+         "ocr": {"scans": 3, "kinds": {"dates": 2, "analyze": 1}},
+         "daily": [{"day": "2024-05-27", "added": 2, "consumed": 1, "discarded": 0, "scans": 1}, ...],
+         "previous": {"start": "2024-05-20", "end": "2024-05-26", "consumed": 6, "discarded": 3, "waste_rate": 0.3333}}
+    """
+    return await _report(user_id, "week", day)
+
+
+@app.get("/api/reports/{user_id}/monthly")
+async def report_monthly(user_id: str, day: Optional[str] = Query(None, alias="date")):
+    """date 所在自然月（默认本月）的饮食报告，格式同 /weekly"""
+    return await _report(user_id, "month", day)
+
 '''--------------------------------------------------------------------------------------'''
     # app/main.py 或 app/routers/freshness.py
-from app.backend.freshness_detector import FreshnessDetector
+from app.backend.batching import MicroBatcher
+from app.backend.freshness_detector_simple import SimpleFreshnessDetector, freshness_advice
+from app.backend.cascade import FreshnessCascade
+
+# 新鲜度检测器（全局单例，首次使用时创建；导入 Paddle 也推迟到那时）
+freshness_detector = None
+_freshness_lock = threading.Lock()
+
+
+def get_freshness_detector():
+    """获取新鲜度检测器（懒加载，只创建一次）"""
+    global freshness_detector
+    if freshness_detector is not None:
+        return freshness_detector
+    with _freshness_lock:
+        if freshness_detector is None:
+            with startup_report.measure("freshness", "import"):
+                from app.backend.freshness_detector import FreshnessDetector
+            model_cfg = get_section("freshness_config", "model")
+            preprocess_cfg = get_section("freshness_config", "preprocessing")
+            inference_cfg = get_section("freshness_config", "inference")
+            backend_options = {
+                "model_file": model_cfg.get("custom_model_path"),
+                "params_file": model_cfg.get("custom_params_path"),
+                "onnx_path": model_cfg.get("onnx_path"),
+                "onnx_int8_path": model_cfg.get("onnx_int8_path"),
+                "onnx_fp16_path": model_cfg.get("onnx_fp16_path"),
+                **inference_cfg,
+            }
+            with startup_report.measure("freshness", "weight_load"):
+                freshness_detector = FreshnessDetector(
+                    model_name="ResNet50_vd",  # 或使用你的自定义模型路径
+                    model_path=model_cfg.get("weights_path"),
+                    label_list=get_section("freshness_config", "labels") or None,   # 与训练的类别顺序一致
+                    device=detect_device(model_cfg.get("device", "auto")),
+                    reduced_decode=preprocess_cfg.get("reduced_decode", False),
+                    max_side=preprocess_cfg.get("max_size"),
+                    backend=inference_cfg.get("backend", "eager"),
+                    backend_options=backend_options
+                )
+    return freshness_detector
+
+
+def _predict_freshness_batch(images):
+    return get_freshness_detector().predict_batch(images)
+
+
+def _predict_freshness(image_bytes: bytes):
+    return get_freshness_detector().predict(image_bytes)
+
+
+def _cached_freshness(image_bytes: bytes):
+    """带缓存的新鲜度检测：只缓存成功的结果；未命中时经微批调度器（若启用）推理"""
+    if freshness_batcher is not None:
+        def predict(data):
+            # 各阶段在调度器线程里按批计时；这里记录本请求排队 + 所在批推理的总耗时
+            with stage("freshness", "batched_predict"):
+                return freshness_batcher.predict(data)
+    else:
+        predict = _predict_freshness
+    if freshness_cache is None:
+        return predict(image_bytes)
+    key = content_key(image_bytes, get_freshness_detector().model_version)
+    return freshness_cache.get_or_compute(key, lambda: predict(image_bytes),
+                                          should_cache=lambda r: r.get("status") == "success")
+
+
+# 动态微批调度器：并发请求攒成一批后一次前向（见 freshness_config.yaml 的 batching 节）
+_batching_cfg = get_section("freshness_config", "batching")
+freshness_batcher: Optional[MicroBatcher] = None
+if _batching_cfg.get("enabled", True):
+    freshness_batcher = MicroBatcher(
+        _predict_freshness_batch,
+        max_batch_size=_batching_cfg.get("max_batch_size", 32),
+        max_wait_ms=_batching_cfg.get("max_wait_ms", 5),
+        name="freshness",
+    )
+
+_freshness_executor_cfg = dict(_executor_cfg.get("freshness") or {})
+if _freshness_executor_cfg.get("kind", "thread") != "thread":
+    # 检测器和微批调度器都在本进程内，不能交给进程池
+    logger.warning("新鲜度检测执行器只支持 thread，已忽略 kind 配置")
+    _freshness_executor_cfg["kind"] = "thread"
+freshness_executor = InferenceExecutor.from_config("freshness", _freshness_executor_cfg)
+
+# 经典视觉检测器：深度模型过载时的降级方案（见 freshness_config.yaml 的 simple_detector 节）
+_simple_cfg = get_section("freshness_config", "simple_detector")
+simple_detector = SimpleFreshnessDetector(_simple_cfg)
 
-# 初始化新鲜度检测器（全局单例）
-freshness_detector = FreshnessDetector(
-    model_name="ResNet50_vd",  # 或使用你的自定义模型路径
-    label_list=["新鲜", "一般", "变质"],
-    device="gpu"
-)
+# 级联检测：经典视觉检测器置信度够高就作答，否则才跑深度模型（阈值见 freshness_config.yaml 的 thresholds 节）
+_cascade_cfg = get_section("freshness_config", "cascade")
+freshness_cascade = FreshnessCascade.from_config(simple_detector, _cached_freshness,
+                                                 get_section("freshness_config", "thresholds"))
 
 @app.post("/api/freshness")
-async def detect_freshness(file: UploadFile = File(...)):
+async def detect_freshness(file: UploadFile = File(...), cascade: Optional[bool] = None,
+                           user_id: Optional[str] = None):
     """
     食品新鲜度检测接口
+
+    cascade 为 true 时先用经典视觉检测器、置信度不够才跑深度模型；不传时按 freshness_config.yaml 的 cascade.enabled
+    带 user_id 时按检测出的标签计入该用户饮食报告的扫描次数
     
     Returns:
         {
@@ -54,7 +858,9 @@ async def detect_freshness(file: UploadFile = File(...)):
             "label": "新鲜",
             "score": 0.95,
             "advice": "食品状态良好，可以放心食用。",
-            "all_results": [...]
+            "all_results": [...],
+            "tier": "simple",            # 级联模式下：由哪一层作答（simple | deep）
+            "low_confidence": false      # 级联模式下：最终置信度低于 thresholds.low_confidence
         }
     """
     # 验证文件类型
@@ -62,19 +868,261 @@ async def detect_freshness(file: UploadFile = File(...)):
         raise HTTPException(400, "请上传图片文件")
     
     # 读取图片
-    img_bytes = await file.read()
+    img_bytes = await _read_image(file, "freshness")
     
-    # 执行检测
-    result = freshness_detector.predict(img_bytes)
+    # 执行检测（先查结果缓存；启用微批时与其它并发请求合并为一次前向）
+    try:
+        use_cascade = _cascade_cfg.get("enabled", False) if cascade is None else cascade
+        predict = freshness_cascade.predict if use_cascade else _cached_freshness
+        result = await freshness_executor.run(predict, img_bytes)
+    except ExecutorBusyError as e:
+        if not _simple_cfg.get("fallback_on_busy", False):
+            raise _busy(e)
+        # 降级：深度模型排不上队时用经典视觉检测器（毫秒级）给出结果
+        with stage("freshness", "degraded"):
+            result = await asyncio.to_thread(simple_detector.predict, img_bytes)
+        result["degraded"] = True
     
     if result["status"] == "error":
         raise HTTPException(500, result["message"])
     
     # 添加建议
-    advice = freshness_detector.get_freshness_advice(
+    advice = freshness_advice(
         result["label"], 
         result["score"]
     )
     result["advice"] = advice
+    _record_scans(user_id, "freshness", [result])
     
-    return result
\ No newline at end of file
+    return result
+
+
+def _cached_freshness_batch(images: List[BatchItem]) -> List[Dict[str, Any]]:
+    """
+    带缓存的批量新鲜度检测：未命中的图片按 max_batch_size 分块直接前向（已成批，不再经微批调度器），
+    成功的结果附上建议
+    """
+    detector = get_freshness_detector()
+    chunk = _batching_cfg.get("max_batch_size", 32)
+
+    def compute(batch: List[bytes]) -> List[Dict[str, Any]]:
+        results = []
+        for start in range(0, len(batch), chunk):
+            results.extend(detector.predict_batch(batch[start:start + chunk]))
+        return results
+
+    results = _run_cached_batch(freshness_cache, detector.model_version, images, compute)
+    for result in results:
+        if result["status"] == "success":
+            result["advice"] = detector.get_freshness_advice(result["label"], result["score"])
+    return results
+
+
+@app.post("/api/freshness/batch")
+async def detect_freshness_batch(files: List[UploadFile] = File(...), user_id: Optional[str] = None):
+    """
+    批量新鲜度检测：一次上传多张图片（表单字段 files），整批一次前向
+
+    Returns:
+        {"count": 2, "succeeded": 1, "results": [
+            {"index": 0, "filename": "a.jpg", "status": "success", "label": "新鲜", "score": 0.95,
+             "advice": "...", "all_results": [...]},
+            {"index": 1, "filename": "b.jpg", "status": "error", "message": "图片解码失败"}]}
+    """
+    images = await _read_batch(files, "freshness")
+    try:
+        results = await freshness_executor.run(_cached_freshness_batch, images)
+    except ExecutorBusyError as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(500, f"检测失败：{e}")
+    _record_scans(user_id, "freshness", results)
+    return _batch_response(files, results)
+
+
+@app.get("/api/freshness/cascade")
+def freshness_cascade_stats():
+    """级联检测：各层作答次数与升级率（交给深度模型的比例）"""
+    return {"enabled": _cascade_cfg.get("enabled", False), **freshness_cascade.stats()}
+
+
+@app.get("/api/freshness/batching")
+def freshness_batching_stats():
+    """微批调度器统计：批大小与排队等待时间直方图，用于调节 max_batch_size / max_wait_ms"""
+    if freshness_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **freshness_batcher.stats()}
+
+
+# 异步任务：提交即返回任务 id，后台工作循环经推理执行器处理（见 service_config.yaml 的 jobs 节）
+_jobs_cfg = get_section("service_config", "jobs")
+
+
+async def _job_freshness(img_bytes: bytes) -> Dict[str, Any]:
+    result = await freshness_executor.run(_cached_freshness, img_bytes)
+    if result.get("status") == "success":
+        result = {**result, "advice": freshness_advice(result["label"], result["score"])}
+    return result
+
+
+JOB_HANDLERS: Dict[str, Callable] = {
+    "ocr": lambda img_bytes: ocr_executor.run(_indexed_ocr, img_bytes),
+    "analyze": lambda img_bytes: ocr_executor.run(_ocr_analyze, img_bytes),
+    "dates": lambda img_bytes: ocr_executor.run(_ocr_dates, img_bytes),
+    "freshness": _job_freshness,
+}
+
+
+async def _jobs(fn: Callable, *args) -> Any:
+    queue = get_job_queue()
+    try:
+        with stage("jobs", fn.__name__):
+            return await queue.run(fn, *args)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except IdempotencyConflictError as e:
+        raise HTTPException(409, str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "5"})
+    except TimeoutError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+
+
+@app.post("/api/jobs", status_code=202)
+async def jobs_submit(response: Response,
+                      file: UploadFile = File(...),
+                      kind: str = Form("ocr"),
+                      user_id: str = Form("anonymous"),
+                      webhook_url: Optional[str] = Form(None),
+                      idempotency_key: Optional[str] = Header(None)):
+    """
+    提交异步任务：kind 为 ocr | analyze | dates | freshness，结果格式与对应的同步接口相同
+
+    请求头 Idempotency-Key：网络重试时带同一个键，不会重复创建任务（已存在时返回 200 和原任务）。
+    webhook_url：任务结束后 POST {"id", "kind", "status", "result", "error"} 到该地址；
+    只接受公网地址或 jobs.webhook_allowlist 中的主机，否则返回 400。
+
+    Returns:
+        202 {"id": "…", "status": "queued", "poll_url": "/api/jobs/…", ...}
+    """
+    if kind not in JOB_HANDLERS:
+        raise HTTPException(400, f"kind 只支持 {list(JOB_HANDLERS)}")
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "请上传图片文件")
+    img_bytes = await _read_image(file, "freshness" if kind == "freshness" else "ocr")
+    job, created = await _jobs(get_job_queue().submit, user_id, kind, img_bytes, idempotency_key, webhook_url)
+    if not created:
+        response.status_code = 200
+    return {**job, "poll_url": f"/api/jobs/{job['id']}"}
+
+
+@app.get("/api/jobs")
+async def jobs_stats():
+    """各状态的任务数，以及有任务在排队的用户数"""
+    return await _jobs(get_job_queue().stats)
+
+
+@app.get("/api/jobs/{job_id}")
+async def jobs_get(job_id: str):
+    """任务状态；排队中时带 position（前面大约还有几个任务），完成后带 result 或 error"""
+    job = await _jobs(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(404, "任务不存在或已过保留期")
+    return job
+
+
+@app.delete("/api/jobs/{job_id}")
+async def jobs_cancel(job_id: str):
+    """取消排队中的任务"""
+    if not await _jobs(get_job_queue().cancel, job_id):
+        raise HTTPException(409, "任务不存在或已开始执行，无法取消")
+    return {"id": job_id, "status": "cancelled"}
+
+
+@app.get("/api/executors")
+def executor_stats():
+    """推理执行器占用情况"""
+    return {"ocr": ocr_executor.stats(), "freshness": freshness_executor.stats()}
+
+
+@app.get("/api/cache")
+def cache_stats():
+    """结果缓存命中/未命中统计"""
+    return {
+        "ocr": ocr_cache.stats() if ocr_cache is not None else {"enabled": False},
+        "freshness": freshness_cache.stats() if freshness_cache is not None else {"enabled": False},
+    }
+
+
+def _collect_in_flight():
+    return [format_sample("smart_food_executor_in_flight", ex.in_flight(), (("executor", ex.name),))
+            for ex in (ocr_executor, freshness_executor)]
+
+
+def _collect_queue_depth():
+    if freshness_batcher is None:
+        return []
+    return [format_sample("smart_food_batcher_queue_depth", freshness_batcher.qsize(),
+                          (("batcher", freshness_batcher.name),))]
+
+
+def _collect_batch_hist(attr: str, name: str):
+    def collect():
+        if freshness_batcher is None:
+            return []
+        hist = getattr(freshness_batcher, attr)
+        return format_histogram(name, hist.snapshot(), (("batcher", freshness_batcher.name),))
+    return collect
+
+
+def _caches():
+    return [c for c in (ocr_cache, freshness_cache) if c is not None]
+
+
+def _collect_cache_events():
+    return [format_sample("smart_food_cache_events_total", cache.stats()[event],
+                          (("cache", cache.name), ("event", event)))
+            for cache in _caches() for event in ("hits", "disk_hits", "misses", "coalesced", "evictions")]
+
+
+def _collect_cache_field(field: str, metric: str):
+    return lambda: [format_sample(metric, cache.stats()[field], (("cache", cache.name),)) for cache in _caches()]
+
+
+# 抓取时才读取的指标：不在请求路径上增加开销
+REGISTRY.register_collector("smart_food_executor_in_flight", "gauge", "推理执行器中执行 + 排队的任务数",
+                            _collect_in_flight)
+REGISTRY.register_collector("smart_food_batcher_queue_depth", "gauge", "微批调度器排队中的请求数",
+                            _collect_queue_depth)
+REGISTRY.register_collector("smart_food_batch_size", "histogram", "微批调度器每批的请求数",
+                            _collect_batch_hist("batch_size_hist", "smart_food_batch_size"))
+REGISTRY.register_collector("smart_food_batch_queue_wait_ms", "histogram", "请求在微批队列中的等待时间（毫秒）",
+                            _collect_batch_hist("queue_wait_hist", "smart_food_batch_queue_wait_ms"))
+REGISTRY.register_collector("smart_food_cache_events_total", "counter", "结果缓存命中/未命中/合并/淘汰次数",
+                            _collect_cache_events)
+REGISTRY.register_collector("smart_food_cache_entries", "gauge", "结果缓存内存层条目数",
+                            _collect_cache_field("entries", "smart_food_cache_entries"))
+REGISTRY.register_collector("smart_food_cache_bytes", "gauge", "结果缓存内存层占用字节数",
+                            _collect_cache_field("bytes", "smart_food_cache_bytes"))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 指标：分阶段耗时、请求耗时、图片大小、队列深度、执行中任务数、缓存命中"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/startup")
+def startup_info():
+    """启动耗时报告：各组件 import / weight_load / warmup 耗时（秒）"""
+    return startup_report.as_dict()
+
+
+@app.get("/api/memory")
+def memory_info():
+    """内存占用（RSS / PSS / 共享 / 私有，MB）：prefork 启动时包括父进程和全部 worker，否则只有本进程"""
+    return memory_report()
+
+
+# 应用模块自身的导入耗时（懒加载模式下不含模型框架）
+startup_report.record("app", "import", time.perf_counter() - _import_started)
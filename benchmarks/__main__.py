@@ -0,0 +1,37 @@
+# benchmarks/__main__.py
+"""
+运行全部基准（分阶段微基准 + 接口压测），结果写入一个 JSON 文件
+
+用法：
+    python -m benchmarks                       # 结果写到 benchmarks/results/<时间>_<commit>.json
+    python -m benchmarks --no-ocr --requests 100 --output before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import logging
+
+from benchmarks import bench_endpoints, bench_stages
+from benchmarks.common import write_results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="OCR / 新鲜度检测基准测试")
+    bench_stages.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="接口压测：每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="接口压测：并发客户端数")
+    parser.add_argument("--batch-size", type=int, default=8, help="接口压测：批量接口每次上传的图片数")
+    parser.add_argument("--skip-endpoints", action="store_true", help="只跑分阶段微基准")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 benchmarks/results/")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = {"stages": bench_stages.run(args.repeat, args.backends.split(","),
+                                          not args.no_ocr, not args.no_synthetic)}
+    if not args.skip_endpoints:
+        results["endpoints"] = bench_endpoints.run(args.requests, args.concurrency,
+                                                   args.batch_size, not args.no_ocr)
+    print(write_results(results, args.output))
+
+
+if __name__ == "__main__":
+    main()
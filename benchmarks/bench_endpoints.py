@@ -0,0 +1,150 @@
+# benchmarks/bench_endpoints.py
+"""
+进程内并发压测 FastAPI 接口：吞吐量与 p50/p95/p99 延迟
+
+请求经 httpx.ASGITransport 直接送进 app.main.app，不走网络，也不启动 uvicorn；
+压测客户端与服务端共用一个进程，结果用于不同提交之间对比，而非绝对容量。
+
+用法：
+    python -m benchmarks.bench_endpoints --requests 200 --concurrency 16 --output endpoints.json
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.common import load_images, skipped, summarize, unique_variant, write_results
+
+logger = logging.getLogger(__name__)
+
+# 场景构造函数：第 i 个请求 → (方法, 路径, 请求参数)
+RequestFactory = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+async def load_test(client: httpx.AsyncClient,
+                    make_request: RequestFactory,
+                    total: int,
+                    concurrency: int) -> Dict[str, Any]:
+    """concurrency 个协程共同发完 total 个请求，统计延迟、吞吐量和状态码"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency": summarize(latencies),
+        "status": dict(statuses),
+    }
+
+
+def _upload(name: str, data: bytes) -> Dict[str, Any]:
+    return {"files": {"file": (name, data, "image/jpeg")}}
+
+
+def scenarios(images: Dict[str, bytes], batch_size: int) -> Dict[str, RequestFactory]:
+    names = list(images)
+    freshness_names = [n for n in names if not n.endswith(".png")] or names
+
+    def pick(pool: List[str], i: int) -> Tuple[str, bytes]:
+        name = pool[i % len(pool)]
+        return name, images[name]
+
+    def freshness_cold(i):
+        name, data = pick(freshness_names, i)
+        return "POST", "/api/freshness", _upload(name, unique_variant(data, i))
+
+    def freshness_cached(i):
+        name, data = pick(freshness_names, i)
+        return "POST", "/api/freshness", _upload(name, data)
+
+    def freshness_batch(i):
+        files = []
+        for j in range(batch_size):
+            name, data = pick(freshness_names, i * batch_size + j)
+            files.append(("files", (name, unique_variant(data, i * batch_size + j), "image/jpeg")))
+        return "POST", "/api/freshness/batch", {"files": files}
+
+    def ocr_cold(i):
+        name, data = pick(names, i)
+        return "POST", "/ocr/", _upload(name, unique_variant(data, i))
+
+    return {
+        "health": lambda i: ("GET", "/health", {}),
+        "freshness_cold": freshness_cold,
+        "freshness_cached": freshness_cached,
+        "freshness_batch": freshness_batch,
+        "ocr_cold": ocr_cold,
+    }
+
+
+async def _run(total: int, concurrency: int, batch_size: int, include_ocr: bool) -> Dict[str, Any]:
+    from app.main import app
+
+    images = load_images()
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for name, make_request in scenarios(images, batch_size).items():
+            if name.startswith("ocr") and not include_ocr:
+                results[name] = skipped("--no-ocr")
+                continue
+            # 预热一次（模型懒加载）；预热失败说明该接口在当前环境不可用
+            method, url, kwargs = make_request(10 ** 6)
+            probe = await client.request(method, url, **kwargs)
+            if probe.status_code >= 500:
+                results[name] = skipped(f"预热请求失败 {probe.status_code}: {probe.text[:200]}")
+                continue
+            n = max(1, total // batch_size) if name == "freshness_batch" else total
+            results[name] = await load_test(client, make_request, n, concurrency)
+            if name == "freshness_batch":
+                results[name]["images_per_s"] = round(results[name]["throughput_rps"] * batch_size, 2)
+            logger.warning(f"{name}: {results[name]['throughput_rps']} req/s, "
+                           f"p99 {results[name]['latency'].get('p99_ms')} ms")
+    return results
+
+
+def run(total: int = 200, concurrency: int = 16, batch_size: int = 8, include_ocr: bool = True) -> Dict[str, Any]:
+    return asyncio.run(_run(total, concurrency, batch_size, include_ocr))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--batch-size", type=int, default=8, help="批量接口每次上传的图片数")
+    parser.add_argument("--no-ocr", action="store_true", help="跳过 OCR 接口")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="FastAPI 接口进程内并发压测")
+    add_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 benchmarks/results/")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args.requests, args.concurrency, args.batch_size, not args.no_ocr)
+    print(write_results({"endpoints": results}, args.output))
+
+
+if __name__ == "__main__":
+    main()
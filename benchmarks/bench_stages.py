@@ -0,0 +1,291 @@
+# benchmarks/bench_stages.py
+"""
+分阶段微基准：解码 → 预处理 → 前向 → 后处理，以及各检测器端到端
+
+用法：
+    python -m benchmarks.bench_stages --repeat 20 --output stages.json
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from benchmarks.common import load_images, skipped, summarize, synthetic_date_labels, time_it, write_results
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(image_bytes: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def bench_freshness(images: Dict[str, bytes], repeat: int, backends: List[str]) -> Dict[str, Any]:
+    from app.backend.config import get_section
+    from app.backend.freshness_detector import FreshnessDetector
+    from app.backend.preprocessing import Preprocessor
+
+    model_cfg = get_section("freshness_config", "model")
+    inference_cfg = get_section("freshness_config", "inference")
+    results: Dict[str, Any] = {"decode": {}, "decode_reduced": {}, "decode_bounded": {}, "preprocess": {}}
+
+    full, reduced = Preprocessor(), Preprocessor(reduced_decode=True)
+    # 与服务一致：最长边限制为 preprocessing.max_size
+    bounded = Preprocessor(max_side=get_section("freshness_config", "preprocessing").get("max_size"))
+    decoded = {}
+    for name, data in images.items():
+        decoded[name] = _decode(data)
+        results["decode"][name] = time_it(lambda: full.decode(data), repeat)
+        results["decode_reduced"][name] = time_it(lambda: reduced.decode(data), repeat)
+        results["decode_bounded"][name] = time_it(lambda: bounded.decode(data), repeat)
+        img = decoded[name]
+        results["preprocess"][name] = time_it(lambda: full.preprocess(img), repeat)
+    batch_imgs = [decoded[n] for n in decoded] * 3
+    results["preprocess"]["batch_8"] = time_it(lambda: full.batch(batch_imgs[:8]), repeat)
+
+    results["forward"], results["postprocess"], results["predict"] = {}, {}, {}
+    for backend in backends:
+        options = {
+            "model_file": model_cfg.get("custom_model_path"),
+            "params_file": model_cfg.get("custom_params_path"),
+            "onnx_path": model_cfg.get("onnx_path"),
+            **inference_cfg,
+            "backend": backend,
+        }
+        try:
+            detector = FreshnessDetector(model_path=model_cfg.get("weights_path"), device="cpu",
+                                         backend=backend, backend_options=options)
+        except RuntimeError as e:
+            results["forward"][backend] = skipped(str(e))
+            continue
+        forward = {}
+        for n in (1, 8):
+            # 前向只计模型本身，输入批提前准备好
+            batch = full.batch(batch_imgs[:n]).copy()
+            forward[f"batch_{n}"] = time_it(lambda: detector._forward(batch), repeat)
+        results["forward"][backend] = forward
+        probs = detector._forward(full.batch(batch_imgs[:1]).copy())[0]
+        results["postprocess"][backend] = time_it(lambda: detector._parse_result(probs), repeat * 10)
+        results["predict"][backend] = {
+            name: time_it(lambda: detector.predict(data), repeat) for name, data in images.items()
+        }
+        batch_bytes = (list(images.values()) * 8)[:8]
+        results["predict"][backend]["predict_batch_8"] = time_it(lambda: detector.predict_batch(batch_bytes), repeat)
+    return results
+
+
+def bench_simple(images: Dict[str, bytes], repeat: int) -> Dict[str, Any]:
+    from app.backend.freshness_detector_simple import SimpleFreshnessDetector
+
+    detector = SimpleFreshnessDetector()
+    results = {name: time_it(lambda: detector.predict(data), repeat) for name, data in images.items()}
+    # 不含解码：级联检测中与深度模型共用解码结果时的开销
+    for name, data in images.items():
+        img = _decode(data)
+        results[f"{name}:features"] = time_it(lambda: detector.predict_image(img), repeat)
+    return results
+
+
+def bench_ocr(images: Dict[str, bytes], repeat: int) -> Dict[str, Any]:
+    """OCR 各阶段；引擎不可用（如离线且本地没有模型）时跳过"""
+    from app.backend import ocr
+
+    try:
+        engine = ocr.get_ocr_engine()
+    except Exception as e:
+        return skipped(f"OCR 引擎不可用: {e}")
+
+    results: Dict[str, Any] = {"decode": {}, "engine_predict": {}, "postprocess": {}, "do_ocr": {}}
+    for name, data in images.items():
+        img = _decode(data)
+        raw = engine.predict(img)
+        results["decode"][name] = time_it(lambda: _decode(data), repeat)
+        results["engine_predict"][name] = time_it(lambda: engine.predict(img), repeat, warmup=1)
+        results["postprocess"][name] = time_it(lambda: ocr._parse_items(raw), repeat * 10)
+        results["do_ocr"][name] = time_it(lambda: ocr.do_ocr(data), repeat, warmup=1)
+    # ROI 模式：缩小检测一次，只识别配料表 / 日期区域；与上面的整页 do_ocr 对比
+    try:
+        results["roi"] = {}
+        for name, data in images.items():
+            roi = ocr.ocr_roi(data)
+            results["roi"][name] = {**time_it(lambda: ocr.ocr_roi(data), repeat, warmup=1),
+                                    **{key: roi[key] for key in ("boxes_detected", "boxes_recognized", "boxes_skipped")}}
+    except Exception as e:
+        results["roi"] = skipped(f"ROI 模型不可用: {e}")
+    return results
+
+
+# 配料表样例（约 200 字），按倍数拼接得到不同长度的文本
+_LABEL_TEXT = ("配料：饮用水、白砂糖、全脂乳粉、小麦粉、植物油（大豆油、氢化植物油）、食品添加剂（柠檬酸、苯甲酸钠、"
+               "山梨酸钾、阿斯巴甜（含苯丙氨酸）、柠檬黄、单,双甘油脂肪酸酯、黄原胶、碳酸氢钠）、鸡蛋、食用盐、"
+               "浓缩苹果汁（≥10%）、食用香精。致敏物质提示：含有麸质谷物、乳制品、大豆、蛋类。")
+
+
+def _synthetic_dictionary(path: str, size: int, seed: int = 0) -> None:
+    """生成 size 条随机汉字条目（每条 2 个同义词）的 TSV 词典"""
+    rng = random.Random(seed)
+
+    def word():
+        return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(3, 8)))
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name\tcategory\te_number\tfunction\trisk\tsynonyms\tnote\n")
+        for i in range(size):
+            f.write(f"{word()}\tadditive\tE{10000 + i}\t合成\tlow\t{word()}|{word()}\t\n")
+
+
+def bench_ingredients(repeat: int, sizes: List[int] = (0, 50000)) -> Dict[str, Any]:
+    """配料匹配：耗时应随文本长度线性增长，与词典条目数无关"""
+    from app.backend.ingredients import (DEFAULT_DICTIONARY, IngredientMatcher, compile_automaton,
+                                         load_dictionary)
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            sources = [DEFAULT_DICTIONARY]
+            if size:
+                sources.append(os.path.join(tmp, f"synthetic_{size}.tsv"))
+                _synthetic_dictionary(sources[-1], size)
+            path = os.path.join(tmp, f"dict_{size}.acm")
+            stats = compile_automaton(load_dictionary(sources), path)
+            matcher = IngredientMatcher(path)
+            timings = {f"chars_{len(_LABEL_TEXT) * n}": time_it(lambda: matcher.match(_LABEL_TEXT * n), repeat)
+                       for n in (1, 4, 16)}
+            results[f"entries_{stats['entries']}"] = {"automaton": stats, **timings}
+            matcher.close()
+    return results
+
+
+def bench_dates(repeat: int, count: int = 5000) -> Dict[str, Any]:
+    """日期提取：整份合成语料一遍的耗时、吞吐（条/秒）和到期日准确率"""
+    from app.backend.date_extractor import extract_dates
+
+    labels = synthetic_date_labels(count)
+    texts = [text for text, _ in labels]
+    timing = time_it(lambda: [extract_dates(t) for t in texts], max(3, repeat // 4), warmup=1)
+    correct = sum(extract_dates(text)["expiry_date"] == expected for text, expected in labels)
+    return {"labels": count, "corpus": timing,
+            "labels_per_s": round(count / (timing["p50_ms"] / 1000), 1),
+            "expiry_accuracy": round(correct / count, 4)}
+
+
+def bench_inventory(repeat: int, rows: int = 1000000, users: int = 1000) -> Dict[str, Any]:
+    """库存查询：百万行、每用户约千条时，到期查询 / 清单翻页 / 计数的延迟，批量录入的吞吐，以及到期提醒一轮的耗时"""
+    from datetime import date, timedelta
+
+    from app.backend.inventory import InventoryStore
+    from app.backend.reminders import QueueSink, ReminderEngine
+
+    rng = random.Random(0)
+    start = date(2024, 1, 1)
+    today = start + timedelta(days=365)
+
+    def item():
+        expiry = start + timedelta(days=rng.randint(0, 730)) if rng.random() < 0.95 else None
+        return {"name": "纯牛奶", "quantity": 1, "expiry_date": expiry,
+                "status": "active" if rng.random() < 0.7 else "consumed"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InventoryStore(os.path.join(tmp, "inventory.sqlite3"), max_bulk_items=rows)
+        chunk = 1000
+        samples = []
+        for offset in range(0, rows, chunk):
+            batch = [item() for _ in range(chunk)]
+            began = time.perf_counter()
+            store.add_items(f"user{(offset // chunk) % users}", batch)
+            samples.append((time.perf_counter() - began) * 1000)
+        insert = summarize(samples)
+        middle = store.list_items("user1", limit=300, today=today)["next_cursor"]
+        results = {
+            "rows": rows, "users": users,
+            "bulk_insert_1000": insert,
+            "rows_per_s": round(chunk / (insert["p50_ms"] / 1000), 1),
+            "expiring_7d": time_it(lambda: store.expiring("user1", 7, today=today), repeat * 5),
+            "list_first_page": time_it(lambda: store.list_items("user1", today=today), repeat * 5),
+            "list_deep_page": time_it(lambda: store.list_items("user1", cursor=middle, today=today), repeat * 5),
+            "counts": time_it(lambda: store.counts("user1", today=today), repeat * 5),
+        }
+        # 到期提醒：全库一轮计算 + 投递；同一天重跑只有去重开销
+        engine = ReminderEngine(store, QueueSink())
+        results["reminders_first_run"] = engine.run_once(today)
+        results["reminders_rerun"] = time_it(lambda: engine.compute(today), repeat, warmup=0)
+        store.close()
+    return results
+
+
+def bench_embedding_index(repeat: int, rows: int = 200000, dim: int = 1280, nlist: int = 512) -> Dict[str, Any]:
+    """包装向量索引：暴力检索与 IVF（nprobe 8 / 32）的单次查询延迟，以及 IVF 的 top-1 召回（查询 = 库内向量 + 噪声）"""
+    from app.backend.embedding_index import EmbeddingIndex
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(nlist * 4, dim)).astype(np.float32)
+
+    def sample(n):
+        return centers[rng.integers(0, len(centers), n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+    results: Dict[str, Any] = {"rows": rows, "dim": dim}
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = EmbeddingIndex(os.path.join(tmp, "flat"))
+        ivf = EmbeddingIndex(os.path.join(tmp, "ivf"), nlist=nlist, train_size=min(rows, 50000))
+        began = time.perf_counter()
+        for offset in range(0, rows, 10000):
+            block = sample(min(10000, rows - offset))
+            flat.add_many(block, [{"text": ""}] * len(block))
+            ivf.add_many(block, [{"text": ""}] * len(block))
+        results["build_s"] = round(time.perf_counter() - began, 2)
+
+        probes = rng.choice(rows, 100, replace=False)
+        queries = [np.asarray(flat._vectors[i], np.float32) + 0.05 * rng.normal(size=dim) for i in probes]
+        results["flat_search"] = time_it(lambda: flat.search(queries[0], k=10), max(3, repeat // 4))
+        for nprobe in (8, 32):
+            ivf.nprobe = nprobe
+            found = sum(ivf.search(q, k=1)[0][0] == i for q, i in zip(queries, probes))
+            results[f"ivf_nprobe{nprobe}"] = {**time_it(lambda: ivf.search(queries[0], k=10), repeat * 5),
+                                              "recall_at_1": found / len(probes)}
+        flat.close()
+        ivf.close()
+    return results
+
+
+def run(repeat: int = 20,
+        backends: List[str] = ("eager",),
+        include_ocr: bool = True,
+        include_synthetic: bool = True) -> Dict[str, Any]:
+    images = load_images(include_synthetic)
+    return {
+        "freshness": bench_freshness(images, repeat, list(backends)),
+        "simple_freshness": bench_simple(images, repeat),
+        "ingredients": bench_ingredients(repeat),
+        "dates": bench_dates(repeat),
+        "inventory": bench_inventory(repeat),
+        "embedding_index": bench_embedding_index(repeat),
+        "ocr": bench_ocr(images, max(3, repeat // 5)) if include_ocr else skipped("--no-ocr"),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    parser.add_argument("--backends", default="eager",
+                        help="逗号分隔的新鲜度推理后端：eager,paddle_inference,onnxruntime")
+    parser.add_argument("--no-ocr", action="store_true", help="跳过 OCR 阶段")
+    parser.add_argument("--no-synthetic", action="store_true", help="只用 tests/images 下的图片")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="OCR / 新鲜度检测分阶段微基准")
+    add_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 benchmarks/results/")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args.repeat, args.backends.split(","), not args.no_ocr, not args.no_synthetic)
+    print(write_results({"stages": results}, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/common.py
+"""基准测试公共工具：测试图片、合成日期语料、计时统计、结果文件"""
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+IMAGES_DIR = os.path.join(ROOT, "tests", "images")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# 合成图片尺寸：小图、手机常见的 1080p 和 12MP 原图
+SYNTHETIC_SIZES = {"small_640x480": (640, 480), "hd_1920x1080": (1920, 1080), "photo_4032x3024": (4032, 3024)}
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> bytes:
+    """生成带纹理和文字的 JPEG（固定随机种子，结果可复现）"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // max(width - 1, 1)), (y * 255 // max(height - 1, 1)),
+                     np.full_like(x, 128)], axis=-1).astype(np.int16)
+    noise = rng.integers(-20, 21, size=base.shape, dtype=np.int16)
+    img = np.clip(base + noise, 0, 255).astype(np.uint8)
+    scale = max(width, height) / 640
+    for i in range(5):
+        cv2.putText(img, f"Ingredients: water, salt, sugar {i}", (int(20 * scale), int((60 + 60 * i) * scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), max(1, int(2 * scale)))
+    _, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+def synthetic_date_labels(count: int, seed: int = 0) -> List[Tuple[str, Optional[str]]]:
+    """
+    生成 count 条随机包装日期文字及其期望到期日 [(text, "YYYY-MM-DD" | None)]
+
+    覆盖各种日期写法、"保质期 N 天/个月/年"、标签直接给到期日、无标签喷码、"见喷码"和干扰文字。
+    """
+    from app.backend.date_extractor import expiry_from
+
+    rng = random.Random(seed)
+    formats = ("{y}.{m:02d}.{d:02d}", "{y}-{m}-{d}", "{y}/{m:02d}/{d:02d}", "{y}年{m}月{d}日", "{y}{m:02d}{d:02d}")
+    durations = (("{n}个月", "month", (3, 6, 9, 12, 18, 24)), ("{n}天", "day", (7, 15, 30, 45, 90, 180, 365)),
+                 ("{n}年", "year", (1, 2, 3)), ("十八个月", "month", (18,)), ("十二个月", "month", (12,)))
+    noise = ("配料：水、白砂糖、食用盐", "贮存条件：常温、阴凉干燥处", "净含量：500mL", "产品标准号：GB/T 10792",
+             "生产许可证号：SC10644010600123", "开封后请冷藏并于3天内饮用", "")
+
+    def fmt(day: date) -> str:
+        return rng.choice(formats).format(y=day.year, m=day.month, d=day.day)
+
+    labels = []
+    for _ in range(count):
+        produced = date(2023, 1, 1) + timedelta(days=rng.randint(0, 900))
+        template, unit, choices = rng.choice(durations)
+        n = rng.choice(choices)
+        shelf = template.format(n=n)
+        expiry = expiry_from(produced, n, unit)
+        kind = rng.random()
+        if kind < 0.5:
+            parts = [f"生产日期：{fmt(produced)}", f"保质期：{shelf}"]
+            rng.shuffle(parts)
+        elif kind < 0.7:
+            parts = ["生产日期：见瓶盖喷码", f"保质期至：{fmt(expiry)}"]
+        elif kind < 0.85:
+            parts = [f"{fmt(produced)} {fmt(expiry)}"]
+        else:
+            parts, expiry = ["生产日期：见包装封口处", f"保质期：{shelf}"], None
+        parts.insert(rng.randint(0, len(parts)), rng.choice(noise))
+        labels.append(("\n".join(parts), expiry.isoformat() if expiry else None))
+    return labels
+
+
+def load_images(include_synthetic: bool = True) -> Dict[str, bytes]:
+    """tests/images 下的真实图片 + 合成图片，{名称: JPEG/PNG 字节}"""
+    images = {}
+    for name in sorted(os.listdir(IMAGES_DIR)):
+        with open(os.path.join(IMAGES_DIR, name), "rb") as f:
+            images[name] = f.read()
+    if include_synthetic:
+        for i, (name, (w, h)) in enumerate(SYNTHETIC_SIZES.items()):
+            images[name] = synthetic_image(w, h, seed=i)
+    return images
+
+
+def unique_variant(image_bytes: bytes, seed: int) -> bytes:
+    """在图片末尾追加不影响解码的字节，得到内容不同的副本（绕过结果缓存）"""
+    return image_bytes + seed.to_bytes(8, "little")
+
+
+def summarize(samples_ms: Sequence[float]) -> Dict[str, float]:
+    """延迟样本（毫秒）→ 均值、分位数"""
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if arr.size == 0:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "n": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "min_ms": round(float(arr.min()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def time_it(fn: Callable[[], Any], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """重复调用 fn，返回延迟统计"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境信息，写进结果文件便于对比"""
+    versions = {}
+    for module in ("numpy", "cv2", "paddle", "paddleocr", "onnxruntime", "fastapi"):
+        mod = sys.modules.get(module)
+        if mod is not None:
+            versions[module] = getattr(mod, "__version__", None)
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def write_results(results: Dict[str, Any], output: Optional[str] = None) -> str:
+    """写入 JSON 结果文件，默认 benchmarks/results/<时间>_<commit>.json"""
+    payload = {"environment": environment(), **results}
+    if output is None:
+        env = payload["environment"]
+        stamp = env["timestamp"].replace(":", "").replace("-", "")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{env['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    return output
+
+
+def skipped(reason: str) -> Dict[str, str]:
+    return {"skipped": reason}
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """把嵌套结果展开成 {"stages.decode.fresh_apple.jpg.p50_ms": 1.2}，便于对比"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
@@ -0,0 +1,68 @@
+# benchmarks/compare.py
+"""
+对比两次基准结果，列出变慢/变快超过阈值的指标
+
+用法：
+    python -m benchmarks.compare baseline.json current.json --threshold 0.1
+有回归时退出码为 1，可直接用在 CI 里。
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.common import flatten
+
+# 越小越好 / 越大越好的指标后缀
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("throughput_rps", "images_per_s")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> Dict[str, List[Tuple[str, float, float, float]]]:
+    """
+    Returns:
+        {"regressions": [(指标, 旧值, 新值, 变化比例)], "improvements": [...]}；
+        变化比例按“变差为正”计算
+    """
+    old, new = flatten(baseline), flatten(current)
+    report = {"regressions": [], "improvements": []}
+    for key in sorted(old.keys() & new.keys()):
+        if key.startswith("environment."):
+            continue
+        if key.endswith(LOWER_IS_BETTER):
+            sign = 1
+        elif key.endswith(HIGHER_IS_BETTER):
+            sign = -1
+        else:
+            continue
+        if old[key] <= 0:
+            continue
+        change = sign * (new[key] - old[key]) / old[key]
+        if change > threshold:
+            report["regressions"].append((key, old[key], new[key], round(change, 4)))
+        elif change < -threshold:
+            report["improvements"].append((key, old[key], new[key], round(change, 4)))
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="变化超过该比例才报告（默认 10%%）")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    report = compare(baseline, current, args.threshold)
+    for title, rows in (("变慢", report["regressions"]), ("变快", report["improvements"])):
+        print(f"== {title} ({len(rows)}) ==")
+        for key, before, after, change in rows:
+            print(f"  {key}: {before} -> {after} ({change:+.1%})")
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 import paddleocr, paddle
 print("OCR:", paddleocr.__version__)
 print("Paddle:", paddle.__version__)
@@ -5,7 +6,7 @@ print("Paddle:", paddle.__version__)
 
 from paddleocr import PaddleOCR
 ocr = PaddleOCR(use_textline_orientation=True)  # use_gpu=True启用GPU
-image_path = "D:/Smart_Food_Manager/tests/images/test.png"
+image_path = os.path.join(os.path.dirname(__file__), "images", "test.png")
 result = ocr.predict(image_path)
 for line in result:
     line.print()
\ No newline at end of file
@@ -0,0 +1,156 @@
+# test_analytics.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import analytics, inventory, jobs
+from app.backend.analytics import AnalyticsEngine, period_range
+from app.backend.inventory import InventoryStore
+from app.backend.jobs import JobQueue, JobWorker
+
+client = TestClient(app.main.app)
+
+TODAY = date(2024, 6, 5)   # 星期三
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = InventoryStore(str(tmp_path / "inventory.sqlite3"), pool_size=2)
+    yield s
+    s.close()
+
+
+def _noon(day: date) -> float:
+    """本地时间当天中午的时间戳（汇总按本地日期归天）"""
+    return datetime(day.year, day.month, day.day, 12).timestamp()
+
+
+def _stats(store):
+    with store.pool.connection() as conn:
+        return sorted(tuple(row) for row in conn.execute("SELECT * FROM daily_stats WHERE count != 0"))
+
+
+def test_period_range():
+    assert period_range("week", TODAY) == (date(2024, 6, 3), date(2024, 6, 9))
+    assert period_range("month", TODAY) == (date(2024, 6, 1), date(2024, 6, 30))
+    assert period_range("month", date(2024, 2, 10)) == (date(2024, 2, 1), date(2024, 2, 29))
+    with pytest.raises(ValueError):
+        period_range("year", TODAY)
+
+
+def test_triggers_match_rebuild_and_report(store):
+    engine = AnalyticsEngine(store)
+    # 跨三周的库存事件：直接写 items，按指定时间戳归天
+    events = [  # (录入日期, 类别, 数量, 结果, 结果日期)
+        (TODAY - timedelta(days=9), "乳制品", 2, "consumed", TODAY - timedelta(days=8)),
+        (TODAY - timedelta(days=8), "蔬菜", 1, "discarded", TODAY - timedelta(days=4)),
+        (TODAY - timedelta(days=2), "乳制品", 1, "consumed", TODAY - timedelta(days=1)),
+        (TODAY - timedelta(days=2), "蔬菜", 3, "discarded", TODAY),
+        (TODAY - timedelta(days=1), None, 1, "active", None),
+        (TODAY, "乳制品", 1, "discarded", TODAY),
+    ]
+    with store.pool.transaction() as conn:
+        for i, (added, category, quantity, status, closed) in enumerate(events, 1):
+            conn.execute("INSERT INTO items (id, user_id, name, category, quantity, status, created_at, updated_at) "
+                         "VALUES (?, 'alice', ?, ?, ?, 'active', ?, ?)",
+                         (i, f"item{i}", category, quantity, _noon(added), _noon(added)))
+            if closed is not None:
+                conn.execute("UPDATE items SET status = ?, updated_at = ? WHERE id = ?", (status, _noon(closed), i))
+        # 改了数量：录入当天的 added 跟着变；丢弃后又撤回、再改成吃完：记在改的那天
+        conn.execute("UPDATE items SET quantity = 4 WHERE id = 5")
+        conn.execute("UPDATE items SET status = 'active', updated_at = ? WHERE id = 2", (_noon(TODAY),))
+        conn.execute("UPDATE items SET status = 'consumed', updated_at = ? WHERE id = 2", (_noon(TODAY),))
+        conn.execute("INSERT INTO items (id, user_id, name, quantity, status, created_at, updated_at) "
+                     "VALUES (7, 'bob', 'x', 1, 'discarded', ?, ?)", (_noon(TODAY), _noon(TODAY)))
+        conn.execute("DELETE FROM items WHERE id = 7")
+
+    incremental = _stats(store)
+    assert engine.rebuild()["items"] == 6
+    assert _stats(store) == incremental
+
+    week = engine.report("alice", "week", TODAY)
+    assert (week["start"], week["end"]) == ("2024-06-03", "2024-06-09")
+    assert week["added"] == {"count": 4, "quantity": 9.0}
+    assert (week["consumed"]["count"], week["discarded"]["count"], week["waste_rate"]) == (2, 2, 0.5)
+    assert week["categories"][0] == {"category": "乳制品", "added": 2, "consumed": 1, "discarded": 1, "waste_rate": 0.5}
+    assert {"category": None, "added": 1, "consumed": 0, "discarded": 0, "waste_rate": None} in week["categories"]
+    assert [d["discarded"] for d in week["daily"]] == [0, 0, 2, 0, 0, 0, 0]
+    assert week["previous"] == {"start": "2024-05-27", "end": "2024-06-02", "consumed": 1, "discarded": 0,
+                                "waste_rate": 0.0}
+    month = engine.report("alice", "month", "2024-06-30")
+    assert (month["added"]["count"], month["consumed"]["count"], len(month["daily"])) == (4, 2, 30)
+    assert month["previous"]["consumed"] == 1
+    assert engine.report("bob", "week", TODAY)["added"]["count"] == 0
+    with pytest.raises(ValueError):
+        engine.report("alice", "week", "2024-13-01")
+
+    # 报告只按主键范围读该周期的汇总行，与历史长短无关
+    with store.pool.connection() as conn:
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT day, metric, key, count, quantity FROM daily_stats "
+            "WHERE user_id = ? AND day >= ? AND day <= ? AND count != 0", ("alice", "2024-05-27", "2024-06-09")))
+    assert "USING PRIMARY KEY (user_id=? AND day>? AND day<?)" in plan
+
+
+def test_scans_are_buffered_and_flushed(store):
+    engine = AnalyticsEngine(store)
+    assert engine.record_scan("alice", "freshness", {"status": "success", "label": "新鲜"}, day=TODAY)
+    assert engine.record_scan("alice", "freshness", {"status": "success", "label": "新鲜"}, day=TODAY)
+    assert engine.record_scan("alice", "dates", {"text": "生产日期"}, day=TODAY)
+    assert not engine.record_scan("alice", "freshness", {"status": "error", "message": "图片解码失败"})
+    assert not engine.record_scan(None, "ocr", {"text": "x"})
+    assert engine.pending() == 2 and _stats(store) == []
+
+    # 报告前先写入本进程的计数
+    week = engine.report("alice", "week", TODAY)
+    assert week["freshness"] == {"scans": 2, "labels": {"新鲜": 2}}
+    assert week["ocr"] == {"scans": 1, "kinds": {"dates": 1}}
+    assert week["daily"][2]["scans"] == 3 and engine.pending() == 0
+    engine.record_scan("alice", "freshness", {"status": "success", "label": "变质"}, day=TODAY)
+    assert engine.flush() == 1 and engine.flush() == 0
+    assert engine.report("alice", "week", TODAY)["freshness"]["labels"] == {"新鲜": 2, "变质": 1}
+
+    # fork 出的子进程不重复写入父进程还没写入的计数
+    engine.record_scan("alice", "ocr", {"text": "x"})
+    engine._after_fork()
+    assert engine.pending() == 0
+
+
+def test_report_endpoints(tmp_path, monkeypatch):
+    store = InventoryStore(str(tmp_path / "api.sqlite3"))
+    monkeypatch.setattr(inventory, "_store", store)
+    monkeypatch.setattr(analytics, "_engine", AnalyticsEngine(store))
+    ids = client.post("/api/inventory/alice/items", json={"items": [
+        {"name": "酸奶", "category": "乳制品"}, {"name": "菠菜", "category": "蔬菜"}, {"name": "面包"}]}).json()["ids"]
+    client.patch(f"/api/inventory/alice/items/{ids[0]}", json={"status": "consumed"})
+    client.patch(f"/api/inventory/alice/items/{ids[1]}", json={"status": "discarded"})
+
+    # 异步任务成功后按提交者记扫描次数
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_queue", queue)
+    queue.submit("alice", "freshness", b"img")
+
+    async def freshness(img):
+        return {"status": "success", "label": "新鲜", "score": 0.9}
+
+    asyncio.run(JobWorker(queue, {"freshness": freshness}, on_success=app.main._record_job).run_once())
+
+    week = client.get("/api/reports/alice/weekly").json()
+    assert (week["added"]["count"], week["consumed"]["count"], week["discarded"]["count"]) == (3, 1, 1)
+    assert week["waste_rate"] == 0.5 and week["freshness"] == {"scans": 1, "labels": {"新鲜": 1}}
+    month = client.get("/api/reports/alice/monthly", params={"date": date.today().isoformat()}).json()
+    assert (month["period"], month["added"]["count"]) == ("month", 3)
+    assert client.get("/api/reports/alice/weekly", params={"date": "yesterday"}).status_code == 400
+    jobs.close_job_queue()
+    analytics.close_analytics()
+    inventory.close_store()
@@ -0,0 +1,86 @@
+# test_batch_api.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.cache import ResultCache
+from app.backend.preprocessing import decode_many
+
+client = TestClient(app.main.app)
+
+
+def _jpeg(value: int) -> bytes:
+    _, buf = cv2.imencode(".jpg", np.full((120, 160, 3), value, dtype=np.uint8))
+    return buf.tobytes()
+
+
+def test_decode_many_keeps_order_and_failures():
+    images = [_jpeg(10), b"not an image", _jpeg(200)]
+    decoded = decode_many(lambda b: cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR), images)
+    assert decoded[1] is None
+    assert decoded[0][0, 0, 0] < decoded[2][0, 0, 0]
+
+
+def test_run_cached_batch_dedups_and_caches():
+    cache = ResultCache("batch_test", max_entries=16)
+    calls = []
+
+    def compute(batch):
+        calls.append(len(batch))
+        return [{"status": "success", "size": len(b)} for b in batch]
+
+    images = [b"aa", b"bbb", b"aa", None]
+    results = app.main._run_cached_batch(cache, "v1", images, compute)
+    assert calls == [2]  # 重复图片只算一次
+    assert [r["status"] for r in results] == ["success", "success", "success", "error"]
+    assert results[0] == results[2]
+
+    app.main._run_cached_batch(cache, "v1", images[:3], compute)
+    assert calls == [2]  # 第二次全部命中缓存
+
+
+def test_ocr_batch_endpoint_per_item_errors(monkeypatch):
+    seen = []
+
+    def fake_batch(images):
+        seen.append(len(images))
+        return [{"status": "success", "text": f"{len(b)}"} for b in images]
+
+    monkeypatch.setattr(app.main, "do_ocr_batch", fake_batch)
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    files = [("files", ("a.jpg", _jpeg(30), "image/jpeg")),
+             ("files", ("b.txt", b"hello", "text/plain")),
+             ("files", ("c.jpg", _jpeg(90), "image/jpeg"))]
+    response = client.post("/ocr/batch", files=files)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 3 and data["succeeded"] == 2
+    assert data["results"][1]["status"] == "error"
+    assert data["results"][2]["filename"] == "c.jpg"
+    assert seen == [2]
+
+
+def test_freshness_batch_endpoint():
+    files = [("files", ("a.jpg", _jpeg(40), "image/jpeg")),
+             ("files", ("broken.jpg", b"\xff\xd8broken", "image/jpeg")),
+             ("files", ("c.jpg", _jpeg(160), "image/jpeg"))]
+    response = client.post("/api/freshness/batch", files=files)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["success", "error", "success"]
+    # 文件头无法识别，读取阶段即被拒绝，不进入解码
+    assert data["results"][1]["message"] == "无法识别的图片文件"
+    assert "advice" in data["results"][0]
+
+
+def test_batch_too_many_files(monkeypatch):
+    monkeypatch.setitem(app.main._batch_cfg, "max_files", 1)
+    files = [("files", ("a.jpg", _jpeg(40), "image/jpeg"))] * 2
+    assert client.post("/api/freshness/batch", files=files).status_code == 413
@@ -0,0 +1,73 @@
+# test_batching.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import cv2
+import numpy as np
+import pytest
+from app.backend.batching import MicroBatcher
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    """并发提交的请求应被合并成较大的批，且结果按调用方一一返回"""
+    seen_batches = []
+    release = threading.Event()
+
+    def batch_fn(items):
+        release.wait(1.0)  # 第一批阻塞片刻，让后续请求在队列里堆积
+        seen_batches.append(len(items))
+        return [x * 2 for x in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=20, name="test")
+    futures = [batcher.submit(i) for i in range(20)]
+    release.set()
+    assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(20)]
+    batcher.close(timeout=5)
+
+    assert sum(seen_batches) == 20
+    assert max(seen_batches) <= 8
+    assert len(seen_batches) < 20
+
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == len(seen_batches)
+    assert stats["queue_wait_ms"]["count"] == 20
+    assert stats["batch_size"]["buckets"]["+Inf"] == len(seen_batches)
+
+
+def test_micro_batcher_propagates_errors():
+    """批处理函数异常时，批内每个调用方都应收到异常"""
+    def batch_fn(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=1, name="test-error")
+    future = batcher.submit(1)
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+    batcher.close(timeout=5)
+
+
+def test_predict_batch_matches_predict():
+    """批量前向的结果应与逐张预测一致，坏图片单独报错"""
+    from app.backend.freshness_detector import FreshnessDetector
+
+    detector = FreshnessDetector(device="cpu")
+    images = []
+    for value in (40, 120, 220):
+        img = np.full((160, 200, 3), value, dtype=np.uint8)
+        cv2.circle(img, (100, 80), 40, (0, 0, 255), -1)
+        _, buf = cv2.imencode('.jpg', img)
+        images.append(buf.tobytes())
+    images.append(b"invalid_image_data")
+
+    batch_results = detector.predict_batch(images)
+    assert len(batch_results) == 4
+    for image_bytes, batch_result in zip(images[:3], batch_results[:3]):
+        single = detector.predict(image_bytes)
+        assert batch_result["status"] == "success"
+        assert batch_result["label"] == single["label"]
+        assert batch_result["score"] == pytest.approx(single["score"], abs=1e-5)
+    assert batch_results[3]["status"] == "error"
@@ -0,0 +1,38 @@
+# test_benchmarks.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from benchmarks.common import summarize, synthetic_image, unique_variant
+from benchmarks.compare import compare
+
+
+def test_summarize_percentiles():
+    stats = summarize(range(1, 101))
+    assert stats["n"] == 100
+    assert stats["p50_ms"] == 50.5
+    assert stats["p99_ms"] == 99.01
+    assert summarize([]) == {"n": 0}
+
+
+def test_synthetic_images_decode_and_variants_differ():
+    data = synthetic_image(320, 240, seed=1)
+    assert data == synthetic_image(320, 240, seed=1)
+    variant = unique_variant(data, 7)
+    assert variant != data
+    img = cv2.imdecode(np.frombuffer(variant, np.uint8), cv2.IMREAD_COLOR)
+    assert img.shape == (240, 320, 3)
+
+
+def test_compare_flags_regressions():
+    baseline = {"stages": {"decode": {"p50_ms": 10.0, "n": 20}},
+                "endpoints": {"health": {"throughput_rps": 100.0}}}
+    current = {"stages": {"decode": {"p50_ms": 12.0, "n": 20}},
+               "endpoints": {"health": {"throughput_rps": 150.0}}}
+    report = compare(baseline, current, threshold=0.1)
+    assert [r[0] for r in report["regressions"]] == ["stages.decode.p50_ms"]
+    assert [r[0] for r in report["improvements"]] == ["endpoints.health.throughput_rps"]
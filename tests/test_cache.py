@@ -0,0 +1,101 @@
+# test_cache.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import pytest
+from app.backend.cache import ResultCache, content_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_content_key_depends_on_bytes_and_version():
+    assert content_key(b"img", "v1") == content_key(b"img", "v1")
+    assert content_key(b"img", "v1") != content_key(b"img", "v2")
+    assert content_key(b"img", "v1") != content_key(b"img2", "v1")
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = ResultCache("t", max_entries=2, ttl_seconds=10, clock=clock)
+    cache.set("a", {"label": "新鲜"})
+    cache.set("b", 2)
+    assert cache.get("a") == {"label": "新鲜"}  # a 变为最近使用
+    cache.set("c", 3)                           # 淘汰最久未用的 b
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    clock.now += 11
+    assert cache.get("a") is None               # 已过期
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+
+
+def test_returned_values_are_independent_copies():
+    cache = ResultCache("t")
+    cache.set("k", {"label": "新鲜"})
+    cache.get("k")["advice"] = "x"
+    assert cache.get("k") == {"label": "新鲜"}
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    first = ResultCache("ocr", disk_path=db)
+    first.set("k", "水、食用盐")
+    first.close()
+
+    second = ResultCache("ocr", disk_path=db)
+    assert second.get("k") == "水、食用盐"
+    assert second.stats()["disk_hits"] == 1
+    assert second.get("k") == "水、食用盐"      # 第二次从内存层命中
+    assert second.stats()["hits"] == 1
+    second.close()
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    cache = ResultCache("t")
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"status": "success"}
+
+    def worker(results):
+        barrier.wait()
+        results.append(cache.get_or_compute("same", compute))
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"status": "success"}] * 8
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_failed_results_are_not_cached():
+    cache = ResultCache("t")
+    result = cache.get_or_compute("k", lambda: {"status": "error"},
+                                  should_cache=lambda r: r["status"] == "success")
+    assert result == {"status": "error"}
+    assert cache.get("k") is None
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert cache.get("k") is None
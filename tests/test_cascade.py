@@ -0,0 +1,77 @@
+# test_cascade.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.cascade import FreshnessCascade
+
+client = TestClient(app.main.app)
+
+
+class _Fixed:
+    """按图片字节返回预设置信度的假检测器"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = 0
+
+    def predict(self, data: bytes):
+        self.calls += 1
+        if data not in self.scores:
+            return {"status": "error", "message": "图片解码失败"}
+        return {"status": "success", "label": "新鲜", "score": self.scores[data], "all_results": []}
+
+
+def test_escalates_only_when_uncertain():
+    cheap = _Fixed({b"clear": 0.95, b"unsure": 0.6, b"hard": 0.3})
+    deep = _Fixed({b"unsure": 0.9, b"hard": 0.4})
+    cascade = FreshnessCascade(cheap, deep.predict, high_confidence=0.8, low_confidence=0.5)
+
+    assert cascade.predict(b"clear")["tier"] == "simple"
+    assert deep.calls == 0
+    unsure = cascade.predict(b"unsure")
+    assert (unsure["tier"], unsure["score"], unsure["cheap_score"], unsure["low_confidence"]) == ("deep", 0.9, 0.6, False)
+    assert cascade.predict(b"hard")["low_confidence"] is True
+    assert cascade.predict(b"broken")["status"] == "error" and deep.calls == 2
+
+    stats = cascade.stats()
+    assert (stats["simple"], stats["deep"], stats["low_confidence"], stats["errors"]) == (1, 2, 1, 1)
+    assert stats["escalation_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_thresholds_validated_and_loaded_from_config():
+    with pytest.raises(ValueError):
+        FreshnessCascade(None, None, high_confidence=0.4, low_confidence=0.6)
+    cascade = FreshnessCascade.from_config(None, None, {"high_confidence": 0.9, "low_confidence": 0.3})
+    assert (cascade.high_confidence, cascade.low_confidence) == (0.9, 0.3)
+    assert app.main.freshness_cascade.high_confidence == 0.8
+
+
+def test_cascade_endpoint(monkeypatch):
+    deep = {"status": "success", "label": "一般", "score": 0.7, "all_results": []}
+    monkeypatch.setattr(app.main.freshness_cascade, "deep_predict", lambda data: deep)
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        apple = f.read()
+    response = client.post("/api/freshness", params={"cascade": True}, files={"file": ("a.jpg", apple, "image/jpeg")})
+    assert response.status_code == 200
+    assert (response.json()["tier"], response.json()["label"]) == ("simple", "新鲜")
+
+    # 灰底文字图：经典检测器拿不准 → 交给深度模型
+    gray = np.full((300, 300, 3), 200, dtype=np.uint8)
+    cv2.putText(gray, "Fresh", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)
+    data = cv2.imencode(".jpg", gray)[1].tobytes()
+    result = client.post("/api/freshness?cascade=true", files={"file": ("g.jpg", data, "image/jpeg")}).json()
+    assert (result["tier"], result["label"]) == ("deep", "一般") and "advice" in result
+    assert deep == {"status": "success", "label": "一般", "score": 0.7, "all_results": []}
+
+    stats = client.get("/api/freshness/cascade").json()
+    assert stats["deep"] >= 1 and 0 < stats["escalation_rate"] < 1
+    assert 'smart_food_cascade_answers_total{tier="deep"}' in client.get("/metrics").text
@@ -0,0 +1,173 @@
+# test_dataset_pack.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app.backend.dataset_pack import (PackedDataset, PackedLoader, augment_batch, config_classes, load_square,
+                                      model_classes, pack_dataset)
+from app.backend.preprocessing import IMAGENET_MEAN, IMAGENET_STD, Preprocessor
+
+# 每个类别一种颜色（BGR），尺寸各不相同
+COLORS = {"fresh": (40, 200, 40), "normal": (40, 200, 200), "spoiled": (40, 40, 160)}
+
+
+@pytest.fixture
+def dataset_dir(tmp_path):
+    root = tmp_path / "dataset"
+    for split, count in (("train", 10), ("val", 3)):
+        for name, color in COLORS.items():
+            class_dir = root / split / name
+            class_dir.mkdir(parents=True)
+            for i in range(count):
+                img = np.full((80 + 7 * i, 120 - 3 * i, 3), color, np.uint8)
+                cv2.imwrite(str(class_dir / f"{i:02d}.jpg"), img)
+    (root / "train" / "fresh" / "broken.jpg").write_bytes(b"not a jpeg")
+    return root
+
+
+def _denormalize(batch):
+    mean = np.asarray(IMAGENET_MEAN)[None, :, None, None]
+    std = np.asarray(IMAGENET_STD)[None, :, None, None]
+    return (batch * std + mean) * 255
+
+
+def test_pack_and_read(dataset_dir, tmp_path):
+    out = tmp_path / "packed"
+    result = pack_dataset(str(dataset_dir), str(out), size=64, shard_size=8, workers=2)
+    train = result["train"]
+    assert (train["count"], train["skipped"], train["classes"]) == (30, 1, ["fresh", "normal", "spoiled"])
+    index = json.loads((out / "train" / "index.json").read_text(encoding="utf-8"))
+    assert [s["count"] for s in index["shards"]] == [8, 8, 8, 6]
+    assert result["val"]["count"] == 9
+
+    dataset = PackedDataset(str(out / "train"))
+    images, labels = dataset.get([29, 0, 15, 8])
+    assert images.shape == (4, 64, 64, 3) and labels.tolist() == [2, 0, 1, 0]
+    # 存的是 RGB：spoiled 红色通道最亮，fresh 绿色通道最亮
+    assert images[0].reshape(-1, 3).mean(axis=0).argmax() == 0
+    assert images[1].reshape(-1, 3).mean(axis=0).argmax() == 1
+
+    # 源目录没变：不重新打包；改了一张图：重新打包
+    assert pack_dataset(str(dataset_dir), str(out), size=64, shard_size=8)["train"]["packed"] is False
+    cv2.imwrite(str(dataset_dir / "train" / "normal" / "new.jpg"), np.zeros((70, 70, 3), np.uint8))
+    again = pack_dataset(str(dataset_dir), str(out), size=64, shard_size=8)["train"]
+    assert again["packed"] and again["count"] == 31
+
+
+def test_augment_batch_crops_flips_and_jitter():
+    side, size = 48, 32
+    # R = 列号，G = 行号，B = 常数：能从输出反推出裁剪位置和是否翻转
+    cols, rows = np.meshgrid(np.arange(side), np.arange(side))
+    image = np.stack([cols * 5, rows * 5, np.full_like(cols, 100)], axis=-1).astype(np.uint8)
+    batch = np.repeat(image[None], 16, axis=0)
+
+    center = _denormalize(augment_batch(batch[:1], np.random.default_rng(0), size=size, train=False))
+    assert np.allclose(center[0, 0, 0], np.arange(8, 8 + size) * 5, atol=1e-3)
+
+    out = _denormalize(augment_batch(batch, np.random.default_rng(1), size=size, jitter=0))
+    flipped = 0
+    for sample in np.rint(out).astype(int) // 5:
+        r, g = sample[0, 0], sample[1, :, 0]
+        assert (np.diff(g) == 1).all() and 0 <= g[0] <= side - size
+        flipped += int((np.diff(r) == -1).all())
+        assert (np.diff(r) == 1).all() or (np.diff(r) == -1).all()
+    assert 0 < flipped < 16
+
+    jittered = augment_batch(batch, np.random.default_rng(2), size=size)
+    assert np.array_equal(jittered, augment_batch(batch, np.random.default_rng(2), size=size))
+    values = _denormalize(jittered)
+    assert values.min() >= -1e-3 and values.max() <= 255 + 1e-3
+    # 每张图的扰动系数不同
+    assert len({round(float(v), 3) for v in values[:, 2].mean(axis=(1, 2))}) > 8
+
+
+def test_loader_is_deterministic_across_worker_counts(dataset_dir, tmp_path):
+    out = tmp_path / "packed"
+    pack_dataset(str(dataset_dir), str(out), size=40, shard_size=8, workers=2)
+    path = str(out / "train")
+
+    def epochs(num_workers):
+        with PackedLoader(path, batch_size=4, size=32, num_workers=num_workers, prefetch=2, seed=3) as loader:
+            assert len(loader) == 8
+            first = [(images.copy(), labels.copy()) for images, labels in loader]
+            # 中途 break：在途的批要等写完，下一个 epoch 不受影响
+            for _ in zip(range(2), loader):
+                pass
+            third = [(images.copy(), labels.copy()) for images, labels in loader]
+        return first, third
+
+    in_process, with_workers = epochs(0), epochs(2)
+    for a, b in zip(in_process, with_workers):
+        assert all(np.array_equal(x[0], y[0]) and np.array_equal(x[1], y[1]) for x, y in zip(a, b))
+    first, third = with_workers
+    # 每个 epoch 覆盖全部样本（最后一批不满），顺序各不相同
+    assert sorted(np.concatenate([l for _, l in first]).tolist()) == [0] * 10 + [1] * 10 + [2] * 10
+    assert len(first[-1][1]) == 2
+    assert not all(np.array_equal(x[1], y[1]) for x, y in zip(first, third))
+
+    with PackedLoader(path, batch_size=4, size=32, train=False, num_workers=0) as val:
+        labels = np.concatenate([l for _, l in val])
+        assert labels.tolist() == sorted(labels.tolist())
+
+
+def test_stretch_geometry_matches_serving(tmp_path):
+    # 左半蓝、右半红的宽图：crop 会裁掉两边，stretch 与线上一样保留整张图
+    img = np.zeros((60, 180, 3), np.uint8)
+    img[:, :90] = (255, 0, 0)
+    img[:, 90:] = (0, 0, 255)
+    path = tmp_path / "wide.png"
+    cv2.imwrite(str(path), img)
+
+    stretched = load_square(str(path), 32)
+    assert np.array_equal(stretched, cv2.cvtColor(cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA),
+                                                  cv2.COLOR_BGR2RGB))
+    cropped = load_square(str(path), 32, geometry="crop")
+    assert cropped[:, 0, 2].mean() > 200 and cropped[:, -1, 0].mean() > 200
+    with pytest.raises(ValueError):
+        load_square(str(path), 32, geometry="pad")
+
+    # 验证时整图缩放到输入大小，与线上 Preprocessor 的结果一致（只差两次缩放的取整）
+    serving = Preprocessor(size=24).preprocess(img)
+    val = augment_batch(stretched[None], np.random.default_rng(0), size=24, train=False, full_view=True)
+    assert val[0].shape == serving.shape and np.abs(val[0] - serving).mean() < 0.1
+
+
+def test_geometry_change_repacks(dataset_dir, tmp_path):
+    out = tmp_path / "packed"
+    pack_dataset(str(dataset_dir), str(out), size=40, shard_size=8)
+    assert PackedDataset(str(out / "val")).geometry == "stretch"
+    again = pack_dataset(str(dataset_dir), str(out), size=40, shard_size=8, geometry="crop")["val"]
+    assert again["packed"] and PackedDataset(str(out / "val")).geometry == "crop"
+    with PackedLoader(str(out / "val"), batch_size=4, size=32, train=False) as val:
+        assert val.full_view is False
+
+
+def test_classes_follow_serving_labels(dataset_dir, tmp_path):
+    # 类别号按线上 labels 的顺序，而不是目录名的字母序
+    classes = model_classes(["变质", "新鲜", "一般"], {"新鲜": "fresh", "一般": "normal", "变质": "spoiled"})
+    assert classes == ["spoiled", "fresh", "normal"]
+    assert config_classes() == ["fresh", "normal", "spoiled"]
+    with pytest.raises(ValueError):
+        model_classes(["新鲜", "一般", "轻微变质"], {"新鲜": "fresh", "一般": "normal"})
+
+    out = tmp_path / "packed"
+    result = pack_dataset(str(dataset_dir), str(out), size=32, shard_size=64, classes=classes)
+    assert result["train"]["classes"] == result["val"]["classes"] == classes
+    images, labels = PackedDataset(str(out / "train")).get(range(30))
+    spoiled = images[labels == 0].reshape(-1, 3).mean(axis=0)
+    assert spoiled.argmax() == 0 and (labels == 0).sum() == 10
+
+    # 数据集目录与类别对不上（多出 / 缺少）时报错，而不是悄悄少一类或忽略一个目录
+    (dataset_dir / "train" / "moldy").mkdir()
+    with pytest.raises(ValueError, match="moldy"):
+        pack_dataset(str(dataset_dir), str(out), size=32, classes=classes)
+    with pytest.raises(ValueError, match="slightly_spoiled"):
+        pack_dataset(str(dataset_dir), str(out), size=32, classes=classes + ["slightly_spoiled"])
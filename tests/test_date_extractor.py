@@ -0,0 +1,66 @@
+# test_date_extractor.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.date_extractor import add_duration, extract_dates, scan
+from benchmarks.common import synthetic_date_labels
+
+client = TestClient(app.main.app)
+
+
+@pytest.mark.parametrize("text, production, expiry, source", [
+    ("生产日期：2024.05.01\n保质期：12个月", "2024-05-01", "2025-04-30", "computed"),
+    ("生产日期(年/月/日)：2024年5月1日 保质期：常温十八个月", "2024-05-01", "2025-10-31", "computed"),
+    ("保质期：180天 生产日期：20240131", "2024-01-31", "2024-07-28", "computed"),
+    ("生产日期：见瓶盖喷码 保质期至 2025/04/30", None, "2025-04-30", "label"),
+    ("20240501 20250430", "2024-05-01", "2025-04-30", "inferred"),
+    ("ＭＦＤ ２０２４０５０１ 保质期：２年", "2024-05-01", "2026-04-30", "computed"),
+])
+def test_extract_label_formats(text, production, expiry, source):
+    result = extract_dates(text)
+    assert (result["production_date"], result["expiry_date"], result["expiry_source"]) == (production, expiry, source)
+
+
+def test_see_print_and_noise():
+    result = extract_dates("生产日期：见包装封口处\n保质期：12个月\n开封后请冷藏并于3天内饮用", today=date(2024, 1, 1))
+    assert result["see_print"] and result["expiry_date"] is None and result["days_left"] is None
+    assert result["shelf_life"] == {"value": 12, "unit": "month", "text": "12个月"}
+    # 非法日期、没有"保质期"标签的时长都不算
+    assert extract_dates("冷藏7天 2024-13-01")["dates"] == []
+    assert [kind for kind, *_ in scan("Express delivery")] == []
+
+
+def test_month_arithmetic_clamps_to_month_end():
+    assert add_duration(date(2024, 1, 31), 1, "month") == date(2024, 2, 29)
+    assert add_duration(date(2024, 2, 29), 1, "year") == date(2025, 2, 28)
+    assert extract_dates("保质期至 2025-04-30 保质期 12个月")["production_date"] == "2024-05-01"
+
+
+def test_synthetic_corpus():
+    for text, expected in synthetic_date_labels(500, seed=1):
+        assert extract_dates(text)["expiry_date"] == expected, text
+
+
+def test_dates_endpoint(monkeypatch):
+    response = client.post("/api/dates", data={"text": "生产日期：2024-05-01 保质期：7天"})
+    assert response.status_code == 200
+    assert response.json()["expiry_date"] == "2024-05-07"
+    assert client.post("/api/dates").status_code == 400
+
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    monkeypatch.setattr(app.main, "do_ocr", lambda img: "20240501\n20250430")
+    _, buf = cv2.imencode(".jpg", np.full((80, 80, 3), 200, dtype=np.uint8))
+    response = client.post("/api/dates", files={"file": ("a.jpg", buf.tobytes(), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["expiry_date"] == "2025-04-30"
@@ -0,0 +1,164 @@
+# test_embedding_index.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import multiprocessing
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import embedding_index
+from app.backend.embedding_index import EmbeddingIndex, kmeans, normalize
+
+client = TestClient(app.main.app)
+
+
+def _clustered(n: int, dim: int = 64, clusters: int = 32, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+
+
+def test_top_k_and_persistence(tmp_path):
+    vectors = _clustered(3000)
+    index = EmbeddingIndex(str(tmp_path / "idx"), model_version="m1")
+    for i, v in enumerate(vectors):
+        index.add(v, {"text": f"label {i}"})
+
+    hits = index.search(vectors[123], k=5)
+    assert hits[0][0] == 123 and hits[0][1] == pytest.approx(1.0, abs=1e-3)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    # 暴力检索结果与 float32 全量计算一致
+    expected = np.argsort(-(normalize(vectors) @ normalize(vectors[7])[0]))[:5]
+    assert [i for i, _ in index.search(vectors[7], k=5)] == list(expected)
+    index.close()
+
+    reopened = EmbeddingIndex(str(tmp_path / "idx"), model_version="m1")
+    assert (reopened.count, reopened.dim) == (3000, 64)
+    assert reopened.lookup(vectors[42] + 0.01, threshold=0.95)["result"] == {"text": "label 42"}
+    assert reopened.lookup(-vectors[42], threshold=0.95) is None
+    reopened.close()
+
+    # 模型换了，旧向量不可比：整个索引清空
+    changed = EmbeddingIndex(str(tmp_path / "idx"), model_version="m2")
+    assert changed.count == 0 and changed.search(vectors[0]) == []
+    changed.close()
+
+
+def test_ivf_partition_recall(tmp_path):
+    vectors = _clustered(4000, seed=1)
+    index = EmbeddingIndex(str(tmp_path / "ivf"), model_version="m", nlist=32, nprobe=4, train_size=3000)
+    for i, v in enumerate(vectors):
+        index.add(v, {"text": str(i)})
+    assert index.stats()["nlist"] == 32
+
+    # 每个查询都是库里某条向量加一点噪声，要能找回那一条（训练前后加入的都算）
+    rng = np.random.default_rng(2)
+    probes = rng.choice(len(vectors), 200, replace=False)
+    found = sum(index.search(vectors[i] + 0.05 * rng.normal(size=64), k=1)[0][0] == i for i in probes)
+    assert found / len(probes) >= 0.95
+    index.close()
+
+    reopened = EmbeddingIndex(str(tmp_path / "ivf"), model_version="m", nlist=32, nprobe=4, train_size=3000)
+    assert reopened.centroids is not None and sum(len(l) for l in reopened._lists) == 4000
+    assert reopened.search(vectors[3999], k=1)[0][0] == 3999
+    reopened.close()
+
+
+def test_kmeans_separates_clusters():
+    data = np.concatenate([np.tile([1.0, 0, 0], (50, 1)), np.tile([0, 1.0, 0], (50, 1))])
+    centroids = kmeans(data + 0.01, 2)
+    assert sorted(np.argmax(centroids, axis=1).tolist()) == [0, 1]
+
+
+def test_known_packaging_skips_ocr(tmp_path, monkeypatch):
+    class FakeDetector:
+        model_version = "fake"
+
+        def embed(self, image_bytes):
+            rng = np.random.default_rng(len(image_bytes))
+            return rng.normal(size=16)
+
+    calls = []
+
+    def fake_ocr(img):
+        calls.append(img)
+        return "纯牛奶 保质期6个月"
+
+    monkeypatch.setattr(app.main, "_index_cfg", {"enabled": True, "match_threshold": 0.95})
+    monkeypatch.setattr(app.main, "_index_unavailable", False)
+    monkeypatch.setattr(app.main, "get_freshness_detector", lambda: FakeDetector())
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    monkeypatch.setattr(app.main, "do_ocr", fake_ocr)
+    monkeypatch.setattr(embedding_index, "_index", EmbeddingIndex(str(tmp_path / "idx"), model_version="fake"))
+
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        data = f.read()
+    first = client.post("/ocr/", files={"file": ("a.jpg", data, "image/jpeg")}).json()
+    assert first == {"text": "纯牛奶 保质期6个月"}
+    # 同一张图换个文件名再传：向量相同，直接返回索引里的结果
+    second = client.post("/ocr/", files={"file": ("b.jpg", data, "image/jpeg")}).json()
+    assert second["text"] == first["text"] and second["index_match"]["similarity"] == pytest.approx(1.0, abs=1e-3)
+    assert len(calls) == 1
+    assert client.get("/api/ocr/index").json()["count"] == 1
+    assert 'smart_food_label_index_lookups_total{outcome="hit"}' in client.get("/metrics").text
+    embedding_index.close_index()
+
+
+def test_untrained_model_falls_back_to_ocr(tmp_path, monkeypatch):
+    import paddle
+    from app.backend.freshness_backends import EagerBackend
+
+    backend = EagerBackend(3)
+    with pytest.raises(RuntimeError):
+        backend.features(np.zeros((1, 3, 224, 224), np.float32))
+    weights = str(tmp_path / "w.pdparams")
+    paddle.save(backend.model.state_dict(), weights)
+    assert EagerBackend(3, weights_path=weights).features(np.zeros((2, 3, 224, 224), np.float32)).shape == (2, 1280)
+
+    class Untrained:
+        def embed(self, image_bytes):
+            return backend.features(np.zeros((1, 3, 224, 224), np.float32))[0]
+
+    monkeypatch.setattr(app.main, "_index_cfg", {"enabled": True})
+    monkeypatch.setattr(app.main, "_index_unavailable", False)
+    monkeypatch.setattr(app.main, "get_freshness_detector", lambda: Untrained())
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    monkeypatch.setattr(app.main, "do_ocr", lambda img: "酸奶")
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        response = client.post("/ocr/", files={"file": ("a.jpg", f.read(), "image/jpeg")})
+    assert response.json() == {"text": "酸奶"} and app.main._index_unavailable
+
+
+def _add_from_process(path: str, worker: int, vectors: np.ndarray) -> None:
+    index = EmbeddingIndex(path, model_version="m1", nlist=4, train_size=96)
+    for i in range(0, len(vectors), 4):
+        index.add_many(vectors[i:i + 4], [{"worker": worker, "row": i + j} for j in range(len(vectors[i:i + 4]))])
+    index.close()
+
+
+def test_concurrent_writers_get_distinct_ids(tmp_path):
+    """两个进程（如 uvicorn --workers 2）同时往同一个索引目录写：id 不重复，向量不互相覆盖"""
+    path = str(tmp_path / "idx")
+    vectors = {w: _clustered(160, dim=16, seed=w) for w in (1, 2)}
+    # 写入前就打开的索引（另一个 worker）也能看到其他进程写入的条目
+    reader = EmbeddingIndex(path, model_version="m1", nlist=4, train_size=96)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_add_from_process, args=(path, w, vectors[w])) for w in (1, 2)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    assert reader.stats()["count"] == 320 and reader.stats()["nlist"] == 4
+    for w, vecs in vectors.items():
+        for row in (0, 77, 159):
+            match = reader.lookup(vecs[row], threshold=0.999)
+            assert match is not None and match["result"] == {"worker": w, "row": row}
+    reader.close()
@@ -0,0 +1,54 @@
+# test_executor.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import time
+
+import pytest
+from app.backend.executor import InferenceExecutor, ExecutorBusyError
+
+
+def test_executor_rejects_when_queue_full():
+    """执行中 + 排队的任务达到上限后，新任务立即被拒绝"""
+    gate = threading.Event()
+    executor = InferenceExecutor("test", max_workers=1, max_queue=1, retry_after=3)
+
+    running = executor.submit(gate.wait, 5)
+    queued = executor.submit(lambda: "queued")
+    assert executor.in_flight() == 2
+
+    with pytest.raises(ExecutorBusyError) as exc_info:
+        executor.submit(lambda: "rejected")
+    assert exc_info.value.retry_after == 3
+
+    gate.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    executor.shutdown()
+    assert executor.in_flight() == 0
+
+
+def test_executor_keeps_event_loop_responsive():
+    """阻塞任务在执行器中运行时，事件循环上的其它协程照常执行"""
+    executor = InferenceExecutor("test-loop", max_workers=1, max_queue=0)
+
+    async def light():
+        began = time.perf_counter()
+        await asyncio.sleep(0.05)
+        return time.perf_counter() - began
+
+    async def main():
+        heavy = asyncio.ensure_future(executor.run(time.sleep, 1.0))
+        await asyncio.sleep(0)   # 让重任务先开始
+        elapsed = await light()
+        # 事件循环被阻塞时 light 要等重任务跑完（约 1s）才能结束
+        assert elapsed < 0.5 and not heavy.done()
+        await heavy
+
+    asyncio.run(main())
+    executor.shutdown()
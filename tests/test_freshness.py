@@ -7,11 +7,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import pytest
 from app.backend.freshness_detector import FreshnessDetector
+
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), "images")
 '''
 def test_freshness_detection():
     detector = FreshnessDetector(device="cpu")
     
-    with open("D:\Smart_Food_Manager\\tests\images\\fresh_apple.jpg", "rb") as f:
+    with open(os.path.join(IMAGES_DIR, "fresh_apple.jpg"), "rb") as f:
         img_bytes = f.read()
     
     result = detector.predict(img_bytes)
@@ -29,7 +31,7 @@ if __name__ == "__main__":
 detector = FreshnessDetector()
 
 # 预测新鲜度
-with open("D:\Smart_Food_Manager\\tests\images\spoiled_banana.jpg", "rb") as f:
+with open(os.path.join(IMAGES_DIR, "spoiled_banana.jpg"), "rb") as f:
     image_bytes = f.read()
     
 result = detector.predict(image_bytes)
@@ -0,0 +1,56 @@
+# test_freshness_backends.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+import pytest
+from app.backend.freshness_backends import EagerBackend, create_backend
+from app.backend.export_freshness_model import compare_backends, export_onnx, export_static
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    """随机初始化一个模型并导出静态图，返回 (eager 后端, 导出参数)"""
+    out_dir = tmp_path_factory.mktemp("models")
+    eager = EagerBackend(3)
+    model_file, params_file = export_static(eager, str(out_dir / "freshness_model"))
+    return eager, {"model_file": model_file, "params_file": params_file,
+                   "onnx_path": str(out_dir / "freshness_model.onnx"), "cpu_threads": 1}
+
+
+def test_paddle_inference_matches_eager(exported):
+    eager, options = exported
+    predictor = create_backend("paddle_inference", 3, options=options)
+    report = compare_backends({"eager": eager, "paddle_inference": predictor}, batch_size=4, runs=2)
+    # 随机初始化模型的输出接近均匀分布，top-1 会受 1e-8 级误差影响，这里只比较概率
+    assert report["paddle_inference"]["max_abs_diff"] < 1e-4
+
+
+def test_onnxruntime_matches_eager(exported):
+    pytest.importorskip("paddle2onnx")
+    pytest.importorskip("onnxruntime")
+    eager, options = exported
+    export_onnx(options["model_file"], options["params_file"], options["onnx_path"])
+    session = create_backend("onnxruntime", 3, options=options)
+    report = compare_backends({"eager": eager, "onnxruntime": session}, batch_size=4, runs=2)
+    assert report["onnxruntime"]["max_abs_diff"] < 1e-4
+
+
+def test_detector_with_static_backend(exported):
+    """FreshnessDetector 通过配置选择 paddle_inference 后端，结果与 eager 一致"""
+    from app.backend.freshness_detector import FreshnessDetector
+
+    eager, options = exported
+    detector = FreshnessDetector(device="cpu", backend="paddle_inference", backend_options=options)
+    img = np.full((200, 200, 3), 90, dtype=np.uint8)
+    _, buf = cv2.imencode(".jpg", img)
+    result = detector.predict(buf.tobytes())
+    assert result["status"] == "success"
+
+    expected = eager(detector.preprocessor.batch([detector._decode_image(buf.tobytes())]))[0]
+    assert result["score"] == pytest.approx(float(expected.max()), abs=1e-4)
+    assert detector.model_version.startswith("paddle_inference:")
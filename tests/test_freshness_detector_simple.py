@@ -66,6 +66,64 @@ def test_with_real_images():
         spoiled_result = detector.predict(f.read())
         print("变质香蕉检测结果:", spoiled_result["label"])
         print_result(spoiled_result)
+
+
+def _encode(img):
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def test_labels_are_deterministic():
+    detector = SimpleFreshnessDetector()
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        apple = f.read()
+    with open("tests/images/spoiled_banana.jpg", "rb") as f:
+        banana = f.read()
+    first = detector.predict(apple)
+    assert first == detector.predict(apple)
+    assert first["label"] == "新鲜"
+    banana_result = detector.predict(banana)
+    assert banana_result["label"] == "变质"
+    assert banana_result["features"]["dark_spots"] > first["features"]["dark_spots"]
+
+    # 白底上的褐色圆 + 暗斑 → 变质；鲜绿色圆 → 新鲜
+    rotten = np.full((300, 300, 3), 245, dtype=np.uint8)
+    cv2.circle(rotten, (150, 150), 100, (30, 80, 140), -1)
+    for x, y in [(110, 120), (170, 140), (140, 190), (190, 180), (120, 170)]:
+        cv2.circle(rotten, (x, y), 8, (20, 25, 35), -1)
+    green = np.full((300, 300, 3), 245, dtype=np.uint8)
+    cv2.circle(green, (150, 150), 100, (40, 180, 60), -1)
+    assert detector.predict(_encode(rotten))["label"] == "变质"
+    assert detector.predict(_encode(green))["label"] == "新鲜"
+    assert abs(sum(r["score"] for r in first["all_results"]) - 1) < 1e-6
+
+
+def test_thresholds_come_from_config():
+    img = np.full((100, 100, 3), 245, dtype=np.uint8)
+    cv2.circle(img, (50, 50), 35, (40, 180, 60), -1)
+    assert SimpleFreshnessDetector({"fresh_below": -1.0, "spoiled_above": -0.9}).predict_image(img)["label"] == "变质"
+    assert SimpleFreshnessDetector({}).predict_image(img)["label"] == "新鲜"
+    assert SimpleFreshnessDetector({}).predict(b"invalid_image_data")["status"] == "error"
+
+
+def test_busy_freshness_falls_back_to_simple_detector(monkeypatch):
+    import app.main
+    from fastapi.testclient import TestClient
+    from app.backend.executor import ExecutorBusyError
+
+    async def busy(*args, **kwargs):
+        raise ExecutorBusyError("freshness", 1)
+
+    monkeypatch.setattr(app.main.freshness_executor, "run", busy)
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        response = TestClient(app.main.app).post("/api/freshness", files={"file": ("a.jpg", f.read(), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["degraded"] is True and response.json()["label"] == "新鲜"
+
+    monkeypatch.setitem(app.main._simple_cfg, "fallback_on_busy", False)
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        response = TestClient(app.main.app).post("/api/freshness", files={"file": ("a.jpg", f.read(), "image/jpeg")})
+    assert response.status_code == 503
+
         
 if __name__ == "__main__":
     #test_freshness_detector()
@@ -0,0 +1,150 @@
+# test_ingest.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageOps
+
+import app.main
+from app.backend import ingest
+from app.backend.ingest import (IngestError, ImageIngestor, RequestSizeLimitMiddleware, apply_orientation,
+                                decode_image, probe, read_upload, reduce_factor)
+
+client = TestClient(app.main.app)
+
+
+def _pattern(h: int = 60, w: int = 90) -> np.ndarray:
+    """左上角红色、右下角绿色的 BGR 图，旋转/翻转后位置可区分"""
+    img = np.zeros((h, w, 3), dtype=np.uint8)
+    img[: h // 2, : w // 3] = (0, 0, 255)
+    img[h // 2:, 2 * w // 3:] = (0, 255, 0)
+    return img
+
+
+def _encode(img: np.ndarray, fmt: str = "JPEG", orientation: int = 1) -> bytes:
+    pil = Image.fromarray(img[:, :, ::-1])
+    exif = pil.getexif()
+    if orientation != 1:
+        exif[0x0112] = orientation
+    buf = io.BytesIO()
+    pil.save(buf, fmt, exif=exif.tobytes(), **({"quality": 95} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+class _Upload:
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+        self.size = None
+        self.reads = 0
+
+    async def read(self, n: int = -1) -> bytes:
+        self.reads += 1
+        return self._buf.read(n)
+
+
+def test_read_upload_enforces_byte_cap():
+    assert asyncio.run(read_upload(_Upload(b"x" * 10), max_bytes=10, chunk_size=4)) == b"x" * 10
+    upload = _Upload(b"x" * 100)
+    with pytest.raises(IngestError) as e:
+        asyncio.run(read_upload(upload, max_bytes=10, chunk_size=4))
+    assert e.value.status_code == 413
+    assert upload.reads == 3  # 超限即停止读取
+
+    known = _Upload(b"x" * 100)
+    known.size = 100
+    with pytest.raises(IngestError):
+        asyncio.run(read_upload(known, max_bytes=10))
+    assert known.reads == 0
+
+
+def test_probe_rejects_before_decoding():
+    info = probe(_encode(_pattern(), orientation=6))
+    assert (info.format, info.width, info.height, info.orientation) == ("JPEG", 90, 60, 6)
+    with pytest.raises(IngestError) as e:
+        probe(b"\xff\xd8broken")
+    assert e.value.status_code == 415
+    with pytest.raises(IngestError) as e:
+        probe(_encode(_pattern()), max_pixels=1000)
+    assert e.value.status_code == 413
+    with pytest.raises(IngestError):
+        ImageIngestor().check(b"")
+
+
+def test_decode_reuses_upload_probe(monkeypatch):
+    data = asyncio.run(read_upload(_Upload(_encode(_pattern(), orientation=6))))
+    info = ImageIngestor().check(data)
+    assert data.info is info and data == _encode(_pattern(), orientation=6)
+
+    def no_probe(*args, **kwargs):
+        raise AssertionError("文件头被重复解析")
+
+    monkeypatch.setattr(ingest, "probe", no_probe)
+    assert decode_image(data).shape == (90, 60, 3)
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_orientation_matches_pil(fmt, orientation):
+    data = _encode(_pattern(), fmt, orientation)
+    expected = np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB"))[:, :, ::-1]
+    decoded = decode_image(data)
+    assert decoded.shape == expected.shape
+    assert np.abs(decoded.astype(int) - expected.astype(int)).mean() < 3
+
+
+def test_apply_orientation_identity():
+    img = _pattern()
+    assert apply_orientation(img, 1) is img
+
+
+def test_downscale_bounds_longest_side():
+    data = _encode(np.full((3000, 4000, 3), 128, dtype=np.uint8))
+    assert reduce_factor(4000, 3000, max_side=1024) == 2
+    assert reduce_factor(4000, 3000, max_side=400) == 8
+    assert reduce_factor(4000, 3000, min_side=224) == 8
+    assert reduce_factor(4000, 3000) == 1
+    img = decode_image(data, max_side=1024)
+    assert img.shape == (768, 1024, 3)
+    # 旋转 90° 的照片按转正后的方向限制
+    rotated = decode_image(_encode(np.full((300, 400, 3), 128, dtype=np.uint8), orientation=6), max_side=100)
+    assert rotated.shape == (100, 75, 3)
+    # 小图不放大
+    assert decode_image(_encode(_pattern()), max_side=1024).shape == (60, 90, 3)
+
+
+def test_endpoint_rejects_oversized_upload(monkeypatch):
+    monkeypatch.setattr(app.main, "ingestor", ImageIngestor(max_bytes=1000))
+    data = _encode(np.random.randint(0, 255, (200, 200, 3), dtype=np.uint8))
+    response = client.post("/api/freshness", files={"file": ("big.jpg", data, "image/jpeg")})
+    assert response.status_code == 413
+
+
+def test_endpoint_rejects_corrupt_upload():
+    response = client.post("/ocr/", files={"file": ("bad.jpg", b"not really a jpeg", "image/jpeg")})
+    assert response.status_code == 415
+
+
+def test_request_size_limit_middleware():
+    from fastapi import FastAPI, Request
+
+    small = FastAPI()
+    small.add_middleware(RequestSizeLimitMiddleware, max_bytes=100)
+
+    @small.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    small_client = TestClient(small)
+    assert small_client.post("/echo", content=b"x" * 50).json() == {"size": 50}
+    assert small_client.post("/echo", content=b"x" * 500).status_code == 413
+    # 分块传输（无 Content-Length）时边读边计数
+    chunks = iter([b"x" * 60, b"x" * 60])
+    assert small_client.post("/echo", content=chunks).status_code == 413
@@ -0,0 +1,109 @@
+# test_ingredients.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.ingredients import (DEFAULT_DICTIONARY, IngredientMatcher, analyze_items,
+                                     compile_automaton, ensure_compiled, load_dictionary, normalize,
+                                     read_fingerprint, split_ingredients)
+
+client = TestClient(app.main.app)
+
+LABEL = ("配料：饮用水、白砂糖、全脂乳粉、食品添加剂（柠檬酸、苯甲\n酸钠、阿斯巴甜、人造奶油）、"
+         "浓缩苹果汁（≥10%）、E 211、E2110、eggplant、酱油。生产日期：见瓶盖")
+
+
+@pytest.fixture(scope="module")
+def matcher(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("ingredients") / "seed.acm")
+    compile_automaton(load_dictionary([DEFAULT_DICTIONARY]), path)
+    m = IngredientMatcher(path)
+    yield m
+    m.close()
+
+
+def test_match_handles_line_breaks_boundaries_and_overlaps(matcher):
+    hits = {(h["term"], matcher.entry(h["entry_id"])["name"]) for h in matcher.match(LABEL)}
+    assert ("苯甲\n酸钠", "苯甲酸钠") in hits           # OCR 断行
+    assert ("E 211", "苯甲酸钠") in hits                # E 编号
+    assert not any(term == "E2110" or "egg" in term for term, _ in hits)   # 英文/数字词边界
+    assert ("人造奶油", "人造奶油") in hits and ("奶油", "牛奶") not in hits  # 被更长匹配覆盖
+    assert {("酱油", "酱油"), ("酱油", "大豆")} <= hits   # 同一片段属于多个条目
+
+
+def test_scan_matches_brute_force(tmp_path):
+    rng = random.Random(0)
+    alphabet = "甲乙丙丁ab"
+    words = sorted({"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(60)})
+    entries = [{"name": w, "category": "additive", "e_number": None, "function": None, "risk": None,
+                "note": None, "synonyms": []} for w in words]
+    path = str(tmp_path / "scan.acm")
+    compile_automaton(entries, path)
+    m = IngredientMatcher(path)
+    try:
+        for _ in range(20):
+            text = "".join(rng.choice(alphabet) for _ in range(50))
+            codes, _ = normalize(text)
+            found = {(s, e, m.entry(m._pattern_entry[p])["name"]) for s, e, p in m.scan(codes)}
+            expected = {(i, i + len(w), w) for w in words for i in range(len(text)) if text.startswith(w, i)}
+            assert found == expected
+    finally:
+        m.close()
+
+
+def test_split_ingredients():
+    tokens = split_ingredients(LABEL)
+    texts = [t["text"] for t in tokens]
+    assert texts[:4] == ["饮用水", "白砂糖", "全脂乳粉", "食品添加剂"]
+    assert "苯甲酸钠" in texts and "见瓶盖" not in texts
+    parent = texts.index("食品添加剂")
+    assert tokens[texts.index("柠檬酸")]["parent"] == parent
+    assert tokens[texts.index("浓缩苹果汁")]["percent"] == "≥10%"
+
+
+def test_analyze_items_keeps_boxes(matcher):
+    items = [{"text": "配料：水、苯甲", "score": 0.9, "box": [[0, 0], [9, 0], [9, 5], [0, 5]]},
+             {"text": "酸钠、牛奶", "score": 0.8, "box": [[0, 6], [9, 6], [9, 11], [0, 11]]}]
+    result = analyze_items(items, matcher)
+    benzoate = next(m for m in result["matches"] if m["name"] == "苯甲酸钠")
+    assert benzoate["lines"] == [0, 1] and benzoate["score"] == pytest.approx(0.8)
+    assert result["allergens"] == [{"group": "乳及乳制品", "terms": ["牛奶"]}]
+    assert any("防腐剂" in w for w in result["warnings"])
+
+
+def test_recompiles_when_dictionary_changes(tmp_path):
+    source = tmp_path / "dict.tsv"
+    source.write_text("name\tcategory\te_number\tfunction\trisk\tsynonyms\tnote\n"
+                      "甲\tadditive\t\t\t\t\t\n", encoding="utf-8")
+    path = str(tmp_path / "dict.acm")
+    ensure_compiled([str(source)], path)
+    first = read_fingerprint(path)
+    mtime = os.path.getmtime(path)
+    ensure_compiled([str(source)], path)
+    assert os.path.getmtime(path) == mtime
+    source.write_text(source.read_text(encoding="utf-8") + "乙\tallergen\t\t\t\t\t\n", encoding="utf-8")
+    ensure_compiled([str(source)], path)
+    assert read_fingerprint(path) != first
+
+
+def test_analyze_endpoints(monkeypatch):
+    response = client.post("/api/ingredients/analyze", json={"text": "配料：小麦粉、山梨酸钾"})
+    assert response.status_code == 200
+    assert [a["name"] for a in response.json()["additives"]] == ["山梨酸钾"]
+
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    monkeypatch.setattr(app.main, "ocr_items", lambda img: [{"text": "配料：花生", "score": 0.9, "box": None}])
+    _, buf = cv2.imencode(".jpg", np.full((80, 80, 3), 200, dtype=np.uint8))
+    response = client.post("/ocr/analyze", files={"file": ("a.jpg", buf.tobytes(), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["allergens"][0]["group"] == "花生"
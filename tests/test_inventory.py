@@ -0,0 +1,137 @@
+# test_inventory.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import inventory
+from app.backend.inventory import InventoryStore
+
+client = TestClient(app.main.app)
+
+TODAY = date(2024, 6, 1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = InventoryStore(str(tmp_path / "inventory.sqlite3"), pool_size=2)
+    yield s
+    s.close()
+
+
+def _day(offset: int) -> str:
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+def test_bulk_insert_and_normalize(store):
+    ids = store.add_items("alice", [
+        {"name": "纯牛奶", "expiry_date": _day(3)},
+        {"name": "饼干", "ocr_text": "生产日期：2024.05.01 保质期：12个月", "freshness": {"label": "新鲜", "score": 0.9}},
+    ])
+    assert len(ids) == 2 and ids[1] == ids[0] + 1
+    biscuit = store.get_item("alice", ids[1])
+    assert (biscuit["production_date"], biscuit["expiry_date"], biscuit["source"]) == ("2024-05-01", "2025-04-30", "ocr")
+    assert biscuit["freshness_label"] == "新鲜"
+    assert store.get_item("bob", ids[0]) is None       # 按用户隔离
+    with pytest.raises(ValueError):
+        store.add_items("alice", [{"name": "x", "expiry_date": "2024-13-01"}])
+    with pytest.raises(ValueError):
+        store.add_items("alice", [{"name": ""}])
+
+
+def test_deleted_ids_are_not_reused(store, tmp_path):
+    ids = store.add_items("alice", [{"name": "a"}, {"name": "b"}, {"name": "c"}])
+    assert store.delete_item("alice", ids[-1])
+    assert store.add_items("alice", [{"name": "d"}]) == [ids[-1] + 1]
+
+    # 旧库（id 没有 AUTOINCREMENT）打开时迁移：数据和 id 不变，之后同样不复用
+    path = str(tmp_path / "old.sqlite3")
+    old = sqlite3.connect(path)
+    old.executescript(inventory._SCHEMA.replace(" AUTOINCREMENT", ""))
+    old.executemany("INSERT INTO items (id, user_id, name, created_at, updated_at) VALUES (?, 'alice', ?, 0, 0)",
+                    [(1, "a"), (2, "b"), (5, "c")])
+    old.commit()
+    old.close()
+    migrated = InventoryStore(path, pool_size=1)
+    assert [migrated.get_item("alice", i)["name"] for i in (1, 2, 5)] == ["a", "b", "c"]
+    assert migrated.delete_item("alice", 5)
+    assert migrated.add_items("alice", [{"name": "d"}]) == [6]
+    migrated.close()
+
+
+def test_keyset_pagination_covers_all_items_in_order(store):
+    offsets = [5, -2, 0, 5, 30, 1, None, 7, None, -10]
+    store.add_items("alice", [{"name": f"item{i}", "expiry_date": _day(o) if o is not None else None}
+                              for i, o in enumerate(offsets)])
+    store.add_items("bob", [{"name": "other", "expiry_date": _day(1)}])
+    seen, cursor = [], None
+    while True:
+        page = store.list_items("alice", limit=3, cursor=cursor, today=TODAY)
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    dated = [i["expiry_date"] for i in seen if i["expiry_date"]]
+    assert len(seen) == len(offsets) and dated == sorted(dated)
+    assert [i["expiry_date"] for i in seen[-2:]] == [None, None]    # 未知到期日排最后
+    assert seen[0]["days_left"] == -10
+
+
+def test_expiring_window_and_status(store):
+    ids = store.add_items("alice", [{"name": f"d{o}", "expiry_date": _day(o)} for o in (-1, 0, 3, 7, 8)])
+    names = [i["name"] for i in store.expiring("alice", 7, today=TODAY)["items"]]
+    assert names == ["d0", "d3", "d7"]
+    assert [i["name"] for i in store.expiring("alice", 3, today=TODAY, include_expired=True)["items"]] == \
+        ["d-1", "d0", "d3"]
+    store.update_item("alice", ids[2], {"status": "consumed"})
+    assert [i["name"] for i in store.expiring("alice", 7, today=TODAY)["items"]] == ["d0", "d7"]
+    assert store.counts("alice", today=TODAY, days=3) == {"active": 4, "expired": 1, "expiring_3d": 1}
+    with pytest.raises(ValueError):
+        store.update_item("alice", ids[0], {"user_id": "bob"})
+
+
+def test_queries_use_index(store):
+    with store.pool.connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM items WHERE user_id = ? AND status = 'active' "
+            "AND expiry_date <= ? AND (expiry_date, id) > (?, ?) ORDER BY expiry_date, id LIMIT 10",
+            ("alice", "2024-06-08", "2024-06-01", 0)).fetchall()
+    detail = " ".join(row[3] for row in plan)
+    assert "idx_items_user_expiry" in detail and "TEMP B-TREE" not in detail
+
+
+def test_async_run_uses_pool_threads(store):
+    async def main():
+        return await asyncio.gather(*(store.run(store.add_items, "alice", [{"name": f"n{i}"}]) for i in range(8)))
+
+    ids = asyncio.run(main())
+    assert sorted(i for batch in ids for i in batch) == list(range(1, 9))
+
+
+def test_inventory_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(inventory, "_store", InventoryStore(str(tmp_path / "api.sqlite3")))
+    today = date.today()
+    response = client.post("/api/inventory/alice/items", json={"items": [
+        {"name": "酸奶", "expiry_date": (today + timedelta(days=2)).isoformat()},
+        {"name": "大米", "expiry_date": (today + timedelta(days=200)).isoformat()}]})
+    assert response.status_code == 200 and response.json()["count"] == 2
+    yogurt = response.json()["ids"][0]
+
+    expiring = client.get("/api/inventory/alice/expiring", params={"days": 3}).json()
+    assert [i["name"] for i in expiring["items"]] == ["酸奶"] and expiring["items"][0]["days_left"] == 2
+    assert client.get("/api/inventory/alice/items", params={"cursor": "bad"}).status_code == 400
+
+    assert client.patch(f"/api/inventory/alice/items/{yogurt}", json={"status": "consumed"}).json()["status"] == "consumed"
+    assert client.get("/api/inventory/alice/summary").json()["active"] == 1
+    assert client.delete(f"/api/inventory/alice/items/{yogurt}").json() == {"deleted": True}
+    assert client.delete(f"/api/inventory/alice/items/{yogurt}").status_code == 404
+    inventory.close_store()
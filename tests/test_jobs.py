@@ -0,0 +1,211 @@
+# test_jobs.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import jobs
+from app.backend.executor import ExecutorBusyError
+from app.backend.jobs import (IdempotencyConflictError, JobQueue, JobQueueFullError, JobWorker, WebhookPolicy,
+                              post_webhook)
+
+client = TestClient(app.main.app)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # 测试用的回调服务在本机：列入白名单
+    q = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=10, max_attempts=2, max_queued_per_user=5,
+                 webhook_policy=WebhookPolicy(["127.0.0.1"]))
+    yield q
+    q.close()
+
+
+def test_claim_is_fair_across_users(queue):
+    for i in range(5):
+        queue.submit("alice", "ocr", f"a{i}".encode())
+    for i in range(2):
+        queue.submit("bob", "ocr", f"b{i}".encode())
+    queue.submit("carol", "ocr", b"c0")
+
+    assert queue.get(queue.submit("bob", "ocr", b"b2")[0]["id"])["position"] == 6
+    claimed = [job["payload"] for job in queue.claim(4)]
+    assert claimed == [b"a0", b"b0", b"c0", b"a1"]
+    assert [job["payload"] for job in queue.claim(10)] == [b"a2", b"b1", b"a3", b"b2", b"a4"]
+    assert queue.stats()["running"] == 9
+
+
+def test_idempotency_and_per_user_limit(queue):
+    job, created = queue.submit("alice", "ocr", b"img", idempotency_key="k1")
+    again, created_again = queue.submit("alice", "ocr", b"img", idempotency_key="k1")
+    assert created and not created_again and again["id"] == job["id"]
+    # 同一个键换了图片：拒绝；别的用户用同一个键互不影响
+    with pytest.raises(IdempotencyConflictError):
+        queue.submit("alice", "ocr", b"other", idempotency_key="k1")
+    assert queue.submit("bob", "ocr", b"other", idempotency_key="k1")[1]
+
+    for i in range(4):
+        queue.submit("alice", "ocr", bytes([i]))
+    with pytest.raises(JobQueueFullError):
+        queue.submit("alice", "ocr", b"too many")
+    with pytest.raises(ValueError):
+        queue.submit("bob", "ocr", b"x", webhook_url="file:///etc/passwd")
+
+
+def test_crash_recovery_and_retention(queue, tmp_path):
+    job, _ = queue.submit("alice", "ocr", b"img")
+    queue.claim(1)
+    queue.close()
+
+    # 进程重启：租约过期的任务回到队列，图片还在
+    restarted = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=10, max_attempts=2)
+    assert restarted.recover(now=time.time() + 11) == 1
+    assert restarted.get(job["id"])["status"] == "queued"
+    assert restarted.claim(1)[0]["payload"] == b"img"
+    # 第二次也没完成：超过 max_attempts，标记失败
+    restarted.recover(now=time.time() + 11)
+    failed = restarted.get(job["id"])
+    assert (failed["status"], failed["attempts"]) == ("failed", 2)
+
+    done, _ = restarted.submit("alice", "ocr", b"ok")
+    restarted.claim(1)
+    restarted.complete(done["id"], {"text": "牛奶"})
+    assert restarted.get(done["id"])["result"] == {"text": "牛奶"}
+    assert restarted.purge(now=time.time() + 86400 + 60) == 2
+    assert restarted.get(done["id"]) is None
+    restarted.close()
+
+
+def test_worker_outcomes_and_webhook(queue):
+    received = []
+
+    class Hook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Hook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/hook"
+
+    flaky_calls = []
+
+    async def ocr(data):
+        if data == b"busy":
+            raise ExecutorBusyError("ocr", 1)
+        if data == b"flaky" and not flaky_calls:
+            flaky_calls.append(data)
+            raise RuntimeError("引擎崩溃")
+        return {"text": data.decode()}
+
+    async def freshness(data):
+        return {"status": "error", "message": "图片解码失败"}
+
+    ok, _ = queue.submit("alice", "ocr", b"hello", webhook_url=url)
+    busy, _ = queue.submit("bob", "ocr", b"busy")
+    flaky, _ = queue.submit("carol", "ocr", b"flaky")
+    bad, _ = queue.submit("dave", "freshness", b"broken")
+    worker = JobWorker(queue, {"ocr": ocr, "freshness": freshness})
+
+    async def run():
+        await worker.run_once()
+        await worker.run_once()
+        await worker.drain()
+
+    asyncio.run(run())
+    server.shutdown()
+
+    assert queue.get(ok["id"])["result"] == {"text": "hello"}
+    assert queue.get(ok["id"])["webhook_status"] == "delivered"
+    assert received == [{"id": ok["id"], "kind": "ocr", "status": "succeeded", "result": {"text": "hello"}, "error": None}]
+    busy_job = queue.get(busy["id"])
+    assert (busy_job["status"], busy_job["attempts"]) == ("queued", 0)
+    flaky_job = queue.get(flaky["id"])
+    assert (flaky_job["status"], flaky_job["attempts"]) == ("succeeded", 2)
+    assert (queue.get(bad["id"])["status"], queue.get(bad["id"])["error"]) == ("failed", "图片解码失败")
+
+
+def test_webhook_policy_rejects_internal_addresses(tmp_path):
+    policy = WebhookPolicy()
+    for url in ("http://127.0.0.1:8000/hook", "http://localhost/hook", "http://10.0.0.5/", "http://192.168.1.1/",
+                "http://169.254.169.254/latest/meta-data/", "http://[::1]/", "http://[::ffff:127.0.0.1]/",
+                "http://0.0.0.0/", "http://224.0.0.1/", "ftp://93.184.216.34/", "http:///hook"):
+        with pytest.raises(ValueError):
+            policy.check(url)
+    policy.check("https://93.184.216.34/hook")
+
+    # 默认策略下提交就拒绝；发送前再检查一次，不会连到内网
+    strict = JobQueue(str(tmp_path / "strict.sqlite3"))
+    with pytest.raises(ValueError, match="内网"):
+        strict.submit("alice", "ocr", b"x", webhook_url="http://127.0.0.1:9/hook")
+    strict.close()
+    assert post_webhook("http://127.0.0.1:9/hook", {}, retries=1) is False
+
+
+def test_webhook_allowlist():
+    policy = WebhookPolicy(["hooks.example.com", "*.internal.example", "127.0.0.1"])
+    for url in ("https://hooks.example.com/cb", "http://ci.internal.example:8080/cb", "http://127.0.0.1:9/hook"):
+        policy.check(url)
+    for url in ("https://evil.example.com/", "https://hooks.example.com.evil.com/", "http://internal.example/",
+                "http://10.0.0.5/"):
+        with pytest.raises(ValueError, match="webhook_allowlist"):
+            policy.check(url)
+
+    # 白名单主机重定向到别处：不跟随
+    received = []
+
+    class Redirect(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(self.path)
+            self.send_response(302)
+            self.send_header("Location", "http://10.0.0.5/")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Redirect)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    assert post_webhook(f"http://127.0.0.1:{server.server_port}/hook", {}, retries=1, policy=policy) is False
+    server.shutdown()
+    assert received == ["/hook"]
+
+
+def test_job_endpoints(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "api.sqlite3"))
+    monkeypatch.setattr(jobs, "_queue", queue)
+    with open("tests/images/fresh_apple.jpg", "rb") as f:
+        data = f.read()
+    files = {"file": ("a.jpg", data, "image/jpeg")}
+
+    first = client.post("/api/jobs", files=files, data={"user_id": "alice"}, headers={"Idempotency-Key": "up-1"})
+    assert first.status_code == 202 and first.json()["status"] == "queued"
+    retry = client.post("/api/jobs", files=files, data={"user_id": "alice"}, headers={"Idempotency-Key": "up-1"})
+    assert retry.status_code == 200 and retry.json()["id"] == first.json()["id"]
+    assert client.post("/api/jobs", files=files, data={"kind": "translate"}).status_code == 400
+
+    async def ocr(img):
+        return {"text": f"{len(img)} bytes"}
+
+    asyncio.run(JobWorker(queue, {"ocr": ocr}).run_once())
+    job = client.get(first.json()["poll_url"]).json()
+    assert (job["status"], job["result"]) == ("succeeded", {"text": f"{len(data)} bytes"})
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.delete(f"/api/jobs/{job['id']}").status_code == 409
+    assert client.get("/api/jobs").json()["succeeded"] == 1
+    jobs.close_job_queue()
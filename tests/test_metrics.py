@@ -0,0 +1,104 @@
+# test_metrics.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+import cv2
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.executor import InferenceExecutor
+from app.backend.metrics import (STAGE_SECONDS, MetricsMiddleware, Registry, _request_timings,
+                                 server_timing_header, stage)
+
+
+def _stage_count(pipeline: str, name: str) -> int:
+    return STAGE_SECONDS.labels(pipeline=pipeline, stage=name).snapshot()["count"]
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    hist = registry.histogram("demo_seconds", "演示", (0.1, 1), ("stage",))
+    hist.labels(stage="decode").observe(0.05)
+    hist.labels(stage="decode").observe(5)
+    registry.counter("demo_total", "计数", ("kind",)).labels(kind="a").inc(3)
+    registry.register_collector("demo_depth", "gauge", "队列深度", lambda: ["demo_depth 7"])
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="decode",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="decode",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{stage="decode"} 2' in text
+    assert 'demo_total{kind="a"} 3.0' in text
+    assert "demo_depth 7" in text
+
+
+def test_stage_feeds_histogram_and_request_timings():
+    before = _stage_count("unit", "step")
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        with stage("unit", "step"):
+            pass
+    finally:
+        _request_timings.reset(token)
+    assert _stage_count("unit", "step") == before + 1
+    assert timings[0][0] == "unit-step"
+    assert server_timing_header([("a", 1.0), ("a", 2.5), ("b", 0.25)]) == "a;dur=3.50, b;dur=0.25"
+
+
+def test_executor_threads_see_request_timings():
+    """线程执行器中记录的阶段也能进入发起请求的 Server-Timing"""
+    executor = InferenceExecutor("ctx", max_workers=1)
+
+    def work():
+        with stage("unit", "in_thread"):
+            pass
+
+    async def request():
+        timings = []
+        _request_timings.set(timings)
+        await executor.run(work)
+        return timings
+
+    try:
+        assert [name for name, _ in asyncio.run(request())] == ["unit-in_thread"]
+    finally:
+        executor.shutdown()
+
+
+def test_server_timing_middleware():
+    demo = FastAPI()
+    demo.add_middleware(MetricsMiddleware, server_timing=True)
+
+    @demo.get("/work")
+    def work():
+        with stage("unit", "handler"):
+            return {"ok": True}
+
+    response = TestClient(demo).get("/work")
+    header = response.headers["server-timing"]
+    assert "unit-handler;dur=" in header and "total;dur=" in header
+
+
+def test_metrics_endpoint_reports_freshness_stages():
+    import app.main
+
+    client = TestClient(app.main.app)
+    _, buf = cv2.imencode(".jpg", np.full((64, 64, 3), 120, dtype=np.uint8))
+    before = _stage_count("freshness", "forward")
+    assert client.post("/api/freshness", files={"file": ("a.jpg", buf.tobytes(), "image/jpeg")}).status_code == 200
+    assert _stage_count("freshness", "forward") >= before + 1
+
+    text = client.get("/metrics").text
+    for stage_name in ("read", "decode", "preprocess", "forward", "softmax", "postprocess"):
+        assert f'smart_food_stage_seconds_count{{pipeline="freshness",stage="{stage_name}"}}' in text
+    assert 'smart_food_http_request_seconds_count{method="POST",route="/api/freshness",status="200"}' in text
+    assert 'smart_food_executor_in_flight{executor="freshness"}' in text
+    assert 'smart_food_cache_events_total{cache="freshness",event="misses"}' in text
+    assert "smart_food_image_bytes_count" in text
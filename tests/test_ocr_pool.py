@@ -0,0 +1,35 @@
+# test_ocr_pool.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.backend.ocr_pool import attach_image, share_image, split_cores
+
+
+def test_split_cores_even_and_oversubscribed():
+    """CPU 核按连续区间平均分配；核数不足时进程共享核"""
+    assert split_cores(range(8), 4) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert split_cores(range(5), 2) == [[0, 1, 2], [3, 4]]
+    assert split_cores([0, 1], 3) == [[0], [1], [0]]
+
+
+def test_shared_memory_image_roundtrip():
+    """经共享内存传递的图片与原图逐像素一致"""
+    img = cv2.imread("tests/images/test.png", cv2.IMREAD_COLOR)
+    assert img is not None
+
+    shm, meta = share_image(img)
+    try:
+        peer, view = attach_image(meta)
+        assert view.shape == img.shape
+        assert view.dtype == np.uint8
+        assert np.array_equal(view, img)
+        del view
+        peer.close()
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,128 @@
+# test_ocr_roi.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import ocr_roi
+from app.backend.ocr_roi import RoiOCR
+
+client = TestClient(app.main.app)
+
+H = 40   # 行高（每个字按 H 宽）
+
+# (文本, 左上角 y)；左边界都是 x=100
+LAYOUT = [
+    ("某某牌纯牛奶", 100),
+    ("营养成分表", 300),
+    ("能量280kJ", 360),
+    ("蛋白质3.2g", 420),
+    ("配料：生牛乳、白砂糖、", 600),
+    ("食品添加剂（单,双甘油脂肪酸酯）", 660),
+    ("贮存条件：常温密闭保存", 720),
+    ("生产日期：", 900),
+    ("20240501", 960),
+    ("保质期：6个月", 1020),
+    ("好喝看得见营养好喝", 1400),
+]
+
+
+class FakePackage:
+    """
+    把每行画成一块颜色编码的矩形：B 通道 = 行号，G 通道左半亮右半暗（用来判断是否倒置）；
+    假识别器按颜色还原文字，截取的宽度不到整行时只返回开头几个字
+    """
+
+    def __init__(self, layout=LAYOUT, flipped=()):
+        self.layout = layout
+        self.img = np.zeros((1600, 1200, 3), np.uint8)
+        self.polys = []
+        for i, (text, y) in enumerate(layout):
+            x0, x1 = 100, 100 + H * len(text)
+            self.img[y:y + H, x0:x1, 0] = (i + 1) * 10
+            half = (x0 + x1) // 2
+            bright = slice(half, x1) if i in flipped else slice(x0, half)
+            self.img[y:y + H, bright, 1] = 255
+            self.polys.append(np.float32([[x0, y], [x1, y], [x1, y + H], [x0, y + H]]))
+        self.widths = []
+
+    def detector(self, small):
+        scale = small.shape[1] / self.img.shape[1]
+        return [p * scale for p in self.polys]
+
+    def recognizer(self, crops):
+        out = []
+        for crop in crops:
+            self.widths.append(crop.shape[1])
+            i = int(round(crop[H // 2, crop.shape[1] // 2, 0] / 10)) - 1
+            text = self.layout[i][0]
+            if crop[:, :4, 1].mean() < 128:   # 倒置：识别不出
+                out.append(("@#", 0.1))
+                continue
+            full = crop.shape[1] >= H * len(text) - 4
+            out.append((text if full else text[:4], 0.95))
+        return out
+
+    def classifier(self, crops):
+        return [180 if crop[:, :4, 1].mean() < 128 else 0 for crop in crops]
+
+    def engine(self, **config):
+        return RoiOCR(self.detector, self.recognizer, self.classifier, {"det_side": 600, **config})
+
+
+def test_only_anchor_regions_are_recognised():
+    package = FakePackage()
+    result = package.engine().run(package.img)
+
+    assert result["regions"] == {"ingredients": "配料：生牛乳、白砂糖、\n食品添加剂（单,双甘油脂肪酸酯）",
+                                 "dates": "生产日期：\n20240501\n保质期：6个月"}
+    assert (result["boxes_detected"], result["boxes_recognized"], result["boxes_skipped"]) == (11, 5, 6)
+    assert result["anchors_found"] and result["items"][0]["box"][0] == [100, 600]
+    # 探测只截每行开头 4 个字宽；整行识别只发生在区域内
+    probes, full = package.widths[:11], package.widths[11:]
+    assert max(probes) <= 4 * H + 2 and len(full) == 5
+
+
+def test_upside_down_line_is_classified_only_when_needed():
+    package = FakePackage(flipped={8})
+    calls = []
+    engine = package.engine()
+    classify = engine.classifier
+    engine.classifier = lambda crops: calls.append(len(crops)) or classify(crops)
+    result = engine.run(package.img)
+    assert calls == [1]
+    assert "20240501" in result["regions"]["dates"]
+
+    never = package.engine(orientation="never").run(package.img)
+    assert "20240501" not in never["regions"]["dates"]
+
+
+def test_no_anchor_falls_back_to_full_page():
+    layout = [("某某牌纯牛奶", 100), ("好喝看得见", 300)]
+    package = FakePackage(layout)
+    result = package.engine().run(package.img)
+    assert [item["text"] for item in result["items"]] == ["某某牌纯牛奶", "好喝看得见"]
+    assert (result["anchors_found"], result["boxes_skipped"], result["regions"]) == (False, 0, {})
+    assert package.engine(fallback="none").run(package.img)["items"] == []
+
+
+def test_roi_endpoints(monkeypatch):
+    package = FakePackage()
+    monkeypatch.setattr(ocr_roi, "_roi_engine", package.engine())
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+    data = cv2.imencode(".png", package.img)[1].tobytes()
+    files = {"file": ("p.png", data, "image/png")}
+
+    roi = client.post("/ocr/roi", files=files).json()
+    assert roi["boxes_skipped"] == 6 and set(roi["regions"]) == {"ingredients", "dates"}
+    dates = client.post("/api/dates?roi=true", files=files).json()
+    assert (dates["production_date"], dates["expiry_date"]) == ("2024-05-01", "2024-10-31")
+    assert dates["roi"]["boxes_recognized"] == 5
+    analysis = client.post("/ocr/analyze?roi=true", files=files).json()
+    assert analysis["text"].startswith("配料") and len(analysis["lines"]) == 2
@@ -0,0 +1,73 @@
+# test_ocr_stream.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.ocr import _parse_items
+
+client = TestClient(app.main.app)
+
+
+def _jpeg(value: int) -> bytes:
+    _, buf = cv2.imencode(".jpg", np.full((80, 80, 3), value, dtype=np.uint8))
+    return buf.tobytes()
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    def fake_items(img_bytes):
+        if len(img_bytes) < 100:
+            raise ValueError("图片解码失败")
+        return [{"text": "配料表", "score": 0.99, "box": [[0, 0], [10, 0], [10, 5], [0, 5]]},
+                {"text": "水、食用盐", "score": 0.95, "box": [[0, 6], [20, 6], [20, 11], [0, 11]]}]
+
+    monkeypatch.setattr(app.main, "ocr_items", fake_items)
+    monkeypatch.setattr(app.main, "ocr_cache", None)
+
+
+def test_parse_items_keeps_scores_and_boxes():
+    result = [{"rec_texts": ["配料表", "水"],
+               "rec_scores": np.array([0.9, 0.8]),
+               "rec_polys": [np.array([[1.2, 2], [3, 2], [3, 4], [1, 4]]), np.zeros((4, 2))]}]
+    items = _parse_items(result)
+    assert items[0] == {"text": "配料表", "score": pytest.approx(0.9), "box": [[1, 2], [3, 2], [3, 4], [1, 4]]}
+    assert [item["text"] for item in items] == ["配料表", "水"]
+
+
+def test_stream_ndjson(fake_ocr):
+    files = [("files", ("a.jpg", _jpeg(50), "image/jpeg")),
+             ("files", ("b.jpg", b"bad", "image/jpeg")),
+             ("files", ("c.txt", b"text", "text/plain"))]
+    with client.stream("POST", "/ocr/stream", files=files) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert [e["event"] for e in events] == ["line", "line", "image_done", "error", "error", "done"]
+    assert events[1]["text"] == "水、食用盐" and events[1]["box"][2] == [20, 11]
+    assert events[3]["filename"] == "b.jpg"
+    assert events[-1] == {"event": "done", "images": 3, "succeeded": 1}
+
+
+def test_stream_sse(fake_ocr):
+    files = [("files", ("a.jpg", _jpeg(50), "image/jpeg"))]
+    response = client.post("/ocr/stream?format=sse", files=files)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    blocks = [b for b in response.text.split("\n\n") if b]
+    assert blocks[0].startswith("event: line\ndata: ")
+    assert json.loads(blocks[-1].split("data: ", 1)[1])["event"] == "done"
+
+
+def test_stream_rejects_unknown_format():
+    files = [("files", ("a.jpg", _jpeg(50), "image/jpeg"))]
+    assert client.post("/ocr/stream?format=xml", files=files).status_code == 400
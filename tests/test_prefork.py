@@ -0,0 +1,125 @@
+# test_prefork.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import signal
+import socket
+import subprocess
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend.batching import MicroBatcher
+from app.backend.cache import ResultCache
+from app.backend.executor import InferenceExecutor
+from app.backend.prefork import memory_report, parse_smaps_rollup
+from app.backend.preprocessing import decode_many
+
+client = TestClient(app.main.app)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SMAPS = """55d0c0a00000-7ffd3de3f000 ---p 00000000 00:00 0                          [rollup]
+Rss:              340800 kB
+Pss:              126500 kB
+Shared_Clean:     300000 kB
+Shared_Dirty:      19800 kB
+Private_Clean:       100 kB
+Private_Dirty:     20900 kB
+Swap:                  0 kB
+"""
+
+
+def test_memory_report():
+    kb = parse_smaps_rollup(SMAPS)
+    assert (kb["Rss"], kb["Pss"], kb["Private_Dirty"]) == (340800, 126500, 20900)
+
+    report = client.get("/api/memory").json()
+    assert report["layout"] == "separate" and [w["pid"] for w in report["workers"]] == [os.getpid()]
+    worker = report["workers"][0]
+    assert worker["rss_mb"] > 0 and worker["pss_mb"] <= worker["rss_mb"]
+    assert memory_report()["total_pss_mb"] > 0
+
+
+def test_fork_reinitialises_threads_and_connections(tmp_path):
+    batcher = MicroBatcher(lambda items: [x * 2 for x in items], max_wait_ms=1, name="fork-test")
+    executor = InferenceExecutor("fork-test", max_workers=2, max_queue=0)
+    cache = ResultCache("fork_test", disk_path=str(tmp_path / "cache.sqlite3"))
+    # 父进程里线程都已经跑起来
+    assert batcher.predict(1, timeout=5) == 2 and executor.submit(sum, [1, 2]).result(timeout=5) == 3
+    cache.set("k", {"v": 1})
+    images = [cv2.imencode(".png", np.zeros((4, 4, 3), np.uint8))[1].tobytes()] * 2
+    decode_many(lambda b: cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR), images)
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            ok = (batcher.predict(21, timeout=5) == 42
+                  and executor.submit(sum, [2, 3]).result(timeout=5) == 5
+                  and executor.in_flight() == 0
+                  and cache._get("k") == {"v": 1}
+                  and len(decode_many(lambda b: b, [b"a", b"b"])) == 2)
+            cache.set("child", {"v": 2})
+            code = 0 if ok else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # 父进程的连接不受子进程影响，还能读到子进程写入的数据
+    assert cache.get("child") == {"v": 2} and batcher.predict(5, timeout=5) == 10
+    batcher.close(timeout=5)
+    executor.shutdown()
+    cache.close()
+
+
+def _get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as r:
+        return json.loads(r.read())
+
+
+def test_prefork_server_shares_models_and_restarts_workers(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    server = subprocess.Popen([sys.executable, "-m", "app.backend.prefork", "serve",
+                               "--workers", "2", "--host", "127.0.0.1", "--port", str(port)],
+                              cwd=str(tmp_path), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 120
+        report = None
+        while time.time() < deadline:
+            try:
+                report = _get(port, "/api/memory")
+                if len(report["workers"]) == 2:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.5)
+        assert report["layout"] == "prefork" and report["parent"]["pid"] == server.pid
+        # 模型在父进程里加载过，worker 的启动报告沿用父进程的
+        assert _get(port, "/startup")["mode"] == "prefork"
+        # 模型页与父进程共享：worker 的常驻内存大部分不是私有的
+        assert all(w["private_mb"] < w["rss_mb"] / 2 for w in report["workers"]), report
+
+        # worker 崩溃后由父进程重新 fork
+        crashed = report["workers"][0]["pid"]
+        os.kill(crashed, signal.SIGKILL)
+        while time.time() < deadline:
+            pids = [w["pid"] for w in _get(port, "/api/memory")["workers"]]
+            if len(pids) == 2 and crashed not in pids:
+                break
+            time.sleep(0.5)
+        assert len(pids) == 2 and crashed not in pids
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=60) == 0
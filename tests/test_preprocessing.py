@@ -0,0 +1,58 @@
+# test_preprocessing.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.backend.preprocessing import Preprocessor
+
+
+def legacy_preprocess(img):
+    """原 FreshnessDetector._preprocess_image 的逐步实现，作为对照"""
+    img = cv2.resize(img, (224, 224))
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = img.astype(np.float32)
+    img = img / 255.0
+    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    img = (img - mean) / std
+    return img.transpose((2, 0, 1))
+
+
+def test_fused_preprocess_matches_legacy():
+    rng = np.random.default_rng(0)
+    pre = Preprocessor()
+    for shape in ((224, 224, 3), (480, 640, 3), (97, 131, 3)):
+        img = rng.integers(0, 256, size=shape, dtype=np.uint8)
+        np.testing.assert_allclose(pre.preprocess(img), legacy_preprocess(img), atol=1e-5)
+
+    real = cv2.imread("tests/images/fresh_apple.jpg", cv2.IMREAD_COLOR)
+    np.testing.assert_allclose(pre.preprocess(real), legacy_preprocess(real), atol=1e-5)
+
+
+def test_batch_reuses_preallocated_buffer():
+    rng = np.random.default_rng(1)
+    pre = Preprocessor()
+    images = [rng.integers(0, 256, size=(300, 200, 3), dtype=np.uint8) for _ in range(4)]
+
+    first = pre.batch(images)
+    assert first.shape == (4, 3, 224, 224)
+    for img, out in zip(images, first):
+        np.testing.assert_allclose(out, legacy_preprocess(img), atol=1e-5)
+
+    second = pre.batch(images[:2])
+    assert np.shares_memory(first, second)
+
+
+def test_reduced_decode_for_large_uploads():
+    img = np.full((1000, 1800, 3), 128, dtype=np.uint8)
+    _, buf = cv2.imencode(".jpg", img)
+    data = buf.tobytes()
+
+    assert Preprocessor(reduced_decode=False).decode(data).shape == (1000, 1800, 3)
+    # 1000 // 4 = 250 >= 224，1000 // 8 = 125 < 224 → 缩小 4 倍解码
+    assert Preprocessor(reduced_decode=True).decode(data).shape == (250, 450, 3)
+    assert Preprocessor(reduced_decode=True).decode(b"invalid_image_data") is None
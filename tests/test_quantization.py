@@ -0,0 +1,121 @@
+# test_quantization.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("paddle2onnx")
+
+from app.backend.freshness_backends import EagerBackend
+from app.backend.export_freshness_model import export_onnx, export_static
+from app.backend.ingest import apply_orientation
+from app.backend.preprocessing import Preprocessor
+from app.backend.quantize_freshness_model import build_report, iter_batches, list_images, quantize_int8
+
+
+@pytest.fixture(scope="module")
+def calib_dir(tmp_path_factory):
+    """按 dataset/train/<类别>/ 结构生成合成校准图片"""
+    root = tmp_path_factory.mktemp("train")
+    rng = np.random.default_rng(0)
+    for i, class_name in enumerate(("fresh", "normal", "spoiled")):
+        os.makedirs(root / class_name)
+        for j in range(4):
+            img = np.clip(rng.normal(60 + 60 * i, 30, (160, 160, 3)), 0, 255).astype(np.uint8)
+            cv2.imwrite(str(root / class_name / f"{j}.jpg"), img)
+    return str(root)
+
+
+@pytest.fixture(scope="module")
+def quantized(tmp_path_factory, calib_dir):
+    out_dir = tmp_path_factory.mktemp("models")
+    model_file, params_file = export_static(EagerBackend(3), str(out_dir / "freshness_model"))
+    fp32 = export_onnx(model_file, params_file, str(out_dir / "freshness_model.onnx"))
+    int8 = quantize_int8(fp32, str(out_dir / "freshness_model_int8.onnx"), calib_dir, batch_size=4)
+    return fp32, int8
+
+
+def test_list_images_interleaves_classes(calib_dir):
+    images = list_images(calib_dir, limit=3)
+    assert [label for _, label in images] == [0, 1, 2]
+
+
+def test_calibration_decodes_like_serving(tmp_path):
+    from PIL import Image
+
+    # 带 EXIF 方向（顺时针转 90°）的竖拍照片：校准看到的应是转正后的图，与线上一致
+    img = np.zeros((120, 200, 3), dtype=np.uint8)
+    img[:, :100] = (0, 0, 255)
+    pil = Image.fromarray(img[:, :, ::-1])
+    exif = pil.getexif()
+    exif[0x0112] = 6
+    path = tmp_path / "rotated.jpg"
+    pil.save(path, "JPEG", exif=exif.tobytes(), quality=95)
+
+    pre = Preprocessor(max_side=150)
+    batch, kept = next(iter_batches([str(path)], 1, pre))
+    assert kept == [0]
+    upright = apply_orientation(cv2.imread(str(path), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION), 6)
+    expected = pre.preprocess(cv2.resize(upright, (90, 150), interpolation=cv2.INTER_AREA))
+    np.testing.assert_allclose(batch[0], expected, atol=0.1)
+
+
+def test_int8_model_is_smaller_and_reported(quantized, calib_dir):
+    fp32, int8 = quantized
+    assert os.path.getsize(int8) < os.path.getsize(fp32) / 2
+
+    report = build_report({"fp32": fp32, "int8": int8}, calib_dir, batch_size=4, cpu_threads=1, runs=2)
+    assert report["fp32"]["top1_agreement_vs_fp32"] == 1.0
+    assert report["int8"]["images"] == 12
+    for key in ("model_size_mb", "accuracy", "latency_ms_batch1", "latency_ms_per_image_batch"):
+        assert key in report["int8"]
+
+
+def test_report_skips_undecodable_images(calib_dir, tmp_path, monkeypatch):
+    from app.backend import quantize_freshness_model
+
+    class BrightnessBackend:
+        """按亮度分类的假模型：合成图上准确率 100%，预测与标签错位一张就会掉下来"""
+
+        def __init__(self, path, cpu_threads=1):
+            pass
+
+        def __call__(self, batch):
+            return np.eye(3)[np.digitize(batch.mean(axis=(1, 2, 3)), (-0.5, 0.6))]
+
+    monkeypatch.setattr(quantize_freshness_model, "OnnxRuntimeBackend", BrightnessBackend)
+    # 坏图排在最前面：预测要按下标对回标签，而不是整体错位一张
+    eval_dir = tmp_path / "eval"
+    shutil.copytree(calib_dir, eval_dir)
+    (eval_dir / "fresh" / "0-broken.jpg").write_bytes(b"not a jpeg")
+    model = tmp_path / "fp32.onnx"
+    model.write_bytes(b"")
+
+    clean = build_report({"fp32": str(model)}, calib_dir, batch_size=4, runs=1)["fp32"]
+    broken = build_report({"fp32": str(model)}, str(eval_dir), batch_size=4, runs=1)["fp32"]
+    assert clean["accuracy"] == 1.0
+    assert (broken["images"], broken["accuracy"]) == (12, 1.0)
+
+
+def test_detector_loads_int8_model(quantized):
+    from app.backend.freshness_detector import FreshnessDetector
+
+    fp32, int8 = quantized
+    options = {"onnx_path": fp32, "onnx_int8_path": int8, "precision": "int8", "cpu_threads": 1}
+    detector = FreshnessDetector(backend="onnxruntime", backend_options=options)
+    assert detector.model_version.startswith("onnxruntime:freshness_model_int8.onnx")
+
+    # model_path 直接指向 .onnx 文件也能加载
+    detector = FreshnessDetector(model_path=int8)
+    _, buf = cv2.imencode(".jpg", np.full((200, 200, 3), 90, dtype=np.uint8))
+    result = detector.predict(buf.tobytes())
+    assert result["status"] == "success"
+    assert detector.backend == "onnxruntime"
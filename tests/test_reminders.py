@@ -0,0 +1,115 @@
+# test_reminders.py
+import sys
+import os
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.backend import inventory, reminders
+from app.backend.inventory import InventoryStore
+from app.backend.reminders import JsonlFileSink, QueueSink, ReminderEngine, lead_bands
+
+client = TestClient(app.main.app)
+
+TODAY = date(2024, 6, 1)
+
+
+def _day(offset: int) -> str:
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = InventoryStore(str(tmp_path / "inventory.sqlite3"), pool_size=2)
+    yield s
+    s.close()
+
+
+def _drain(sink: QueueSink):
+    items = []
+    while not sink.queue.empty():
+        items.append(sink.queue.get_nowait())
+    return items
+
+
+def test_lead_bands():
+    assert lead_bands([7, 0, 3, 3]) == [(0, 0, 0), (1, 3, 3), (4, 7, 7)]
+    with pytest.raises(ValueError):
+        lead_bands([-1])
+
+
+def test_reminders_follow_bands_and_deduplicate(store):
+    store.add_items("alice", [{"name": f"d{o}", "expiry_date": _day(o)} for o in (-1, 0, 2, 3, 5, 8)])
+    sink = QueueSink()
+    engine = ReminderEngine(store, sink, lead_days=(0, 3, 7))
+
+    assert engine.run_once(TODAY)["created"] == 4
+    got = {r["name"]: (r["lead_days"], r["days_left"]) for r in _drain(sink)}
+    assert got == {"d0": (0, 0), "d2": (3, 2), "d3": (3, 3), "d5": (7, 5)}
+
+    # 同一天再跑不重复；之后每天只在食品进入新的区间时提醒
+    assert engine.run_once(TODAY)["created"] == 0
+    engine.run_once(TODAY + timedelta(days=1))
+    assert [r["message"] for r in _drain(sink)] == ["d8将在7天后过期"]
+    engine.run_once(TODAY + timedelta(days=2))
+    assert sorted(r["message"] for r in _drain(sink)) == ["d2今天过期", "d5将在3天后过期"]
+
+
+def test_per_user_lead_days(store):
+    store.add_items("alice", [{"name": "milk", "expiry_date": _day(1)}])
+    store.add_items("bob", [{"name": "milk", "expiry_date": _day(1)}])
+    sink = QueueSink()
+    engine = ReminderEngine(store, sink, lead_days=(0, 3))
+    assert engine.set_lead_days("bob", [1, 1, 14]) == [1, 14]
+    engine.run_once(TODAY)
+    assert sorted((r["user_id"], r["lead_days"]) for r in _drain(sink)) == [("alice", 3), ("bob", 1)]
+
+
+def test_failed_delivery_resumes_after_restart(store, tmp_path):
+    store.add_items("alice", [{"name": f"n{i}", "expiry_date": _day(1)} for i in range(5)])
+
+    class Broken:
+        def send(self, batch):
+            raise ConnectionError("push service down")
+
+    result = ReminderEngine(store, Broken(), batch_size=2).run_once(TODAY)
+    assert (result["created"], result["delivered"]) == (5, 0)
+
+    path = str(tmp_path / "out.jsonl")
+    restarted = ReminderEngine(store, JsonlFileSink(path), batch_size=2)
+    assert restarted.stats()["pending"] == 5
+    assert restarted.run_once(TODAY)["delivered"] == 5
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.loads(line)["name"] for line in f) == [f"n{i}" for i in range(5)]
+    assert restarted.stats() == {"pending": 0, "last_computed_date": "2024-06-01", "lead_days": [0, 3, 7]}
+
+
+def test_changed_expiry_is_reminded_again(store):
+    (item_id,) = store.add_items("alice", [{"name": "yogurt", "expiry_date": _day(2)}])
+    sink = QueueSink()
+    engine = ReminderEngine(store, sink)
+    engine.run_once(TODAY)
+    store.update_item("alice", item_id, {"expiry_date": _day(3)})
+    engine.run_once(TODAY)
+    assert [r["expiry_date"] for r in _drain(sink)] == [_day(2), _day(3)]
+
+
+def test_reminder_endpoints(tmp_path, monkeypatch):
+    store = InventoryStore(str(tmp_path / "api.sqlite3"))
+    monkeypatch.setattr(inventory, "_store", store)
+    monkeypatch.setattr(reminders, "_engine", ReminderEngine(store, QueueSink()))
+    store.add_items("alice", [{"name": "酸奶", "expiry_date": (date.today() + timedelta(days=3)).isoformat()}])
+
+    assert client.put("/api/reminders/alice/settings", json={"lead_days": [3]}).json() == {"lead_days": [3]}
+    assert client.put("/api/reminders/alice/settings", json={"lead_days": [-2]}).status_code == 400
+    assert client.post("/api/reminders/run").json()["created"] == 1
+    assert client.get("/api/reminders/alice").json()["reminders"][0]["message"] == "酸奶将在3天后过期"
+    assert client.get("/api/reminders").json()["pending"] == 0
+    inventory.close_store()
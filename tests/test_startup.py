@@ -0,0 +1,39 @@
+# test_startup.py
+import sys
+import os
+import subprocess
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.backend.startup import StartupReport, detect_device
+
+
+def test_detect_device():
+    """显式指定设备时原样返回；auto 时只会得到 gpu 或 cpu"""
+    assert detect_device("cpu") == "cpu"
+    assert detect_device("gpu") == "gpu"
+    assert detect_device("auto") in ("gpu", "cpu")
+
+
+def test_startup_report_phases():
+    report = StartupReport()
+    with report.measure("ocr", "weight_load"):
+        pass
+    report.record("ocr", "warmup", 0.5)
+    data = report.as_dict()
+    assert set(data["components"]["ocr"]) == {"weight_load", "warmup"}
+    assert data["total_s"] >= 0.5
+
+
+def test_app_import_does_not_load_models():
+    """懒加载模式下导入 app.main 不应创建任何模型（在新进程中检查，不受其它测试影响）"""
+    code = (
+        "import app.main, app.backend.ocr\n"
+        "assert app.main.freshness_detector is None\n"
+        "assert app.backend.ocr.ocr_engine is None\n"
+        "assert 'app' in app.main.startup_report.as_dict()['components']\n"
+    )
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr